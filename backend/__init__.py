@@ -66,6 +66,11 @@ def create_app(env="backend.config.EnvironmentConfig"):
 
     # Connect to database
     app.logger.debug("Connecting to the database")
+    from backend.services.pool_service import InstrumentedQueuePool, PoolService
+
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"], poolclass=InstrumentedQueuePool
+    )
     db.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
@@ -76,6 +81,11 @@ def create_app(env="backend.config.EnvironmentConfig"):
     def index_redirect():
         return redirect(format_url("system/heartbeat/"), code=302)
 
+    @app.after_request
+    def publish_pool_metrics(response):
+        PoolService.publish_metrics(db.engine)
+        return response
+
     # Add paths to API endpoints
     add_api_endpoints(app)
 
@@ -113,14 +123,6 @@ def initialise_logger(app):
     app.logger.setLevel(log_level)
 
 
-def initialise_counters(app):
-    """ Initialise homepage counters so that users don't see 0 users on first load of application"""
-    from backend.services.stats_service import StatsService
-
-    with app.app_context():
-        StatsService.get_homepage_stats()
-
-
 def add_api_endpoints(app):
     """
     Define the routes the API exposes using Flask-Restful.
@@ -174,16 +176,20 @@ def add_api_endpoints(app):
         TasksQueriesJsonAPI,
         TasksQueriesXmlAPI,
         TasksQueriesGpxAPI,
+        TasksQueriesTilesAPI,
+        TasksQueriesChangesAPI,
         TasksQueriesAoiAPI,
         TasksQueriesMappedAPI,
         TasksQueriesOwnInvalidatedAPI,
     )
     from backend.api.tasks.actions import (
         TasksActionsMappingLockAPI,
+        TasksActionsMappingLockNextAPI,
         TasksActionsMappingStopAPI,
         TasksActionsMappingUnlockAPI,
         TasksActionsMappingUndoAPI,
         TasksActionsValidationLockAPI,
+        TasksActionsValidationLockNextAPI,
         TasksActionsValidationStopAPI,
         TasksActionsValidationUnlockAPI,
         TasksActionsMapAllAPI,
@@ -290,6 +296,7 @@ def add_api_endpoints(app):
     )
     from backend.api.system.banner import SystemBannerAPI
     from backend.api.system.statistics import SystemStatisticsAPI
+    from backend.api.system.metrics import SystemMetricsAPI
     from backend.api.system.authentication import (
         SystemAuthenticationEmailAPI,
         SystemAuthenticationLoginAPI,
@@ -475,6 +482,17 @@ def add_api_endpoints(app):
     api.add_resource(
         TasksQueriesGpxAPI, format_url("projects/<int:project_id>/tasks/queries/gpx/")
     )
+    api.add_resource(
+        TasksQueriesChangesAPI,
+        format_url("projects/<int:project_id>/tasks/queries/changes/"),
+    )
+    api.add_resource(
+        TasksQueriesTilesAPI,
+        # Tile URLs end with the file extension, without the trailing slash of format_url
+        format_url(
+            "projects/<int:project_id>/tasks/tiles/<int:zoom>/<int:x>/<int:y>.mvt"
+        )[:-1],
+    )
     api.add_resource(
         TasksQueriesAoiAPI, format_url("projects/<int:project_id>/tasks/queries/aoi/")
     )
@@ -494,6 +512,10 @@ def add_api_endpoints(app):
             "projects/<int:project_id>/tasks/actions/lock-for-mapping/<int:task_id>/"
         ),
     )
+    api.add_resource(
+        TasksActionsMappingLockNextAPI,
+        format_url("projects/<int:project_id>/tasks/actions/lock-next-for-mapping/"),
+    )
     api.add_resource(
         TasksActionsMappingStopAPI,
         format_url(
@@ -520,6 +542,10 @@ def add_api_endpoints(app):
         TasksActionsValidationLockAPI,
         format_url("projects/<int:project_id>/tasks/actions/lock-for-validation/"),
     )
+    api.add_resource(
+        TasksActionsValidationLockNextAPI,
+        format_url("projects/<int:project_id>/tasks/actions/lock-next-for-validation/"),
+    )
     api.add_resource(
         TasksActionsValidationStopAPI,
         format_url("projects/<int:project_id>/tasks/actions/stop-validation/"),
@@ -818,6 +844,7 @@ def add_api_endpoints(app):
     api.add_resource(SystemHeartbeatAPI, format_url("system/heartbeat/"))
     api.add_resource(SystemLanguagesAPI, format_url("system/languages/"))
     api.add_resource(SystemStatisticsAPI, format_url("system/statistics/"))
+    api.add_resource(SystemMetricsAPI, format_url("system/metrics/"))
     api.add_resource(
         SystemAuthenticationLoginAPI, format_url("system/authentication/login/")
     )
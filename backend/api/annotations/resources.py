@@ -1,9 +1,10 @@
 from flask_restful import Resource, current_app, request
-from schematics.exceptions import DataError
-from backend.models.postgis.task import Task
 from backend.models.postgis.task_annotation import TaskAnnotation
 from backend.services.project_service import ProjectService, NotFound
-from backend.services.task_annotations_service import TaskAnnotationsService
+from backend.services.task_annotations_service import (
+    TaskAnnotationsService,
+    TaskAnnotationsServiceError,
+)
 from backend.services.application_service import ApplicationService
 
 
@@ -65,7 +66,7 @@ class AnnotationsRestAPI(Resource):
         parameters:
             - in: header
               name: Content-Type
-              description: Content type for post body
+              description: Content type for post body, application/x-ndjson to stream one task annotation per line
               required: true
               type: string
               default: application/json
@@ -111,11 +112,11 @@ class AnnotationsRestAPI(Resource):
                                 description: JSON object with properties
         responses:
             200:
-                description: Project updated
+                description: Number of annotations inserted and updated
             400:
-                description: Client Error - Invalid Request
+                description: Client Error - Invalid Request or task not in project
             404:
-                description: Project or task not found
+                description: Project not found
             500:
                 description: Internal Server Error
         """
@@ -133,38 +134,28 @@ class AnnotationsRestAPI(Resource):
             current_app.logger.error("No token supplied")
             return {"Error": "No token supplied", "SubCode": "NotFound"}, 500
 
-        try:
-            annotations = request.get_json() or {}
-        except DataError as e:
-            current_app.logger.error(f"Error validating request: {str(e)}")
-
         try:
             ProjectService.exists(project_id)
         except NotFound as e:
             current_app.logger.error(f"Error validating project: {str(e)}")
             return {"Error": "Project not found", "SubCode": "NotFound"}, 404
 
-        task_ids = [t["taskId"] for t in annotations["tasks"]]
-
-        # check if task ids are valid
-        tasks = Task.get_tasks(project_id, task_ids)
-        tasks_ids_db = [t.id for t in tasks]
-        if len(task_ids) != len(tasks_ids_db):
-            return {"Error": "Invalid task id"}, 500
+        if request.mimetype == "application/x-ndjson":
+            annotations = TaskAnnotationsService.read_ndjson(request.stream)
+        else:
+            annotations = (request.get_json() or {}).get("tasks")
+            if not isinstance(annotations, list):
+                return {"Error": "No tasks supplied", "SubCode": "InvalidData"}, 400
 
-        for annotation in annotations["tasks"]:
-            try:
-                TaskAnnotationsService.add_or_update_annotation(
-                    annotation, project_id, annotation_type
-                )
-            except DataError as e:
-                current_app.logger.error(f"Error creating annotations: {str(e)}")
-                return {
-                    "Error": "Error creating annotations",
-                    "SubCode": "InvalidData",
-                }, 400
+        try:
+            counts = TaskAnnotationsService.upsert_annotations(
+                project_id, annotation_type, annotations
+            )
+        except TaskAnnotationsServiceError as e:
+            current_app.logger.error(f"Error creating annotations: {str(e)}")
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 400
 
-        return project_id, 200
+        return {"projectId": project_id, **counts}, 200
 
     def put(self, project_id: int, task_id: int):
         """
@@ -1,5 +1,3 @@
-import threading
-
 from flask_restful import Resource, request, current_app
 from schematics.exceptions import DataError
 
@@ -11,7 +9,7 @@ from backend.services.project_admin_service import (
     ProjectAdminServiceError,
 )
 from backend.services.grid.grid_service import GridService
-from backend.services.messaging.message_service import MessageService
+from backend.services.job_service import JobService
 from backend.services.users.authentication_service import token_auth, tm
 from backend.services.interests_service import InterestService
 from backend.models.postgis.utils import InvalidGeoJson
@@ -142,10 +140,11 @@ class ProjectsActionsMessageContributorsAPI(Resource):
             ):
                 raise ValueError()
 
-            threading.Thread(
-                target=MessageService.send_message_to_all_contributors,
-                args=(project_id, message_dto),
-            ).start()
+            JobService.enqueue(
+                "send_message_to_all_contributors",
+                project_id=project_id,
+                message_dto=message_dto.to_primitive(),
+            )
             return {"Success": "Messages started"}, 200
         except ValueError:
             return {
@@ -1,4 +1,5 @@
 from flask_restful import Resource, current_app, request
+from backend.services.pagination_service import PaginationServiceError
 from backend.services.stats_service import StatsService
 from backend.services.project_service import ProjectService
 from backend.models.postgis.utils import NotFound
@@ -24,6 +25,17 @@ class ProjectsActivitiesAPI(Resource):
               name: page
               description: Page of results user requested
               type: integer
+            - in: query
+              name: cursor
+              description:
+                Cursor of the page of results user requested, as returned in nextCursor. Pages by cursor
+                instead of page number if present, starting from the first page if empty
+              type: string
+            - in: query
+              name: count
+              description: How the total of results is counted, defaults to exact, or none with a cursor
+              type: string
+              enum: [exact, cached, estimate, none]
         responses:
             200:
                 description: Project activity
@@ -40,8 +52,12 @@ class ProjectsActivitiesAPI(Resource):
 
         try:
             page = int(request.args.get("page")) if request.args.get("page") else 1
-            activity = StatsService.get_latest_activity(project_id, page)
+            cursor = request.args.get("cursor")
+            count = request.args.get("count", "exact" if cursor is None else "none")
+            activity = StatsService.get_latest_activity(project_id, page, cursor, count)
             return activity.to_primitive(), 200
+        except PaginationServiceError as e:
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 400
         except Exception as e:
             error_msg = f"User GET - unhandled error: {str(e)}"
             current_app.logger.critical(error_msg)
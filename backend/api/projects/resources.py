@@ -1,6 +1,6 @@
 import geojson
 import io
-from flask import send_file
+from flask import Response, send_file, stream_with_context
 from flask_restful import Resource, current_app, request
 from schematics.exceptions import DataError
 from distutils.util import strtobool
@@ -22,6 +22,7 @@ from backend.services.project_service import (
 )
 from backend.services.users.user_service import UserService
 from backend.services.organisation_service import OrganisationService
+from backend.services.pagination_service import PaginationServiceError
 from backend.services.users.authentication_service import token_auth
 from backend.services.project_admin_service import (
     ProjectAdminService,
@@ -93,6 +94,30 @@ class ProjectsRestAPI(Resource):
                 else False
             )
 
+            if not abbreviated:
+                # Full projects can hold many thousands of task geometries, so they are streamed
+                project_stream = ProjectService.get_project_stream_for_mapper(
+                    project_id,
+                    authenticated_user_id,
+                    request.environ.get("HTTP_ACCEPT_LANGUAGE"),
+                )
+                if project_stream is None:
+                    return {
+                        "Error": "User not permitted: Private Project",
+                        "SubCode": "PrivateProject",
+                    }, 403
+
+                headers = {}
+                if as_file:
+                    headers[
+                        "Content-Disposition"
+                    ] = f"attachment; filename=project_{str(project_id)}.json"
+                return Response(
+                    stream_with_context(project_stream),
+                    mimetype="application/json",
+                    headers=headers,
+                )
+
             project_dto = ProjectService.get_project_dto_for_mapper(
                 project_id,
                 authenticated_user_id,
@@ -130,7 +155,7 @@ class ProjectsRestAPI(Resource):
         finally:
             # this will try to unlock tasks that have been locked too long
             try:
-                ProjectService.auto_unlock_tasks(project_id)
+                ProjectService.auto_unlock_tasks_async(project_id)
             except Exception as e:
                 current_app.logger.critical(str(e))
 
@@ -520,6 +545,11 @@ class ProjectSearchBase(Resource):
         search_dto.page = (
             int(request.args.get("page")) if request.args.get("page") else 1
         )
+        search_dto.cursor = request.args.get("cursor")
+        # Counting every result costs as much as the search, cursor pages skip it unless asked
+        search_dto.count = request.args.get(
+            "count", "exact" if search_dto.cursor is None else "none"
+        )
         search_dto.text_search = request.args.get("textSearch")
         search_dto.omit_map_results = strtobool(
             request.args.get("omitMapResults", "false")
@@ -626,6 +656,19 @@ class ProjectsAllAPI(ProjectSearchBase):
               description: Page of results user requested
               type: integer
               default: 1
+            - in: query
+              name: cursor
+              description:
+                Cursor of the page of results user requested, as returned in nextCursor. Pages by cursor
+                instead of page number if present, starting from the first page if empty
+              type: string
+            - in: query
+              name: count
+              description:
+                How the total of results is counted. Cached counts may be out of date until a project is
+                saved, estimated counts come from database statistics. Defaults to exact, or none with a cursor
+              type: string
+              enum: [exact, cached, estimate, none]
             - in: query
               name: textSearch
               description: Text to search
@@ -713,6 +756,8 @@ class ProjectsAllAPI(ProjectSearchBase):
             return results_dto.to_primitive(), 200
         except NotFound:
             return {"mapResults": {}, "results": []}, 200
+        except PaginationServiceError as e:
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 400
         except (KeyError, ValueError) as e:
             error_msg = f"Projects GET - {str(e)}"
             return {"Error": error_msg}, 400
@@ -1048,7 +1093,7 @@ class ProjectsQueriesNoGeometriesAPI(Resource):
         finally:
             # this will try to unlock tasks that have been locked too long
             try:
-                ProjectService.auto_unlock_tasks(project_id)
+                ProjectService.auto_unlock_tasks_async(project_id)
             except Exception as e:
                 current_app.logger.critical(str(e))
 
@@ -0,0 +1,53 @@
+from flask_restful import Resource, current_app
+
+from backend import db
+from backend.models.postgis.statuses import UserRole
+from backend.services.pool_service import PoolService
+from backend.services.users.authentication_service import token_auth
+from backend.services.users.user_service import UserService
+
+
+class SystemMetricsAPI(Resource):
+    @token_auth.login_required
+    def get(self):
+        """
+        Get the database connection pool metrics of each worker
+        ---
+        tags:
+          - system
+        produces:
+          - application/json
+        parameters:
+            - in: header
+              name: Authorization
+              description: Base64 encoded session token
+              required: true
+              type: string
+              default: Token sessionTokenHere==
+        responses:
+            200:
+                description: Pool size, connections checked out, overflow, checkouts and wait time per worker.
+                    Other workers are only listed with the file or redis cache backend
+            401:
+                description: Unauthorized - Invalid credentials
+            403:
+                description: Forbidden
+            500:
+                description: Internal Server Error
+        """
+        authenticated_user = UserService.get_user_by_id(token_auth.current_user())
+        if authenticated_user.role != UserRole.ADMIN.value:
+            return {
+                "Error": "Metrics can only be read by system admins",
+                "SubCode": "OnlyAdminAccess",
+            }, 403
+
+        try:
+            return PoolService.get_metrics(db.engine), 200
+        except Exception as e:
+            error_msg = f"Unhandled error: {str(e)}"
+            current_app.logger.critical(error_msg)
+            return {
+                "Error": "Unable to fetch metrics",
+                "SubCode": "InternalServerError",
+            }, 500
@@ -19,6 +19,7 @@ from backend.services.validator_service import (
 )
 from backend.models.dtos.mapping_dto import (
     LockTaskDTO,
+    LockNextTaskDTO,
     StopMappingTaskDTO,
     MappedTaskDTO,
     ExtendLockTimeDTO,
@@ -109,6 +110,87 @@ class TasksActionsMappingLockAPI(Resource):
             }, 500
 
 
+class TasksActionsMappingLockNextAPI(Resource):
+    @token_auth.login_required
+    def post(self, project_id):
+        """
+        Locks the next available task for mapping, preferring tasks in priority areas
+        ---
+        tags:
+            - tasks
+        produces:
+            - application/json
+        parameters:
+            - in: header
+              name: Authorization
+              description: Base64 encoded session token
+              required: true
+              type: string
+              default: Token sessionTokenHere==
+            - in: header
+              name: Accept-Language
+              description: Language user is requesting
+              type: string
+              required: true
+              default: en
+            - name: project_id
+              in: path
+              description: Project ID the task is associated with
+              required: true
+              type: integer
+              default: 1
+            - in: query
+              name: nearTaskId
+              description: Prefer the available task closest to this task
+              type: integer
+        responses:
+            200:
+                description: Task locked
+            400:
+                description: Client Error
+            401:
+                description: Unauthorized - Invalid credentials
+            403:
+                description: Forbidden
+            404:
+                description: No task available
+            409:
+                description: User has not accepted license terms of project
+            500:
+                description: Internal Server Error
+        """
+        try:
+            lock_dto = LockNextTaskDTO()
+            lock_dto.user_id = token_auth.current_user()
+            lock_dto.project_id = project_id
+            lock_dto.near_task_id = request.args.get("nearTaskId")
+            lock_dto.preferred_locale = request.environ.get("HTTP_ACCEPT_LANGUAGE")
+            lock_dto.validate()
+        except DataError as e:
+            current_app.logger.error(f"Error validating request: {str(e)}")
+            return {"Error": "Unable to lock task", "SubCode": "InvalidData"}, 400
+
+        try:
+            task = MappingService.lock_next_task_for_mapping(lock_dto)
+            return task.to_primitive(), 200
+        except NotFound:
+            return {"Error": "No task available", "SubCode": "NotFound"}, 404
+        except MappingServiceError as e:
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 403
+        except UserLicenseError:
+            return {
+                "Error": "User not accepted license terms",
+                "SubCode": "UserLicenseError",
+            }, 409
+        except Exception as e:
+            error_msg = f"Task Lock Next API - unhandled error: {str(e)}"
+            current_app.logger.critical(error_msg)
+            return {
+                "Error": "Unable to lock task",
+                "SubCode": "InternalServerError",
+            }, 500
+
+
 class TasksActionsMappingStopAPI(Resource):
     @token_auth.login_required
     def post(self, project_id, task_id):
@@ -438,6 +520,87 @@ class TasksActionsValidationLockAPI(Resource):
             }, 500
 
 
+class TasksActionsValidationLockNextAPI(Resource):
+    @token_auth.login_required
+    def post(self, project_id):
+        """
+        Locks the next available task for validation, preferring tasks in priority areas
+        ---
+        tags:
+            - tasks
+        produces:
+            - application/json
+        parameters:
+            - in: header
+              name: Authorization
+              description: Base64 encoded session token
+              required: true
+              type: string
+              default: Token sessionTokenHere==
+            - in: header
+              name: Accept-Language
+              description: Language user is requesting
+              type: string
+              required: true
+              default: en
+            - name: project_id
+              in: path
+              description: Project ID the task is associated with
+              required: true
+              type: integer
+              default: 1
+            - in: query
+              name: nearTaskId
+              description: Prefer the available task closest to this task
+              type: integer
+        responses:
+            200:
+                description: Task locked for validation
+            400:
+                description: Client Error
+            401:
+                description: Unauthorized - Invalid credentials
+            403:
+                description: Forbidden
+            404:
+                description: No task available
+            409:
+                description: User has not accepted license terms of project
+            500:
+                description: Internal Server Error
+        """
+        try:
+            lock_dto = LockNextTaskDTO()
+            lock_dto.user_id = token_auth.current_user()
+            lock_dto.project_id = project_id
+            lock_dto.near_task_id = request.args.get("nearTaskId")
+            lock_dto.preferred_locale = request.environ.get("HTTP_ACCEPT_LANGUAGE")
+            lock_dto.validate()
+        except DataError as e:
+            current_app.logger.error(f"Error validating request: {str(e)}")
+            return {"Error": "Unable to lock task", "SubCode": "InvalidData"}, 400
+
+        try:
+            tasks = ValidatorService.lock_next_task_for_validation(lock_dto)
+            return tasks.to_primitive(), 200
+        except NotFound:
+            return {"Error": "No task available", "SubCode": "NotFound"}, 404
+        except ValidatorServiceError as e:
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 403
+        except UserLicenseError:
+            return {
+                "Error": "User not accepted license terms",
+                "SubCode": "UserLicenseError",
+            }, 409
+        except Exception as e:
+            error_msg = f"Validator Lock Next API - unhandled error: {str(e)}"
+            current_app.logger.critical(error_msg)
+            return {
+                "Error": "Unable to lock task",
+                "SubCode": "InternalServerError",
+            }, 500
+
+
 class TasksActionsValidationStopAPI(Resource):
     @tm.pm_only(False)
     @token_auth.login_required
@@ -922,6 +1085,11 @@ class TasksActionsSplitAPI(Resource):
               required: true
               type: integer
               default: 1
+            - in: query
+              name: levels
+              description: Number of times the task is split, giving 4^levels tasks (1 to 3)
+              type: integer
+              default: 1
         responses:
             200:
                 description: Task split OK
@@ -944,8 +1112,10 @@ class TasksActionsSplitAPI(Resource):
             split_task_dto.preferred_locale = request.environ.get(
                 "HTTP_ACCEPT_LANGUAGE"
             )
+            if request.args.get("levels"):
+                split_task_dto.levels = int(request.args.get("levels"))
             split_task_dto.validate()
-        except DataError as e:
+        except (DataError, ValueError) as e:
             current_app.logger.error(f"Error validating request: {str(e)}")
             return {"Error": "Unable to split task", "SubCode": "InvalidData"}, 400
         try:
@@ -1,16 +1,17 @@
-import io
 from distutils.util import strtobool
 
-from flask import send_file, Response
+from flask import Response, stream_with_context
 from flask_restful import Resource, current_app, request
 from schematics.exceptions import DataError
 
+from backend.api.utils import stream_response
 from backend.services.mapping_service import MappingService, NotFound
 from backend.models.dtos.grid_dto import GridDTO
 
 from backend.services.users.authentication_service import token_auth, tm
 from backend.services.users.user_service import UserService
 from backend.services.validator_service import ValidatorService
+from backend.services.pagination_service import PaginationServiceError
 
 from backend.services.project_service import ProjectService, ProjectServiceError
 from backend.services.grid.grid_service import GridService
@@ -96,9 +97,32 @@ class TasksQueriesJsonAPI(Resource):
               type: boolean
               description: Set to true if file download preferred
               default: True
+            - in: query
+              name: orderBy
+              type: string
+              description: Set to effort_prediction to sort tasks by their predicted mapping effort
+            - in: query
+              name: orderByType
+              type: string
+              description: ASC or DESC
+              default: ASC
+            - in: query
+              name: limit
+              type: integer
+              description: Maximum number of tasks, at least 1, eg. the top tasks by predicted effort
+            - in: query
+              name: minEffort
+              type: number
+              description: Only tasks whose predicted effort is at least this
+            - in: query
+              name: maxEffort
+              type: number
+              description: Only tasks whose predicted effort is at most this
         responses:
             200:
                 description: Project found
+            400:
+                description: Invalid query parameters
             403:
                 description: Forbidden
             404:
@@ -114,18 +138,38 @@ class TasksQueriesJsonAPI(Resource):
                 else True
             )
 
-            tasks_json = ProjectService.get_project_tasks(int(project_id), tasks)
+            limit, min_effort, max_effort = (
+                request.args.get(name) for name in ["limit", "minEffort", "maxEffort"]
+            )
+            try:
+                limit = int(limit) if limit else None
+                min_effort = float(min_effort) if min_effort else None
+                max_effort = float(max_effort) if max_effort else None
+            except ValueError:
+                return {"Error": "Invalid parameters", "SubCode": "InvalidData"}, 400
+            if limit is not None and limit < 1:
+                return {"Error": "Invalid limit", "SubCode": "InvalidData"}, 400
+
+            tasks_stream = ProjectService.get_project_tasks_stream(
+                int(project_id),
+                tasks,
+                request.args.get("orderBy"),
+                request.args.get("orderByType", "ASC").upper(),
+                limit=limit,
+                min_effort=min_effort,
+                max_effort=max_effort,
+            )
 
+            headers = {}
             if as_file:
-                tasks_json = str(tasks_json).encode("utf-8")
-                return send_file(
-                    io.BytesIO(tasks_json),
-                    mimetype="application/json",
-                    as_attachment=True,
-                    attachment_filename=f"{str(project_id)}-tasks.geojson",
-                )
-
-            return tasks_json, 200
+                headers[
+                    "Content-Disposition"
+                ] = f"attachment; filename={str(project_id)}-tasks.geojson"
+            return Response(
+                stream_with_context(tasks_stream),
+                mimetype="application/json",
+                headers=headers,
+            )
         except NotFound:
             return {"Error": "Project or Task Not Found", "SubCode": "NotFound"}, 404
         except ProjectServiceError as e:
@@ -261,17 +305,13 @@ class TasksQueriesXmlAPI(Resource):
                 else False
             )
 
-            xml = MappingService.generate_osm_xml(project_id, tasks)
+            xml = MappingService.stream_osm_xml(project_id, tasks)
 
-            if as_file:
-                return send_file(
-                    io.BytesIO(xml),
-                    mimetype="text.xml",
-                    as_attachment=True,
-                    attachment_filename=f"HOT-project-{project_id}.osm",
-                )
-
-            return Response(xml, mimetype="text/xml", status=200)
+            return stream_response(
+                xml,
+                "text/xml",
+                f"HOT-project-{project_id}.osm" if as_file else None,
+            )
         except NotFound:
             return (
                 {
@@ -334,17 +374,13 @@ class TasksQueriesGpxAPI(Resource):
                 else False
             )
 
-            xml = MappingService.generate_gpx(project_id, tasks)
+            xml = MappingService.stream_gpx(project_id, tasks)
 
-            if as_file:
-                return send_file(
-                    io.BytesIO(xml),
-                    mimetype="text.xml",
-                    as_attachment=True,
-                    attachment_filename=f"HOT-project-{project_id}.gpx",
-                )
-
-            return Response(xml, mimetype="text/xml", status=200)
+            return stream_response(
+                xml,
+                "text/xml",
+                f"HOT-project-{project_id}.gpx" if as_file else None,
+            )
         except NotFound:
             return (
                 {
@@ -362,6 +398,134 @@ class TasksQueriesGpxAPI(Resource):
             }, 500
 
 
+class TasksQueriesChangesAPI(Resource):
+    def get(self, project_id):
+        """
+        Get the tasks of a project whose status, locker or mapper changed since a cursor
+        ---
+        tags:
+            - tasks
+        produces:
+            - application/json
+        parameters:
+            - name: project_id
+              in: path
+              description: Project ID the tasks are associated with
+              required: true
+              type: integer
+              default: 1
+            - in: query
+              name: since
+              type: integer
+              description: Cursor of the previous response; leave blank to get all tasks
+        responses:
+            200:
+                description: Changed tasks, without geometry, and the cursor to send next time
+            400:
+                description: Invalid cursor
+            404:
+                description: Project not found
+            500:
+                description: Internal Server Error
+        """
+        try:
+            since = request.args.get("since")
+            if since is not None:
+                try:
+                    since = int(since)
+                except ValueError:
+                    return {"Error": "Invalid cursor", "SubCode": "InvalidData"}, 400
+
+            changes = ProjectService.get_task_state_changes(project_id, since)
+            return changes.to_primitive(), 200
+        except NotFound:
+            return {"Error": "Project Not Found", "SubCode": "NotFound"}, 404
+        except Exception as e:
+            error_msg = f"TasksQueriesChangesAPI - unhandled error: {str(e)}"
+            current_app.logger.critical(error_msg)
+            return {
+                "Error": "Unable to fetch task changes",
+                "SubCode": "InternalServerError",
+            }, 500
+
+
+class TasksQueriesTilesAPI(Resource):
+    def get(self, project_id, zoom, x, y):
+        """
+        Get the tasks of a project within a map tile as a Mapbox Vector Tile
+        ---
+        tags:
+            - tasks
+        produces:
+            - application/vnd.mapbox-vector-tile
+        parameters:
+            - name: project_id
+              in: path
+              description: Project ID the tasks are associated with
+              required: true
+              type: integer
+              default: 1
+            - name: zoom
+              in: path
+              description: Zoom level of the tile
+              required: true
+              type: integer
+              default: 12
+            - name: x
+              in: path
+              description: Column of the tile
+              required: true
+              type: integer
+              default: 2048
+            - name: y
+              in: path
+              description: Row of the tile
+              required: true
+              type: integer
+              default: 2048
+            - in: header
+              name: If-None-Match
+              type: string
+              description: ETag of a tile fetched before
+        responses:
+            200:
+                description: Tile with a tasks layer holding taskId, taskStatus, lockedBy and mappedBy
+            304:
+                description: Tile not modified
+            400:
+                description: Invalid tile
+            404:
+                description: Project not found
+            500:
+                description: Internal Server Error
+        """
+        try:
+            if zoom > 24 or x >= 2 ** zoom or y >= 2 ** zoom:
+                return {"Error": "Invalid tile", "SubCode": "InvalidData"}, 400
+
+            etag = ProjectService.get_project_tasks_tile_etag(project_id, zoom, x, y)
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            tile = ProjectService.get_project_tasks_tile(project_id, zoom, x, y, etag)
+            response = Response(tile, mimetype="application/vnd.mapbox-vector-tile")
+            response.set_etag(etag)
+            # Clients keep the tile, but check it is still current before using it
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        except NotFound:
+            return {"Error": "Project Not Found", "SubCode": "NotFound"}, 404
+        except Exception as e:
+            error_msg = f"TasksQueriesTilesAPI - unhandled error: {str(e)}"
+            current_app.logger.critical(error_msg)
+            return {
+                "Error": "Unable to fetch task tile",
+                "SubCode": "InternalServerError",
+            }, 500
+
+
 class TasksQueriesAoiAPI(Resource):
     @tm.pm_only()
     @token_auth.login_required
@@ -526,6 +690,17 @@ class TasksQueriesOwnInvalidatedAPI(Resource):
               name: pageSize
               description: Size of page, defaults to 10
               type: integer
+            - in: query
+              name: cursor
+              description:
+                Cursor of the page of results user requested, as returned in nextCursor. Pages by cursor
+                instead of page number if present, starting from the first page if empty
+              type: string
+            - in: query
+              name: count
+              description: How the total of results is counted, defaults to exact, or none with a cursor
+              type: string
+              enum: [exact, cached, estimate, none]
             - in: query
               name: project
               description: Optional project filter
@@ -562,6 +737,8 @@ class TasksQueriesOwnInvalidatedAPI(Resource):
             else:
                 sort_direction = "desc"
 
+            cursor = request.args.get("cursor")
+
             invalidated_tasks = ValidatorService.get_user_invalidated_tasks(
                 request.args.get("asValidator") == "true",
                 username,
@@ -572,10 +749,14 @@ class TasksQueriesOwnInvalidatedAPI(Resource):
                 request.args.get("pageSize", None, type=int),
                 sort_column,
                 sort_direction,
+                cursor,
+                request.args.get("count", "exact" if cursor is None else "none"),
             )
             return invalidated_tasks.to_primitive(), 200
         except NotFound:
             return {"Error": "No invalidated tasks", "SubCode": "NotFound"}, 404
+        except PaginationServiceError as e:
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 400
         except Exception as e:
             error_msg = f"TasksQueriesMappedAPI - unhandled error: {str(e)}"
             current_app.logger.critical(error_msg)
@@ -1,6 +1,5 @@
 from flask_restful import Resource, request, current_app
 from schematics.exceptions import DataError
-import threading
 
 from backend.models.dtos.message_dto import MessageDTO
 from backend.services.team_service import (
@@ -9,6 +8,7 @@ from backend.services.team_service import (
     TeamJoinNotAllowed,
     TeamServiceError,
 )
+from backend.services.job_service import JobService
 from backend.services.users.authentication_service import token_auth, tm
 from backend.models.postgis.user import User
 
@@ -379,10 +379,12 @@ class TeamsActionsMessageMembersAPI(Resource):
             }, 403
 
         try:
-            threading.Thread(
-                target=TeamService.send_message_to_all_team_members,
-                args=(team_id, team.name, message_dto),
-            ).start()
+            JobService.enqueue(
+                "send_message_to_all_team_members",
+                team_id=team_id,
+                team_name=team.name,
+                message_dto=message_dto.to_primitive(),
+            )
 
             return {"Success": "Message sent successfully"}, 200
         except ValueError as e:
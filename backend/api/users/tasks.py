@@ -1,6 +1,7 @@
 from flask_restful import Resource, current_app, request
 from dateutil.parser import parse as date_parse
 
+from backend.services.pagination_service import PaginationServiceError
 from backend.services.users.authentication_service import token_auth
 from backend.services.users.user_service import UserService, NotFound
 
@@ -72,6 +73,17 @@ class UsersTasksAPI(Resource):
               name: page_size
               description: Size of page, defaults to 10
               type: integer
+            - in: query
+              name: cursor
+              description:
+                Cursor of the page of results user requested, as returned in nextCursor. Pages by cursor
+                instead of page number if present, starting from the first page if empty
+              type: string
+            - in: query
+              name: count
+              description: How the total of results is counted, defaults to exact, or none with a cursor
+              type: string
+              enum: [exact, cached, estimate, none]
         responses:
             200:
                 description: Mapped projects found
@@ -96,6 +108,7 @@ class UsersTasksAPI(Resource):
                 else None
             )
             sort_by = request.args.get("sort_by", "-action_date")
+            cursor = request.args.get("cursor")
 
             tasks = UserService.get_tasks_dto(
                 user.id,
@@ -107,8 +120,12 @@ class UsersTasksAPI(Resource):
                 page=request.args.get("page", None, type=int),
                 page_size=request.args.get("page_size", 10, type=int),
                 sort_by=sort_by,
+                cursor=cursor,
+                count=request.args.get("count", "exact" if cursor is None else "none"),
             )
             return tasks.to_primitive(), 200
+        except PaginationServiceError as e:
+            return {"Error": str(e).split("-")[1], "SubCode": str(e).split("-")[0]}, 400
         except ValueError:
             return {"tasks": [], "pagination": {"total": 0}}, 200
         except NotFound:
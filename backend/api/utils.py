@@ -1,6 +1,9 @@
+import zlib
 from functools import wraps
 from datetime import date, datetime
 
+from flask import Response, request, stream_with_context
+
 
 class TMAPIDecorators:
     """ Class for Tasking Manager custom API decorators """
@@ -34,3 +37,27 @@ def validate_date_input(input_date):
         return input_date
     except (TypeError, ValueError):
         raise ValueError("Invalid date value")
+
+
+def gzip_stream(chunks):
+    """ Compresses a stream of bytes chunks into gzip chunks """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_response(chunks, mimetype: str, filename: str = None) -> Response:
+    """
+    Streams the chunks as the response, compressed with gzip if the client accepts it
+    :param filename: Name of the file to download the response as, if wanted
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
+    if "gzip" in request.accept_encodings:
+        headers["Content-Encoding"] = "gzip"
+        chunks = gzip_stream(chunks)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
@@ -1,5 +1,6 @@
 import logging
 import os
+from distutils.util import strtobool
 from dotenv import load_dotenv
 
 
@@ -46,6 +47,14 @@ class EnvironmentConfig:
         "OSM_NOMINATIM_SERVER_URL", "https://nominatim.openstreetmap.org"
     )
 
+    # Country polygons used to set the countries of projects, one GeoJSON file per continent
+    COUNTRY_POLYGONS_DIR = os.getenv(
+        "TM_COUNTRY_POLYGONS_DIR",
+        os.path.normpath(
+            os.path.join(os.path.dirname(__file__), "..", "scripts", "world")
+        ),
+    )
+
     # Database connection
     POSTGRES_USER = os.getenv("POSTGRES_USER", None)
     POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", None)
@@ -88,6 +97,14 @@ class EnvironmentConfig:
     # Mapper Level values represent number of OSM changesets
     MAPPER_LEVEL_INTERMEDIATE = int(os.getenv("TM_MAPPER_LEVEL_INTERMEDIATE", 250))
     MAPPER_LEVEL_ADVANCED = int(os.getenv("TM_MAPPER_LEVEL_ADVANCED", 500))
+    # Days before the changeset count of a user is checked again by refresh_levels
+    MAPPER_LEVEL_CHECK_INTERVAL = int(os.getenv("TM_MAPPER_LEVEL_CHECK_INTERVAL", 7))
+    # Concurrent requests, and their overall rate, made to the OSM API by refresh_levels
+    OSM_REFRESH_WORKERS = int(os.getenv("TM_OSM_REFRESH_WORKERS", 8))
+    OSM_REFRESH_REQUESTS_PER_SECOND = float(
+        os.getenv("TM_OSM_REFRESH_REQUESTS_PER_SECOND", 10)
+    )
+    OSM_REFRESH_RETRIES = int(os.getenv("TM_OSM_REFRESH_RETRIES", 3))
 
     # Time to wait until task auto-unlock (e.g. '2h' or '7d' or '30m' or '1h30m')
     TASK_AUTOUNLOCK_AFTER = os.getenv("TM_TASK_AUTOUNLOCK_AFTER", "2h")
@@ -125,11 +142,39 @@ class EnvironmentConfig:
     OAUTH_SCOPE = os.getenv("TM_SCOPE", None)
     OAUTH_REDIRECT_URI = os.getenv("TM_REDIRECT_URI", None)
 
-    # Some more definitions (not overridable)
+    # Cache shared by the workers for search results and project summaries.
+    # One of "local" (per worker), "file" (per host) or "redis"
+    CACHE_BACKEND = os.getenv("TM_CACHE_BACKEND", "local")
+    CACHE_MAXSIZE = int(os.getenv("TM_CACHE_MAXSIZE", 1024))
+    CACHE_DIR = os.getenv("TM_CACHE_DIR", "/tmp/tasking-manager-cache")
+    CACHE_REDIS_URL = os.getenv("TM_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Database connection pool, each worker process has its own pool
     SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_size": 10,
-        "max_overflow": 10,
+        "pool_size": int(os.getenv("TM_DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("TM_DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.getenv("TM_DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("TM_DB_POOL_RECYCLE", 3600)),
+        "pool_pre_ping": bool(strtobool(os.getenv("TM_DB_POOL_PRE_PING", "true"))),
     }
+    # Yield to other greenlets while waiting on the database, for gevent workers
+    DB_GEVENT_WAIT_CALLBACK = bool(
+        strtobool(os.getenv("TM_DB_GEVENT_WAIT_CALLBACK", "false"))
+    )
+
+    # Background jobs, run by `manage.py run_jobs`
+    JOB_WORKERS = int(os.getenv("TM_JOB_WORKERS", 4))
+    JOB_POLL_INTERVAL = float(os.getenv("TM_JOB_POLL_INTERVAL", 2))
+    JOB_RETRY_BACKOFF = int(os.getenv("TM_JOB_RETRY_BACKOFF", 30))
+    JOB_LOCK_TIMEOUT = int(os.getenv("TM_JOB_LOCK_TIMEOUT", 3600))
+
+    # Queue a job snapshotting the contributions timeline of a project when this many state changes had
+    # to be replayed to build it, 0 disables the snapshots
+    CONTRIBS_SNAPSHOT_MIN_EVENTS = int(
+        os.getenv("TM_CONTRIBS_SNAPSHOT_MIN_EVENTS", 10000)
+    )
+
+    # Some more definitions (not overridable)
     SEND_FILE_MAX_AGE_DEFAULT = 0
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
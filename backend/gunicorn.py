@@ -6,3 +6,18 @@ workers = (os.cpu_count() or 1) * 2 + 1
 threads = (os.cpu_count() or 1) * 2 + 1
 preload = True
 timeout = 180
+
+
+def pre_fork(server, worker):
+    # Connections opened while preloading the app must not be inherited by the workers
+    from backend import db
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    from backend.services.pool_service import PoolService
+
+    if server.app.wsgi().config["DB_GEVENT_WAIT_CALLBACK"]:
+        PoolService.set_gevent_wait_callback()
@@ -17,3 +17,4 @@ class SplitTaskDTO(Model):
     task_id = IntType(required=True)
     project_id = IntType(required=True)
     preferred_locale = StringType(default="en")
+    levels = IntType(default=1, min_value=1, max_value=3)
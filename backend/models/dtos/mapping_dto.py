@@ -29,6 +29,15 @@ class LockTaskDTO(Model):
     preferred_locale = StringType(default="en")
 
 
+class LockNextTaskDTO(Model):
+    """ DTO used to lock the next available task of a project """
+
+    user_id = IntType(required=True)
+    project_id = IntType(required=True)
+    near_task_id = IntType(serialized_name="nearTaskId")
+    preferred_locale = StringType(default="en")
+
+
 class MappedTaskDTO(Model):
     """ Describes the model used to update the status of one task after mapping """
 
@@ -72,6 +81,22 @@ class TaskStatusDTO(Model):
     action_by = StringType(serialized_name="actionBy")
 
 
+class TaskStateDTO(Model):
+    """ Status, locker and mapper of a task, without its geometry """
+
+    task_id = IntType(serialized_name="taskId")
+    task_status = StringType(serialized_name="taskStatus")
+    locked_by = IntType(serialized_name="lockedBy")
+    mapped_by = IntType(serialized_name="mappedBy")
+
+
+class TaskStateChangesDTO(Model):
+    """ Tasks of a project that changed since a cursor, and the cursor to poll with next """
+
+    cursor = IntType()
+    tasks = ListType(ModelType(TaskStateDTO))
+
+
 class TaskDTO(Model):
     """ Describes a Task DTO """
 
@@ -319,6 +319,8 @@ class ProjectSearchDTO(Model):
     order_by_type = StringType()
     country = StringType()
     page = IntType(required=True)
+    cursor = StringType()
+    count = StringType(default="exact")
     text_search = StringType()
     mapping_editors = ListType(StringType, validators=[is_known_editor])
     validation_editors = ListType(StringType, validators=[is_known_editor])
@@ -369,6 +371,8 @@ class ProjectSearchDTO(Model):
                 self.organisation_name,
                 self.campaign,
                 self.page,
+                self.cursor,
+                self.count,
                 self.text_search,
                 hashable_mapping_editors,
                 hashable_validation_editors,
@@ -35,7 +35,7 @@ class Pagination(Model):
     """ Properties for paginating results """
 
     def __init__(self, paginated_result):
-        """ Instantiate from a Flask-SQLAlchemy paginated result"""
+        """ Instantiate from a Flask-SQLAlchemy paginated result or a page of the PaginationService"""
         super().__init__()
 
         self.has_next = paginated_result.has_next
@@ -46,6 +46,8 @@ class Pagination(Model):
         self.prev_num = paginated_result.prev_num
         self.per_page = paginated_result.per_page
         self.total = paginated_result.total
+        self.total_estimated = getattr(paginated_result, "total_estimated", False)
+        self.next_cursor = getattr(paginated_result, "next_cursor", None)
 
     has_next = BooleanType(serialized_name="hasNext")
     has_prev = BooleanType(serialized_name="hasPrev")
@@ -55,6 +57,8 @@ class Pagination(Model):
     prev_num = IntType(serialized_name="prevNum")
     per_page = IntType(serialized_name="perPage")
     total = IntType()
+    total_estimated = BooleanType(serialized_name="totalEstimated")
+    next_cursor = StringType(serialized_name="nextCursor")
 
 
 class ProjectActivityDTO(Model):
@@ -0,0 +1,523 @@
+import math
+
+from sqlalchemy import DDL, event, func, text
+
+from backend import db
+
+# Concurrent transactions add their deltas to different rows of global_stats, organisation_stats and
+# campaign_stats, picked from their backend pid, so task updates don't queue on a single row lock
+GLOBAL_STATS_SLOTS = 8
+
+# Triggers adding the changes of tasks, projects, campaign links, users, organisations and campaigns to
+# the statistics as deltas. Areas are in square kilometers, like the ones of the homepage always were
+STATS_TRIGGERS = f"""
+create or replace function stats_add_global(
+    d_projects integer default 0,
+    d_mappers integer default 0,
+    d_organisations integer default 0,
+    d_campaigns integer default 0,
+    d_validators integer default 0,
+    d_tasks_mapped integer default 0,
+    d_tasks_validated integer default 0,
+    d_area double precision default 0,
+    d_mapped_area double precision default 0,
+    d_validated_area double precision default 0
+) returns void as $$
+    insert into global_stats as s (
+        slot, total_projects, total_mappers, total_organisations, total_campaigns,
+        total_validators, tasks_mapped, tasks_validated, total_area, total_mapped_area,
+        total_validated_area
+    )
+    values (
+        mod(pg_backend_pid(), {GLOBAL_STATS_SLOTS}), d_projects, d_mappers, d_organisations,
+        d_campaigns, d_validators, d_tasks_mapped, d_tasks_validated, d_area, d_mapped_area,
+        d_validated_area
+    )
+    on conflict (slot) do update
+    set total_projects = s.total_projects + excluded.total_projects,
+        total_mappers = s.total_mappers + excluded.total_mappers,
+        total_organisations = s.total_organisations + excluded.total_organisations,
+        total_campaigns = s.total_campaigns + excluded.total_campaigns,
+        total_validators = s.total_validators + excluded.total_validators,
+        tasks_mapped = s.tasks_mapped + excluded.tasks_mapped,
+        tasks_validated = s.tasks_validated + excluded.tasks_validated,
+        total_area = s.total_area + excluded.total_area,
+        total_mapped_area = s.total_mapped_area + excluded.total_mapped_area,
+        total_validated_area = s.total_validated_area + excluded.total_validated_area
+$$ language sql;
+
+create or replace function stats_add_organisation(
+    p_organisation_id integer,
+    d_projects integer,
+    d_tasks_mapped integer,
+    d_tasks_validated integer,
+    d_mapped_area double precision,
+    d_validated_area double precision
+) returns void as $$
+    insert into organisation_stats as s (
+        organisation_id, slot, total_projects, tasks_mapped, tasks_validated, mapped_area,
+        validated_area
+    )
+    select p_organisation_id, mod(pg_backend_pid(), {GLOBAL_STATS_SLOTS}), d_projects,
+           d_tasks_mapped, d_tasks_validated, d_mapped_area, d_validated_area
+     where p_organisation_id is not null
+    on conflict (organisation_id, slot) do update
+    set total_projects = s.total_projects + excluded.total_projects,
+        tasks_mapped = s.tasks_mapped + excluded.tasks_mapped,
+        tasks_validated = s.tasks_validated + excluded.tasks_validated,
+        mapped_area = s.mapped_area + excluded.mapped_area,
+        validated_area = s.validated_area + excluded.validated_area
+$$ language sql;
+
+create or replace function stats_add_campaign(
+    p_campaign_id integer,
+    d_projects integer,
+    d_tasks_mapped integer,
+    d_tasks_validated integer,
+    d_mapped_area double precision,
+    d_validated_area double precision
+) returns void as $$
+    insert into campaign_stats as s (
+        campaign_id, slot, total_projects, tasks_mapped, tasks_validated, mapped_area,
+        validated_area
+    )
+    select p_campaign_id, mod(pg_backend_pid(), {GLOBAL_STATS_SLOTS}), d_projects,
+           d_tasks_mapped, d_tasks_validated, d_mapped_area, d_validated_area
+     where p_campaign_id is not null
+    on conflict (campaign_id, slot) do update
+    set total_projects = s.total_projects + excluded.total_projects,
+        tasks_mapped = s.tasks_mapped + excluded.tasks_mapped,
+        tasks_validated = s.tasks_validated + excluded.tasks_validated,
+        mapped_area = s.mapped_area + excluded.mapped_area,
+        validated_area = s.validated_area + excluded.validated_area
+$$ language sql;
+
+create or replace function stats_project_totals(
+    p_project_id integer,
+    out tasks_mapped integer,
+    out tasks_validated integer,
+    out mapped_area double precision,
+    out validated_area double precision
+) as $$
+    select (count(*) filter (where task_status in (2, 4)))::integer,
+           (count(*) filter (where task_status = 4))::integer,
+           coalesce(sum(st_area(geometry, true)) filter (where task_status = 2), 0) / 1000000,
+           coalesce(sum(st_area(geometry, true)) filter (where task_status = 4), 0) / 1000000
+      from tasks
+     where project_id = p_project_id
+$$ language sql stable;
+
+create or replace function stats_tasks_change() returns trigger as $$
+declare
+    task_project_id integer;
+    d_tasks_mapped integer := 0;
+    d_tasks_validated integer := 0;
+    d_validators integer := 0;
+    d_mapped_area double precision := 0;
+    d_validated_area double precision := 0;
+    validator_tasks integer;
+    campaign record;
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        task_project_id := old.project_id;
+        if old.task_status = 2 then
+            d_tasks_mapped := d_tasks_mapped - 1;
+            d_mapped_area := d_mapped_area - st_area(old.geometry, true) / 1000000;
+        elsif old.task_status = 4 then
+            d_tasks_mapped := d_tasks_mapped - 1;
+            d_tasks_validated := d_tasks_validated - 1;
+            d_validated_area := d_validated_area - st_area(old.geometry, true) / 1000000;
+            if old.validated_by is not null then
+                update validator_stats
+                   set tasks_validated = tasks_validated - 1
+                 where user_id = old.validated_by
+                returning tasks_validated into validator_tasks;
+                if validator_tasks = 0 then
+                    d_validators := d_validators - 1;
+                end if;
+            end if;
+        end if;
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        task_project_id := new.project_id;
+        if new.task_status = 2 then
+            d_tasks_mapped := d_tasks_mapped + 1;
+            d_mapped_area := d_mapped_area + st_area(new.geometry, true) / 1000000;
+        elsif new.task_status = 4 then
+            d_tasks_mapped := d_tasks_mapped + 1;
+            d_tasks_validated := d_tasks_validated + 1;
+            d_validated_area := d_validated_area + st_area(new.geometry, true) / 1000000;
+            if new.validated_by is not null then
+                insert into validator_stats as v (user_id, tasks_validated)
+                values (new.validated_by, 1)
+                on conflict (user_id) do update
+                set tasks_validated = v.tasks_validated + 1
+                returning tasks_validated into validator_tasks;
+                if validator_tasks = 1 then
+                    d_validators := d_validators + 1;
+                end if;
+            end if;
+        end if;
+    end if;
+
+    if d_tasks_mapped = 0 and d_tasks_validated = 0 and d_validators = 0
+       and d_mapped_area = 0 and d_validated_area = 0 then
+        return null;
+    end if;
+
+    perform stats_add_global(
+        d_validators => d_validators,
+        d_tasks_mapped => d_tasks_mapped,
+        d_tasks_validated => d_tasks_validated,
+        d_mapped_area => d_mapped_area,
+        d_validated_area => d_validated_area
+    );
+    -- Projects being deleted already removed their tasks from their organisation
+    perform stats_add_organisation(
+        (select organisation_id from projects where id = task_project_id),
+        0, d_tasks_mapped, d_tasks_validated, d_mapped_area, d_validated_area
+    );
+    for campaign in
+        select campaign_id, count(*) as links
+          from campaign_projects
+         where project_id = task_project_id
+         group by campaign_id
+    loop
+        perform stats_add_campaign(
+            campaign.campaign_id, 0, (campaign.links * d_tasks_mapped)::integer,
+            (campaign.links * d_tasks_validated)::integer, campaign.links * d_mapped_area,
+            campaign.links * d_validated_area
+        );
+    end loop;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function stats_projects_change() returns trigger as $$
+declare
+    totals record;
+begin
+    if tg_op = 'INSERT' then
+        perform stats_add_global(
+            d_projects => 1,
+            d_area => coalesce(st_area(new.geometry, true), 0) / 1000000
+        );
+        perform stats_add_organisation(new.organisation_id, 1, 0, 0, 0, 0);
+        return null;
+    elsif tg_op = 'DELETE' then
+        -- Runs before the delete, so the tasks the project still has are removed with it
+        select * into totals from stats_project_totals(old.id);
+        perform stats_add_global(
+            d_projects => -1,
+            d_area => -coalesce(st_area(old.geometry, true), 0) / 1000000
+        );
+        perform stats_add_organisation(
+            old.organisation_id, -1, -totals.tasks_mapped, -totals.tasks_validated,
+            -totals.mapped_area, -totals.validated_area
+        );
+        return old;
+    end if;
+
+    perform stats_add_global(
+        d_area => (
+            coalesce(st_area(new.geometry, true), 0) - coalesce(st_area(old.geometry, true), 0)
+        ) / 1000000
+    );
+    if new.organisation_id is distinct from old.organisation_id then
+        select * into totals from stats_project_totals(old.id);
+        perform stats_add_organisation(
+            old.organisation_id, -1, -totals.tasks_mapped, -totals.tasks_validated,
+            -totals.mapped_area, -totals.validated_area
+        );
+        perform stats_add_organisation(
+            new.organisation_id, 1, totals.tasks_mapped, totals.tasks_validated,
+            totals.mapped_area, totals.validated_area
+        );
+    end if;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function stats_campaign_projects_change() returns trigger as $$
+declare
+    link record;
+    direction integer;
+    totals record;
+begin
+    if tg_op = 'INSERT' then
+        link := new;
+        direction := 1;
+    else
+        link := old;
+        direction := -1;
+    end if;
+    select * into totals from stats_project_totals(link.project_id);
+    perform stats_add_campaign(
+        link.campaign_id, direction, direction * totals.tasks_mapped,
+        direction * totals.tasks_validated, direction * totals.mapped_area,
+        direction * totals.validated_area
+    );
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function stats_count_change() returns trigger as $$
+declare
+    direction integer := case when tg_op = 'INSERT' then 1 else -1 end;
+begin
+    if tg_table_name = 'users' then
+        perform stats_add_global(d_mappers => direction);
+    elsif tg_table_name = 'organisations' then
+        perform stats_add_global(d_organisations => direction);
+    else
+        perform stats_add_global(d_campaigns => direction);
+    end if;
+    return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists stats_tasks on tasks;
+create trigger stats_tasks
+    after insert or delete or update of task_status, validated_by on tasks
+    for each row execute procedure stats_tasks_change();
+drop trigger if exists stats_projects on projects;
+create trigger stats_projects
+    after insert or update of organisation_id, geometry on projects
+    for each row execute procedure stats_projects_change();
+drop trigger if exists stats_projects_delete on projects;
+create trigger stats_projects_delete
+    before delete on projects
+    for each row execute procedure stats_projects_change();
+drop trigger if exists stats_campaign_projects on campaign_projects;
+create trigger stats_campaign_projects
+    after insert or delete on campaign_projects
+    for each row execute procedure stats_campaign_projects_change();
+drop trigger if exists stats_users on users;
+create trigger stats_users
+    after insert or delete on users
+    for each row execute procedure stats_count_change();
+drop trigger if exists stats_organisations on organisations;
+create trigger stats_organisations
+    after insert or delete on organisations
+    for each row execute procedure stats_count_change();
+drop trigger if exists stats_campaigns on campaigns;
+create trigger stats_campaigns
+    after insert or delete on campaigns
+    for each row execute procedure stats_count_change();
+"""
+
+# Full recompute of the statistics, used to backfill and reconcile them
+STATS_RECOMPUTE = [
+    "delete from global_stats",
+    "delete from validator_stats",
+    "delete from organisation_stats",
+    "delete from campaign_stats",
+    """
+    create temporary table project_totals on commit drop as
+    select p.id as project_id,
+           p.organisation_id,
+           count(t.id) filter (where t.task_status in (2, 4)) as tasks_mapped,
+           count(t.id) filter (where t.task_status = 4) as tasks_validated,
+           coalesce(sum(st_area(t.geometry, true)) filter (where t.task_status = 2), 0)
+               / 1000000 as mapped_area,
+           coalesce(sum(st_area(t.geometry, true)) filter (where t.task_status = 4), 0)
+               / 1000000 as validated_area
+      from projects p
+      left join tasks t on t.project_id = p.id
+     group by p.id
+    """,
+    """
+    insert into validator_stats (user_id, tasks_validated)
+    select validated_by, count(*)
+      from tasks
+     where task_status = 4
+       and validated_by is not null
+     group by validated_by
+    """,
+    """
+    insert into global_stats (
+        slot, total_projects, total_mappers, total_organisations, total_campaigns,
+        total_validators, tasks_mapped, tasks_validated, total_area, total_mapped_area,
+        total_validated_area
+    )
+    select 0,
+           (select count(*) from projects),
+           (select count(*) from users),
+           (select count(*) from organisations),
+           (select count(*) from campaigns),
+           (select count(*) from validator_stats),
+           coalesce(sum(tasks_mapped), 0),
+           coalesce(sum(tasks_validated), 0),
+           (select coalesce(sum(st_area(geometry, true)), 0) / 1000000 from projects),
+           coalesce(sum(mapped_area), 0),
+           coalesce(sum(validated_area), 0)
+      from project_totals
+    """,
+    """
+    insert into organisation_stats (
+        organisation_id, slot, total_projects, tasks_mapped, tasks_validated, mapped_area,
+        validated_area
+    )
+    select organisation_id, 0, count(*), sum(tasks_mapped), sum(tasks_validated),
+           sum(mapped_area), sum(validated_area)
+      from project_totals
+     where organisation_id is not null
+     group by organisation_id
+    """,
+    """
+    insert into campaign_stats (
+        campaign_id, slot, total_projects, tasks_mapped, tasks_validated, mapped_area,
+        validated_area
+    )
+    select cp.campaign_id, 0, count(*), coalesce(sum(pt.tasks_mapped), 0),
+           coalesce(sum(pt.tasks_validated), 0), coalesce(sum(pt.mapped_area), 0),
+           coalesce(sum(pt.validated_area), 0)
+      from campaign_projects cp
+      left join project_totals pt on pt.project_id = cp.project_id
+     where cp.campaign_id is not null
+     group by cp.campaign_id
+    """,
+]
+
+
+class GlobalStats(db.Model):
+    """ Homepage statistics, kept up to date as deltas by database triggers """
+
+    __tablename__ = "global_stats"
+
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_projects = db.Column(db.Integer, default=0, nullable=False)
+    total_mappers = db.Column(db.Integer, default=0, nullable=False)
+    total_organisations = db.Column(db.Integer, default=0, nullable=False)
+    total_campaigns = db.Column(db.Integer, default=0, nullable=False)
+    total_validators = db.Column(db.Integer, default=0, nullable=False)
+    tasks_mapped = db.Column(db.Integer, default=0, nullable=False)
+    tasks_validated = db.Column(db.Integer, default=0, nullable=False)
+    total_area = db.Column(db.Float, default=0, nullable=False)
+    total_mapped_area = db.Column(db.Float, default=0, nullable=False)
+    total_validated_area = db.Column(db.Float, default=0, nullable=False)
+
+    @staticmethod
+    def get():
+        """ Gets the statistics, summing the slots they are spread over """
+        columns = [c for c in GlobalStats.__table__.columns if c.name != "slot"]
+        return db.session.query(
+            *[func.coalesce(func.sum(c), 0).label(c.name) for c in columns]
+        ).one()
+
+    @staticmethod
+    def _snapshot() -> dict:
+        snapshot = {"global": GlobalStats.get()._asdict()}
+        for totals, scope, key in [
+            (OrganisationStats.totals(), "organisation", "organisation_id"),
+            (CampaignStats.totals(), "campaign", "campaign_id"),
+        ]:
+            for row in db.session.query(totals).all():
+                counters = row._asdict()
+                snapshot[f"{scope} {counters.pop(key)}"] = counters
+        return snapshot
+
+    @staticmethod
+    def reconcile() -> dict:
+        """
+        Recomputes all statistics from the tasks, projects, users, organisations and campaigns tables and
+        replaces the ones kept by the triggers. Writers wait on the statistics until it's done.
+        :returns: the counters that drifted as (kept, recomputed) tuples, keyed by scope and counter
+        """
+        db.session.execute(
+            text(
+                "lock table global_stats, validator_stats, organisation_stats, campaign_stats "
+                "in exclusive mode"
+            )
+        )
+        kept = GlobalStats._snapshot()
+        for statement in STATS_RECOMPUTE:
+            db.session.execute(text(statement))
+        recomputed = GlobalStats._snapshot()
+        db.session.commit()
+
+        drift = {}
+        for scope in set(kept) | set(recomputed):
+            kept_counters = kept.get(scope, {})
+            recomputed_counters = recomputed.get(scope, {})
+            for name in set(kept_counters) | set(recomputed_counters):
+                kept_value = kept_counters.get(name, 0)
+                recomputed_value = recomputed_counters.get(name, 0)
+                # Areas added up as deltas differ from their sum in the last digits
+                if not math.isclose(kept_value, recomputed_value, abs_tol=1e-6):
+                    drift.setdefault(scope, {})[name] = (kept_value, recomputed_value)
+        return drift
+
+
+def _sum_slots(model, key):
+    """ Subquery of the statistics of a model per key, summing the slots they are spread over """
+    columns = [c for c in model.__table__.columns if c.name not in ("slot", key.name)]
+    return (
+        db.session.query(key, *[func.sum(c).label(c.name) for c in columns])
+        .group_by(key)
+        .subquery()
+    )
+
+
+class ValidatorStats(db.Model):
+    """ Number of validated tasks per validator, used to count the distinct validators """
+
+    __tablename__ = "validator_stats"
+
+    user_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    tasks_validated = db.Column(db.Integer, default=0, nullable=False)
+
+
+class OrganisationStats(db.Model):
+    """ Statistics of the projects of an organisation, spread over slots kept up to date by database triggers """
+
+    __tablename__ = "organisation_stats"
+
+    organisation_id = db.Column(
+        db.Integer,
+        db.ForeignKey("organisations.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    total_projects = db.Column(db.Integer, default=0, nullable=False)
+    tasks_mapped = db.Column(db.Integer, default=0, nullable=False)
+    tasks_validated = db.Column(db.Integer, default=0, nullable=False)
+    mapped_area = db.Column(db.Float, default=0, nullable=False)
+    validated_area = db.Column(db.Float, default=0, nullable=False)
+
+    @staticmethod
+    def totals():
+        """ Subquery of the statistics per organisation, summing the slots they are spread over """
+        return _sum_slots(OrganisationStats, OrganisationStats.organisation_id)
+
+
+class CampaignStats(db.Model):
+    """ Statistics of the projects of a campaign, spread over slots kept up to date by database triggers """
+
+    __tablename__ = "campaign_stats"
+
+    campaign_id = db.Column(
+        db.Integer,
+        db.ForeignKey("campaigns.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    total_projects = db.Column(db.Integer, default=0, nullable=False)
+    tasks_mapped = db.Column(db.Integer, default=0, nullable=False)
+    tasks_validated = db.Column(db.Integer, default=0, nullable=False)
+    mapped_area = db.Column(db.Float, default=0, nullable=False)
+    validated_area = db.Column(db.Float, default=0, nullable=False)
+
+    @staticmethod
+    def totals():
+        """ Subquery of the statistics per campaign, summing the slots they are spread over """
+        return _sum_slots(CampaignStats, CampaignStats.campaign_id)
+
+
+# Tables created by create_all, as in the tests, get the triggers too
+event.listen(
+    db.metadata, "after_create", DDL(STATS_TRIGGERS).execute_if(dialect="postgresql")
+)
@@ -0,0 +1,149 @@
+import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from backend import db
+from backend.models.postgis.statuses import JobStatus
+from backend.models.postgis.utils import timestamp
+
+
+class Job(db.Model):
+    """ Background job run by the worker started with `manage.py run_jobs` """
+
+    __tablename__ = "jobs"
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    payload = db.Column(JSONB, nullable=False, default=dict)
+    status = db.Column(db.Integer, default=JobStatus.QUEUED.value, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    run_at = db.Column(db.DateTime, default=timestamp, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String)
+    last_error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, default=timestamp, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index(
+            "idx_jobs_queued",
+            "run_at",
+            postgresql_where=text(f"status = {JobStatus.QUEUED.value}"),
+        ),
+    )
+
+    @staticmethod
+    def enqueue(name: str, payload: dict, max_attempts: int = 5) -> "Job":
+        """ Saves a new job, it will be picked up by the next worker poll """
+        job = Job(name=name, payload=payload, max_attempts=max_attempts)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def get_pending(name: str, payload: dict) -> "Job":
+        """ Gets a queued or running job with the same name and payload, if there is one """
+        return (
+            Job.query.filter(
+                Job.name == name,
+                Job.payload == payload,
+                Job.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]),
+            )
+            .order_by(Job.id)
+            .first()
+        )
+
+    @staticmethod
+    def claim(worker: str, limit: int, lock_timeout: int) -> list:
+        """
+        Marks up to limit due jobs as running and returns their ids. Jobs locked by other workers are
+        skipped, and jobs running for longer than lock_timeout seconds are assumed lost and claimed again,
+        unless they ran out of attempts, as they may be killing their worker
+        :param worker: Name of the claiming worker
+        """
+        params = dict(
+            running=JobStatus.RUNNING.value,
+            queued=JobStatus.QUEUED.value,
+            failed=JobStatus.FAILED.value,
+            worker=worker,
+            lock_timeout=lock_timeout,
+            limit=limit,
+        )
+        db.session.execute(
+            text(
+                """
+                update jobs
+                   set status = :failed, finished_at = now() at time zone 'utc',
+                       locked_at = null, locked_by = null,
+                       last_error = 'Worker lost while running the last attempt'
+                 where status = :running
+                   and attempts >= max_attempts
+                   and locked_at < now() at time zone 'utc' - make_interval(secs => :lock_timeout)
+                """
+            ),
+            params,
+        )
+        rows = db.session.execute(
+            text(
+                """
+                update jobs
+                   set status = :running, locked_at = now() at time zone 'utc',
+                       locked_by = :worker, attempts = attempts + 1
+                 where id in (
+                        select id from jobs
+                         where (status = :queued and run_at <= now() at time zone 'utc')
+                            or (status = :running
+                                and attempts < max_attempts
+                                and locked_at < now() at time zone 'utc' - make_interval(secs => :lock_timeout))
+                         order by run_at
+                         limit :limit
+                           for update skip locked)
+             returning id
+                """
+            ),
+            params,
+        ).fetchall()
+        db.session.commit()
+        return [row.id for row in rows]
+
+    def complete(self):
+        self.status = JobStatus.DONE.value
+        self.finished_at = timestamp()
+        self.locked_at = None
+        self.locked_by = None
+        db.session.commit()
+
+    def fail(self, error: str, backoff: int):
+        """
+        Records a failed attempt. The job is retried after backoff * 2^(attempts - 1) seconds, unless it
+        ran out of attempts
+        """
+        self.last_error = error
+        self.locked_at = None
+        self.locked_by = None
+        if self.attempts >= self.max_attempts:
+            self.status = JobStatus.FAILED.value
+            self.finished_at = timestamp()
+        else:
+            self.status = JobStatus.QUEUED.value
+            self.run_at = timestamp() + datetime.timedelta(
+                seconds=backoff * 2 ** (self.attempts - 1)
+            )
+        db.session.commit()
+
+
+class JobStep(db.Model):
+    """ Step of a job already done, like a message sent to one recipient, skipped when the job is retried """
+
+    __tablename__ = "job_steps"
+
+    job_id = db.Column(
+        db.BigInteger, db.ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True
+    )
+    key = db.Column(db.String, primary_key=True)
+
+    @staticmethod
+    def get_keys(job_id: int) -> set:
+        return {key for key, in db.session.query(JobStep.key).filter_by(job_id=job_id)}
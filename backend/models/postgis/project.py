@@ -9,10 +9,9 @@ from flask import current_app
 from geoalchemy2 import Geometry
 from geoalchemy2.shape import to_shape
 from sqlalchemy.sql.expression import cast, or_
-from sqlalchemy import text, desc, func, Time, orm, literal
+from sqlalchemy import text, desc, func, Time, orm, literal, distinct
 from shapely.geometry import shape
 from sqlalchemy.dialects.postgresql import ARRAY
-import requests
 
 from backend import db
 from backend.models.dtos.campaign_dto import CampaignDTO
@@ -35,6 +34,7 @@ from backend.models.postgis.custom_editors import CustomEditor
 from backend.models.postgis.priority_area import PriorityArea, project_priority_areas
 from backend.models.postgis.project_info import ProjectInfo
 from backend.models.postgis.project_chat import ProjectChat
+from backend.models.postgis.project_activity import ProjectActivityStats
 from backend.models.postgis.statuses import (
     ProjectStatus,
     ProjectPriority,
@@ -59,7 +59,9 @@ from backend.models.postgis.utils import (
     ST_Centroid,
     NotFound,
 )
+from backend.services.geocoding_service import GeocodingService
 from backend.services.grid.grid_service import GridService
+from backend.services.cache_service import CacheService
 from backend.models.postgis.interests import Interest, project_interests
 
 # Secondary table defining many-to-many join for projects that were favorited by users.
@@ -264,19 +266,16 @@ class Project(db.Model):
         self.save()
 
     def set_country_info(self):
-        """Sets the default country based on centroid"""
-
-        centroid = to_shape(self.centroid)
-        lat, lng = (centroid.y, centroid.x)
-        url = "{0}/reverse?format=jsonv2&lat={1}&lon={2}&accept-language=en".format(
-            current_app.config["OSM_NOMINATIM_SERVER_URL"], lat, lng
-        )
-        try:
-            country_info = requests.get(url).json()  # returns a dict
-            if country_info["address"].get("country") is not None:
-                self.country = [country_info["address"]["country"]]
-        except (KeyError, AttributeError, requests.exceptions.ConnectionError):
-            pass
+        """Sets the countries the area of interest lies in"""
+        countries = GeocodingService.get_countries(to_shape(self.geometry))
+        if not countries:
+            # The bundled country polygons don't cover every continent
+            country = GeocodingService.get_country_from_nominatim(
+                to_shape(self.centroid)
+            )
+            countries = [country] if country else []
+        if countries:
+            self.country = countries
 
         self.save()
 
@@ -288,6 +287,7 @@ class Project(db.Model):
     def save(self):
         """Save changes to db"""
         db.session.commit()
+        CacheService.invalidate_project(self.id)
 
     @staticmethod
     def clone(project_id: int, author_id: int):
@@ -512,11 +512,13 @@ class Project(db.Model):
             self.set_country_info()
 
         db.session.commit()
+        CacheService.invalidate_project(self.id)
 
     def delete(self):
         """Deletes the current model from the DB"""
         db.session.delete(self)
         db.session.commit()
+        CacheService.invalidate_project(self.id)
 
     @staticmethod
     def exists(project_id):
@@ -535,6 +537,7 @@ class Project(db.Model):
         user = User.query.get(user_id)
         self.favorited.append(user)
         db.session.commit()
+        CacheService.invalidate_project(self.id)
 
     def unfavorite(self, user_id: int):
         user = User.query.get(user_id)
@@ -542,6 +545,7 @@ class Project(db.Model):
             raise ValueError("NotFeatured- Project not been favorited by user")
         self.favorited.remove(user)
         db.session.commit()
+        CacheService.invalidate_project(self.id)
 
     def set_as_featured(self):
         if self.featured is True:
@@ -954,17 +958,8 @@ class Project(db.Model):
 
     @staticmethod
     def get_project_total_contributions(project_id: int) -> int:
-
-        project_contributors_count = (
-            TaskHistory.query.with_entities(TaskHistory.user_id)
-            .filter(
-                TaskHistory.project_id == project_id, TaskHistory.action != "COMMENT"
-            )
-            .distinct(TaskHistory.user_id)
-            .count()
-        )
-
-        return project_contributors_count
+        """Gets the number of distinct contributors from the project activity rollup"""
+        return ProjectActivityStats.get_total_contributors([project_id])[project_id]
 
     def get_aoi_geometry_as_geojson(self):
         """Helper which returns the AOI geometry as a geojson object"""
@@ -1004,6 +999,32 @@ class Project(db.Model):
             .count()
         )
 
+    @staticmethod
+    def get_active_mappers_for_projects(project_ids: list) -> dict:
+        """Get count of distinct lockers for several projects in one query, keyed by project id"""
+        if not project_ids:
+            return {}
+
+        query = (
+            Task.query.with_entities(
+                Task.project_id, func.count(distinct(Task.locked_by)).label("total")
+            )
+            .filter(
+                Task.task_status.in_(
+                    (
+                        TaskStatus.LOCKED_FOR_MAPPING.value,
+                        TaskStatus.LOCKED_FOR_VALIDATION.value,
+                    )
+                )
+            )
+            .filter(Task.project_id.in_(project_ids))
+            .group_by(Task.project_id)
+        )
+        active_mappers = {project_id: 0 for project_id in project_ids}
+        active_mappers.update({row.project_id: row.total for row in query.all()})
+
+        return active_mappers
+
     def _get_project_and_base_dto(self):
         """Populates a project DTO with properties common to all roles"""
         base_dto = ProjectDTO()
@@ -1120,18 +1141,26 @@ class Project(db.Model):
         return self, base_dto
 
     def as_dto_for_mapping(
-        self, authenticated_user_id: int = None, locale: str = "en", abbrev: bool = True
+        self,
+        authenticated_user_id: int = None,
+        locale: str = "en",
+        abbrev: bool = True,
+        include_tasks: bool = True,
     ) -> Optional[ProjectDTO]:
-        """Creates a Project DTO suitable for transmitting to mapper users"""
+        """
+        Creates a Project DTO suitable for transmitting to mapper users
+        :param include_tasks: False leaves the tasks out, so they can be streamed separately
+        """
         project, project_dto = self._get_project_and_base_dto()
-        if abbrev is False:
-            project_dto.tasks = Task.get_tasks_as_geojson_feature_collection(
-                self.id, None
-            )
-        else:
-            project_dto.tasks = Task.get_tasks_as_geojson_feature_collection_no_geom(
-                self.id
-            )
+        if include_tasks:
+            if abbrev is False:
+                project_dto.tasks = Task.get_tasks_as_geojson_feature_collection(
+                    self.id, None
+                )
+            else:
+                project_dto.tasks = (
+                    Task.get_tasks_as_geojson_feature_collection_no_geom(self.id)
+                )
         project_dto.project_info = ProjectInfo.get_dto_for_locale(
             self.id, locale, project.default_locale
         )
@@ -1154,6 +1183,28 @@ class Project(db.Model):
 
         return project_tasks
 
+    def tasks_as_geojson_stream(
+        self,
+        task_ids_str: str,
+        order_by=None,
+        order_by_type="ASC",
+        status=None,
+        limit=None,
+        min_effort=None,
+        max_effort=None,
+    ):
+        """Streams the geojson of all areas as encoded chunks"""
+        return Task.get_tasks_as_geojson_stream(
+            self.id,
+            task_ids_str,
+            order_by,
+            order_by_type,
+            status,
+            limit=limit,
+            min_effort=min_effort,
+            max_effort=max_effort,
+        )
+
     @staticmethod
     def get_all_countries():
         query = (
@@ -1229,6 +1280,27 @@ class Project(db.Model):
 
         return campaign_list
 
+    @staticmethod
+    def get_campaigns_for_projects(project_ids: list) -> dict:
+        """Get campaign DTOs for several projects in one query, keyed by project id"""
+        campaigns = {project_id: [] for project_id in project_ids}
+        if not project_ids:
+            return campaigns
+
+        query = (
+            db.session.query(campaign_projects.c.project_id, Campaign.id, Campaign.name)
+            .join(Campaign, Campaign.id == campaign_projects.c.campaign_id)
+            .filter(campaign_projects.c.project_id.in_(project_ids))
+            .all()
+        )
+        for row in query:
+            campaign_dto = CampaignDTO()
+            campaign_dto.id = row.id
+            campaign_dto.name = row.name
+            campaigns[row.project_id].append(campaign_dto)
+
+        return campaigns
+
 
 # Add index on project geometry
 db.Index("idx_geometry", Project.geometry, postgresql_using="gist")
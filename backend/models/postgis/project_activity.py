@@ -0,0 +1,487 @@
+import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert
+
+from backend import db
+
+
+class ProjectActivityStats(db.Model):
+    """ Rollup of the project activity recorded in task_history, kept up to date as tasks change """
+
+    __tablename__ = "project_activity_stats"
+
+    project_id = db.Column(
+        db.Integer,
+        db.ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    total_contributors = db.Column(db.Integer, default=0, nullable=False)
+    last_activity = db.Column(db.DateTime)
+
+    @staticmethod
+    def record_action(
+        project_id: int,
+        task_id: int,
+        user_id: int,
+        action: str,
+        action_date: datetime.datetime,
+        is_new_contributor: bool,
+    ):
+        """
+        Adds a task history action to the rollups of the project. Changes are flushed with the current
+        transaction, so they are saved together with the task.
+        :param is_new_contributor: True if it's the first action of the user on the project
+        """
+        stats = insert(ProjectActivityStats.__table__).values(
+            project_id=project_id,
+            total_contributors=1 if is_new_contributor else 0,
+            last_activity=action_date,
+        )
+        db.session.execute(
+            stats.on_conflict_do_update(
+                index_elements=["project_id"],
+                set_=dict(
+                    total_contributors=ProjectActivityStats.total_contributors
+                    + stats.excluded.total_contributors,
+                    last_activity=action_date,
+                ),
+            )
+        )
+
+        last_action = insert(TaskLastAction.__table__).values(
+            project_id=project_id,
+            task_id=task_id,
+            action=action,
+            action_date=action_date,
+            user_id=user_id,
+        )
+        db.session.execute(
+            last_action.on_conflict_do_update(
+                index_elements=["project_id", "task_id"],
+                set_=dict(action=action, action_date=action_date, user_id=user_id),
+            )
+        )
+
+    @staticmethod
+    def record_bulk_action(
+        project_id: int,
+        task_ids: list,
+        user_id: int,
+        action: str,
+        action_date: datetime.datetime,
+        new_contributors: int,
+    ):
+        """
+        Adds the same action on many tasks of a project to the rollups, in two statements
+        :param new_contributors: Number of users that had no action on the project before
+        """
+        stats = insert(ProjectActivityStats.__table__).values(
+            project_id=project_id,
+            total_contributors=new_contributors,
+            last_activity=action_date,
+        )
+        db.session.execute(
+            stats.on_conflict_do_update(
+                index_elements=["project_id"],
+                set_=dict(
+                    total_contributors=ProjectActivityStats.total_contributors
+                    + stats.excluded.total_contributors,
+                    last_activity=action_date,
+                ),
+            )
+        )
+
+        if not task_ids:
+            return
+        db.session.execute(
+            text(
+                """
+                insert into task_last_actions (project_id, task_id, action, action_date, user_id)
+                select :project_id, task_id, :action, :action_date, :user_id
+                  from unnest(cast(:task_ids as integer[])) as task_id
+                    on conflict (project_id, task_id) do update
+                   set action = excluded.action,
+                       action_date = excluded.action_date,
+                       user_id = excluded.user_id
+                """
+            ),
+            dict(
+                project_id=project_id,
+                task_ids=task_ids,
+                action=action,
+                action_date=action_date,
+                user_id=user_id,
+            ),
+        )
+
+    @staticmethod
+    def recount_contributors(project_id: int):
+        """
+        Recounts the distinct contributors of a project from task_history, to be used when history is
+        removed. Changes are flushed with the current transaction
+        """
+        db.session.execute(
+            text(
+                """
+                update project_activity_stats
+                   set total_contributors = (
+                       select count(distinct user_id)
+                         from task_history
+                        where project_id = :project_id
+                          and action != 'COMMENT')
+                 where project_id = :project_id
+                """
+            ),
+            dict(project_id=project_id),
+        )
+
+    @staticmethod
+    def get_total_contributors(project_ids: list) -> dict:
+        """ Gets the distinct contributor count of the supplied projects, keyed by project id """
+        total_contributors = {project_id: 0 for project_id in project_ids}
+        if not project_ids:
+            return total_contributors
+
+        rows = ProjectActivityStats.query.filter(
+            ProjectActivityStats.project_id.in_(project_ids)
+        ).all()
+        total_contributors.update({r.project_id: r.total_contributors for r in rows})
+
+        return total_contributors
+
+    @staticmethod
+    def rebuild(project_id: int = None):
+        """
+        Recomputes all activity rollups from task_history
+        :param project_id: Optionally limit the rebuild to a single project
+        """
+        project_filter = "" if project_id is None else "where project_id = :project_id"
+        projects_filter = "" if project_id is None else "where p.id = :project_id"
+        history_filter = "" if project_id is None else "and project_id = :project_id"
+
+        for table in [
+            "project_activity_stats",
+            "project_lock_activity",
+            "task_last_actions",
+            "task_stats_daily",
+            "project_contribs_snapshots",
+        ]:
+            db.session.execute(
+                text(f"delete from {table} {project_filter}"),
+                {"project_id": project_id},
+            )
+
+        db.session.execute(
+            text(
+                f"""
+                insert into project_activity_stats (project_id, total_contributors, last_activity)
+                select p.id, count(distinct th.user_id), max(th.action_date)
+                  from projects p
+                  left join task_history th on th.project_id = p.id and th.action != 'COMMENT'
+                 {projects_filter}
+                 group by p.id
+                """
+            ),
+            {"project_id": project_id},
+        )
+        db.session.execute(
+            text(
+                f"""
+                insert into project_lock_activity (project_id, day, lock_count, lock_seconds)
+                select project_id, action_date::date, count(*),
+                       sum(extract(epoch from action_date::time))
+                  from task_history
+                 where action in ('LOCKED_FOR_MAPPING', 'LOCKED_FOR_VALIDATION')
+                   and action_text != ''
+                   {history_filter}
+                 group by project_id, action_date::date
+                """
+            ),
+            {"project_id": project_id},
+        )
+        db.session.execute(
+            text(
+                f"""
+                insert into task_last_actions (project_id, task_id, action, action_date, user_id)
+                select distinct on (project_id, task_id)
+                       project_id, task_id, action, action_date, user_id
+                  from task_history
+                 where action != 'COMMENT'
+                   {history_filter}
+                 order by project_id, task_id, action_date desc
+                """
+            ),
+            {"project_id": project_id},
+        )
+        db.session.execute(
+            text(
+                f"""
+                insert into task_stats_daily (project_id, day, mapped, validated, bad_imagery)
+                select project_id, day,
+                       count(*) filter (where action_text = 'MAPPED'),
+                       count(*) filter (where action_text = 'VALIDATED'),
+                       count(*) filter (where action_text = 'BADIMAGERY')
+                  from (select distinct on (project_id, task_id, action_text)
+                               project_id, action_text, action_date::date as day
+                          from task_history
+                         where action = 'STATE_CHANGE'
+                           and action_text in ('MAPPED', 'VALIDATED', 'BADIMAGERY')
+                           {history_filter}
+                         order by project_id, task_id, action_text, action_date) first_changes
+                 group by project_id, day
+                """
+            ),
+            {"project_id": project_id},
+        )
+        db.session.commit()
+
+
+class ProjectLockActivity(db.Model):
+    """ Daily count of completed task locks per project, used to rank popular projects """
+
+    __tablename__ = "project_lock_activity"
+
+    project_id = db.Column(
+        db.Integer,
+        db.ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = db.Column(db.Date, primary_key=True)
+    lock_count = db.Column(db.Integer, default=0, nullable=False)
+    # Sum of the time of day, in seconds, the locks were taken at
+    lock_seconds = db.Column(db.Float, default=0, nullable=False)
+
+    @staticmethod
+    def record_lock(project_id: int, locked_date: datetime.datetime):
+        """ Adds a finished lock to the daily bucket of the day it was taken """
+        lock_seconds = (
+            locked_date - datetime.datetime.combine(locked_date.date(), datetime.time())
+        ).total_seconds()
+        lock = insert(ProjectLockActivity.__table__).values(
+            project_id=project_id,
+            day=locked_date.date(),
+            lock_count=1,
+            lock_seconds=lock_seconds,
+        )
+        db.session.execute(
+            lock.on_conflict_do_update(
+                index_elements=["project_id", "day"],
+                set_=dict(
+                    lock_count=ProjectLockActivity.lock_count + 1,
+                    lock_seconds=ProjectLockActivity.lock_seconds + lock_seconds,
+                ),
+            )
+        )
+
+    @staticmethod
+    def record_locks(project_id: int, locked_dates: list):
+        """ Adds many finished locks to the daily buckets, with one statement per day """
+        buckets = {}
+        for locked_date in locked_dates:
+            lock_count, lock_seconds = buckets.get(locked_date.date(), (0, 0.0))
+            buckets[locked_date.date()] = (
+                lock_count + 1,
+                lock_seconds
+                + (
+                    locked_date
+                    - datetime.datetime.combine(locked_date.date(), datetime.time())
+                ).total_seconds(),
+            )
+
+        for day, (lock_count, lock_seconds) in buckets.items():
+            lock = insert(ProjectLockActivity.__table__).values(
+                project_id=project_id,
+                day=day,
+                lock_count=lock_count,
+                lock_seconds=lock_seconds,
+            )
+            db.session.execute(
+                lock.on_conflict_do_update(
+                    index_elements=["project_id", "day"],
+                    set_=dict(
+                        lock_count=ProjectLockActivity.lock_count + lock_count,
+                        lock_seconds=ProjectLockActivity.lock_seconds + lock_seconds,
+                    ),
+                )
+            )
+
+
+class TaskLastAction(db.Model):
+    """ Latest task history action of every task, ignoring comments """
+
+    __tablename__ = "task_last_actions"
+
+    project_id = db.Column(
+        db.Integer,
+        db.ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    task_id = db.Column(db.Integer, primary_key=True)
+    action = db.Column(db.String, nullable=False)
+    action_date = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.BigInteger, nullable=False)
+
+
+class TaskStatsDaily(db.Model):
+    """
+    Daily number of tasks of a project that were mapped, validated or marked as bad imagery for the
+    first time
+    """
+
+    __tablename__ = "task_stats_daily"
+
+    project_id = db.Column(
+        db.Integer,
+        db.ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = db.Column(db.Date, primary_key=True)
+    mapped = db.Column(db.Integer, default=0, nullable=False)
+    validated = db.Column(db.Integer, default=0, nullable=False)
+    bad_imagery = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (db.Index("idx_task_stats_daily_day", "day"), {})
+
+    @staticmethod
+    def record_state_changes(
+        project_id: int,
+        task_ids: list,
+        new_state,
+        action_date: datetime.datetime,
+        history_ids: list = None,
+    ):
+        """
+        Adds the tasks reaching the new state for the first time to the bucket of the day
+        :param new_state: TaskStatus the tasks changed to, only MAPPED, VALIDATED and BADIMAGERY are counted
+        :param history_ids: State change rows of these changes already in task_history, if any
+        """
+        if new_state.name not in ["MAPPED", "VALIDATED", "BADIMAGERY"] or not task_ids:
+            return
+
+        db.session.execute(
+            text(
+                """
+                insert into task_stats_daily as s (project_id, day, mapped, validated, bad_imagery)
+                select :project_id, :day, count(*) * :mapped, count(*) * :validated,
+                       count(*) * :bad_imagery
+                  from unnest(cast(:task_ids as integer[])) as t(task_id)
+                 where not exists (
+                       select 1
+                         from task_history th
+                        where th.project_id = :project_id
+                          and th.task_id = t.task_id
+                          and th.action = 'STATE_CHANGE'
+                          and th.action_text = :state
+                          and th.id != all(cast(:history_ids as integer[])))
+                having count(*) > 0
+                    on conflict (project_id, day) do update
+                   set mapped = s.mapped + excluded.mapped,
+                       validated = s.validated + excluded.validated,
+                       bad_imagery = s.bad_imagery + excluded.bad_imagery
+                """
+            ),
+            dict(
+                project_id=project_id,
+                day=action_date.date(),
+                task_ids=task_ids,
+                state=new_state.name,
+                history_ids=history_ids or [],
+                mapped=int(new_state.name == "MAPPED"),
+                validated=int(new_state.name == "VALIDATED"),
+                bad_imagery=int(new_state.name == "BADIMAGERY"),
+            ),
+        )
+
+    @staticmethod
+    def remove_tasks(project_id: int, task_ids: list):
+        """
+        Removes the first state changes of tasks about to be deleted with their history from the buckets
+        of their days. Changes are flushed with the current transaction
+        """
+        db.session.execute(
+            text(
+                """
+                update task_stats_daily s
+                   set mapped = s.mapped - c.mapped,
+                       validated = s.validated - c.validated,
+                       bad_imagery = s.bad_imagery - c.bad_imagery
+                  from (select day,
+                               count(*) filter (where action_text = 'MAPPED') as mapped,
+                               count(*) filter (where action_text = 'VALIDATED') as validated,
+                               count(*) filter (where action_text = 'BADIMAGERY') as bad_imagery
+                          from (select distinct on (task_id, action_text)
+                                       action_text, action_date::date as day
+                                  from task_history
+                                 where project_id = :project_id
+                                   and task_id = any(:task_ids)
+                                   and action = 'STATE_CHANGE'
+                                   and action_text in ('MAPPED', 'VALIDATED', 'BADIMAGERY')
+                                 order by task_id, action_text, action_date) first_changes
+                         group by day) c
+                 where s.project_id = :project_id
+                   and s.day = c.day
+                """
+            ),
+            dict(project_id=project_id, task_ids=task_ids),
+        )
+
+
+class ProjectContribsSnapshot(db.Model):
+    """
+    Contributions timeline of a project up to a past day, with the task states needed to resume it, so
+    that only newer state changes have to be replayed
+    """
+
+    __tablename__ = "project_contribs_snapshots"
+
+    project_id = db.Column(
+        db.Integer,
+        db.ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # Last day replayed into the snapshot, always before the day it was saved on
+    day = db.Column(db.Date, nullable=False)
+    mapped_tasks = db.Column(ARRAY(db.Integer), nullable=False, default=[])
+    validated_tasks = db.Column(ARRAY(db.Integer), nullable=False, default=[])
+    invalidated_tasks = db.Column(ARRAY(db.Integer), nullable=False, default=[])
+    # [date, mapped, validated, cumulative mapped, cumulative validated] of every day with changes
+    stats = db.Column(JSONB, nullable=False, default=list)
+
+    @staticmethod
+    def save(
+        project_id: int,
+        day: datetime.date,
+        mapped_tasks: set,
+        validated_tasks: set,
+        invalidated_tasks: set,
+        stats: list,
+    ):
+        """ Saves the snapshot of the project, unless a snapshot of a later day was saved meanwhile """
+        snapshot = insert(ProjectContribsSnapshot.__table__).values(
+            project_id=project_id,
+            day=day,
+            mapped_tasks=sorted(mapped_tasks),
+            validated_tasks=sorted(validated_tasks),
+            invalidated_tasks=sorted(invalidated_tasks),
+            stats=stats,
+        )
+        db.session.execute(
+            snapshot.on_conflict_do_update(
+                index_elements=["project_id"],
+                set_=dict(
+                    day=snapshot.excluded.day,
+                    mapped_tasks=snapshot.excluded.mapped_tasks,
+                    validated_tasks=snapshot.excluded.validated_tasks,
+                    invalidated_tasks=snapshot.excluded.invalidated_tasks,
+                    stats=snapshot.excluded.stats,
+                ),
+                where=ProjectContribsSnapshot.day < snapshot.excluded.day,
+            )
+        )
+        db.session.commit()
+
+    @staticmethod
+    def invalidate(project_id: int):
+        """ Drops the snapshot of the project, to be used when past task history is removed """
+        ProjectContribsSnapshot.query.filter_by(project_id=project_id).delete()
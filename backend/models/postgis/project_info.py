@@ -91,6 +91,59 @@ class ProjectInfo(db.Model):
         # Pass thru default_locale in case of partial translation
         return project_info.get_dto(default_locale)
 
+    @staticmethod
+    def get_dtos_for_locale(projects, locale) -> dict:
+        """
+        Bulk version of get_dto_for_locale, loading the info of several projects in a single query
+        :param projects: iterable of (project_id, default_locale) pairs
+        :param locale: locale requested by user
+        :raises: ValueError if no info found for Default Locale
+        :return: dict of ProjectInfoDTO keyed by project id
+        """
+        projects = [
+            (project_id, default_locale) for project_id, default_locale in projects
+        ]
+        if not projects:
+            return {}
+
+        locales = {default_locale for _, default_locale in projects}
+        if locale is not None:
+            locales.add(locale)
+
+        infos = ProjectInfo.query.filter(
+            ProjectInfo.project_id.in_([project_id for project_id, _ in projects]),
+            ProjectInfo.locale.in_(locales),
+        ).all()
+        infos_by_key = {(info.project_id, info.locale): info for info in infos}
+
+        project_info_dtos = {}
+        for project_id, default_locale in projects:
+            project_info = infos_by_key.get((project_id, locale))
+            default_info = infos_by_key.get((project_id, default_locale))
+
+            if project_info is None:
+                # If project is none, get default locale and don't worry about empty translations
+                project_info_dtos[project_id] = default_info.get_dto()
+                continue
+
+            if locale == default_locale:
+                # If locale == default_locale don't need to worry about empty translations
+                project_info_dtos[project_id] = project_info.get_dto()
+                continue
+
+            if default_info is None:
+                error_message = (
+                    f"BAD DATA: no info for project {project_id}, "
+                    f"locale: {locale}, default {default_locale}"
+                )
+                current_app.logger.critical(error_message)
+                raise ValueError(error_message)
+
+            # Pass thru default_locale in case of partial translation
+            project_info_dtos[project_id] = project_info.get_dto(default_info)
+
+        return project_info_dtos
+
     def get_dto(self, default_locale=ProjectInfoDTO()) -> ProjectInfoDTO:
         """
         Get DTO for current ProjectInfo
@@ -187,3 +187,12 @@ class BannerType(Enum):
 
     INFO = 1
     WARNING = 2
+
+
+class JobStatus(Enum):
+    """ Describes the state of a background job """
+
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3  # Job ran out of attempts
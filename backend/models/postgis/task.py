@@ -1,12 +1,29 @@
 import bleach
+import csv
 import datetime
 import geojson
+import io
 import json
+import shapely.geometry
+import shapely.wkb
 from enum import Enum
 from flask import current_app
-from sqlalchemy.types import Float, Text
-from sqlalchemy import desc, cast, func, distinct
+from sqlalchemy.types import Text, JSON
+from sqlalchemy import (
+    DDL,
+    desc,
+    cast,
+    event,
+    func,
+    distinct,
+    case,
+    text,
+    or_,
+    and_,
+    exists,
+)
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm.session import make_transient
 from geoalchemy2 import Geometry
 from backend import db
@@ -30,7 +47,22 @@ from backend.models.postgis.utils import (
     parse_duration,
     NotFound,
 )
+from backend.models.postgis.priority_area import PriorityArea, project_priority_areas
 from backend.models.postgis.task_annotation import TaskAnnotation
+from backend.models.postgis.project_activity import (
+    ProjectActivityStats,
+    ProjectContribsSnapshot,
+    ProjectLockActivity,
+    TaskStatsDaily,
+)
+from backend.services.cache_service import CacheService
+
+
+# Half of the width of the web mercator projection, in meters
+WEB_MERCATOR_HALF_WIDTH = 20037508.342789244
+# Vector tiles are encoded on a 4096 grid, keeping 64 units of the features beyond the tile edges
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
 
 
 class TaskAction(Enum):
@@ -211,6 +243,17 @@ class TaskHistory(db.Model):
         ),
         db.Index("idx_task_history_composite", "task_id", "project_id"),
         db.Index("idx_task_history_project_id_user_id", "user_id", "project_id"),
+        # Latest activity of a project, paginated by cursor
+        db.Index(
+            "idx_task_history_project_action_date", "project_id", "action_date", "id"
+        ),
+        # Validation locks of a user by time, summed per minute into their statistics
+        db.Index(
+            "idx_task_history_validation_locks",
+            "user_id",
+            "action_date",
+            postgresql_where=(action == "LOCKED_FOR_VALIDATION"),
+        ),
         {},
     )
 
@@ -301,6 +344,7 @@ class TaskHistory(db.Model):
         last_locked.action_text = (
             (datetime.datetime.min + duration_task_locked).time().isoformat()
         )
+        ProjectLockActivity.record_lock(project_id, last_locked.action_date)
         db.session.commit()
 
     @staticmethod
@@ -325,44 +369,84 @@ class TaskHistory(db.Model):
         dupe.delete()
 
     @staticmethod
-    def update_expired_and_locked_actions(
-        project_id: int, task_id: int, expiry_date: datetime, action_text: str
-    ):
+    def auto_unlock_expired_actions(
+        expiry_date: datetime, action_text: str, project_id: int = None
+    ) -> list:
         """
-        Sets auto unlock state to all not finished actions, that are older then the expiry date.
-        Action is considered as a not finished, when it is in locked state and doesn't have action text
-        :param project_id: Project ID in scope
-        :param task_id: Task in scope
+        Sets auto unlock state to all not finished actions of locked tasks, that are older then the expiry
+        date, in a single statement. Action is considered as a not finished, when it is in locked state and
+        doesn't have action text. Changes are left for the caller to commit
         :param expiry_date: Action created before this date is treated as expired
         :param action_text: Text which will be set for all changed actions
-        :return:
+        :param project_id: Optionally limit the update to a single project
+        :return: list of (project_id, task_id) of the tasks with expired actions
         """
-        all_expired = TaskHistory.query.filter(
-            TaskHistory.task_id == task_id,
-            TaskHistory.project_id == project_id,
-            TaskHistory.action_text.is_(None),
-            TaskHistory.action.in_(
-                [
-                    TaskAction.LOCKED_FOR_VALIDATION.name,
-                    TaskAction.LOCKED_FOR_MAPPING.name,
-                    TaskAction.EXTENDED_FOR_MAPPING.name,
-                    TaskAction.EXTENDED_FOR_VALIDATION.name,
-                ]
+        project_filter = "" if project_id is None else "and th.project_id = :project_id"
+        expired = db.session.execute(
+            text(
+                f"""
+                update task_history th
+                   set action = case
+                         when th.action in ('LOCKED_FOR_MAPPING', 'EXTENDED_FOR_MAPPING')
+                         then 'AUTO_UNLOCKED_FOR_MAPPING'
+                         else 'AUTO_UNLOCKED_FOR_VALIDATION'
+                       end,
+                       action_text = :action_text
+                  from tasks t
+                 where t.id = th.task_id
+                   and t.project_id = th.project_id
+                   and t.task_status in (:locked_for_mapping, :locked_for_validation)
+                   and th.action_text is null
+                   and th.action in ('LOCKED_FOR_MAPPING', 'LOCKED_FOR_VALIDATION',
+                                     'EXTENDED_FOR_MAPPING', 'EXTENDED_FOR_VALIDATION')
+                   and th.action_date <= :expiry_date
+                   {project_filter}
+             returning th.project_id, th.task_id, th.action, th.action_date
+                """
             ),
-            TaskHistory.action_date <= expiry_date,
-        ).all()
-
-        for task_history in all_expired:
-            unlock_action = (
-                TaskAction.AUTO_UNLOCKED_FOR_MAPPING
-                if task_history.action in ["LOCKED_FOR_MAPPING", "EXTENDED_FOR_MAPPING"]
-                else TaskAction.AUTO_UNLOCKED_FOR_VALIDATION
+            dict(
+                action_text=action_text,
+                expiry_date=expiry_date,
+                project_id=project_id,
+                locked_for_mapping=TaskStatus.LOCKED_FOR_MAPPING.value,
+                locked_for_validation=TaskStatus.LOCKED_FOR_VALIDATION.value,
+            ),
+        ).fetchall()
+
+        if expired:
+            # Keep the last action rollup in step with the renamed actions
+            db.session.execute(
+                text(
+                    """
+                    update task_last_actions tla
+                       set action = e.action
+                      from unnest(:project_ids, :task_ids, :actions, :action_dates)
+                           as e(project_id, task_id, action, action_date)
+                     where tla.project_id = e.project_id
+                       and tla.task_id = e.task_id
+                       and tla.action_date = e.action_date
+                    """
+                ),
+                dict(
+                    project_ids=[r.project_id for r in expired],
+                    task_ids=[r.task_id for r in expired],
+                    actions=[r.action for r in expired],
+                    action_dates=[r.action_date for r in expired],
+                ),
             )
 
-            task_history.set_auto_unlock_action(unlock_action)
-            task_history.action_text = action_text
+        return sorted({(r.project_id, r.task_id) for r in expired})
 
-        db.session.commit()
+    @staticmethod
+    def is_project_contributor(project_id: int, user_id: int) -> bool:
+        """Checks if the user has any history other than comments on the project"""
+        query = TaskHistory.query.filter(
+            TaskHistory.project_id == project_id,
+            TaskHistory.user_id == user_id,
+            TaskHistory.action != TaskAction.COMMENT.name,
+        ).exists()
+
+        return db.session.query(query).scalar()
 
     @staticmethod
     def get_all_comments(project_id: int) -> ProjectCommentsDTO:
@@ -524,6 +608,20 @@ class Task(db.Model):
     validated_by = db.Column(
         db.BigInteger, db.ForeignKey("users.id", name="fk_users_validator"), index=True
     )
+    # Id of the transaction that last changed the status, locker or mapper, set by TASK_STATE_TRIGGER
+    state_version = db.Column(db.BigInteger)
+    # Predicted mapping effort, the building_area_diff of the task annotations, set by TaskAnnotation.upsert
+    effort_prediction = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index("idx_tasks_state_version", "project_id", "state_version"),
+        db.Index(
+            "idx_tasks_effort_prediction",
+            "project_id",
+            effort_prediction.desc().nullslast(),
+        ),
+        {},
+    )
 
     # Mapped objects
     task_history = db.relationship(
@@ -541,10 +639,18 @@ class Task(db.Model):
     def update(self):
         """Updates the DB with the current state of the Task"""
         db.session.commit()
+        CacheService.invalidate_project(self.project_id, catalogue=False)
 
     def delete(self):
         """Deletes the current model from the DB"""
+        project_id = self.project_id
+        # The task history goes with the task, so the rollups built from it are updated and the
+        # contributions timeline must be replayed again
+        TaskStatsDaily.remove_tasks(project_id, [self.id])
         db.session.delete(self)
+        db.session.flush()
+        ProjectContribsSnapshot.invalidate(project_id)
+        ProjectActivityStats.recount_contributors(project_id)
         db.session.commit()
 
     @classmethod
@@ -589,6 +695,105 @@ class Task(db.Model):
 
         return task
 
+    @staticmethod
+    def rows_from_geojson_features(features: list) -> list:
+        """
+        Validates task features in a single pass and converts them to rows for bulk_insert, numbering
+        the tasks from 1. Rows hold the same values from_geojson_feature sets on a task
+        :param features: list of geojson feature dicts
+        :raises InvalidGeoJson, InvalidData
+        """
+        rows = []
+        for task_id, task_feature in enumerate(features, start=1):
+            if (
+                not isinstance(task_feature, dict)
+                or task_feature.get("type") != "Feature"
+            ):
+                raise InvalidGeoJson(
+                    "MustBeFeature- Invalid GeoJson should be a feature"
+                )
+
+            task_geometry = geojson.GeoJSON.to_instance(task_feature.get("geometry"))
+            if type(task_geometry) is not geojson.MultiPolygon:
+                raise InvalidGeoJson(
+                    "MustBeMultiPloygon- Geometry must be a MultiPolygon"
+                )
+
+            is_valid_geojson = geojson.is_valid(task_geometry)
+            if is_valid_geojson["valid"] == "no":
+                raise InvalidGeoJson(
+                    f"InvalidFeatureCollection- {is_valid_geojson['message']}"
+                )
+
+            properties = task_feature.get("properties") or {}
+            try:
+                row = dict(
+                    id=task_id,
+                    x=properties["x"],
+                    y=properties["y"],
+                    zoom=properties["zoom"],
+                    is_square=properties["isSquare"],
+                    extra_properties=None,
+                )
+            except KeyError as e:
+                raise InvalidData(
+                    f"PropertyNotFound: Expected property not found: {str(e)}"
+                )
+
+            if "extra_properties" in properties:
+                row["extra_properties"] = json.dumps(properties["extra_properties"])
+
+            row["geometry"] = shapely.wkb.dumps(
+                shapely.geometry.shape(task_geometry), hex=True, srid=4326
+            )
+            rows.append(row)
+
+        return rows
+
+    @staticmethod
+    def bulk_insert(project_id: int, rows: list, batch_size: int = 5000):
+        """
+        Loads the tasks of a project with COPY, in batches, as part of the current transaction
+        :param project_id: Owning project ID
+        :param rows: task rows from rows_from_geojson_features
+        """
+        columns = [
+            "id",
+            "project_id",
+            "x",
+            "y",
+            "zoom",
+            "extra_properties",
+            "is_square",
+            "geometry",
+            "task_status",
+        ]
+        copy_sql = f"COPY tasks ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        cursor = db.session.connection().connection.cursor()
+        for start in range(0, len(rows), batch_size):
+            end = min(start + batch_size, len(rows))
+            batch = io.StringIO()
+            writer = csv.writer(batch)
+            for row in rows[start:end]:
+                writer.writerow(
+                    [
+                        row["id"],
+                        project_id,
+                        row["x"],
+                        row["y"],
+                        row["zoom"],
+                        row["extra_properties"],
+                        row["is_square"],
+                        row["geometry"],
+                        TaskStatus.READY.value,
+                    ]
+                )
+            batch.seek(0)
+            cursor.copy_expert(copy_sql, batch)
+            current_app.logger.info(
+                f"Project {project_id}: loaded {end} of {len(rows)} tasks"
+            )
+
     @staticmethod
     def get(task_id: int, project_id: int):
         """
@@ -601,6 +806,54 @@ class Task(db.Model):
 
         return Task.query.filter_by(id=task_id, project_id=project_id).one_or_none()
 
+    @staticmethod
+    def get_next_available(
+        project_id: int,
+        task_statuses: list,
+        near_task_id: int = None,
+        exclude_mapped_by: int = None,
+    ):
+        """
+        Gets a task in one of the supplied statuses and locks its row until the end of the transaction.
+        Rows already locked by other transactions are skipped, so concurrent callers never get the same
+        task. Tasks in a priority area come first, then the tasks closest to near_task_id
+        :param task_statuses: list of TaskStatus the task can be in
+        :param near_task_id: Optional task the next task should be close to
+        :param exclude_mapped_by: Optionally skip the tasks mapped by this user
+        :return: Task or None if no task is available
+        """
+        query = Task.query.filter(
+            Task.project_id == project_id,
+            Task.task_status.in_([status.value for status in task_statuses]),
+        )
+        if exclude_mapped_by is not None:
+            query = query.filter(
+                or_(Task.mapped_by.is_(None), Task.mapped_by != exclude_mapped_by)
+            )
+
+        in_priority_area = exists().where(
+            and_(
+                project_priority_areas.c.project_id == Task.project_id,
+                project_priority_areas.c.priority_area_id == PriorityArea.id,
+                func.ST_Intersects(PriorityArea.geometry, Task.geometry),
+            )
+        )
+        order_by = [in_priority_area.desc()]
+        if near_task_id is not None:
+            near_task = aliased(Task)
+            near_geometry = (
+                db.session.query(near_task.geometry)
+                .filter(
+                    near_task.project_id == project_id, near_task.id == near_task_id
+                )
+                .as_scalar()
+            )
+            order_by.append(func.ST_Distance(Task.geometry, near_geometry))
+        # Spread users that start together over the tasks
+        order_by.append(func.random())
+
+        return query.order_by(*order_by).with_for_update(skip_locked=True).first()
+
     @staticmethod
     def get_tasks(project_id: int, task_ids: List[int]):
         """Get all tasks that match supplied list"""
@@ -613,6 +866,28 @@ class Task(db.Model):
         """Get all tasks for a given project"""
         return Task.query.filter(Task.project_id == project_id).all()
 
+    @staticmethod
+    def get_tasks_as_wkb(project_id: int, task_ids: List[int] = None, chunk_size=1000):
+        """
+        Gets the id and WKB geometry of the tasks of a project, ordered by id and read through a server
+        side cursor in chunks
+        :param task_ids: Optionally limit the rows to these tasks
+        :raises NotFound: if none of the requested tasks exist
+        """
+        filters = [Task.project_id == project_id]
+        if task_ids is not None:
+            filters.append(Task.id.in_(task_ids))
+
+        if not db.session.query(Task.query.filter(*filters).exists()).scalar():
+            raise NotFound()
+
+        return (
+            db.session.query(Task.id, func.ST_AsBinary(Task.geometry).label("geometry"))
+            .filter(*filters)
+            .order_by(Task.id)
+            .yield_per(chunk_size)
+        )
+
     @staticmethod
     def get_tasks_by_status(project_id: int, status: str):
         "Returns all tasks filtered by status in a project"
@@ -625,54 +900,76 @@ class Task(db.Model):
         return parse_duration(current_app.config["TASK_AUTOUNLOCK_AFTER"])
 
     @staticmethod
-    def auto_unlock_tasks(project_id: int):
-        """Unlock all tasks locked for longer than the auto-unlock delta"""
+    def auto_unlock_tasks(project_id: int = None) -> dict:
+        """
+        Unlock all tasks locked for longer than the auto-unlock delta. Expired locks of a project, or of
+        the whole database, are released with a few set based statements in a single transaction
+        :param project_id: Optionally limit the unlock to a single project
+        :return: dict of the unlocked task ids keyed by project id
+        """
         expiry_delta = Task.auto_unlock_delta()
         lock_duration = (datetime.datetime.min + expiry_delta).time().isoformat()
         expiry_date = datetime.datetime.utcnow() - expiry_delta
 
-        old_tasks = (
-            db.session.query(Task.id)
-            .filter(Task.id == TaskHistory.task_id)
-            .filter(Task.project_id == TaskHistory.project_id)
-            .filter(Task.task_status.in_([1, 3]))
-            .filter(
-                TaskHistory.action.in_(
-                    [
-                        "EXTENDED_FOR_MAPPING",
-                        "EXTENDED_FOR_VALIDATION",
-                        "LOCKED_FOR_VALIDATION",
-                        "LOCKED_FOR_MAPPING",
-                    ]
-                )
-            )
-            .filter(TaskHistory.action_text.is_(None))
-            .filter(Task.project_id == project_id)
-            .filter(TaskHistory.action_date <= str(expiry_date))
+        expired_tasks = TaskHistory.auto_unlock_expired_actions(
+            expiry_date, lock_duration, project_id
         )
-
-        if old_tasks.count() == 0:
+        if not expired_tasks:
             # no tasks older than the delta found, return without further processing
-            return
+            db.session.commit()
+            return {}
 
-        for old_task in old_tasks:
-            task = Task.get(old_task[0], project_id)
-            task.auto_unlock_expired_tasks(expiry_date, lock_duration)
-
-    def auto_unlock_expired_tasks(self, expiry_date, lock_duration):
-        """Unlock all tasks locked before expiry date. Clears task lock if needed"""
-        TaskHistory.update_expired_and_locked_actions(
-            self.project_id, self.id, expiry_date, lock_duration
+        # Tasks are only released when their latest lock is the one that expired, the task is then
+        # reset to the status of its last state change
+        status_names = ", ".join(
+            f"('{status.name}', {status.value})" for status in TaskStatus
         )
+        unlocked = db.session.execute(
+            text(
+                f"""
+                update tasks t
+                   set task_status = coalesce(
+                         (select s.value
+                            from task_history th
+                            join (values {status_names}) as s(name, value)
+                              on s.name = th.action_text
+                           where th.project_id = t.project_id
+                             and th.task_id = t.id
+                             and th.action = 'STATE_CHANGE'
+                           order by th.action_date desc
+                           limit 1),
+                         :ready),
+                       locked_by = null
+                  from unnest(:project_ids, :task_ids) as e(project_id, task_id)
+                 where t.project_id = e.project_id
+                   and t.id = e.task_id
+                   and (select th.action
+                          from task_history th
+                         where th.project_id = t.project_id
+                           and th.task_id = t.id
+                           and th.action in ('LOCKED_FOR_MAPPING', 'LOCKED_FOR_VALIDATION',
+                                             'AUTO_UNLOCKED_FOR_MAPPING',
+                                             'AUTO_UNLOCKED_FOR_VALIDATION')
+                         order by th.action_date desc
+                         limit 1) like 'AUTO_UNLOCKED_FOR_%'
+             returning t.project_id, t.id
+                """
+            ),
+            dict(
+                ready=TaskStatus.READY.value,
+                project_ids=[project_id for project_id, _ in expired_tasks],
+                task_ids=[task_id for _, task_id in expired_tasks],
+            ),
+        ).fetchall()
+        db.session.commit()
 
-        last_action = TaskHistory.get_last_locked_or_auto_unlocked_action(
-            self.project_id, self.id
-        )
-        if last_action.action in [
-            "AUTO_UNLOCKED_FOR_MAPPING",
-            "AUTO_UNLOCKED_FOR_VALIDATION",
-        ]:
-            self.clear_lock()
+        report = {}
+        for row in unlocked:
+            report.setdefault(row.project_id, []).append(row.id)
+        for unlocked_project_id in report:
+            CacheService.invalidate_project(unlocked_project_id, catalogue=False)
+
+        return report
 
     def is_mappable(self):
         """Determines if task in scope is in suitable state for mapping"""
@@ -718,6 +1015,22 @@ class Task(db.Model):
         if mapping_issues is not None:
             history.task_mapping_issues = mapping_issues
 
+        if action != TaskAction.COMMENT:
+            # Keep the project activity rollups in step with the history
+            history.action_date = timestamp()
+            ProjectActivityStats.record_action(
+                self.project_id,
+                self.id,
+                user_id,
+                history.action,
+                history.action_date,
+                not TaskHistory.is_project_contributor(self.project_id, user_id),
+            )
+        if action == TaskAction.STATE_CHANGE:
+            TaskStatsDaily.record_state_changes(
+                self.project_id, [self.id], new_state, history.action_date
+            )
+
         self.task_history.append(history)
         return history
 
@@ -758,6 +1071,8 @@ class Task(db.Model):
         # clear the lock action for the task in the task history
         last_action = TaskHistory.get_last_locked_action(self.project_id, self.id)
         last_action.delete()
+        # The lock may have been the only action of its holder on the project
+        ProjectActivityStats.recount_contributors(self.project_id)
 
         # Set locked_by to null and status to last status on task
         self.clear_lock()
@@ -771,6 +1086,8 @@ class Task(db.Model):
             else TaskAction.AUTO_UNLOCKED_FOR_VALIDATION
         )
 
+        # Clearing the lock recounts the contributors, so the holder is only counted again here if the
+        # lock was their only action on the project
         self.clear_task_lock()
 
         # Add AUTO_UNLOCKED action in the task history
@@ -845,6 +1162,393 @@ class Task(db.Model):
         self.locked_by = None
         self.update()
 
+    @staticmethod
+    def bulk_change_state(
+        project_id: int,
+        user_id: int,
+        task_statuses: list,
+        new_state: TaskStatus,
+        lock_action: TaskAction,
+    ) -> int:
+        """
+        Moves all tasks of the project in the supplied statuses to the new state with a few set based
+        statements. History, invalidation history and activity rollups end up as if every task had been
+        locked with lock_action and then unlocked with unlock_task. Tasks that are already locked are
+        unlocked without taking a new lock. Changes are left for the caller to commit, together with the
+        project counters
+        :param task_statuses: list of TaskStatus of the tasks to change
+        :param new_state: TaskStatus the tasks are unlocked to
+        :param lock_action: TaskAction of the lock taken on tasks that aren't locked
+        :return: number of changed tasks
+        """
+        locked_statuses = [
+            TaskStatus.LOCKED_FOR_MAPPING.value,
+            TaskStatus.LOCKED_FOR_VALIDATION.value,
+        ]
+        tasks = (
+            db.session.query(Task.id, Task.task_status)
+            .filter(
+                Task.project_id == project_id,
+                Task.task_status.in_([status.value for status in task_statuses]),
+            )
+            .with_for_update()
+            .all()
+        )
+        if not tasks:
+            return 0
+
+        task_ids = [task.id for task in tasks]
+        tasks_to_lock = [
+            task.id for task in tasks if task.task_status not in locked_statuses
+        ]
+        locked_tasks = [
+            task.id for task in tasks if task.task_status in locked_statuses
+        ]
+        new_contributors = (
+            0 if TaskHistory.is_project_contributor(project_id, user_id) else 1
+        )
+
+        # Every task is locked and unlocked at once, the state change is dated right after the lock
+        # so it stays the latest action of the task
+        lock_date = timestamp()
+        state_date = lock_date + datetime.timedelta(microseconds=1)
+        locked_dates = [lock_date] * len(tasks_to_lock)
+
+        db.session.execute(
+            text(
+                """
+                insert into task_history (project_id, task_id, action, action_text, action_date, user_id)
+                select :project_id, task_id, :action, :action_text, :action_date, :user_id
+                  from unnest(cast(:task_ids as integer[])) as task_id
+                """
+            ),
+            dict(
+                project_id=project_id,
+                task_ids=tasks_to_lock,
+                action=lock_action.name,
+                action_text=(datetime.datetime.min + (state_date - lock_date))
+                .time()
+                .isoformat(),
+                action_date=lock_date,
+                user_id=user_id,
+            ),
+        )
+
+        if locked_tasks:
+            # Locks of the user on tasks that were already locked get their duration, like in
+            # TaskHistory.update_task_locked_with_duration
+            open_locks = db.session.execute(
+                text(
+                    """
+                    select distinct on (th.task_id) th.id, th.action_date
+                      from task_history th
+                      join tasks t on t.project_id = th.project_id and t.id = th.task_id
+                     where th.project_id = :project_id
+                       and th.task_id = any(:task_ids)
+                       and th.user_id = :user_id
+                       and th.action_text is null
+                       and th.action = case t.task_status
+                             when :locked_for_mapping then 'LOCKED_FOR_MAPPING'
+                             else 'LOCKED_FOR_VALIDATION'
+                           end
+                     order by th.task_id, th.id desc
+                    """
+                ),
+                dict(
+                    project_id=project_id,
+                    task_ids=locked_tasks,
+                    user_id=user_id,
+                    locked_for_mapping=TaskStatus.LOCKED_FOR_MAPPING.value,
+                ),
+            ).fetchall()
+            if open_locks:
+                db.session.execute(
+                    text(
+                        """
+                        update task_history th
+                           set action_text = l.action_text
+                          from unnest(cast(:ids as integer[]), cast(:action_texts as varchar[]))
+                               as l(id, action_text)
+                         where th.id = l.id
+                        """
+                    ),
+                    dict(
+                        ids=[lock.id for lock in open_locks],
+                        action_texts=[
+                            (datetime.datetime.min + (state_date - lock.action_date))
+                            .time()
+                            .isoformat()
+                            for lock in open_locks
+                        ],
+                    ),
+                )
+                locked_dates += [lock.action_date for lock in open_locks]
+
+        state_changes = db.session.execute(
+            text(
+                """
+                insert into task_history (project_id, task_id, action, action_text, action_date, user_id)
+                select :project_id, task_id, :action, :action_text, :action_date, :user_id
+                  from unnest(cast(:task_ids as integer[])) as task_id
+             returning id, task_id
+                """
+            ),
+            dict(
+                project_id=project_id,
+                task_ids=task_ids,
+                action=TaskAction.STATE_CHANGE.name,
+                action_text=new_state.name,
+                action_date=state_date,
+                user_id=user_id,
+            ),
+        ).fetchall()
+        TaskStatsDaily.record_state_changes(
+            project_id,
+            task_ids,
+            new_state,
+            state_date,
+            [row.id for row in state_changes],
+        )
+
+        last_mapped_action = """
+            select th.user_id, th.action_date
+              from task_history th
+             where th.project_id = {alias}.project_id
+               and th.task_id = {alias}.task_id
+               and th.action = 'STATE_CHANGE'
+               and th.action_text in ('BADIMAGERY', 'MAPPED')
+             order by th.action_date desc
+             limit 1
+        """
+        if new_state == TaskStatus.VALIDATED:
+            # Close the open invalidations, like TaskInvalidationHistory.record_validation
+            db.session.execute(
+                text(
+                    f"""
+                    update task_invalidation_history tih
+                       set (mapper_id, mapped_date) = ({last_mapped_action.format(alias="tih")}),
+                           validator_id = :user_id,
+                           validated_date = :validated_date,
+                           is_closed = true,
+                           updated_date = :updated_date
+                     where tih.project_id = :project_id
+                       and tih.task_id = any(:task_ids)
+                       and tih.is_closed = false
+                    """
+                ),
+                dict(
+                    project_id=project_id,
+                    task_ids=task_ids,
+                    user_id=user_id,
+                    validated_date=state_date,
+                    updated_date=timestamp(),
+                ),
+            )
+        elif new_state == TaskStatus.INVALIDATED:
+            # Start a new invalidation for every task, like TaskInvalidationHistory.record_invalidation
+            db.session.execute(
+                text(
+                    """
+                    update task_invalidation_history
+                       set is_closed = true
+                     where project_id = :project_id
+                       and task_id = any(:task_ids)
+                       and is_closed = false
+                    """
+                ),
+                dict(project_id=project_id, task_ids=task_ids),
+            )
+            db.session.execute(
+                text(
+                    f"""
+                    insert into task_invalidation_history (
+                           project_id, task_id, is_closed, mapper_id, mapped_date, invalidator_id,
+                           invalidated_date, invalidation_history_id, updated_date)
+                    select sc.project_id, sc.task_id, false, lm.user_id, lm.action_date, :user_id,
+                           :invalidated_date, sc.history_id, :updated_date
+                      from (select :project_id as project_id, task_id, history_id
+                              from unnest(cast(:task_ids as integer[]), cast(:history_ids as integer[]))
+                                   as s(task_id, history_id)) sc
+                      join lateral ({last_mapped_action.format(alias="sc")}) lm on true
+                    """
+                ),
+                dict(
+                    project_id=project_id,
+                    task_ids=[row.task_id for row in state_changes],
+                    history_ids=[row.id for row in state_changes],
+                    user_id=user_id,
+                    invalidated_date=state_date,
+                    updated_date=timestamp(),
+                ),
+            )
+
+        task_updates = dict(task_status=new_state.value, locked_by=None)
+        if new_state in [TaskStatus.MAPPED, TaskStatus.BADIMAGERY]:
+            # Don't set mapped if state being set back to mapped after validation
+            validating_tasks = [
+                task.id
+                for task in tasks
+                if task.task_status == TaskStatus.LOCKED_FOR_VALIDATION.value
+                or (
+                    task.id in tasks_to_lock
+                    and lock_action == TaskAction.LOCKED_FOR_VALIDATION
+                )
+            ]
+            task_updates["mapped_by"] = (
+                case([(Task.id.in_(validating_tasks), Task.mapped_by)], else_=user_id)
+                if validating_tasks
+                else user_id
+            )
+        elif new_state == TaskStatus.VALIDATED:
+            task_updates["validated_by"] = user_id
+        elif new_state == TaskStatus.INVALIDATED:
+            task_updates["mapped_by"] = None
+            task_updates["validated_by"] = None
+        Task.query.filter(Task.project_id == project_id, Task.id.in_(task_ids)).update(
+            task_updates, synchronize_session=False
+        )
+
+        ProjectActivityStats.record_bulk_action(
+            project_id,
+            task_ids,
+            user_id,
+            TaskAction.STATE_CHANGE.name,
+            state_date,
+            new_contributors,
+        )
+        ProjectLockActivity.record_locks(project_id, locked_dates)
+
+        return len(task_ids)
+
+    @staticmethod
+    def bulk_reset_tasks(project_id: int, user_id: int) -> int:
+        """
+        Resets all tasks of the project that aren't ready with a few set based statements. History and
+        activity rollups end up as if every task had been commented and reset with reset_task. Changes
+        are left for the caller to commit, together with the project counters
+        :return: number of reset tasks
+        """
+        tasks = (
+            db.session.query(Task.id, Task.task_status, Task.locked_by)
+            .filter(
+                Task.project_id == project_id,
+                Task.task_status != TaskStatus.READY.value,
+            )
+            .with_for_update()
+            .all()
+        )
+        if not tasks:
+            return 0
+
+        task_ids = [task.id for task in tasks]
+        locked_by = {
+            task.id: task.locked_by
+            for task in tasks
+            if task.task_status
+            in [
+                TaskStatus.LOCKED_FOR_MAPPING.value,
+                TaskStatus.LOCKED_FOR_VALIDATION.value,
+            ]
+            and task.locked_by is not None
+        }
+        # Only the user resetting the tasks can be new, the auto unlocks replacing the locks of lock
+        # holders keep them counted
+        new_contributors = (
+            0 if TaskHistory.is_project_contributor(project_id, user_id) else 1
+        )
+
+        comment_date = timestamp()
+        unlock_date = comment_date + datetime.timedelta(microseconds=1)
+        state_date = comment_date + datetime.timedelta(microseconds=2)
+        history = text(
+            """
+            insert into task_history (project_id, task_id, action, action_text, action_date, user_id)
+            select :project_id, h.task_id, h.action, :action_text, :action_date, h.user_id
+              from unnest(cast(:task_ids as integer[]), cast(:actions as varchar[]),
+                          cast(:user_ids as bigint[])) as h(task_id, action, user_id)
+            """
+        )
+        db.session.execute(
+            history,
+            dict(
+                project_id=project_id,
+                task_ids=task_ids,
+                actions=[TaskAction.COMMENT.name] * len(task_ids),
+                user_ids=[user_id] * len(task_ids),
+                action_text=bleach.clean("Task reset"),
+                action_date=comment_date,
+            ),
+        )
+
+        if locked_by:
+            # Replace the latest lock of locked tasks with an auto unlock, like record_auto_unlock
+            cleared_locks = db.session.execute(
+                text(
+                    """
+                    delete from task_history th
+                     using (select distinct on (task_id) id
+                              from task_history
+                             where project_id = :project_id
+                               and task_id = any(:task_ids)
+                               and action in ('LOCKED_FOR_MAPPING', 'LOCKED_FOR_VALIDATION')
+                             order by task_id, action_date desc) last_lock
+                     where th.id = last_lock.id
+                 returning th.task_id, th.action
+                    """
+                ),
+                dict(project_id=project_id, task_ids=list(locked_by)),
+            ).fetchall()
+            db.session.execute(
+                history,
+                dict(
+                    project_id=project_id,
+                    task_ids=[lock.task_id for lock in cleared_locks],
+                    actions=[
+                        TaskAction.AUTO_UNLOCKED_FOR_MAPPING.name
+                        if lock.action == TaskAction.LOCKED_FOR_MAPPING.name
+                        else TaskAction.AUTO_UNLOCKED_FOR_VALIDATION.name
+                        for lock in cleared_locks
+                    ],
+                    user_ids=[locked_by[lock.task_id] for lock in cleared_locks],
+                    action_text=(datetime.datetime.min + Task.auto_unlock_delta())
+                    .time()
+                    .isoformat(),
+                    action_date=unlock_date,
+                ),
+            )
+
+        db.session.execute(
+            history,
+            dict(
+                project_id=project_id,
+                task_ids=task_ids,
+                actions=[TaskAction.STATE_CHANGE.name] * len(task_ids),
+                user_ids=[user_id] * len(task_ids),
+                action_text=TaskStatus.READY.name,
+                action_date=state_date,
+            ),
+        )
+        Task.query.filter(Task.project_id == project_id, Task.id.in_(task_ids)).update(
+            dict(
+                task_status=TaskStatus.READY.value,
+                mapped_by=None,
+                validated_by=None,
+                locked_by=None,
+            ),
+            synchronize_session=False,
+        )
+
+        ProjectActivityStats.record_bulk_action(
+            project_id,
+            task_ids,
+            user_id,
+            TaskAction.STATE_CHANGE.name,
+            state_date,
+            new_contributors,
+        )
+
+        return len(task_ids)
+
     @staticmethod
     def get_tasks_as_geojson_feature_collection(
         project_id,
@@ -856,99 +1560,203 @@ class Task(db.Model):
         """
         Creates a geoJson.FeatureCollection object for tasks related to the supplied project ID
         :param project_id: Owning project ID
-        :order_by: sorting option: available values update_date and building_area_diff
+        :order_by: sorting option: available values update_date and effort_prediction
         :status: task status id to filter by
         :return: geojson.FeatureCollection
         """
-        # subquery = (
-        #     db.session.query(func.max(TaskHistory.action_date))
-        #     .filter(
-        #         Task.id == TaskHistory.task_id,
-        #         Task.project_id == TaskHistory.project_id,
-        #     )
-        #     .correlate(Task)
-        #     .group_by(Task.id)
-        #     .label("update_date")
-        # )
-        query = db.session.query(
+        feature_collection = b"".join(
+            Task.get_tasks_as_geojson_stream(
+                project_id, task_ids_str, order_by, order_by_type, status
+            )
+        )
+        return geojson.loads(feature_collection.decode("utf-8"))
+
+    @staticmethod
+    def get_tasks_as_geojson_stream(
+        project_id,
+        task_ids_str: str = None,
+        order_by: str = None,
+        order_by_type: str = "ASC",
+        status: int = None,
+        chunk_size: int = 1000,
+        limit: int = None,
+        min_effort: float = None,
+        max_effort: float = None,
+    ):
+        """
+        Streams the geoJson FeatureCollection of tasks related to the supplied project ID. Features are
+        encoded by Postgres and read through a server side cursor, so memory use doesn't grow with the
+        number of tasks
+        :param project_id: Owning project ID
+        :order_by: sorting option: available values update_date and effort_prediction
+        :status: task status id to filter by
+        :limit: maximum number of tasks, eg. to get the tasks needing the most effort
+        :min_effort: only tasks whose effort prediction is at least this
+        :max_effort: only tasks whose effort prediction is at most this
+        :raises NotFound: if none of the requested tasks exist
+        :return: generator of utf-8 encoded JSON chunks
+        """
+        filters = [Task.project_id == project_id]
+        if task_ids_str:
+            task_ids = [int(task_id) for task_id in task_ids_str.split(",")]
+            filters.append(Task.id.in_(task_ids))
+
+        if not db.session.query(Task.query.filter(*filters).exists()).scalar():
+            raise NotFound()
+
+        if status:
+            filters.append(Task.task_status == status)
+        if min_effort is not None:
+            filters.append(Task.effort_prediction >= min_effort)
+        if max_effort is not None:
+            filters.append(Task.effort_prediction <= max_effort)
+
+        task_properties = func.json_build_object(
+            "taskId",
             Task.id,
+            "taskX",
             Task.x,
+            "taskY",
             Task.y,
+            "taskZoom",
             Task.zoom,
+            "taskIsSquare",
             Task.is_square,
-            Task.task_status,
-            Task.geometry.ST_AsGeoJSON().label("geojson"),
+            "taskStatus",
+            case(
+                {task_status.value: task_status.name for task_status in TaskStatus},
+                value=Task.task_status,
+            ),
+            "lockedBy",
             Task.locked_by,
+            "mappedBy",
             Task.mapped_by,
-            # subquery,
         )
+        feature = func.json_build_object(
+            "type",
+            "Feature",
+            "geometry",
+            cast(Task.geometry.ST_AsGeoJSON(), JSON),
+            "properties",
+            task_properties,
+        )
+        # Cast to text so the driver hands the JSON over as is, without parsing it
+        query = db.session.query(cast(feature, Text).label("feature"))
 
-        filters = [Task.project_id == project_id]
-
-        if task_ids_str:
-            task_ids = map(int, task_ids_str.split(","))
-            tasks = Task.get_tasks(project_id, task_ids)
-            if not tasks or len(tasks) == 0:
-                raise NotFound()
-            else:
-                tasks_filters = [task.id for task in tasks]
-            filters = [Task.project_id == project_id, Task.id.in_(tasks_filters)]
-        else:
-            tasks = Task.get_all_tasks(project_id)
-            if not tasks or len(tasks) == 0:
-                raise NotFound()
-
-        if status:
-            filters.append(Task.task_status == status)
-
+        query = query.filter(*filters)
         if order_by == "effort_prediction":
-            query = query.outerjoin(TaskAnnotation).filter(*filters)
+            # Tasks without prediction come last either way, the most effort first is read from the index
             if order_by_type == "DESC":
-                query = query.order_by(
-                    desc(
-                        cast(
-                            cast(TaskAnnotation.properties["building_area_diff"], Text),
-                            Float,
-                        )
-                    )
-                )
+                query = query.order_by(Task.effort_prediction.desc().nullslast())
             else:
-                query = query.order_by(
-                    cast(
-                        cast(TaskAnnotation.properties["building_area_diff"], Text),
-                        Float,
-                    )
-                )
-        # elif order_by == "last_updated":
-        #     if order_by_type == "DESC":
-        #         query = query.filter(*filters).order_by(desc("update_date"))
-        #     else:
-        #         query = query.filter(*filters).order_by("update_date")
-        else:
-            query = query.filter(*filters)
+                query = query.order_by(Task.effort_prediction.asc().nullslast())
+        if limit:
+            query = query.limit(limit)
 
-        project_tasks = query.all()
+        return Task._stream_feature_collection(query.yield_per(chunk_size), chunk_size)
 
-        tasks_features = []
-        for task in project_tasks:
-            task_geometry = geojson.loads(task.geojson)
-            task_properties = dict(
-                taskId=task.id,
-                taskX=task.x,
-                taskY=task.y,
-                taskZoom=task.zoom,
-                taskIsSquare=task.is_square,
-                taskStatus=TaskStatus(task.task_status).name,
-                lockedBy=task.locked_by,
-                mappedBy=task.mapped_by,
-            )
+    @staticmethod
+    def _stream_feature_collection(features, chunk_size: int):
+        """ Wraps a query of encoded features into FeatureCollection chunks """
+        yield b'{"type": "FeatureCollection", "features": ['
+        separator = ""
+        chunk = []
+        for row in features:
+            chunk.append(row.feature)
+            if len(chunk) == chunk_size:
+                yield (separator + ", ".join(chunk)).encode("utf-8")
+                separator = ", "
+                chunk = []
+        if chunk:
+            yield (separator + ", ".join(chunk)).encode("utf-8")
+        yield b"]}"
+
+    @staticmethod
+    def get_state_changes(project_id: int, since: int = None):
+        """
+        Gets the status, locker and mapper of the tasks of a project changed since a cursor
+        :param since: Cursor returned by a previous call, None to get all tasks
+        :returns: the cursor to pass next time, and the changed task rows
+        """
+        # Transactions older than the oldest one still running are all visible to the query below, newer
+        # ones may not be yet so their changes are returned again next time
+        cursor = db.session.execute(
+            text("select txid_snapshot_xmin(txid_current_snapshot())")
+        ).scalar()
 
-            feature = geojson.Feature(
-                geometry=task_geometry, properties=task_properties
+        query = db.session.query(
+            Task.id, Task.task_status, Task.locked_by, Task.mapped_by
+        ).filter(Task.project_id == project_id)
+        if since is not None:
+            query = query.filter(Task.state_version >= since)
+        return cursor, query.order_by(Task.id).all()
+
+    @staticmethod
+    def get_tiles_version(project_id: int) -> tuple:
+        """
+        Version of the task tiles of a project, read from the task rows so every worker agrees on it. Each
+        state change stamps a task with a transaction id above its previous one, so the sum of the stamps
+        grows on any change or insert, and the count drops on deletes
+        :returns: the number of tasks and the sum of their state versions
+        """
+        count, version = (
+            db.session.query(
+                func.count(Task.id), func.coalesce(func.sum(Task.state_version), 0)
             )
-            tasks_features.append(feature)
+            .filter(Task.project_id == project_id)
+            .one()
+        )
+        return count, int(version)
 
-        return geojson.FeatureCollection(tasks_features)
+    @staticmethod
+    def get_tasks_as_mvt(project_id: int, zoom: int, x: int, y: int) -> bytes:
+        """
+        Encodes the tasks of a project intersecting a web mercator tile as a Mapbox Vector Tile. Geometries
+        are clipped to the tile and snapped to its grid, so their detail follows the zoom level
+        :return: the tile, empty if no task intersects it
+        """
+        tile = db.session.execute(
+            text(
+                """
+                with bounds as (
+                    select st_makeenvelope(:xmin, :ymin, :xmax, :ymax, 3857) as geom
+                )
+                select st_asmvt(features, 'tasks', :extent, 'geom')
+                  from (select st_asmvtgeom(
+                                   st_transform(t.geometry, 3857), bounds.geom, :extent,
+                                   :buffer, true
+                               ) as geom,
+                               t.id as "taskId",
+                               (cast(:status_names as text[]))[t.task_status + 1] as "taskStatus",
+                               t.locked_by as "lockedBy",
+                               t.mapped_by as "mappedBy"
+                          from tasks t, bounds
+                         where t.project_id = :project_id
+                           and st_intersects(t.geometry, st_transform(bounds.geom, 4326))
+                       ) features
+                 where features.geom is not null
+                """
+            ),
+            dict(
+                project_id=project_id,
+                extent=MVT_EXTENT,
+                buffer=MVT_BUFFER,
+                status_names=[task_status.name for task_status in TaskStatus],
+                **Task._tile_bounds(zoom, x, y),
+            ),
+        ).scalar()
+        return bytes(tile) if tile is not None else b""
+
+    @staticmethod
+    def _tile_bounds(zoom: int, x: int, y: int) -> dict:
+        """ Web mercator bounds of a tile, in meters """
+        tile_size = 2 * WEB_MERCATOR_HALF_WIDTH / 2 ** zoom
+        return dict(
+            xmin=-WEB_MERCATOR_HALF_WIDTH + x * tile_size,
+            xmax=-WEB_MERCATOR_HALF_WIDTH + (x + 1) * tile_size,
+            ymin=WEB_MERCATOR_HALF_WIDTH - (y + 1) * tile_size,
+            ymax=WEB_MERCATOR_HALF_WIDTH - y * tile_size,
+        )
 
     @staticmethod
     def get_tasks_as_geojson_feature_collection_no_geom(project_id):
@@ -1159,3 +1967,32 @@ class Task(db.Model):
         locked_tasks = [task for task in tasks]
 
         return locked_tasks
+
+
+# Stamps tasks with the transaction changing their status, locker or mapper, so clients can poll for the
+# changes made since a cursor
+TASK_STATE_TRIGGER = """
+create or replace function tasks_state_version() returns trigger as $$
+begin
+    if tg_op = 'INSERT'
+       or new.task_status is distinct from old.task_status
+       or new.locked_by is distinct from old.locked_by
+       or new.mapped_by is distinct from old.mapped_by then
+        new.state_version := txid_current();
+    end if;
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists tasks_state_version on tasks;
+create trigger tasks_state_version
+    before insert or update of task_status, locked_by, mapped_by on tasks
+    for each row execute procedure tasks_state_version();
+"""
+
+# Tables created by create_all, as in the tests, get the trigger too
+event.listen(
+    Task.__table__,
+    "after_create",
+    DDL(TASK_STATE_TRIGGER).execute_if(dialect="postgresql"),
+)
@@ -1,8 +1,19 @@
+import math
+
+from sqlalchemy import literal_column, text
+from sqlalchemy.dialects.postgresql import insert
+
 from backend.models.postgis.utils import timestamp
 from backend import db
 from backend.models.dtos.task_annotation_dto import TaskAnnotationDTO
 from backend.models.dtos.project_dto import ProjectTaskAnnotationsDTO
 
+# Annotation property holding the predicted mapping effort of a task, copied to tasks.effort_prediction
+EFFORT_PREDICTION_PROPERTY = "building_area_diff"
+
+# Text of the numeric predictions Postgres can cast, for reading them in SQL
+EFFORT_PREDICTION_PATTERN = r"^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$"
+
 
 class TaskAnnotation(db.Model):
     """ Describes Task annotaions like derived ML attributes """
@@ -25,6 +36,13 @@ class TaskAnnotation(db.Model):
             name="fk_task_annotations",
         ),
         db.Index("idx_task_annotations_composite", "task_id", "project_id"),
+        db.Index(
+            "idx_task_annotations_type",
+            "project_id",
+            "task_id",
+            "annotation_type",
+            unique=True,
+        ),
         {},
     )
 
@@ -65,6 +83,113 @@ class TaskAnnotation(db.Model):
             project_id=project_id, task_id=task_id, annotation_type=annotation_type
         ).one_or_none()
 
+    @staticmethod
+    def upsert(project_id: int, annotation_type: str, annotations: list) -> tuple:
+        """
+        Adds annotations of the supplied type to tasks, updating the properties of the ones tasks already
+        have, in a single statement - DOES NOT COMMIT
+        :param annotations: dicts of task_id, properties, annotation_source and annotation_markdown, one per task
+        :returns: number of annotations inserted and updated
+        """
+        updated_timestamp = timestamp()
+        statement = insert(TaskAnnotation.__table__).values(
+            [
+                dict(
+                    annotation,
+                    project_id=project_id,
+                    annotation_type=annotation_type,
+                    updated_timestamp=updated_timestamp,
+                )
+                for annotation in annotations
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["project_id", "task_id", "annotation_type"],
+            set_=dict(
+                properties=statement.excluded.properties,
+                updated_timestamp=statement.excluded.updated_timestamp,
+            ),
+        ).returning(literal_column("xmax = 0").label("inserted"))
+
+        inserted = sum(1 for row in db.session.execute(statement) if row.inserted)
+        TaskAnnotation._set_effort_predictions(project_id, annotations)
+        return inserted, len(annotations) - inserted
+
+    @staticmethod
+    def get_effort_prediction(properties: dict):
+        """ Gets the predicted effort from annotation properties, None if they have no valid prediction """
+        try:
+            effort_prediction = float(properties.get(EFFORT_PREDICTION_PROPERTY))
+        except (TypeError, ValueError):
+            return None
+        return effort_prediction if math.isfinite(effort_prediction) else None
+
+    @staticmethod
+    def _set_effort_predictions(project_id: int, annotations: list):
+        """
+        Copies the effort predictions of annotations to their tasks, so tasks can be sorted by an index. Tasks
+        whose annotation no longer holds a prediction fall back to the latest prediction of their other
+        annotations, or none
+        """
+        task_ids = []
+        effort_predictions = []
+        cleared_task_ids = []
+        for annotation in annotations:
+            effort_prediction = TaskAnnotation.get_effort_prediction(
+                annotation["properties"]
+            )
+            if effort_prediction is not None:
+                task_ids.append(annotation["task_id"])
+                effort_predictions.append(effort_prediction)
+            else:
+                cleared_task_ids.append(annotation["task_id"])
+
+        if cleared_task_ids:
+            db.session.execute(
+                text(
+                    """
+                    update tasks
+                       set effort_prediction = (
+                               select cast(a.properties ->> :property as double precision)
+                                 from task_annotations a
+                                where a.project_id = tasks.project_id
+                                  and a.task_id = tasks.id
+                                  and a.properties ->> :property ~ :pattern
+                                order by a.updated_timestamp desc
+                                limit 1)
+                     where tasks.project_id = :project_id
+                       and tasks.id = any(cast(:task_ids as integer[]))
+                    """
+                ),
+                dict(
+                    project_id=project_id,
+                    task_ids=cleared_task_ids,
+                    property=EFFORT_PREDICTION_PROPERTY,
+                    pattern=EFFORT_PREDICTION_PATTERN,
+                ),
+            )
+        if not task_ids:
+            return
+
+        db.session.execute(
+            text(
+                """
+                update tasks
+                   set effort_prediction = predictions.effort_prediction
+                  from unnest(cast(:task_ids as integer[]),
+                              cast(:effort_predictions as double precision[]))
+                       as predictions(task_id, effort_prediction)
+                 where tasks.project_id = :project_id
+                   and tasks.id = predictions.task_id
+                """
+            ),
+            dict(
+                project_id=project_id,
+                task_ids=task_ids,
+                effort_predictions=effort_predictions,
+            ),
+        )
+
     def get_dto(self):
         task_annotation_dto = TaskAnnotationDTO()
         task_annotation_dto.task_id = self.task_id
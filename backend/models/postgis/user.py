@@ -67,6 +67,8 @@ class User(db.Model):
     date_registered = db.Column(db.DateTime, default=timestamp)
     # Represents the date the user last had one of their tasks validated
     last_validation_date = db.Column(db.DateTime, default=timestamp)
+    # Represents the date the OSM changeset count of the user was last checked for a level upgrade
+    changesets_checked_at = db.Column(db.DateTime)
 
     # Relationships
     accepted_licenses = db.relationship("License", secondary=user_licenses_table)
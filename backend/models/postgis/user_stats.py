@@ -0,0 +1,399 @@
+from sqlalchemy import DDL, event, text
+
+from backend import db
+
+# Trigger adding every task history change to the statistics of the users involved. It runs before each
+# row is written, so the rows written earlier by the same statement are seen and every task is counted
+# once, like the profile statistics always were
+USER_STATS_TRIGGERS = """
+create or replace function user_stats_seconds(duration text) returns double precision as $$
+    select coalesce(
+        extract(epoch from to_timestamp(nullif(duration, ''), 'HH24:MI:SS')::time), 0
+    )
+$$ language sql stable;
+
+create or replace function user_stats_add(
+    p_user_id bigint,
+    d_tasks_mapped integer default 0,
+    d_tasks_validated integer default 0,
+    d_tasks_invalidated integer default 0,
+    d_validated_by_others integer default 0,
+    d_invalidated_by_others integer default 0,
+    d_time_spent_mapping double precision default 0,
+    d_time_spent_validating double precision default 0
+) returns void as $$
+    insert into user_stats as s (
+        user_id, tasks_mapped, tasks_validated, tasks_invalidated, tasks_validated_by_others,
+        tasks_invalidated_by_others, time_spent_mapping, time_spent_validating
+    )
+    values (
+        p_user_id, d_tasks_mapped, d_tasks_validated, d_tasks_invalidated,
+        d_validated_by_others, d_invalidated_by_others, d_time_spent_mapping,
+        d_time_spent_validating
+    )
+    on conflict (user_id) do update
+    set tasks_mapped = s.tasks_mapped + excluded.tasks_mapped,
+        tasks_validated = s.tasks_validated + excluded.tasks_validated,
+        tasks_invalidated = s.tasks_invalidated + excluded.tasks_invalidated,
+        tasks_validated_by_others = s.tasks_validated_by_others
+            + excluded.tasks_validated_by_others,
+        tasks_invalidated_by_others = s.tasks_invalidated_by_others
+            + excluded.tasks_invalidated_by_others,
+        time_spent_mapping = s.time_spent_mapping + excluded.time_spent_mapping,
+        time_spent_validating = s.time_spent_validating + excluded.time_spent_validating
+$$ language sql;
+
+-- Adds (direction 1) or removes (direction -1) a history row. Rows of the table are compared with it
+-- leaving it out by id, so it doesn't matter whether it is already written
+create or replace function user_stats_apply(h task_history, direction integer)
+returns void as $$
+declare
+    minute_max text;
+    other_user record;
+begin
+    if h.action = 'STATE_CHANGE' then
+        insert into user_stats_daily as s (user_id, day, contributions)
+        values (h.user_id, h.action_date::date, direction)
+        on conflict (user_id, day) do update
+        set contributions = s.contributions + excluded.contributions;
+
+        if h.action_text in ('MAPPED', 'BADIMAGERY', 'VALIDATED') then
+            insert into user_project_stats as s (user_id, project_id, mapped, validated)
+            values (
+                h.user_id, h.project_id,
+                case when h.action_text = 'VALIDATED' then 0 else direction end,
+                case when h.action_text = 'VALIDATED' then direction else 0 end
+            )
+            on conflict (user_id, project_id) do update
+            set mapped = s.mapped + excluded.mapped,
+                validated = s.validated + excluded.validated;
+        end if;
+
+        if coalesce(h.action_text, '') not in ('MAPPED', 'VALIDATED', 'INVALIDATED') then
+            return;
+        end if;
+
+        -- Tasks are counted once per state the user changed them to
+        if not exists (
+            select 1
+              from task_history th
+             where th.project_id = h.project_id
+               and th.task_id = h.task_id
+               and th.user_id = h.user_id
+               and th.action = 'STATE_CHANGE'
+               and th.action_text = h.action_text
+               and th.id != h.id
+        ) then
+            perform user_stats_add(
+                h.user_id,
+                d_tasks_mapped => case when h.action_text = 'MAPPED' then direction else 0 end,
+                d_tasks_validated => case when h.action_text = 'VALIDATED' then direction else 0 end,
+                d_tasks_invalidated => case when h.action_text = 'INVALIDATED' then direction else 0 end
+            );
+        end if;
+
+        -- A task the user contributes to for the first time counts if others validated or
+        -- invalidated it already
+        if not exists (
+            select 1
+              from task_history th
+             where th.project_id = h.project_id
+               and th.task_id = h.task_id
+               and th.user_id = h.user_id
+               and th.action = 'STATE_CHANGE'
+               and th.action_text in ('MAPPED', 'VALIDATED', 'INVALIDATED')
+               and th.id != h.id
+        ) then
+            perform user_stats_add(
+                h.user_id,
+                d_validated_by_others => direction * (exists (
+                    select 1
+                      from task_history th
+                     where th.project_id = h.project_id
+                       and th.task_id = h.task_id
+                       and th.user_id != h.user_id
+                       and th.action = 'STATE_CHANGE'
+                       and th.action_text = 'VALIDATED'
+                       and th.id != h.id
+                ))::integer,
+                d_invalidated_by_others => direction * (exists (
+                    select 1
+                      from task_history th
+                     where th.project_id = h.project_id
+                       and th.task_id = h.task_id
+                       and th.user_id != h.user_id
+                       and th.action = 'STATE_CHANGE'
+                       and th.action_text = 'INVALIDATED'
+                       and th.id != h.id
+                ))::integer
+            );
+        end if;
+
+        -- and the other contributors of the task count it if nobody else but them did it before
+        if h.action_text in ('VALIDATED', 'INVALIDATED') then
+            for other_user in
+                select distinct th.user_id
+                  from task_history th
+                 where th.project_id = h.project_id
+                   and th.task_id = h.task_id
+                   and th.user_id != h.user_id
+                   and th.action = 'STATE_CHANGE'
+                   and th.action_text in ('MAPPED', 'VALIDATED', 'INVALIDATED')
+                   and th.id != h.id
+                   and not exists (
+                       select 1
+                         from task_history o
+                        where o.project_id = h.project_id
+                          and o.task_id = h.task_id
+                          and o.user_id != th.user_id
+                          and o.action = 'STATE_CHANGE'
+                          and o.action_text = h.action_text
+                          and o.id != h.id
+                   )
+                 order by th.user_id
+            loop
+                perform user_stats_add(
+                    other_user.user_id,
+                    d_validated_by_others => case
+                        when h.action_text = 'VALIDATED' then direction else 0 end,
+                    d_invalidated_by_others => case
+                        when h.action_text = 'INVALIDATED' then direction else 0 end
+                );
+            end loop;
+        end if;
+    elsif h.action in ('LOCKED_FOR_MAPPING', 'AUTO_UNLOCKED_FOR_MAPPING')
+          and h.action_text is not null then
+        perform user_stats_add(
+            h.user_id, d_time_spent_mapping => direction * user_stats_seconds(h.action_text)
+        );
+    elsif h.action = 'LOCKED_FOR_VALIDATION' and h.action_text is not null then
+        -- Validation locks taken in the same minute, as done by bulk validation, count once
+        select max(th.action_text)
+          into minute_max
+          from task_history th
+         where th.user_id = h.user_id
+           and th.action = 'LOCKED_FOR_VALIDATION'
+           and th.action_date >= date_trunc('minute', h.action_date)
+           and th.action_date < date_trunc('minute', h.action_date) + interval '1 minute'
+           and th.id != h.id;
+        if minute_max is null or h.action_text > minute_max then
+            perform user_stats_add(
+                h.user_id,
+                d_time_spent_validating => direction * (
+                    user_stats_seconds(h.action_text) - user_stats_seconds(minute_max)
+                )
+            );
+        end if;
+    end if;
+end;
+$$ language plpgsql;
+
+create or replace function user_stats_task_history_change() returns trigger as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform user_stats_apply(old, -1);
+    end if;
+    if tg_op = 'DELETE' then
+        return old;
+    end if;
+    perform user_stats_apply(new, 1);
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists user_stats_task_history on task_history;
+create trigger user_stats_task_history
+    before insert or delete
+    or update of project_id, task_id, action, action_text, action_date, user_id
+    on task_history
+    for each row execute procedure user_stats_task_history_change();
+"""
+
+# Full recompute of the statistics from task_history. {users_filter}, {stats_filter} and
+# {history_filter} limit it to a single user
+USER_STATS_REBUILD = [
+    "delete from user_stats {stats_filter}",
+    "delete from user_project_stats {stats_filter}",
+    "delete from user_stats_daily {stats_filter}",
+    """
+    insert into user_stats (
+        user_id, tasks_mapped, tasks_validated, tasks_invalidated, tasks_validated_by_others,
+        tasks_invalidated_by_others, time_spent_mapping, time_spent_validating
+    )
+    select u.id,
+           coalesce(tasks.mapped, 0),
+           coalesce(tasks.validated, 0),
+           coalesce(tasks.invalidated, 0),
+           coalesce(others.validated, 0),
+           coalesce(others.invalidated, 0),
+           coalesce(mapping.seconds, 0),
+           coalesce(validating.seconds, 0)
+      from users u
+      left join (
+           select th.user_id,
+                  count(distinct (th.project_id, th.task_id))
+                      filter (where th.action_text = 'MAPPED') as mapped,
+                  count(distinct (th.project_id, th.task_id))
+                      filter (where th.action_text = 'VALIDATED') as validated,
+                  count(distinct (th.project_id, th.task_id))
+                      filter (where th.action_text = 'INVALIDATED') as invalidated
+             from task_history th
+            where th.action = 'STATE_CHANGE'
+              and th.action_text in ('MAPPED', 'VALIDATED', 'INVALIDATED')
+              {history_filter}
+            group by th.user_id
+      ) tasks on tasks.user_id = u.id
+      left join (
+           select tu.user_id,
+                  count(*) filter (where exists (
+                      select 1
+                        from task_history o
+                       where o.project_id = tu.project_id
+                         and o.task_id = tu.task_id
+                         and o.user_id != tu.user_id
+                         and o.action = 'STATE_CHANGE'
+                         and o.action_text = 'VALIDATED'
+                  )) as validated,
+                  count(*) filter (where exists (
+                      select 1
+                        from task_history o
+                       where o.project_id = tu.project_id
+                         and o.task_id = tu.task_id
+                         and o.user_id != tu.user_id
+                         and o.action = 'STATE_CHANGE'
+                         and o.action_text = 'INVALIDATED'
+                  )) as invalidated
+             from (select distinct th.user_id, th.project_id, th.task_id
+                     from task_history th
+                    where th.action = 'STATE_CHANGE'
+                      and th.action_text in ('MAPPED', 'VALIDATED', 'INVALIDATED')
+                      {history_filter}) tu
+            group by tu.user_id
+      ) others on others.user_id = u.id
+      left join (
+           select th.user_id, sum(user_stats_seconds(th.action_text)) as seconds
+             from task_history th
+            where th.action in ('LOCKED_FOR_MAPPING', 'AUTO_UNLOCKED_FOR_MAPPING')
+              and th.action_text is not null
+              {history_filter}
+            group by th.user_id
+      ) mapping on mapping.user_id = u.id
+      left join (
+           select minutes.user_id, sum(user_stats_seconds(minutes.action_text)) as seconds
+             from (select th.user_id, max(th.action_text) as action_text
+                     from task_history th
+                    where th.action = 'LOCKED_FOR_VALIDATION'
+                      and th.action_text is not null
+                      {history_filter}
+                    group by th.user_id, date_trunc('minute', th.action_date)) minutes
+            group by minutes.user_id
+      ) validating on validating.user_id = u.id
+     where coalesce(tasks.user_id, mapping.user_id, validating.user_id) is not null
+       {users_filter}
+    """,
+    """
+    insert into user_project_stats (user_id, project_id, mapped, validated)
+    select th.user_id, th.project_id,
+           count(*) filter (where th.action_text in ('MAPPED', 'BADIMAGERY')),
+           count(*) filter (where th.action_text = 'VALIDATED')
+      from task_history th
+     where th.action = 'STATE_CHANGE'
+       and th.action_text in ('MAPPED', 'BADIMAGERY', 'VALIDATED')
+       {history_filter}
+     group by th.user_id, th.project_id
+    """,
+    """
+    insert into user_stats_daily (user_id, day, contributions)
+    select th.user_id, th.action_date::date, count(*)
+      from task_history th
+     where th.action = 'STATE_CHANGE'
+       {history_filter}
+     group by th.user_id, th.action_date::date
+    """,
+]
+
+
+class UserStats(db.Model):
+    """ Contribution statistics of a user, kept up to date from task_history by a database trigger """
+
+    __tablename__ = "user_stats"
+
+    user_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    # Number of tasks the user changed to each state
+    tasks_mapped = db.Column(db.Integer, default=0, nullable=False)
+    tasks_validated = db.Column(db.Integer, default=0, nullable=False)
+    tasks_invalidated = db.Column(db.Integer, default=0, nullable=False)
+    # Number of tasks the user contributed to that others validated or invalidated
+    tasks_validated_by_others = db.Column(db.Integer, default=0, nullable=False)
+    tasks_invalidated_by_others = db.Column(db.Integer, default=0, nullable=False)
+    # Seconds of the mapping and validation locks of the user
+    time_spent_mapping = db.Column(db.Float, default=0, nullable=False)
+    time_spent_validating = db.Column(db.Float, default=0, nullable=False)
+
+    @staticmethod
+    def rebuild(user_id: int = None):
+        """
+        Recomputes the statistics of all users from task_history
+        :param user_id: Optionally limit the rebuild to a single user
+        """
+        filters = dict(users_filter="", stats_filter="", history_filter="")
+        if user_id is not None:
+            filters = dict(
+                users_filter="and u.id = :user_id",
+                stats_filter="where user_id = :user_id",
+                history_filter="and th.user_id = :user_id",
+            )
+
+        for statement in USER_STATS_REBUILD:
+            db.session.execute(text(statement.format(**filters)), {"user_id": user_id})
+        db.session.commit()
+
+
+class UserProjectStats(db.Model):
+    """ Number of times a user changed tasks of a project to mapped, bad imagery or validated """
+
+    __tablename__ = "user_project_stats"
+
+    user_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    project_id = db.Column(
+        db.Integer,
+        db.ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    # Mapped and bad imagery state changes
+    mapped = db.Column(db.Integer, default=0, nullable=False)
+    validated = db.Column(db.Integer, default=0, nullable=False)
+
+
+class UserStatsDaily(db.Model):
+    """ Daily number of task state changes made by a user """
+
+    __tablename__ = "user_stats_daily"
+
+    user_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    day = db.Column(db.Date, primary_key=True)
+    contributions = db.Column(db.Integer, default=0, nullable=False)
+
+
+# Tables created by create_all, as in the tests, get the trigger too
+event.listen(
+    db.metadata,
+    "after_create",
+    DDL(USER_STATS_TRIGGERS).execute_if(dialect="postgresql"),
+)
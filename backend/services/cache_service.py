@@ -0,0 +1,521 @@
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+from cachetools import TTLCache
+from flask import current_app
+
+from backend.models.postgis.statuses import UserRole
+
+# Entries without an explicit ttl are kept for a day. Version counters never expire, a counter starting
+# again would revive the entries it outdated
+DEFAULT_TTL = 24 * 60 * 60
+CATALOGUE_VERSION_KEY = "version:catalogue"
+# Bumped before any project version, so results computed while a project changed are never cached
+CHANGES_VERSION_KEY = "version:changes"
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+class CacheServiceError(Exception):
+    """Custom Exception to notify callers an error occurred when talking to the cache backend"""
+
+    def __init__(self, message):
+        if current_app:
+            current_app.logger.debug(message)
+
+
+class LocalCacheBackend:
+    """In-process LRU cache with per-entry expiry, private to each worker"""
+
+    def __init__(self, maxsize: int = 1024):
+        self._entries = TTLCache(maxsize=maxsize, ttl=DEFAULT_TTL)
+        # Version counters are kept apart so the LRU never evicts them
+        self._counters = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                self._entries.pop(key, None)
+                return None
+            return value
+
+    def get_many(self, keys: list) -> list:
+        return [self.get(key) for key in keys]
+
+    def get_counters(self, keys: list) -> list:
+        with self._lock:
+            return [self._counters.get(key) for key in keys]
+
+    def get_prefixed(self, prefix: str) -> dict:
+        with self._lock:
+            keys = [key for key in self._entries.keys() if key.startswith(prefix)]
+        values = {key: self.get(key) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def set(self, key: str, value, ttl: int = DEFAULT_TTL):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class FileCacheBackend:
+    """
+    Cache stored as pickled files in a directory, shared by all workers on the same host. Entry files
+    carry their expiry as modification time, so they can be swept without reading them
+    """
+
+    def __init__(self, directory: str, maxsize: int = 1024):
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str = ".cache") -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}{suffix}")
+
+    def _read(self, path: str):
+        try:
+            with open(path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _write(self, path: str, data, expires_at: float = None):
+        # Write to a temporary file first so readers never see a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as cache_file:
+                pickle.dump(data, cache_file)
+            if expires_at is not None:
+                os.utime(tmp_path, (time.time(), expires_at))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self):
+        """ Removes the expired entries, then the ones closest to expiry while there are more than maxsize """
+        now = time.time()
+        entries = []
+        with os.scandir(self.directory) as files:
+            for cache_file in files:
+                if not cache_file.name.endswith(".cache"):
+                    continue
+                try:
+                    expires_at = cache_file.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if expires_at < now:
+                    self._remove(cache_file.path)
+                else:
+                    entries.append((expires_at, cache_file.path))
+
+        if len(entries) > self.maxsize:
+            entries.sort()
+            for _, path in entries[: len(entries) - self.maxsize]:
+                self._remove(path)
+
+    def get(self, key: str):
+        path = self._path(key)
+        entry = self._read(path)
+        if entry is None:
+            return None
+
+        expires_at, value, _ = entry
+        if expires_at < time.time():
+            self._remove(path)
+            return None
+        return value
+
+    def get_many(self, keys: list) -> list:
+        return [self.get(key) for key in keys]
+
+    def get_counters(self, keys: list) -> list:
+        # Counters have files of their own, never swept
+        return [self._read(self._path(key, ".counter")) for key in keys]
+
+    def get_prefixed(self, prefix: str) -> dict:
+        # File names are hashed, so the keys are read back from the entries
+        values = {}
+        now = time.time()
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".cache"):
+                continue
+            entry = self._read(os.path.join(self.directory, file_name))
+            if entry is not None and entry[0] >= now and entry[2].startswith(prefix):
+                values[entry[2]] = entry[1]
+        return values
+
+    def set(self, key: str, value, ttl: int = DEFAULT_TTL):
+        expires_at = time.time() + ttl
+        self._write(self._path(key), (expires_at, value, key), expires_at)
+        self._sweep()
+
+    def incr(self, key: str) -> int:
+        path = self._path(key, ".counter")
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                value = (self._read(path) or 0) + 1
+                self._write(path, value)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return value
+
+    def delete(self, key: str):
+        self._remove(self._path(key))
+        self._remove(self._path(key, ".counter"))
+
+    def clear(self):
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith((".cache", ".counter")):
+                self._remove(os.path.join(self.directory, file_name))
+
+
+class RedisCacheBackend:
+    """Cache shared by all workers and hosts, talking the Redis protocol (RESP) over a plain socket"""
+
+    def __init__(self, url: str, prefix: str = "tm:", timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._socket = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._socket = socket.create_connection(
+            (self.host, self.port), timeout=self.timeout
+        )
+        self._reader = self._socket.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._reader.close()
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    def _send(self, *args):
+        command = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            command.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._socket.sendall(b"".join(command))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by cache server")
+        reply_type, payload = line[:1], line[1:-2]
+        if reply_type == b"+":
+            return payload.decode("utf-8")
+        if reply_type == b"-":
+            raise CacheServiceError(f"CacheError- {payload.decode('utf-8')}")
+        if reply_type == b":":
+            return int(payload)
+        if reply_type == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if reply_type == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise CacheServiceError(f"CacheError- Unknown reply type {reply_type}")
+
+    def _command(self, *args):
+        with self._lock:
+            # Retry once on a fresh connection, the server may have dropped an idle one
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    return self._send(*args)
+                except (OSError, ConnectionError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def get(self, key: str):
+        value = self._command("GET", self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def get_many(self, keys: list) -> list:
+        if not keys:
+            return []
+        values = self._command("MGET", *[self.prefix + key for key in keys])
+        return [pickle.loads(v) if v is not None else None for v in values]
+
+    def set(self, key: str, value, ttl: int = DEFAULT_TTL):
+        self._command("SET", self.prefix + key, pickle.dumps(value), "EX", int(ttl))
+
+    def incr(self, key: str) -> int:
+        # INCR stores a plain integer, so versions are read back with int() rather than unpickled
+        return self._command("INCR", self.prefix + key)
+
+    def get_counters(self, keys: list) -> list:
+        if not keys:
+            return []
+        values = self._command("MGET", *[self.prefix + key for key in keys])
+        return [int(v) if v is not None else None for v in values]
+
+    def _scan(self, pattern: str) -> list:
+        keys = []
+        cursor = "0"
+        while True:
+            cursor, page = self._command("SCAN", cursor, "MATCH", pattern)
+            cursor = cursor.decode("utf-8")
+            keys.extend(page)
+            if cursor == "0":
+                return keys
+
+    def get_prefixed(self, prefix: str) -> dict:
+        offset = len(self.prefix)
+        keys = [
+            key.decode("utf-8")[offset:]
+            for key in self._scan(self.prefix + prefix + "*")
+        ]
+        values = dict(zip(keys, self.get_many(keys)))
+        return {key: value for key, value in values.items() if value is not None}
+
+    def delete(self, key: str):
+        self._command("DEL", self.prefix + key)
+
+    def clear(self):
+        keys = self._scan(self.prefix + "*")
+        if keys:
+            self._command("DEL", *keys)
+
+
+def create_backend(config):
+    """Creates the cache backend selected by the TM_CACHE_BACKEND setting"""
+    backend_name = config["CACHE_BACKEND"]
+    if backend_name == "file":
+        return FileCacheBackend(config["CACHE_DIR"], config["CACHE_MAXSIZE"])
+    if backend_name == "redis":
+        return RedisCacheBackend(config["CACHE_REDIS_URL"])
+    return LocalCacheBackend(config["CACHE_MAXSIZE"])
+
+
+class CacheService:
+    @staticmethod
+    def get_backend():
+        """Returns the cache backend of the current process, creating it on first use or after a fork"""
+        global _backend, _backend_pid
+
+        pid = os.getpid()
+        if _backend is None or _backend_pid != pid:
+            with _backend_lock:
+                if _backend is None or _backend_pid != pid:
+                    _backend = create_backend(current_app.config)
+                    _backend_pid = pid
+        return _backend
+
+    @staticmethod
+    def set_backend(backend):
+        """Replaces the cache backend of the current process, mostly useful for tests"""
+        global _backend, _backend_pid
+
+        _backend = backend
+        _backend_pid = os.getpid()
+
+    @staticmethod
+    def make_key(namespace: str, *parts) -> str:
+        """Builds a stable cache key from any JSON serializable parts"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        return f"{namespace}:{digest}"
+
+    @staticmethod
+    def _get_counters(keys: list) -> list:
+        values = CacheService.get_backend().get_counters(keys)
+        return [value or 0 for value in values]
+
+    @staticmethod
+    def get_catalogue_version() -> int:
+        """Version of the project catalogue, bumped whenever any project is saved"""
+        return CacheService._get_counters([CATALOGUE_VERSION_KEY])[0]
+
+    @staticmethod
+    def get_project_versions(project_ids: list) -> dict:
+        """Versions of the supplied projects, bumped whenever a project or one of its tasks changes"""
+        project_ids = list(project_ids)
+        versions = CacheService._get_counters(
+            [f"version:project:{project_id}" for project_id in project_ids]
+        )
+        return dict(zip(project_ids, versions))
+
+    @staticmethod
+    def get_project_version(project_id: int) -> int:
+        return CacheService.get_project_versions([project_id])[project_id]
+
+    @staticmethod
+    def invalidate_project(project_id: int, catalogue: bool = True):
+        """
+        Invalidates every cached entry built from the supplied project
+        :param project_id: Project that changed
+        :param catalogue: Set when the change can affect which projects are listed, eg. on project save
+        """
+        try:
+            backend = CacheService.get_backend()
+            backend.incr(CHANGES_VERSION_KEY)
+            backend.incr(f"version:project:{project_id}")
+            if catalogue:
+                backend.incr(CATALOGUE_VERSION_KEY)
+        except (OSError, CacheServiceError) as e:
+            current_app.logger.warning(f"Unable to invalidate cache: {e}")
+
+    @staticmethod
+    def get_search_key_parts(search_dto) -> dict:
+        """Normalizes a ProjectSearchDTO so that equivalent searches share the same key"""
+        parts = {}
+        for field, value in search_dto.to_primitive().items():
+            if value is None or value == []:
+                continue
+            if isinstance(value, list):
+                value = sorted(value, key=str)
+            parts[field] = value
+        return parts
+
+    @staticmethod
+    def get_user_fingerprint(user, search_dto=None) -> str:
+        """
+        Summarises everything about the user that can change the outcome of a project search, so that
+        users with the same permissions share cached results
+        """
+        if user is None:
+            return "anonymous"
+
+        if search_dto is not None and search_dto.favorited_by:
+            # Favorites are personal, these searches can't be shared
+            return f"user:{user.id}"
+
+        if user.role == UserRole.ADMIN.value:
+            return "admin"
+
+        team_projects = sorted(
+            {
+                (team_project.project_id, team_project.role)
+                for user_team in user.teams
+                for team_project in user_team.team.projects
+            }
+        )
+        organisation_projects = sorted(
+            {project.id for org in user.organisations for project in org.projects}
+        )
+        return CacheService.make_key(
+            "user",
+            user.role,
+            user.mapping_level,
+            team_projects,
+            organisation_projects,
+        )
+
+
+def cached(namespace: str, key, ttl: int, projects=None):
+    """
+    Caches the result of a service function in the configured cache backend
+    :param namespace: Prefix for the keys of the decorated function
+    :param key: Callable receiving the function arguments and returning the key parts, including any version
+    :param ttl: Seconds before an entry expires regardless of versions
+    :param projects: Optional callable returning the ids of the projects a result was built from, entries are
+                     discarded as soon as any of those projects changes
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                cache_key = CacheService.make_key(namespace, key(*args, **kwargs))
+                entry = CacheService.get_backend().get(cache_key)
+                if entry is not None:
+                    value, versions = entry
+                    if not versions or versions == CacheService.get_project_versions(
+                        versions.keys()
+                    ):
+                        return value
+                # The projects of a result are only known once it's computed, so the versions read
+                # afterwards are only trusted if no project changed meanwhile
+                changes = CacheService._get_counters([CHANGES_VERSION_KEY])[0]
+            except (OSError, CacheServiceError) as e:
+                current_app.logger.warning(f"Cache unavailable: {e}")
+                return func(*args, **kwargs)
+
+            value = func(*args, **kwargs)
+            try:
+                versions = {}
+                if projects:
+                    project_ids = list(projects(value))
+                    counters = CacheService._get_counters(
+                        [CHANGES_VERSION_KEY]
+                        + [
+                            f"version:project:{project_id}"
+                            for project_id in project_ids
+                        ]
+                    )
+                    if counters[0] != changes:
+                        return value
+                    versions = dict(zip(project_ids, counters[1:]))
+                CacheService.get_backend().set(cache_key, (value, versions), ttl)
+            except (OSError, CacheServiceError) as e:
+                current_app.logger.warning(f"Unable to cache {namespace}: {e}")
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,118 @@
+import glob
+import json
+import os
+import threading
+from typing import Optional
+
+import requests
+from flask import current_app
+from shapely.geometry import shape
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+# Names in the bundled polygons which differ from the English names OpenStreetMap uses, that the
+# countries of existing projects were set from
+COUNTRY_NAMES = {
+    "Brunei Darussalam": "Brunei",
+    "Czech Republic": "Czechia",
+    "Falkland Islands (Malvinas)": "Falkland Islands",
+    "Holy See (Vatican City)": "Vatican City",
+    "Iran (Islamic Republic of)": "Iran",
+    "Ivory Coast": "Côte d'Ivoire",
+    "Korea, Democratic People's Republic of": "North Korea",
+    "Korea, Republic of": "South Korea",
+    "Libyan Arab Jamahiriya": "Libya",
+    "Republic of Moldova": "Moldova",
+    "Swaziland": "Eswatini",
+    "Syrian Arab Republic": "Syria",
+    "The former Yugoslav Republic of Macedonia": "North Macedonia",
+    "United Republic of Tanzania": "Tanzania",
+    "Viet Nam": "Vietnam",
+}
+
+# Seconds to wait for Nominatim, which is only asked about places the bundled polygons don't cover
+NOMINATIM_TIMEOUT = 5
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class CountryIndex:
+    """Country polygons indexed by bounding box, each multipolygon split so its parts are indexed separately"""
+
+    def __init__(self, directory: str):
+        self.parts = []
+        self.countries = {}
+        self.prepared_parts = {}
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            with open(path, encoding="utf-8") as continent_file:
+                continent = json.load(continent_file)
+            for features in continent.values():
+                for feature in features:
+                    name = feature["properties"]["NAME"]
+                    self.add(COUNTRY_NAMES.get(name, name), feature["geometry"])
+        self.tree = STRtree(self.parts)
+
+    def add(self, name: str, geometry: dict):
+        polygon = shape(geometry)
+        if not polygon.is_valid:
+            polygon = polygon.buffer(0)
+        for part in getattr(polygon, "geoms", [polygon]):
+            self.parts.append(part)
+            self.countries[id(part)] = name
+            self.prepared_parts[id(part)] = prep(part)
+
+    def query(self, geometry) -> list:
+        """
+        Gets the countries a geometry intersects
+        :returns: the country names, the ones covering most of an area first
+        """
+        if not self.parts:
+            return []
+
+        overlaps = {}
+        for part in self.tree.query(geometry):
+            if not self.prepared_parts[id(part)].intersects(geometry):
+                continue
+            name = self.countries[id(part)]
+            overlap = part.intersection(geometry).area if geometry.area else 0
+            overlaps[name] = overlaps.get(name, 0) + overlap
+        return sorted(overlaps, key=lambda name: (-overlaps[name], name))
+
+
+class GeocodingService:
+    @staticmethod
+    def get_index() -> CountryIndex:
+        """Gets the country index, loaded once per process on first use"""
+        global _index
+        if _index is None:
+            with _index_lock:
+                if _index is None:
+                    _index = CountryIndex(current_app.config["COUNTRY_POLYGONS_DIR"])
+        return _index
+
+    @staticmethod
+    def get_countries(geometry) -> list:
+        """
+        Gets the countries a point or area lies in from the bundled country polygons
+        :param geometry: shapely geometry in EPSG:4326
+        :returns: the country names, the ones covering most of an area first
+        """
+        return GeocodingService.get_index().query(geometry)
+
+    @staticmethod
+    def get_country_from_nominatim(point) -> Optional[str]:
+        """Gets the country a shapely point lies in from Nominatim, None if it can't be found"""
+        url = "{0}/reverse?format=jsonv2&lat={1}&lon={2}&accept-language=en".format(
+            current_app.config["OSM_NOMINATIM_SERVER_URL"], point.y, point.x
+        )
+        try:
+            country_info = requests.get(url, timeout=NOMINATIM_TIMEOUT).json()
+            return country_info["address"].get("country")
+        except (
+            KeyError,
+            AttributeError,
+            ValueError,
+            requests.exceptions.RequestException,
+        ):
+            return None
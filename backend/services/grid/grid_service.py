@@ -2,6 +2,8 @@ import geojson
 import json
 from shapely.geometry import MultiPolygon, mapping
 from shapely.ops import cascaded_union
+from shapely.prepared import prep
+from shapely.strtree import STRtree
 import shapely.geometry
 from flask import current_app
 from backend.models.dtos.grid_dto import GridDTO
@@ -36,15 +38,31 @@ class GridService:
         )
 
         aoi_multi_polygon = shapely.geometry.shape(aoi_multi_polygon_geojson)
+
+        # Index the aoi parts, so each tile is only tested against the parts around it
+        aoi_parts = list(aoi_multi_polygon.geoms)
+        aoi_index = STRtree(aoi_parts)
+        prepared_parts = {id(part): prep(part) for part in aoi_parts}
+
         intersecting_features = []
         for feature in grid["features"]:
             # create a shapely shape for the tile
             tile = shapely.geometry.shape(feature["geometry"])
-            if aoi_multi_polygon.contains(tile):
+            candidate_parts = aoi_index.query(tile)
+            if not candidate_parts:
+                continue  # tile bounds don't overlap the aoi, tile is outside
+
+            prepared_candidates = [prepared_parts[id(p)] for p in candidate_parts]
+            if any(part.contains(tile) for part in prepared_candidates):
                 # tile is completely within aoi, use as is
                 intersecting_features.append(feature)
-            else:
-                intersection = aoi_multi_polygon.intersection(tile)
+            elif any(part.intersects(tile) for part in prepared_candidates):
+                # tile is on the aoi boundary, only these are clipped
+                if len(candidate_parts) < len(aoi_parts):
+                    aoi_around_tile = MultiPolygon(candidate_parts)
+                else:
+                    aoi_around_tile = aoi_multi_polygon
+                intersection = aoi_around_tile.intersection(tile)
                 if intersection.is_empty or intersection.geom_type not in [
                     "Polygon",
                     "MultiPolygon",
@@ -1,17 +1,31 @@
 import geojson
-from shapely.geometry import Polygon, MultiPolygon, LineString, shape as shapely_shape
-from shapely.ops import split
+import json
+import math
+from pyproj import Geod
+from shapely.geometry import (
+    Polygon,
+    MultiPolygon,
+    LineString,
+    mapping,
+    shape as shapely_shape,
+)
+from shapely.ops import split, transform
 from backend import db
 from flask import current_app
 from geoalchemy2 import shape
 from backend.models.dtos.grid_dto import SplitTaskDTO
 from backend.models.dtos.mapping_dto import TaskDTOs
-from backend.models.postgis.utils import ST_Transform, ST_Area, ST_GeogFromWKB
 from backend.models.postgis.task import Task, TaskStatus, TaskAction
 from backend.models.postgis.project import Project
 from backend.models.postgis.utils import NotFound, InvalidGeoJson
 
 
+# Radius of the sphere used by the EPSG:3857 projection
+EARTH_RADIUS = 6378137
+# Decimal digits kept by ST_AsGeoJSON
+GEOJSON_PRECISION = 9
+
+
 class SplitServiceError(Exception):
     """Custom Exception to notify callers an error occurred when handling splitting tasks"""
 
@@ -21,25 +35,30 @@ class SplitServiceError(Exception):
 
 
 class SplitService:
+    # Geodesic area calculations on the WGS84 ellipsoid, as ST_Area does for geographies
+    geod = Geod(ellps="WGS84")
+
     @staticmethod
-    def _create_split_tasks(x, y, zoom, task) -> list:
+    def _create_split_tasks(x, y, zoom, task, levels: int = 1) -> list:
         """
         function for splitting a task square geometry into 4 smaller squares
         :param geom_to_split: {geojson.Feature} the geojson feature to b split
+        :param levels: number of times the task is split, giving 4^levels squares
         :return: list of {geojson.Feature}
         """
         # If the task's geometry doesn't correspond to an OSM tile identified by an
         # x, y, zoom then we need to take a different approach to splitting
         if x is None or y is None or zoom is None or not task.is_square:
-            return SplitService._create_split_tasks_from_geometry(task)
+            return SplitService._create_split_tasks_from_geometry(task, levels)
 
         try:
             split_geoms = []
-            for i in range(0, 2):
-                for j in range(0, 2):
-                    new_x = x * 2 + i
-                    new_y = y * 2 + j
-                    new_zoom = zoom + 1
+            tiles_per_side = 2 ** levels
+            for i in range(0, tiles_per_side):
+                for j in range(0, tiles_per_side):
+                    new_x = x * tiles_per_side + i
+                    new_y = y * tiles_per_side + j
+                    new_zoom = zoom + levels
                     new_square = SplitService._create_square(new_x, new_y, new_zoom)
                     feature = geojson.Feature()
                     feature.geometry = new_square
@@ -84,27 +103,97 @@ class SplitService:
             [Polygon([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])]
         )
 
-        # use the database to transform the geometry from 3857 to 4326
-        transformed_geometry = ST_Transform(shape.from_shape(multipolygon, 3857), 4326)
+        # transform the geometry from 3857 to 4326
+        return SplitService._as_geojson(
+            transform(SplitService._to_geographic, multipolygon)
+        )
+
+    @staticmethod
+    def _to_geographic(x, y) -> tuple:
+        """
+        Inverse spherical mercator projection, from EPSG:3857 meters to EPSG:4326 degrees
+        :param x: tuple of x coords
+        :param y: tuple of y coords
+        :return: tuple of longitudes and tuple of latitudes
+        """
+        longitudes = tuple(math.degrees(value / EARTH_RADIUS) for value in x)
+        latitudes = tuple(
+            math.degrees(2 * math.atan(math.exp(value / EARTH_RADIUS)) - math.pi / 2)
+            for value in y
+        )
+        return longitudes, latitudes
 
-        # use DB to get the geometry as geojson
-        return geojson.loads(
-            db.engine.execute(transformed_geometry.ST_AsGeoJSON()).scalar()
+    @staticmethod
+    def _round(x, y) -> tuple:
+        """
+        Rounds coordinates to the precision used by ST_AsGeoJSON
+        :param x: tuple of x coords
+        :param y: tuple of y coords
+        """
+        return (
+            tuple(round(value, GEOJSON_PRECISION) for value in x),
+            tuple(round(value, GEOJSON_PRECISION) for value in y),
         )
 
     @staticmethod
-    def _create_split_tasks_from_geometry(task) -> list:
+    def _as_geojson(geometry) -> geojson.MultiPolygon:
+        """
+        Gets the geojson of a shapely geometry with the coordinates precision of ST_AsGeoJSON
+        :param geometry: shapely geometry
+        :return: geojson geometry
+        """
+        rounded_geometry = transform(SplitService._round, geometry)
+        return geojson.loads(json.dumps(mapping(rounded_geometry)))
+
+    @staticmethod
+    def _geodesic_area(geometry) -> float:
+        """
+        Gets the area in square meters of a geometry in EPSG:4326
+        :param geometry: shapely geometry
+        :return: area in square meters
+        """
+        area, _ = SplitService.geod.geometry_area_perimeter(geometry)
+        return abs(area)
+
+    @staticmethod
+    def _create_split_tasks_from_geometry(task, levels: int = 1) -> list:
         """
         Splits a task into 4 smaller tasks based purely on the task's geometry rather than
         an OSM tile identified by x, y, zoom
+        :param levels: number of times the task is split, giving 4^levels tasks
         :return: list of {geojson.Feature}
         """
-        # Load the task's geometry and calculate its centroid and bbox
-        query = db.session.query(
-            Task.id, Task.geometry.ST_AsGeoJSON().label("geometry")
-        ).filter(Task.id == task.id, Task.project_id == task.project_id)
-        task_geojson = geojson.loads(query[0].geometry)
-        geometry = shapely_shape(task_geojson)
+        # Use the task's geometry with the precision it would have as GeoJSON
+        split_geometries = [
+            transform(SplitService._round, shape.to_shape(task.geometry))
+        ]
+        for _ in range(levels):
+            split_geometries = [
+                quarter
+                for geometry in split_geometries
+                for quarter in SplitService._split_geometry(geometry)
+            ]
+
+        # convert split geometries into GeoJSON features expected by Task
+        split_features = []
+        for split_geometry in split_geometries:
+            feature = geojson.Feature()
+            # Tasks expect multipolygons
+            feature.geometry = SplitService._as_geojson(split_geometry)
+            feature.properties["x"] = None
+            feature.properties["y"] = None
+            feature.properties["zoom"] = None
+            feature.properties["isSquare"] = False
+            split_features.append(feature)
+        return split_features
+
+    @staticmethod
+    def _split_geometry(geometry) -> list:
+        """
+        Splits a geometry in 4 around its centroid
+        :return: list of MultiPolygons
+        """
+        # calculate its centroid and bbox
         centroid = geometry.centroid
         minx, miny, maxx, maxy = geometry.bounds
 
@@ -120,22 +209,7 @@ class SplitService:
             split_geometries += SplitService._as_halves(
                 split(half, horizontal_dividing_line), centroid, "y"
             )
-
-        # convert split geometries into GeoJSON features expected by Task
-        split_features = []
-        for split_geometry in split_geometries:
-            feature = geojson.Feature()
-            # Tasks expect multipolygons. Convert and use the database to get as GeoJSON
-            multipolygon_geometry = shape.from_shape(split_geometry, 4326)
-            feature.geometry = geojson.loads(
-                db.engine.execute(multipolygon_geometry.ST_AsGeoJSON()).scalar()
-            )
-            feature.properties["x"] = None
-            feature.properties["y"] = None
-            feature.properties["zoom"] = None
-            feature.properties["isSquare"] = False
-            split_features.append(feature)
-        return split_features
+        return split_geometries
 
     @staticmethod
     def _as_halves(geometries, centroid, axis) -> list:
@@ -158,7 +232,8 @@ class SplitService:
     @staticmethod
     def split_task(split_task_dto: SplitTaskDTO) -> TaskDTOs:
         """
-        Replaces a task square with 4 smaller tasks at the next OSM tile grid zoom level
+        Replaces a task square with 4 smaller tasks at the next OSM tile grid zoom level, or with 4^levels
+        tasks when splitting several levels at once
         Validates that task is:
          - locked for mapping by current user
         :param split_task_dto:
@@ -171,14 +246,14 @@ class SplitService:
 
         original_geometry = shape.to_shape(original_task.geometry)
 
-        # Fetch the task geometry in meters
-        original_task_area_m = db.engine.execute(
-            ST_Area(ST_GeogFromWKB(original_task.geometry))
-        ).scalar()
+        # Calculate the task area in meters
+        original_task_area_m = SplitService._geodesic_area(original_geometry)
 
+        # Every level of splitting needs tasks of at least zoom 17 and 25000m2 to be split
+        levels = split_task_dto.levels
         if (
-            original_task.zoom and original_task.zoom >= 18
-        ) or original_task_area_m < 25000:
+            original_task.zoom and original_task.zoom + levels > 18
+        ) or original_task_area_m / 4 ** (levels - 1) < 25000:
             raise SplitServiceError("SmallToSplit- Task is too small to be split")
 
         # check its locked for mapping by the current user
@@ -195,7 +270,11 @@ class SplitService:
         # create new geometries from the task geometry
         try:
             new_tasks_geojson = SplitService._create_split_tasks(
-                original_task.x, original_task.y, original_task.zoom, original_task
+                original_task.x,
+                original_task.y,
+                original_task.zoom,
+                original_task,
+                levels,
             )
         except Exception as e:
             raise SplitServiceError(f"Error splitting task{str(e)}")
@@ -0,0 +1,189 @@
+import importlib
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from backend import db
+from backend.models.postgis.job import Job, JobStep
+
+# Jobs that can be enqueued, mapped to the module and name of the function running them.
+# Functions are imported when the job runs and receive the job payload as keyword arguments
+JOB_HANDLERS = {
+    "send_message_to_all_contributors": (
+        "backend.services.messaging.message_service",
+        "MessageService.send_message_to_all_contributors",
+    ),
+    "send_message_after_chat": (
+        "backend.services.messaging.message_service",
+        "MessageService.send_message_after_chat",
+    ),
+    "send_project_transfer_message": (
+        "backend.services.messaging.message_service",
+        "MessageService.send_project_transfer_message",
+    ),
+    "send_email_to_contributors_on_project_progress": (
+        "backend.services.messaging.smtp_service",
+        "SMTPService.send_email_to_contributors_on_project_progress",
+    ),
+    "send_message_to_all_team_members": (
+        "backend.services.team_service",
+        "TeamService.send_message_to_all_team_members",
+    ),
+    "auto_unlock_tasks": (
+        "backend.services.project_service",
+        "ProjectService.auto_unlock_tasks",
+    ),
+    "save_contribs_snapshot": (
+        "backend.services.project_service",
+        "ProjectService.save_contribs_snapshot",
+    ),
+}
+
+# Job run by the current thread, with the keys of its steps already done
+_current = threading.local()
+
+
+class JobServiceError(Exception):
+    """ Custom Exception to notify callers an error occurred when handling jobs """
+
+    def __init__(self, message):
+        if current_app:
+            current_app.logger.debug(message)
+
+
+class JobService:
+    @staticmethod
+    def enqueue(name: str, **payload) -> int:
+        """
+        Queues a job for the background worker
+        :param name: Name of the job, one of JOB_HANDLERS
+        :param payload: JSON serialisable arguments of the job
+        :raises JobServiceError
+        :return: Job id
+        """
+        if name not in JOB_HANDLERS:
+            raise JobServiceError(f"UnknownJob- Job {name} is not registered")
+
+        return Job.enqueue(name, payload).id
+
+    @staticmethod
+    def enqueue_once(name: str, **payload) -> int:
+        """
+        Queues a job unless the same job is already queued or running
+        :raises JobServiceError
+        :return: Id of the new or pending job
+        """
+        if name not in JOB_HANDLERS:
+            raise JobServiceError(f"UnknownJob- Job {name} is not registered")
+
+        job = Job.get_pending(name, payload)
+        if job is not None:
+            return job.id
+        return Job.enqueue(name, payload).id
+
+    @staticmethod
+    def get_handler(name: str):
+        module_name, attribute = JOB_HANDLERS[name]
+        handler = importlib.import_module(module_name)
+        for part in attribute.split("."):
+            handler = getattr(handler, part)
+        return handler
+
+    @staticmethod
+    def is_step_done(key: str) -> bool:
+        """ Tells if a previous attempt of the job run by the current thread already did a step """
+        return key in getattr(_current, "steps", ())
+
+    @staticmethod
+    def record_step(key: str):
+        """
+        Records a step of the job run by the current thread as done, in the current transaction so it is
+        saved along with the step's own changes. Does nothing outside jobs
+        """
+        job_id = getattr(_current, "job_id", None)
+        if job_id is None or key in _current.steps:
+            return
+        db.session.add(JobStep(job_id=job_id, key=key))
+        _current.steps.add(key)
+
+    @staticmethod
+    def run_job(job_id: int):
+        """
+        Runs a claimed job, recording a failed attempt if it raises. Handlers record the steps they do, like
+        each message sent, so a retry only does the steps left
+        """
+        job = Job.query.get(job_id)
+        _current.job_id = job.id
+        _current.steps = JobStep.get_keys(job.id)
+        try:
+            JobService.get_handler(job.name)(**job.payload)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(
+                f"Job {job.id} {job.name} failed on attempt {job.attempts}: {str(e)}"
+            )
+            job.fail(str(e), current_app.config["JOB_RETRY_BACKOFF"])
+        else:
+            job.complete()
+        finally:
+            _current.job_id = None
+            _current.steps = set()
+
+    @staticmethod
+    def run_pending(worker: str = None, limit: int = 100) -> int:
+        """
+        Runs the due jobs one after the other on the current thread
+        :return: Number of jobs run
+        """
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        job_ids = Job.claim(worker, limit, current_app.config["JOB_LOCK_TIMEOUT"])
+        for job_id in job_ids:
+            JobService.run_job(job_id)
+        return len(job_ids)
+
+    @staticmethod
+    def _run_job_in_context(app, job_id: int):
+        with app.app_context():
+            try:
+                JobService.run_job(job_id)
+            except Exception as e:
+                current_app.logger.critical(f"Job {job_id} crashed: {str(e)}")
+
+    @staticmethod
+    def run_worker(app, workers: int = None, poll_interval: float = None):
+        """
+        Polls the job queue and runs the jobs on a pool of threads sharing the app, until interrupted.
+        Jobs are only claimed when a thread is free to run them, so other workers can pick them up
+        """
+        workers = workers or app.config["JOB_WORKERS"]
+        poll_interval = poll_interval or app.config["JOB_POLL_INTERVAL"]
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        app.logger.info(f"Job worker {worker} started with {workers} threads")
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    running = {future for future in running if not future.done()}
+                    job_ids = []
+                    if len(running) < workers:
+                        with app.app_context():
+                            job_ids = Job.claim(
+                                worker,
+                                workers - len(running),
+                                app.config["JOB_LOCK_TIMEOUT"],
+                            )
+                    for job_id in job_ids:
+                        running.add(
+                            executor.submit(JobService._run_job_in_context, app, job_id)
+                        )
+                    if not job_ids:
+                        time.sleep(poll_interval)
+            except KeyboardInterrupt:
+                app.logger.info(
+                    f"Job worker {worker} stopping, waiting for {len(running)} jobs"
+                )
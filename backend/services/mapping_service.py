@@ -1,14 +1,15 @@
 import datetime
 import xml.etree.ElementTree as ET
 
+import shapely.wkb
 from flask import current_app
-from geoalchemy2 import shape
 
 from backend.models.dtos.mapping_dto import (
     ExtendLockTimeDTO,
     TaskDTO,
     MappedTaskDTO,
     LockTaskDTO,
+    LockNextTaskDTO,
     StopMappingTaskDTO,
     TaskCommentDTO,
 )
@@ -91,32 +92,60 @@ class MappingService:
                     "InvalidTaskState- Task in invalid state for mapping"
                 )
 
-            user_can_map, error_reason = ProjectService.is_user_permitted_to_map(
+            MappingService._check_user_can_map(
                 lock_task_dto.project_id, lock_task_dto.user_id
             )
-            if not user_can_map:
-                if error_reason == MappingNotAllowed.USER_NOT_ACCEPTED_LICENSE:
-                    raise UserLicenseError("User must accept license to map this task")
-                elif error_reason == MappingNotAllowed.USER_NOT_ON_ALLOWED_LIST:
-                    raise MappingServiceError(
-                        "UserNotAllowed- User not on allowed list"
-                    )
-                elif error_reason == MappingNotAllowed.PROJECT_NOT_PUBLISHED:
-                    raise MappingServiceError(
-                        "ProjectNotPublished- Project is not published"
-                    )
-                elif error_reason == MappingNotAllowed.USER_ALREADY_HAS_TASK_LOCKED:
-                    raise MappingServiceError(
-                        "UserAlreadyHasTaskLocked- User already has task locked"
-                    )
-                else:
-                    raise MappingServiceError(
-                        f"{error_reason}- Mapping not allowed because: {error_reason}"
-                    )
 
         task.lock_task_for_mapping(lock_task_dto.user_id)
         return task.as_dto_with_instructions(lock_task_dto.preferred_locale)
 
+    @staticmethod
+    def lock_next_task_for_mapping(lock_dto: LockNextTaskDTO) -> TaskDTO:
+        """
+        Picks a mappable task for the user and locks it in the same transaction, so users locking tasks
+        at the same time never get the same one
+        :raises MappingServiceError, UserLicenseError, NotFound
+        """
+        MappingService._check_user_can_map(lock_dto.project_id, lock_dto.user_id)
+
+        task = Task.get_next_available(
+            lock_dto.project_id,
+            [TaskStatus.READY, TaskStatus.INVALIDATED],
+            lock_dto.near_task_id,
+        )
+        if task is None:
+            raise NotFound("No task available for mapping")
+
+        task.lock_task_for_mapping(lock_dto.user_id)
+        return task.as_dto_with_instructions(lock_dto.preferred_locale)
+
+    @staticmethod
+    def _check_user_can_map(project_id: int, user_id: int):
+        """
+        Raises an error if the user isn't allowed to map tasks of the project
+        :raises MappingServiceError, UserLicenseError
+        """
+        user_can_map, error_reason = ProjectService.is_user_permitted_to_map(
+            project_id, user_id
+        )
+        if not user_can_map:
+            if error_reason == MappingNotAllowed.USER_NOT_ACCEPTED_LICENSE:
+                raise UserLicenseError("User must accept license to map this task")
+            elif error_reason == MappingNotAllowed.USER_NOT_ON_ALLOWED_LIST:
+                raise MappingServiceError("UserNotAllowed- User not on allowed list")
+            elif error_reason == MappingNotAllowed.PROJECT_NOT_PUBLISHED:
+                raise MappingServiceError(
+                    "ProjectNotPublished- Project is not published"
+                )
+            elif error_reason == MappingNotAllowed.USER_ALREADY_HAS_TASK_LOCKED:
+                raise MappingServiceError(
+                    "UserAlreadyHasTaskLocked- User already has task locked"
+                )
+            else:
+                raise MappingServiceError(
+                    f"{error_reason}- Mapping not allowed because: {error_reason}"
+                )
+
     @staticmethod
     def unlock_task_after_mapping(mapped_task: MappedTaskDTO) -> TaskDTO:
         """Unlocks the task and sets the task history appropriately"""
@@ -216,10 +245,23 @@ class MappingService:
         You can use the following URL to test locally:
         http://www.openstreetmap.org/edit?editor=id&#map=11/31.50362930069913/34.628906243797054&comment=CHANGSET_COMMENT&gpx=http://localhost:5000/api/v2/projects/{project_id}/tasks/queries/gpx%3Ftasks=2
         """
+        return b"".join(MappingService.stream_gpx(project_id, task_ids_str, timestamp))
 
+    @staticmethod
+    def stream_gpx(project_id: int, task_ids_str: str, timestamp=None):
+        """
+        Streams the GPX file of the supplied tasks in chunks, without holding the tasks or the document
+        in memory. The output is the same as the one of an ElementTree of the whole document.
+        :raises NotFound: if none of the tasks exist
+        :return: generator of utf-8 encoded chunks
+        """
         if timestamp is None:
             timestamp = datetime.datetime.utcnow()
 
+        task_ids = MappingService._parse_task_ids(task_ids_str)
+        # The track points come first and the waypoints last, so the tasks are read twice
+        trk_tasks = Task.get_tasks_as_wkb(project_id, task_ids)
+
         root = ET.Element(
             "gpx",
             attrib=dict(
@@ -240,90 +282,124 @@ class MappingService:
         ET.SubElement(metadata, "time").text = timestamp.isoformat()
         root.append(metadata)
 
-        # Create trk element
+        # Create trk element, its trkseg elements are written in between
         trk = ET.Element("trk")
         root.append(trk)
         ET.SubElement(
             trk, "name"
         ).text = f"Task for project {project_id}. Do not edit outside of this area!"
-
-        # Construct trkseg elements
-        if task_ids_str is not None:
-            task_ids = map(int, task_ids_str.split(","))
-            tasks = Task.get_tasks(project_id, task_ids)
-            if not tasks or len(tasks) == 0:
-                raise NotFound()
-        else:
-            tasks = Task.get_all_tasks(project_id)
-            if not tasks or len(tasks) == 0:
-                raise NotFound()
-
-        for task in tasks:
-            task_geom = shape.to_shape(task.geometry)
-            for poly in task_geom:
-                trkseg = ET.SubElement(trk, "trkseg")
-                for point in poly.exterior.coords:
-                    ET.SubElement(
-                        trkseg,
-                        "trkpt",
-                        attrib=dict(lon=str(point[0]), lat=str(point[1])),
-                    )
-
-                    # Append wpt elements to end of doc
-                    wpt = ET.Element(
-                        "wpt", attrib=dict(lon=str(point[0]), lat=str(point[1]))
-                    )
-                    root.append(wpt)
-
-        xml_gpx = ET.tostring(root, encoding="utf8")
-        return xml_gpx
+        head, tail = ET.tostring(root, encoding="utf8").rsplit(b"</trk>", 1)
+
+        trkpt = MappingService._element_template("trkpt", "lon", "lat")
+        wpt = MappingService._element_template("wpt", "lon", "lat")
+
+        def write_gpx():
+            yield head
+            for task_id, geometry in trk_tasks:
+                chunk = []
+                for poly in shapely.wkb.loads(bytes(geometry)):
+                    chunk.append("<trkseg>")
+                    for point in poly.exterior.coords:
+                        chunk.append(trkpt.format(lon=str(point[0]), lat=str(point[1])))
+                    chunk.append("</trkseg>")
+                yield "".join(chunk).encode("utf-8")
+            yield b"</trk>"
+
+            # Append wpt elements to end of doc
+            for task_id, geometry in Task.get_tasks_as_wkb(project_id, task_ids):
+                chunk = []
+                for poly in shapely.wkb.loads(bytes(geometry)):
+                    for point in poly.exterior.coords:
+                        chunk.append(wpt.format(lon=str(point[0]), lat=str(point[1])))
+                yield "".join(chunk).encode("utf-8")
+            yield tail
+
+        return write_gpx()
 
     @staticmethod
     def generate_osm_xml(project_id: int, task_ids_str: str) -> str:
         """Generate xml response suitable for loading into JOSM.  A sample output file is in
         /backend/helpers/testfiles/osm-sample.xml"""
+        return b"".join(MappingService.stream_osm_xml(project_id, task_ids_str))
+
+    @staticmethod
+    def stream_osm_xml(project_id: int, task_ids_str: str):
+        """
+        Streams the OSM XML of the supplied tasks in chunks, without holding the tasks or the document in
+        memory. The output is the same as the one of an ElementTree of the whole document.
+        :raises NotFound: if none of the tasks exist
+        :return: generator of utf-8 encoded chunks
+        """
+        tasks = Task.get_tasks_as_wkb(
+            project_id, MappingService._parse_task_ids(task_ids_str)
+        )
+
         # Note XML created with upload No to ensure it will be rejected by OSM if uploaded by mistake
         root = ET.Element(
             "osm",
             attrib=dict(version="0.6", upload="never", creator="HOT Tasking Manager"),
         )
+        ET.SubElement(root, "tasks")
+        head, tail = ET.tostring(root, encoding="utf8").split(b"<tasks />", 1)
 
-        if task_ids_str:
-            task_ids = map(int, task_ids_str.split(","))
-            tasks = Task.get_tasks(project_id, task_ids)
-            if not tasks or len(tasks) == 0:
-                raise NotFound()
-        else:
-            tasks = Task.get_all_tasks(project_id)
-            if not tasks or len(tasks) == 0:
-                raise NotFound()
-
-        fake_id = -1  # We use fake-ids to ensure XML will not be validated by OSM
-        for task in tasks:
-            task_geom = shape.to_shape(task.geometry)
-            way = ET.SubElement(
-                root,
-                "way",
-                attrib=dict(id=str((task.id * -1)), action="modify", visible="true"),
-            )
-            for poly in task_geom:
-                for point in poly.exterior.coords:
-                    ET.SubElement(
-                        root,
-                        "node",
-                        attrib=dict(
-                            action="modify",
-                            visible="true",
-                            id=str(fake_id),
-                            lon=str(point[0]),
-                            lat=str(point[1]),
-                        ),
-                    )
-                    ET.SubElement(way, "nd", attrib=dict(ref=str(fake_id)))
-                    fake_id -= 1
-
-        xml_gpx = ET.tostring(root, encoding="utf8")
-        return xml_gpx
+        way = MappingService._element_template(
+            "way", "id", "action", "visible", empty=False
+        )
+        node = MappingService._element_template(
+            "node", "action", "visible", "id", "lon", "lat"
+        )
+        nd = MappingService._element_template("nd", "ref")
+
+        def write_osm_xml():
+            yield head
+            fake_id = -1  # We use fake-ids to ensure XML will not be validated by OSM
+            for task_id, geometry in tasks:
+                nds = []
+                nodes = []
+                for poly in shapely.wkb.loads(bytes(geometry)):
+                    for point in poly.exterior.coords:
+                        nodes.append(
+                            node.format(
+                                action="modify",
+                                visible="true",
+                                id=str(fake_id),
+                                lon=str(point[0]),
+                                lat=str(point[1]),
+                            )
+                        )
+                        nds.append(nd.format(ref=str(fake_id)))
+                        fake_id -= 1
+                task_way = way.format(
+                    id=str((task_id * -1)),
+                    action="modify",
+                    visible="true",
+                    nds="".join(nds),
+                )
+                yield (task_way + "".join(nodes)).encode("utf-8")
+            yield tail
+
+        return write_osm_xml()
+
+    @staticmethod
+    def _parse_task_ids(task_ids_str: str):
+        """ Parses a comma separated list of task ids, None or an empty string meaning all tasks """
+        if not task_ids_str:
+            return None
+        return [int(task_id) for task_id in task_ids_str.split(",")]
+
+    @staticmethod
+    def _element_template(tag: str, *attributes, empty=True) -> str:
+        """
+        Serializes an element with ElementTree once, with format placeholders for its attribute values,
+        so elements written from it are the same as the ones of a serialized tree
+        :param empty: False to get a {nds} placeholder for the child elements
+        """
+        element = ET.Element(
+            tag, attrib={attribute: f"{{{attribute}}}" for attribute in attributes}
+        )
+        if not empty:
+            element.text = "{nds}"
+        return ET.tostring(element, encoding="unicode")
 
     @staticmethod
     def undo_mapping(
@@ -359,26 +435,18 @@ class MappingService:
     @staticmethod
     def map_all_tasks(project_id: int, user_id: int):
         """Marks all tasks on a project as mapped"""
-        tasks_to_map = Task.query.filter(
-            Task.project_id == project_id,
-            Task.task_status.notin_(
-                [
-                    TaskStatus.BADIMAGERY.value,
-                    TaskStatus.MAPPED.value,
-                    TaskStatus.VALIDATED.value,
-                ]
-            ),
-        ).all()
-
-        for task in tasks_to_map:
-            if TaskStatus(task.task_status) not in [
-                TaskStatus.LOCKED_FOR_MAPPING,
-                TaskStatus.LOCKED_FOR_VALIDATION,
-            ]:
-                # Only lock tasks that are not already locked to avoid double lock issue
-                task.lock_task_for_mapping(user_id)
-
-            task.unlock_task(user_id, new_state=TaskStatus.MAPPED)
+        Task.bulk_change_state(
+            project_id,
+            user_id,
+            [
+                status
+                for status in TaskStatus
+                if status
+                not in [TaskStatus.BADIMAGERY, TaskStatus.MAPPED, TaskStatus.VALIDATED]
+            ],
+            TaskStatus.MAPPED,
+            TaskAction.LOCKED_FOR_MAPPING,
+        )
 
         # Set counters to fully mapped
         project = ProjectService.get_project_by_id(project_id)
@@ -390,14 +458,13 @@ class MappingService:
     @staticmethod
     def reset_all_badimagery(project_id: int, user_id: int):
         """Marks all bad imagery tasks ready for mapping"""
-        badimagery_tasks = Task.query.filter(
-            Task.task_status == TaskStatus.BADIMAGERY.value,
-            Task.project_id == project_id,
-        ).all()
-
-        for task in badimagery_tasks:
-            task.lock_task_for_mapping(user_id)
-            task.unlock_task(user_id, new_state=TaskStatus.READY)
+        Task.bulk_change_state(
+            project_id,
+            user_id,
+            [TaskStatus.BADIMAGERY],
+            TaskStatus.READY,
+            TaskAction.LOCKED_FOR_MAPPING,
+        )
 
         # Reset bad imagery counter
         project = ProjectService.get_project_by_id(project_id)
@@ -1,11 +1,9 @@
-import threading
-
 from flask import current_app
 
 from backend.models.dtos.message_dto import ChatMessageDTO, ProjectChatDTO
 from backend.models.postgis.project_chat import ProjectChat
 from backend.models.postgis.project_info import ProjectInfo
-from backend.services.messaging.message_service import MessageService
+from backend.services.job_service import JobService
 from backend.services.project_service import ProjectService
 from backend.services.project_admin_service import ProjectAdminService
 from backend.services.team_service import TeamService
@@ -65,15 +63,13 @@ class ChatService:
         if is_manager_permission or is_team_member or is_allowed_user:
             chat_message = ProjectChat.create_from_dto(chat_dto)
             db.session.commit()
-            threading.Thread(
-                target=MessageService.send_message_after_chat,
-                args=(
-                    chat_dto.user_id,
-                    chat_message.message,
-                    chat_dto.project_id,
-                    project_name,
-                ),
-            ).start()
+            JobService.enqueue(
+                "send_message_after_chat",
+                chat_from=chat_dto.user_id,
+                chat=chat_message.message,
+                project_id=chat_dto.project_id,
+                project_name=project_name,
+            )
             # Ensure we return latest messages after post
             return ProjectChat.get_messages(chat_dto.project_id, 1, 5)
         else:
@@ -8,7 +8,7 @@ from flask import current_app
 from sqlalchemy import text, func
 from markdown import markdown
 
-from backend import create_app, db
+from backend import db
 from backend.models.dtos.message_dto import MessageDTO, MessagesDTO
 from backend.models.dtos.stats_dto import Pagination
 from backend.models.postgis.message import Message, MessageType, NotFound
@@ -23,12 +23,16 @@ from backend.services.messaging.template_service import (
     template_var_replacing,
     clean_html,
 )
+from backend.services.job_service import JobService
 from backend.services.organisation_service import OrganisationService
 from backend.services.users.user_service import UserService, User
 
 
 message_cache = TTLCache(maxsize=512, ttl=30)
 
+# Messages saved per commit when pushing them, emails are sent once their batch is saved
+PUSH_BATCH_SIZE = 100
+
 
 class MessageServiceError(Exception):
     """Custom Exception to notify callers an error occurred when handling mapping"""
@@ -117,111 +121,118 @@ class MessageService:
         MessageService._push_messages(messages)
 
     @staticmethod
-    def send_message_to_all_contributors(project_id: int, message_dto: MessageDTO):
+    def send_message_to_all_contributors(project_id: int, message_dto: dict):
         """Sends supplied message to all contributors on specified project.  Message all contributors can take
-        over a minute to run, so this method is expected to be called on its own thread"""
-
-        app = (
-            create_app()
-        )  # Because message-all run on background thread it needs it's own app context
-
-        with app.app_context():
-            contributors = Message.get_all_contributors(project_id)
-            project = Project.get(project_id)
-            project_name = ProjectInfo.get_dto_for_locale(
-                project_id, project.default_locale
-            ).name
-            message_dto.message = "A message from {} managers:<br/><br/>{}".format(
-                MessageService.get_project_link(
-                    project_id, project_name, highlight=True
-                ),
-                markdown(message_dto.message, output_format="html"),
-            )
+        over a minute to run, so this method is expected to be run as a background job"""
+        message_dto = MessageDTO(message_dto)
+        contributors = Message.get_all_contributors(project_id)
+        project = Project.get(project_id)
+        project_name = ProjectInfo.get_dto_for_locale(
+            project_id, project.default_locale
+        ).name
+        message_dto.message = "A message from {} managers:<br/><br/>{}".format(
+            MessageService.get_project_link(project_id, project_name, highlight=True),
+            markdown(message_dto.message, output_format="html"),
+        )
 
-            messages = []
-            for contributor in contributors:
-                message = Message.from_dto(contributor[0], message_dto)
-                message.message_type = MessageType.BROADCAST.value
-                message.project_id = project_id
-                user = UserService.get_user_by_id(contributor[0])
-                messages.append(
-                    dict(message=message, user=user, project_name=project_name)
-                )
+        messages = []
+        for contributor in contributors:
+            message = Message.from_dto(contributor[0], message_dto)
+            message.message_type = MessageType.BROADCAST.value
+            message.project_id = project_id
+            user = UserService.get_user_by_id(contributor[0])
+            messages.append(dict(message=message, user=user, project_name=project_name))
 
-            MessageService._push_messages(messages)
+        MessageService._push_messages(messages)
 
     @staticmethod
     def _push_messages(messages):
+        """
+        Saves the messages and emails their recipients. Each batch of messages is saved before its emails are
+        sent, so a retried job skips the recipients it already messaged
+        """
         if len(messages) == 0:
             return
 
-        messages_objs = []
-        for i, message in enumerate(messages):
-            user = message.get("user")
-            obj = message.get("message")
-            project_name = message.get("project_name")
-            # Store message in the database only if mentions option are disabled.
-            if (
-                user.mentions_notifications is False
-                and obj.message_type == MessageType.MENTION_NOTIFICATION.value
-            ):
+        for start in range(0, len(messages), PUSH_BATCH_SIZE):
+            end = start + PUSH_BATCH_SIZE
+            messages_objs = []
+            emails = []
+            for message in messages[start:end]:
+                user = message.get("user")
+                obj = message.get("message")
+                step = f"message:{obj.message_type}:{user.id}"
+                if JobService.is_step_done(step):
+                    continue
+                JobService.record_step(step)
+                # Store message in the database only if mentions option are disabled.
+                if (
+                    user.mentions_notifications is False
+                    and obj.message_type == MessageType.MENTION_NOTIFICATION.value
+                ):
+                    messages_objs.append(obj)
+                    continue
+                if (
+                    user.projects_notifications is False
+                    and obj.message_type
+                    == MessageType.PROJECT_ACTIVITY_NOTIFICATION.value
+                ):
+                    continue
+                if (
+                    user.projects_notifications is False
+                    and obj.message_type == MessageType.BROADCAST.value
+                ):
+                    continue
+                if (
+                    user.teams_announcement_notifications is False
+                    and obj.message_type == MessageType.TEAM_BROADCAST.value
+                ):
+                    messages_objs.append(obj)
+                    continue
+                if (
+                    user.projects_comments_notifications is False
+                    and obj.message_type == MessageType.PROJECT_CHAT_NOTIFICATION.value
+                ):
+                    continue
+                if (
+                    user.tasks_comments_notifications is False
+                    and obj.message_type == MessageType.TASK_COMMENT_NOTIFICATION.value
+                ):
+                    continue
+                if user.tasks_notifications is False and obj.message_type in (
+                    MessageType.VALIDATION_NOTIFICATION.value,
+                    MessageType.INVALIDATION_NOTIFICATION.value,
+                ):
+                    messages_objs.append(obj)
+                    continue
                 messages_objs.append(obj)
-                continue
-            if (
-                user.projects_notifications is False
-                and obj.message_type == MessageType.PROJECT_ACTIVITY_NOTIFICATION.value
-            ):
-                continue
-            if (
-                user.projects_notifications is False
-                and obj.message_type == MessageType.BROADCAST.value
-            ):
-                continue
-            if (
-                user.teams_announcement_notifications is False
-                and obj.message_type == MessageType.TEAM_BROADCAST.value
-            ):
-                messages_objs.append(obj)
-                continue
-            if (
-                user.projects_comments_notifications is False
-                and obj.message_type == MessageType.PROJECT_CHAT_NOTIFICATION.value
-            ):
-                continue
-            if (
-                user.tasks_comments_notifications is False
-                and obj.message_type == MessageType.TASK_COMMENT_NOTIFICATION.value
-            ):
-                continue
-            if user.tasks_notifications is False and obj.message_type in (
-                MessageType.VALIDATION_NOTIFICATION.value,
-                MessageType.INVALIDATION_NOTIFICATION.value,
-            ):
-                messages_objs.append(obj)
-                continue
-            messages_objs.append(obj)
-            SMTPService.send_email_alert(
-                user.email_address,
-                user.username,
-                user.is_email_verified,
-                message["message"].id,
-                UserService.get_user_by_id(message["message"].from_user_id).username,
-                message["message"].project_id,
-                message["message"].task_id,
-                clean_html(message["message"].subject),
-                message["message"].message,
-                obj.message_type,
-                project_name,
-            )
-
-            if i + 1 % 10 == 0:
-                time.sleep(0.5)
+                emails.append(message)
+
+            # Flush messages to the database, with the steps recording them
+            if len(messages_objs) > 0:
+                db.session.add_all(messages_objs)
+                db.session.commit()
+
+            for i, message in enumerate(emails):
+                user = message.get("user")
+                SMTPService.send_email_alert(
+                    user.email_address,
+                    user.username,
+                    user.is_email_verified,
+                    message["message"].id,
+                    UserService.get_user_by_id(
+                        message["message"].from_user_id
+                    ).username,
+                    message["message"].project_id,
+                    message["message"].task_id,
+                    clean_html(message["message"].subject),
+                    message["message"].message,
+                    message["message"].message_type,
+                    message.get("project_name"),
+                )
 
-        # Flush messages to the database.
-        if len(messages_objs) > 0:
-            db.session.add_all(messages_objs)
-            db.session.flush()
-            db.session.commit()
+                if i + 1 % 10 == 0:
+                    time.sleep(0.5)
 
     @staticmethod
     def send_message_after_comment(
@@ -317,45 +328,46 @@ class MessageService:
         transferred_by: str,
     ):
         """Will send a message to the manager of the organization after a project is transferred"""
-        app = (
-            create_app()
-        )  # Because message-all run on background thread it needs it's own app context
-
-        with app.app_context():
-            project = Project.get(project_id)
-            project_name = project.get_project_title(project.default_locale)
+        project = Project.get(project_id)
+        project_name = project.get_project_title(project.default_locale)
 
-            message = Message()
-            message.message_type = MessageType.SYSTEM.value
-            message.subject = f"Project {project_name} #{project_id} was transferred to {transferred_to}"
-            message.message = (
-                f"Project {project_name} #{project_id} associated with your"
-                + f"organisation {project.organisation.name} was transferred to {transferred_to} by {transferred_by}."
-            )
-            values = {
-                "PROJECT_ORG_NAME": project.organisation.name,
-                "PROJECT_ORG_ID": project.organisation_id,
-                "PROJECT_NAME": project_name,
-                "PROJECT_ID": project_id,
-                "TRANSFERRED_TO": transferred_to,
-                "TRANSFERRED_BY": transferred_by,
-            }
-            html_template = get_template("project_transfer_alert_en.html", values)
-
-            managers = OrganisationService.get_organisation_by_id_as_dto(
-                project.organisation_id, User.get_by_username(transferred_by).id, False
-            ).managers
-            for manager in managers:
-                manager = UserService.get_user_by_username(manager.username)
-                message.to_user_id = manager.id
-                message.save()
-                if manager.email_address and manager.is_email_verified:
-                    SMTPService._send_message(
-                        manager.email_address,
-                        message.subject,
-                        html_template,
-                        message.message,
-                    )
+        message = Message()
+        message.message_type = MessageType.SYSTEM.value
+        message.subject = (
+            f"Project {project_name} #{project_id} was transferred to {transferred_to}"
+        )
+        message.message = (
+            f"Project {project_name} #{project_id} associated with your"
+            + f"organisation {project.organisation.name} was transferred to {transferred_to} by {transferred_by}."
+        )
+        values = {
+            "PROJECT_ORG_NAME": project.organisation.name,
+            "PROJECT_ORG_ID": project.organisation_id,
+            "PROJECT_NAME": project_name,
+            "PROJECT_ID": project_id,
+            "TRANSFERRED_TO": transferred_to,
+            "TRANSFERRED_BY": transferred_by,
+        }
+        html_template = get_template("project_transfer_alert_en.html", values)
+
+        managers = OrganisationService.get_organisation_by_id_as_dto(
+            project.organisation_id, User.get_by_username(transferred_by).id, False
+        ).managers
+        for manager in managers:
+            manager = UserService.get_user_by_username(manager.username)
+            step = f"transfer_message:{manager.id}"
+            if JobService.is_step_done(step):
+                continue
+            JobService.record_step(step)
+            message.to_user_id = manager.id
+            message.save()
+            if manager.email_address and manager.is_email_verified:
+                SMTPService._send_message(
+                    manager.email_address,
+                    message.subject,
+                    html_template,
+                    message.message,
+                )
 
     @staticmethod
     def get_user_link(username: str):
@@ -464,81 +476,78 @@ class MessageService:
         chat_from: int, chat: str, project_id: int, project_name: str
     ):
         """Send alert to user if they were @'d in a chat message"""
-        # Because message-all run on background thread it needs it's own app context
-        app = create_app()
-        with app.app_context():
-            usernames = MessageService._parse_message_for_username(chat, project_id)
-            if len(usernames) != 0:
-                link = MessageService.get_project_link(
-                    project_id, project_name, include_chat_section=True
-                )
-                messages = []
-                for username in usernames:
-                    current_app.logger.debug(f"Searching for {username}")
-                    try:
-                        user = UserService.get_user_by_username(username)
-                    except NotFound:
-                        current_app.logger.error(f"Username {username} not found")
-                        continue  # If we can't find the user, keep going no need to fail
-
-                    message = Message()
-                    message.message_type = MessageType.MENTION_NOTIFICATION.value
-                    message.project_id = project_id
-                    message.from_user_id = chat_from
-                    message.to_user_id = user.id
-                    message.subject = f"You were mentioned in Project {link} chat"
-                    message.message = chat
-                    messages.append(
-                        dict(message=message, user=user, project_name=project_name)
-                    )
-
-                MessageService._push_messages(messages)
-
-            query = """ select user_id from project_favorites where project_id = :project_id"""
-            favorited_users_results = db.engine.execute(
-                text(query), project_id=project_id
-            )
-            favorited_users = [r[0] for r in favorited_users_results]
-
-            # Notify all contributors except the user that created the comment.
-            contributed_users_results = (
-                TaskHistory.query.with_entities(TaskHistory.user_id.distinct())
-                .filter(TaskHistory.project_id == project_id)
-                .filter(TaskHistory.user_id != chat_from)
-                .filter(TaskHistory.action == TaskAction.STATE_CHANGE.name)
-                .all()
+        usernames = MessageService._parse_message_for_username(chat, project_id)
+        if len(usernames) != 0:
+            link = MessageService.get_project_link(
+                project_id, project_name, include_chat_section=True
             )
-            contributed_users = [r[0] for r in contributed_users_results]
+            messages = []
+            for username in usernames:
+                current_app.logger.debug(f"Searching for {username}")
+                try:
+                    user = UserService.get_user_by_username(username)
+                except NotFound:
+                    current_app.logger.error(f"Username {username} not found")
+                    continue  # If we can't find the user, keep going no need to fail
+
+                message = Message()
+                message.message_type = MessageType.MENTION_NOTIFICATION.value
+                message.project_id = project_id
+                message.from_user_id = chat_from
+                message.to_user_id = user.id
+                message.subject = f"You were mentioned in Project {link} chat"
+                message.message = chat
+                messages.append(
+                    dict(message=message, user=user, project_name=project_name)
+                )
 
-            users_to_notify = list(set(contributed_users + favorited_users))
+            MessageService._push_messages(messages)
+
+        query = (
+            """ select user_id from project_favorites where project_id = :project_id"""
+        )
+        favorited_users_results = db.engine.execute(text(query), project_id=project_id)
+        favorited_users = [r[0] for r in favorited_users_results]
 
-            if len(users_to_notify) != 0:
-                from_user = User.query.get(chat_from)
-                from_user_link = MessageService.get_user_link(from_user.username)
-                project_link = MessageService.get_project_link(
-                    project_id, project_name, include_chat_section=True
+        # Notify all contributors except the user that created the comment.
+        contributed_users_results = (
+            TaskHistory.query.with_entities(TaskHistory.user_id.distinct())
+            .filter(TaskHistory.project_id == project_id)
+            .filter(TaskHistory.user_id != chat_from)
+            .filter(TaskHistory.action == TaskAction.STATE_CHANGE.name)
+            .all()
+        )
+        contributed_users = [r[0] for r in contributed_users_results]
+
+        users_to_notify = list(set(contributed_users + favorited_users))
+
+        if len(users_to_notify) != 0:
+            from_user = User.query.get(chat_from)
+            from_user_link = MessageService.get_user_link(from_user.username)
+            project_link = MessageService.get_project_link(
+                project_id, project_name, include_chat_section=True
+            )
+            messages = []
+            for user_id in users_to_notify:
+                try:
+                    user = UserService.get_user_by_id(user_id)
+                except NotFound:
+                    continue  # If we can't find the user, keep going no need to fail
+                message = Message()
+                message.message_type = MessageType.PROJECT_CHAT_NOTIFICATION.value
+                message.project_id = project_id
+                message.from_user_id = chat_from
+                message.to_user_id = user.id
+                message.subject = (
+                    f"{from_user_link} left a comment in project {project_link}"
                 )
-                messages = []
-                for user_id in users_to_notify:
-                    try:
-                        user = UserService.get_user_by_id(user_id)
-                    except NotFound:
-                        continue  # If we can't find the user, keep going no need to fail
-                    message = Message()
-                    message.message_type = MessageType.PROJECT_CHAT_NOTIFICATION.value
-                    message.project_id = project_id
-                    message.from_user_id = chat_from
-                    message.to_user_id = user.id
-                    message.subject = (
-                        f"{from_user_link} left a comment in project {project_link}"
-                    )
-                    message.message = chat
-                    messages.append(
-                        dict(message=message, user=user, project_name=project_name)
-                    )
-
-                # it's important to keep that line inside the if to avoid duplicated emails
-                MessageService._push_messages(messages)
+                message.message = chat
+                messages.append(
+                    dict(message=message, user=user, project_name=project_name)
+                )
+
+            # it's important to keep that line inside the if to avoid duplicated emails
+            MessageService._push_messages(messages)
 
     @staticmethod
     def send_favorite_project_activities(user_id: int):
@@ -24,6 +24,7 @@ from backend.models.postgis.task import Task
 from backend.models.postgis.statuses import ProjectStatus, TaskStatus
 from backend.models.postgis.utils import NotFound
 from backend.services.users.user_service import UserService
+from backend.services.users.principal import Principal
 
 
 class OrganisationServiceError(Exception):
@@ -296,13 +297,12 @@ class OrganisationService:
     def is_user_an_org_manager(organisation_id: int, user_id: int):
         """Check that the user is an manager for the org"""
 
-        org = Organisation.get(organisation_id)
+        if Principal.get(user_id).is_org_manager(organisation_id):
+            return True
 
-        if org is None:
+        if Organisation.get(organisation_id) is None:
             raise NotFound()
-        user = UserService.get_user_by_id(user_id)
-
-        return user in org.managers
+        return False
 
     @staticmethod
     def get_campaign_organisations_as_dto(campaign_id: int, user_id: int):
@@ -0,0 +1,268 @@
+import base64
+import binascii
+import datetime
+import json
+import math
+
+from flask import abort, current_app
+from sqlalchemy import func, literal, tuple_
+
+from backend import db
+from backend.services.cache_service import CacheService, CacheServiceError
+
+# Ways of counting the total number of results of a paginated query
+COUNT_EXACT = "exact"
+COUNT_CACHED = "cached"
+COUNT_ESTIMATE = "estimate"
+COUNT_NONE = "none"
+COUNT_MODES = [COUNT_EXACT, COUNT_CACHED, COUNT_ESTIMATE, COUNT_NONE]
+
+# Seconds cached counts are trusted for, when their key isn't versioned
+COUNT_CACHE_TTL = 60
+
+
+class PaginationServiceError(Exception):
+    """ Custom Exception to notify callers an error occurred when paginating results """
+
+    def __init__(self, message):
+        if current_app:
+            current_app.logger.debug(message)
+
+
+class SortKey:
+    """ An expression results are sorted on, read back from the last row of a page to build the next cursor """
+
+    def __init__(self, expression, value, null_value=None):
+        """
+        :param expression: column or expression to sort on
+        :param value: callable returning the value of the expression for a result row
+        :param null_value: SQL value sorted in place of nulls, required if the expression is nullable
+        """
+        self.expression = expression
+        self.value = value
+        self.null_value = null_value
+
+    @property
+    def sort_expression(self):
+        if self.null_value is None:
+            return self.expression
+        return func.coalesce(self.expression, self.null_value)
+
+    def bind(self, value):
+        """ Converts a value read from a cursor to a SQL value comparable with the sort expression """
+        if value is None:
+            if self.null_value is None:
+                raise PaginationServiceError("InvalidCursor- Cursor is invalid")
+            return self.null_value
+        try:
+            python_type = self.expression.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if python_type is datetime.datetime:
+            try:
+                value = datetime.datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise PaginationServiceError("InvalidCursor- Cursor is invalid")
+        elif python_type in (int, float) and not isinstance(value, (int, float)):
+            raise PaginationServiceError("InvalidCursor- Cursor is invalid")
+        return literal(value, type_=self.expression.type)
+
+
+class Page:
+    """ A page of results with the attributes of a Flask-SQLAlchemy Pagination, plus the cursor of the next page """
+
+    def __init__(
+        self,
+        items: list,
+        per_page: int,
+        has_next: bool,
+        page: int = None,
+        total: int = None,
+        total_estimated: bool = False,
+        next_cursor: str = None,
+        has_prev: bool = None,
+    ):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.page = page
+        self.total = total
+        self.total_estimated = total_estimated
+        self.next_cursor = next_cursor
+
+        self.has_prev = has_prev if has_prev is not None else bool(page and page > 1)
+        self.prev_num = page - 1 if page and self.has_prev else None
+        self.next_num = page + 1 if page and has_next else None
+        self.pages = math.ceil(total / per_page) if total is not None else None
+
+
+class PaginationService:
+    @staticmethod
+    def paginate(
+        query,
+        page: int,
+        per_page: int,
+        count: str = COUNT_EXACT,
+        cache_key: str = None,
+        cache_ttl: int = COUNT_CACHE_TTL,
+    ):
+        """
+        Paginates a query by page number
+        :param count: how the total is counted, exact counts are the default and cost another full query
+        :param cache_key: key cached counts are stored under, counts are exact when there is none
+        :returns: a Flask-SQLAlchemy Pagination for exact counts, a Page otherwise
+        """
+        PaginationService.validate_count(count)
+        if count == COUNT_EXACT or (count == COUNT_CACHED and cache_key is None):
+            return query.paginate(page, per_page, True)
+
+        # Same defaults as Flask-SQLAlchemy
+        page = page or 1
+        per_page = per_page or 20
+        if page < 1:
+            abort(404)
+        start = (page - 1) * per_page
+        rows = query.limit(per_page + 1).offset(start).all()
+        if not rows and page != 1:
+            abort(404)
+
+        total, estimated = PaginationService.count(query, count, cache_key, cache_ttl)
+        if total is not None and not estimated:
+            # Cached totals can be out of date, but never hide the rows just fetched
+            total = max(total, start + len(rows[:per_page]))
+        return Page(
+            rows[:per_page],
+            per_page,
+            len(rows) > per_page,
+            page=page,
+            total=total,
+            total_estimated=estimated,
+        )
+
+    @staticmethod
+    def paginate_keyset(
+        query,
+        sort_keys: list,
+        cursor: str = None,
+        per_page: int = 10,
+        descending: bool = False,
+        sort_name: str = "",
+        count: str = COUNT_NONE,
+        cache_key: str = None,
+        cache_ttl: int = COUNT_CACHE_TTL,
+    ) -> Page:
+        """
+        Paginates a query by cursor, fetching the rows sorted after the last row of the previous page, so deep
+        pages cost the same as the first one given an index on the sort keys
+        :param sort_keys: SortKey list, the last one must be unique so every row has a distinct position
+        :param cursor: opaque cursor returned with the previous page, the first page is returned if empty
+        :param descending: sorts every key in descending order
+        :param sort_name: name of the sort order, cursors of other sort orders are rejected
+        :raises PaginationServiceError if the cursor is invalid
+        """
+        PaginationService.validate_count(count)
+        expressions = [key.sort_expression for key in sort_keys]
+        query = query.order_by(
+            *[
+                expression.desc() if descending else expression.asc()
+                for expression in expressions
+            ]
+        )
+
+        total, estimated = PaginationService.count(query, count, cache_key, cache_ttl)
+        if cursor:
+            values = PaginationService.decode_cursor(cursor, sort_name, len(sort_keys))
+            position = tuple_(
+                *[key.bind(value) for key, value in zip(sort_keys, values)]
+            )
+            query = query.filter(
+                tuple_(*expressions) < position
+                if descending
+                else tuple_(*expressions) > position
+            )
+
+        rows = query.limit(per_page + 1).all()
+        items = rows[:per_page]
+        next_cursor = None
+        if len(rows) > per_page:
+            next_cursor = PaginationService.encode_cursor(
+                sort_name, [key.value(items[-1]) for key in sort_keys]
+            )
+        return Page(
+            items,
+            per_page,
+            next_cursor is not None,
+            total=total,
+            total_estimated=estimated,
+            next_cursor=next_cursor,
+            has_prev=bool(cursor),
+        )
+
+    @staticmethod
+    def validate_count(count: str):
+        if count not in COUNT_MODES:
+            raise PaginationServiceError(
+                f"InvalidCount- Count must be one of {', '.join(COUNT_MODES)}"
+            )
+
+    @staticmethod
+    def count(query, count: str, cache_key: str = None, cache_ttl: int = None):
+        """
+        Counts the results of a query
+        :returns: the total, None if not counted, and whether the total is an estimate
+        """
+        if count == COUNT_NONE:
+            return None, False
+        if count == COUNT_ESTIMATE:
+            return PaginationService.estimate_count(query), True
+        if count == COUNT_CACHED and cache_key is not None:
+            try:
+                total = CacheService.get_backend().get(cache_key)
+                if total is None:
+                    total = query.order_by(None).count()
+                    CacheService.get_backend().set(cache_key, total, cache_ttl)
+                return total, False
+            except (OSError, CacheServiceError) as e:
+                current_app.logger.warning(f"Cache unavailable: {e}")
+        return query.order_by(None).count(), False
+
+    @staticmethod
+    def estimate_count(query) -> int:
+        """ Estimates the number of results of a query from the planner statistics, without running it """
+        statement = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+        plan = (
+            db.session.connection()
+            .execute(f"EXPLAIN (FORMAT JSON) {statement}", statement.params)
+            .scalar()
+        )
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    @staticmethod
+    def encode_cursor(sort_name: str, values: list) -> str:
+        """ Encodes the sort key values of a row as an opaque cursor """
+        values = [
+            value.isoformat() if isinstance(value, datetime.datetime) else value
+            for value in values
+        ]
+        payload = json.dumps({"sort": sort_name, "values": values})
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort_name: str, length: int) -> list:
+        """
+        Decodes the sort key values of a cursor
+        :raises PaginationServiceError if the cursor is malformed or belongs to another sort order
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            values = payload["values"]
+            valid = (
+                payload["sort"] == sort_name
+                and isinstance(values, list)
+                and len(values) == length
+            )
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+            valid = False
+        if not valid:
+            raise PaginationServiceError("InvalidCursor- Cursor is invalid")
+        return values
@@ -0,0 +1,125 @@
+import os
+import socket
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from backend.services.cache_service import CacheService
+
+# Snapshot of the pool of every worker, each under its own key of the cache backend, so workers never
+# overwrite each other's. Only the file and redis backends are shared between workers
+METRICS_PREFIX = "pool_metrics:"
+METRICS_INTERVAL = 10
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool counting the checkouts of the current worker and the time spent waiting on them"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.published_at = 0.0
+
+    def _do_get(self):
+        started_at = time.monotonic()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.monotonic() - started_at
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def get_metrics(self) -> dict:
+        """ Snapshot of the pool usage since the worker started """
+        with self._metrics_lock:
+            return dict(
+                worker=f"{socket.gethostname()}:{os.getpid()}",
+                size=self.size(),
+                checked_out=self.checkedout(),
+                overflow=max(self.overflow(), 0),
+                max_overflow=self._max_overflow,
+                checkouts=self.checkouts,
+                timeouts=self.timeouts,
+                wait_seconds=round(self.wait_seconds, 6),
+                max_wait_seconds=round(self.max_wait_seconds, 6),
+                updated_at=time.time(),
+            )
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """psycopg2 wait callback yielding to other greenlets while waiting on the database"""
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import OperationalError, extensions
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state}")
+
+
+class PoolService:
+    @staticmethod
+    def set_gevent_wait_callback():
+        """Lets gevent switch greenlets while psycopg2 waits on the database"""
+        from psycopg2 import extensions
+
+        extensions.set_wait_callback(gevent_wait_callback)
+
+    @staticmethod
+    def get_worker_metrics(engine) -> dict:
+        """ Gets the pool metrics of the current worker """
+        if not isinstance(engine.pool, InstrumentedQueuePool):
+            return None
+        return engine.pool.get_metrics()
+
+    @staticmethod
+    def publish_metrics(engine, force: bool = False):
+        """
+        Shares the pool metrics of the current worker with the other workers through the cache backend,
+        at most once every METRICS_INTERVAL seconds. Entries of workers that stopped publishing expire
+        """
+        metrics = PoolService.get_worker_metrics(engine)
+        if metrics is None:
+            return
+        if (
+            not force
+            and metrics["updated_at"] - engine.pool.published_at < METRICS_INTERVAL
+        ):
+            return
+        engine.pool.published_at = metrics["updated_at"]
+
+        try:
+            CacheService.get_backend().set(
+                METRICS_PREFIX + metrics["worker"], metrics, 6 * METRICS_INTERVAL
+            )
+        except Exception as e:
+            current_app.logger.warning(f"Unable to publish pool metrics: {str(e)}")
+
+    @staticmethod
+    def get_metrics(engine) -> dict:
+        """
+        Gets the latest pool metrics published by every worker. With the local cache backend, only the
+        worker answering is listed
+        """
+        PoolService.publish_metrics(engine, force=True)
+        workers = CacheService.get_backend().get_prefixed(METRICS_PREFIX)
+        return dict(workers=sorted(workers.values(), key=lambda m: m["worker"]))
@@ -1,7 +1,8 @@
-import json
-import threading
-import geojson
 from flask import current_app
+from shapely import wkb
+from sqlalchemy import func, or_
+
+from backend import db
 
 from backend.models.dtos.project_dto import (
     DraftProjectDTO,
@@ -11,12 +12,14 @@ from backend.models.dtos.project_dto import (
 )
 from backend.models.postgis.project import Project, Task, ProjectStatus
 from backend.models.postgis.statuses import TaskCreationMode, TeamRoles
-from backend.models.postgis.task import TaskHistory, TaskStatus, TaskAction
+from backend.models.postgis.task import TaskHistory
 from backend.models.postgis.user import User
-from backend.models.postgis.utils import NotFound, InvalidData, InvalidGeoJson
+from backend.models.postgis.utils import NotFound, InvalidGeoJson
+from backend.services.cache_service import CacheService
+from backend.services.geocoding_service import GeocodingService
 from backend.services.grid.grid_service import GridService
 from backend.services.license_service import LicenseService
-from backend.services.messaging.message_service import MessageService
+from backend.services.job_service import JobService
 from backend.services.users.user_service import UserService
 from backend.services.organisation_service import OrganisationService
 from backend.services.team_service import TeamService
@@ -86,7 +89,12 @@ class ProjectAdminService:
             draft_project.task_creation_mode = TaskCreationMode.ARBITRARY.value
         else:
             tasks = draft_project_dto.tasks
-        ProjectAdminService._attach_tasks_to_project(draft_project, tasks)
+        task_rows = ProjectAdminService._attach_tasks_to_project(draft_project, tasks)
+
+        # The project id is needed to load the tasks, which are saved together with the project
+        db.session.add(draft_project)
+        db.session.flush()
+        Task.bulk_insert(draft_project.id, task_rows)
 
         if draft_project_dto.cloneFromProjectId:
             draft_project.save()  # Update the clone
@@ -181,16 +189,7 @@ class ProjectAdminService:
     @staticmethod
     def reset_all_tasks(project_id: int, user_id: int):
         """Resets all tasks on project, preserving history"""
-        tasks_to_reset = Task.query.filter(
-            Task.project_id == project_id,
-            Task.task_status != TaskStatus.READY.value,
-        ).all()
-
-        for task in tasks_to_reset:
-            task.set_task_history(
-                TaskAction.COMMENT, user_id, "Task reset", TaskStatus.READY
-            )
-            task.reset_task(user_id)
+        Task.bulk_reset_tasks(project_id, user_id)
 
         # Reset project counters
         project = ProjectAdminService._get_project_by_id(project_id)
@@ -210,38 +209,25 @@ class ProjectAdminService:
         return comments
 
     @staticmethod
-    def _attach_tasks_to_project(draft_project: Project, tasks_geojson):
+    def _attach_tasks_to_project(draft_project: Project, tasks_geojson) -> list:
         """
-        Validates then iterates over the array of tasks and attach them to the draft project
+        Validates the tasks of the draft project and converts them to rows for Task.bulk_insert
         :param draft_project: Draft project in scope
         :param tasks_geojson: GeoJSON feature collection of mapping tasks
         :raises InvalidGeoJson, InvalidData
+        :return: list of task rows
         """
-        tasks = geojson.loads(json.dumps(tasks_geojson))
-
-        if type(tasks) is not geojson.FeatureCollection:
+        if (
+            not isinstance(tasks_geojson, dict)
+            or tasks_geojson.get("type") != "FeatureCollection"
+        ):
             raise InvalidGeoJson(
                 "MustBeFeatureCollection- Invalid: GeoJson must be FeatureCollection"
             )
 
-        is_valid_geojson = geojson.is_valid(tasks)
-        if is_valid_geojson["valid"] == "no":
-            raise InvalidGeoJson(
-                f"InvalidFeatureCollection- {is_valid_geojson['message']}"
-            )
-
-        task_count = 1
-        for feature in tasks["features"]:
-            try:
-                task = Task.from_geojson_feature(task_count, feature)
-            except (InvalidData, InvalidGeoJson) as e:
-                raise e
-
-            draft_project.tasks.append(task)
-            task_count += 1
-
-        task_count -= 1  # Remove last increment before falling out loop
-        draft_project.total_tasks = task_count
+        task_rows = Task.rows_from_geojson_features(tasks_geojson.get("features", []))
+        draft_project.total_tasks = len(task_rows)
+        return task_rows
 
     @staticmethod
     def _validate_default_locale(default_locale, project_info_locales):
@@ -321,10 +307,12 @@ class ProjectAdminService:
             transferred_by = User.get_by_id(transfering_user_id).username
             project.author_id = new_owner.id
             project.save()
-            threading.Thread(
-                target=MessageService.send_project_transfer_message,
-                args=(project_id, username, transferred_by),
-            ).start()
+            JobService.enqueue(
+                "send_project_transfer_message",
+                project_id=project_id,
+                transferred_to=username,
+                transferred_by=transferred_by,
+            )
 
     @staticmethod
     def is_user_action_permitted_on_project(
@@ -353,3 +341,42 @@ class ProjectAdminService:
                     )
 
         return is_admin or is_author or is_org_manager or is_manager_team
+
+    @staticmethod
+    def backfill_project_countries(overwrite: bool = False, batch_size: int = 200):
+        """
+        Sets the countries of projects from the bundled country polygons, without calling Nominatim
+        :param overwrite: Also update the projects which already have countries
+        :returns: number of projects updated, and ids of the projects outside the bundled polygons
+        """
+        query = db.session.query(Project.id)
+        if not overwrite:
+            query = query.filter(
+                or_(Project.country.is_(None), func.cardinality(Project.country) == 0)
+            )
+        project_ids = [project_id for project_id, in query.order_by(Project.id)]
+
+        updated = 0
+        unmatched = []
+        for start in range(0, len(project_ids), batch_size):
+            end = start + batch_size
+            batch = project_ids[start:end]
+            aois = db.session.query(
+                Project.id, func.ST_AsBinary(Project.geometry)
+            ).filter(Project.id.in_(batch))
+
+            mappings = []
+            for project_id, aoi in aois:
+                countries = GeocodingService.get_countries(wkb.loads(bytes(aoi)))
+                if countries:
+                    mappings.append({"id": project_id, "country": countries})
+                else:
+                    unmatched.append(project_id)
+
+            db.session.bulk_update_mappings(Project, mappings)
+            db.session.commit()
+            for mapping in mappings:
+                CacheService.invalidate_project(mapping["id"])
+            updated += len(mappings)
+
+        return updated, sorted(unmatched)
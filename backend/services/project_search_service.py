@@ -2,9 +2,8 @@ from flask import current_app
 import math
 import geojson
 from geoalchemy2 import shape
-from sqlalchemy import func, distinct, desc, or_, and_
+from sqlalchemy import func, desc, literal, or_, and_
 from shapely.geometry import Polygon, box
-from cachetools import TTLCache, cached
 
 from backend import db
 from backend.api.utils import validate_date_input
@@ -16,6 +15,7 @@ from backend.models.dtos.project_dto import (
     ProjectSearchBBoxDTO,
 )
 from backend.models.postgis.project import Project, ProjectInfo, ProjectTeams
+from backend.models.postgis.project_activity import ProjectActivityStats
 from backend.models.postgis.statuses import (
     ProjectStatus,
     MappingLevel,
@@ -29,7 +29,6 @@ from backend.models.postgis.statuses import (
 )
 from backend.models.postgis.campaign import Campaign
 from backend.models.postgis.organisation import Organisation
-from backend.models.postgis.task import TaskHistory
 from backend.models.postgis.utils import (
     NotFound,
     ST_Intersects,
@@ -39,9 +38,51 @@ from backend.models.postgis.utils import (
 )
 from backend.models.postgis.interests import project_interests
 from backend.services.users.user_service import UserService
+from backend.services.cache_service import CacheService, cached
+from backend.services.pagination_service import (
+    COUNT_CACHED,
+    PaginationService,
+    PaginationServiceError,
+    SortKey,
+)
+
+
+def search_cache_key(search_dto: ProjectSearchDTO, user):
+    """Search results are shared by users with the same permissions until any project is saved"""
+    return (
+        CacheService.get_search_key_parts(search_dto),
+        CacheService.get_user_fingerprint(user, search_dto),
+        CacheService.get_catalogue_version(),
+    )
+
+
+def search_count_key(search_dto: ProjectSearchDTO, user) -> str:
+    """Counts of search results are shared by every page and sort order of a search"""
+    parts = CacheService.get_search_key_parts(search_dto)
+    for field in ["page", "cursor", "count", "order_by", "order_by_type"]:
+        parts.pop(field, None)
+    return CacheService.make_key(
+        "search-count",
+        parts,
+        CacheService.get_user_fingerprint(user, search_dto),
+        CacheService.get_catalogue_version(),
+    )
 
 
-search_cache = TTLCache(maxsize=128, ttl=300)
+# Columns projects can be sorted on in cursor pagination, with the value their nulls are sorted as, after every
+# other value as Postgres sorts them
+SEARCH_SORT_COLUMNS = {
+    "id": None,
+    "difficulty": None,
+    "priority": 2147483647,
+    "status": None,
+    "last_updated": "infinity",
+    "due_date": "infinity",
+}
+
+# Seconds cached counts of search results are kept for, they are discarded earlier when any project is saved
+SEARCH_COUNT_TTL = 300
+
 
 # max area allowed for passed in bbox, calculation shown to help future maintenance
 # client resolution (mpp)* arbitrary large map size on a large screen in pixels * 50% buffer, all squared
@@ -116,10 +157,24 @@ class ProjectSearchService:
         return query
 
     @staticmethod
-    def create_result_dto(project, preferred_locale, total_contributors):
-        project_info_dto = ProjectInfo.get_dto_for_locale(
-            project.id, preferred_locale, project.default_locale
-        )
+    def create_result_dto(
+        project,
+        preferred_locale,
+        total_contributors,
+        project_info_dto=None,
+        active_mappers=None,
+        campaigns=None,
+    ):
+        """Creates a search result DTO, hydrating any value that wasn't preloaded"""
+        if project_info_dto is None:
+            project_info_dto = ProjectInfo.get_dto_for_locale(
+                project.id, preferred_locale, project.default_locale
+            )
+        if active_mappers is None:
+            active_mappers = Project.get_active_mappers(project.id)
+        if campaigns is None:
+            campaigns = Project.get_project_campaigns(project.id)
+
         list_dto = ListSearchResultDTO()
         list_dto.project_id = project.id
         list_dto.locale = project_info_dto.locale
@@ -144,57 +199,73 @@ class ProjectSearchService:
             project.tasks_bad_imagery,
         )
         list_dto.status = ProjectStatus(project.status).name
-        list_dto.active_mappers = Project.get_active_mappers(project.id)
+        list_dto.active_mappers = active_mappers
         list_dto.total_contributors = total_contributors
         list_dto.country = project.country
         list_dto.organisation_name = project.organisation_name
         list_dto.organisation_logo = project.organisation_logo
-        list_dto.campaigns = Project.get_project_campaigns(project.id)
+        list_dto.campaigns = campaigns
 
         return list_dto
 
     @staticmethod
-    def get_total_contributions(paginated_results):
-        paginated_projects_ids = [p.id for p in paginated_results]
+    def create_result_dtos(projects, preferred_locale) -> list:
+        """
+        Creates search result DTOs for a page of projects. Localized info, active mappers, campaigns
+        and total contributors are loaded for the whole page with one query each, instead of per project.
+        :param projects: rows returned by a query built with create_search_query
+        :param preferred_locale: locale requested by user
+        """
+        if not projects:
+            return []
+
+        project_ids = [p.id for p in projects]
+        project_info_dtos = ProjectInfo.get_dtos_for_locale(
+            [(p.id, p.default_locale) for p in projects], preferred_locale
+        )
+        active_mappers = Project.get_active_mappers_for_projects(project_ids)
+        campaigns = Project.get_campaigns_for_projects(project_ids)
+        contrib_counts = ProjectSearchService.get_total_contributions(projects)
 
-        # We need to make a join to return projects without contributors.
-        project_contributors_count = (
-            Project.query.with_entities(
-                Project.id, func.count(distinct(TaskHistory.user_id)).label("total")
-            )
-            .filter(Project.id.in_(paginated_projects_ids))
-            .outerjoin(
-                TaskHistory,
-                and_(
-                    TaskHistory.project_id == Project.id,
-                    TaskHistory.action != "COMMENT",
-                ),
+        return [
+            ProjectSearchService.create_result_dto(
+                p,
+                preferred_locale,
+                total_contributors,
+                project_info_dtos[p.id],
+                active_mappers[p.id],
+                campaigns[p.id],
             )
-            .group_by(Project.id)
-            .all()
-        )
+            for p, total_contributors in zip(projects, contrib_counts)
+        ]
+
+    @staticmethod
+    def get_total_contributions(paginated_results):
+        paginated_projects_ids = [p.id for p in paginated_results]
+        totals = ProjectActivityStats.get_total_contributors(paginated_projects_ids)
 
-        return [p.total for p in project_contributors_count]
+        # Keep the counts in the same order as the projects that were passed in.
+        return [totals[project_id] for project_id in paginated_projects_ids]
 
     @staticmethod
-    @cached(search_cache)
+    @cached(
+        "search",
+        key=search_cache_key,
+        ttl=300,
+        projects=lambda dto: [result.project_id for result in dto.results],
+    )
     def search_projects(search_dto: ProjectSearchDTO, user) -> ProjectSearchResultsDTO:
         """Searches all projects for matches to the criteria provided by the user"""
         all_results, paginated_results = ProjectSearchService._filter_projects(
             search_dto, user
         )
-        if paginated_results.total == 0:
+        if not paginated_results.items:
             raise NotFound()
 
         dto = ProjectSearchResultsDTO()
-        dto.results = [
-            ProjectSearchService.create_result_dto(
-                p,
-                search_dto.preferred_locale,
-                Project.get_project_total_contributions(p[0]),
-            )
-            for p in paginated_results.items
-        ]
+        dto.results = ProjectSearchService.create_result_dtos(
+            paginated_results.items, search_dto.preferred_locale
+        )
         dto.pagination = Pagination(paginated_results)
         if search_dto.omit_map_results:
             return dto
@@ -339,11 +410,15 @@ class ProjectSearchService:
             created_lte = validate_date_input(search_dto.created_lte)
             query = query.filter(Project.created <= created_lte)
 
-        order_by = search_dto.order_by
-        if search_dto.order_by_type == "DESC":
-            order_by = desc(search_dto.order_by)
+        if search_dto.cursor is not None:
+            sort_keys = ProjectSearchService.get_sort_keys(search_dto.order_by)
+            query = query.distinct(*[key.sort_expression for key in sort_keys])
+        else:
+            order_by = search_dto.order_by
+            if search_dto.order_by_type == "DESC":
+                order_by = desc(search_dto.order_by)
 
-        query = query.order_by(order_by).distinct(search_dto.order_by, Project.id)
+            query = query.order_by(order_by).distinct(search_dto.order_by, Project.id)
 
         if search_dto.managed_by and user.role != UserRole.ADMIN.value:
             # Get all the projects associated with the user and team.
@@ -377,10 +452,51 @@ class ProjectSearchService:
             query_result.add_column(Project.priority)
             all_results = query_result.all()
 
-        paginated_results = query.paginate(search_dto.page, 14, True)
+        count_key = None
+        if search_dto.count == COUNT_CACHED:
+            count_key = search_count_key(search_dto, user)
+        if search_dto.cursor is not None:
+            paginated_results = PaginationService.paginate_keyset(
+                query,
+                sort_keys,
+                search_dto.cursor,
+                14,
+                descending=search_dto.order_by_type == "DESC",
+                sort_name=f"{search_dto.order_by} {search_dto.order_by_type}",
+                count=search_dto.count,
+                cache_key=count_key,
+                cache_ttl=SEARCH_COUNT_TTL,
+            )
+        else:
+            paginated_results = PaginationService.paginate(
+                query,
+                search_dto.page,
+                14,
+                count=search_dto.count,
+                cache_key=count_key,
+                cache_ttl=SEARCH_COUNT_TTL,
+            )
 
         return all_results, paginated_results
 
+    @staticmethod
+    def get_sort_keys(order_by: str) -> list:
+        """ Gets the keys projects are sorted on in cursor pagination, ties broken by project id """
+        if order_by not in SEARCH_SORT_COLUMNS:
+            raise PaginationServiceError(f"InvalidSort- Unable to sort by {order_by}")
+
+        sort_keys = [SortKey(Project.id, lambda row: row.id)]
+        if order_by != "id":
+            column = getattr(Project, order_by)
+            null_value = SEARCH_SORT_COLUMNS[order_by]
+            if null_value is not None:
+                null_value = literal(null_value, type_=column.type)
+            sort_keys.insert(
+                0,
+                SortKey(column, lambda row: getattr(row, order_by), null_value),
+            )
+        return sort_keys
+
     @staticmethod
     def filter_by_user_permission(query, user, permission: str):
         """Filter projects a user can map or validate, based on their permissions."""
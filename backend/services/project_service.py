@@ -1,8 +1,12 @@
-import threading
-from cachetools import TTLCache, cached
+import datetime
+import json
 from flask import current_app
 
-from backend.models.dtos.mapping_dto import TaskDTOs
+from backend.models.dtos.mapping_dto import (
+    TaskDTOs,
+    TaskStateChangesDTO,
+    TaskStateDTO,
+)
 from backend.models.dtos.project_dto import (
     ProjectDTO,
     ProjectSummary,
@@ -15,6 +19,7 @@ from backend.models.dtos.project_dto import (
 from backend.models.postgis.organisation import Organisation
 from backend.models.postgis.project_info import ProjectInfo
 from backend.models.postgis.project import Project, ProjectStatus
+from backend.models.postgis.project_activity import ProjectContribsSnapshot
 from backend.models.postgis.statuses import (
     MappingNotAllowed,
     ValidatingNotAllowed,
@@ -23,18 +28,33 @@ from backend.models.postgis.statuses import (
     TeamRoles,
     EncouragingEmailType,
     MappingLevel,
+    TaskStatus,
 )
 from backend.models.postgis.task import Task, TaskHistory
 from backend.models.postgis.utils import NotFound
-from backend.services.messaging.smtp_service import SMTPService
+from backend.services.job_service import JobService
 from backend.services.users.user_service import UserService
 from backend.services.project_search_service import ProjectSearchService
 from backend.services.project_admin_service import ProjectAdminService
 from backend.services.team_service import TeamService
-from sqlalchemy import func, or_
+from backend.services.cache_service import CacheService, cached
+from sqlalchemy import desc, func, or_
 from sqlalchemy.sql.expression import true
 
-summary_cache = TTLCache(maxsize=1024, ttl=600)
+
+def project_cache_key(project_id: int, *args, **kwargs):
+    """Project entries are kept until the project or one of its tasks changes"""
+    return (
+        project_id,
+        args,
+        sorted(kwargs.items()),
+        CacheService.get_project_version(project_id),
+    )
+
+
+def tile_cache_key(project_id: int, zoom: int, x: int, y: int, etag: str = None):
+    """Tiles are kept until a task of the project changes, which their ETag follows"""
+    return etag or ProjectService.get_project_tasks_tile_etag(project_id, zoom, x, y)
 
 
 class ProjectServiceError(Exception):
@@ -70,8 +90,22 @@ class ProjectService:
         return project
 
     @staticmethod
-    def auto_unlock_tasks(project_id: int):
-        Task.auto_unlock_tasks(project_id)
+    def auto_unlock_tasks(project_id: int) -> dict:
+        return Task.auto_unlock_tasks(project_id)
+
+    @staticmethod
+    def auto_unlock_tasks_async(project_id: int, interval: int = 60):
+        """
+        Queues a job releasing the expired locks of a project, so requests don't wait on it. Each worker
+        queues it at most once per interval seconds for each project, and never while it's already queued
+        """
+        cache = CacheService.get_backend()
+        key = CacheService.make_key("auto_unlock", project_id)
+        if cache.get(key):
+            return
+        cache.set(key, True, interval)
+
+        JobService.enqueue_once("auto_unlock_tasks", project_id=project_id)
 
     @staticmethod
     def delete_tasks(project_id: int, tasks_ids):
@@ -92,11 +126,72 @@ class ProjectService:
 
     @staticmethod
     def get_contribs_by_day(project_id: int) -> ProjectContribsDTO:
+        """
+        Gets the contributions of a project by day. When many state changes had to be replayed,
+        a job is queued to snapshot the timeline up to yesterday, so later requests replay the newer ones only
+        """
         # Validate that project exists
         project = ProjectService.get_project_by_id(project_id)
 
-        # Fetch all state change with date and task ID
-        stats = (
+        stats, events, _, _ = ProjectService._replay_contribs(project_id)
+        min_events = current_app.config["CONTRIBS_SNAPSHOT_MIN_EVENTS"]
+        if min_events > 0 and events >= min_events:
+            JobService.enqueue_once("save_contribs_snapshot", project_id=project_id)
+
+        contribs_dto = ProjectContribsDTO()
+        contribs_dto.stats = [
+            ProjectContribDTO(
+                {
+                    "date": date,
+                    "mapped": mapped,
+                    "validated": validated,
+                    "cumulative_mapped": cumulative_mapped,
+                    "cumulative_validated": cumulative_validated,
+                    "total_tasks": project.total_tasks,
+                }
+            )
+            for date, mapped, validated, cumulative_mapped, cumulative_validated in stats
+        ]
+
+        return contribs_dto
+
+    @staticmethod
+    def save_contribs_snapshot(project_id: int):
+        """ Snapshots the contributions timeline of a project up to yesterday, run as a background job """
+        _, _, past_tasks, past_stats = ProjectService._replay_contribs(project_id)
+        ProjectContribsSnapshot.save(
+            project_id,
+            datetime.datetime.utcnow().date() - datetime.timedelta(days=1),
+            past_tasks["MAPPED"],
+            past_tasks["VALIDATED"],
+            past_tasks["INVALIDATED"],
+            [[s[0].isoformat()] + s[1:] for s in past_stats],
+        )
+
+    @staticmethod
+    def _replay_contribs(project_id: int):
+        """
+        Replays the state changes of a project into its contributions timeline, resuming from its snapshot
+        :returns: the stats of every day with changes, the number of state changes replayed, and the task
+                  states and stats up to yesterday, which won't change anymore
+        """
+        # Resume from the snapshot of the project if there is one, only replaying newer state changes
+        snapshot = ProjectContribsSnapshot.query.get(project_id)
+        if snapshot is not None:
+            tasks = {
+                "MAPPED": set(snapshot.mapped_tasks),
+                "VALIDATED": set(snapshot.validated_tasks),
+                "INVALIDATED": set(snapshot.invalidated_tasks),
+            }
+            stats = [
+                [datetime.date.fromisoformat(s[0])] + s[1:] for s in snapshot.stats
+            ]
+        else:
+            tasks = {"MAPPED": set(), "VALIDATED": set(), "INVALIDATED": set()}
+            stats = []
+
+        # Fetch state changes with date and task ID, sorted by day and most recent action first
+        query = (
             TaskHistory.query.with_entities(
                 TaskHistory.action_text.label("action_text"),
                 func.DATE(TaskHistory.action_date).label("day"),
@@ -112,98 +207,80 @@ class ProjectService:
                 ),
             )
             .group_by("action_text", "day", "task_id")
-            .order_by("day")
-        ).all()
-
-        contribs_dto = ProjectContribsDTO()
-        # Filter and store unique dates
-        dates = list(set(r[1] for r in stats))
-        dates.sort(
-            reverse=False
-        )  # Why was this reversed? To have the dates in ascending order
-        dates_list = []
-        cumulative_mapped = 0
-        cumulative_validated = 0
-        # A hashmap to track task state change updates
-        tasks = {
-            "MAPPED": {"total": 0},
-            "VALIDATED": {"total": 0},
-            "INVALIDATED": {"total": 0},
-        }
-
-        for date in dates:
-            dto = ProjectContribDTO(
-                {
-                    "date": date,
-                    "mapped": 0,
-                    "validated": 0,
-                    "total_tasks": project.total_tasks,
-                }
+            .order_by("day", desc("action_text"), desc("task_id"))
+        )
+        if snapshot is not None:
+            query = query.filter(
+                TaskHistory.action_date
+                >= datetime.datetime.combine(
+                    snapshot.day + datetime.timedelta(days=1), datetime.time()
+                )
             )
-            # s -> ('LOCKED_FOR_MAPPING', datetime.date(2019, 4, 23), 1)
-            # s[0] -> action, s[1] -> date, s[2] -> task_id
-            values = [(s[0], s[2]) for s in stats if date == s[1]]
-            values.sort(reverse=True)  # Most recent action comes first
-            for val in values:
-                task_id = val[1]
-                task_status = val[0]
-
-                if task_status == "MAPPED":
-                    if task_id not in tasks["MAPPED"]:
-                        tasks["MAPPED"][task_id] = 1
-                        tasks["MAPPED"]["total"] += 1
-                        dto.mapped += 1
-                elif task_status == "VALIDATED":
-                    if task_id not in tasks["VALIDATED"]:
-                        tasks["VALIDATED"][task_id] = 1
-                        tasks["VALIDATED"]["total"] += 1
-                        dto.validated += 1
-                        if task_id in tasks["INVALIDATED"]:
-                            del tasks["INVALIDATED"][task_id]
-                            tasks["INVALIDATED"]["total"] -= 1
-                        if task_id not in tasks["MAPPED"]:
-                            tasks["MAPPED"][task_id] = 1
-                            tasks["MAPPED"]["total"] += 1
-                            dto.mapped += 1
-                else:
-                    if task_id not in tasks["INVALIDATED"]:
-                        tasks["INVALIDATED"][task_id] = 1
-                        tasks["INVALIDATED"]["total"] += 1
-                        if task_id in tasks["MAPPED"]:
-                            del tasks["MAPPED"][task_id]
-                            tasks["MAPPED"]["total"] -= 1
-                            if dto.mapped > 0:
-                                dto.mapped -= 1
-                        if task_id in tasks["VALIDATED"]:
-                            del tasks["VALIDATED"][task_id]
-                            tasks["VALIDATED"]["total"] -= 1
-                            if dto.validated > 0:
-                                dto.validated -= 1
-
-                cumulative_mapped = tasks["MAPPED"]["total"]
-                cumulative_validated = tasks["VALIDATED"]["total"]
-                dto.cumulative_mapped = cumulative_mapped
-                dto.cumulative_validated = cumulative_validated
-            dates_list.append(dto)
-
-        contribs_dto.stats = dates_list
 
-        return contribs_dto
+        # Days before today won't change anymore, so their state can be kept in a new snapshot
+        today = datetime.datetime.utcnow().date()
+        past_tasks = None
+        events = 0
+        day_stats = None
+        for task_status, date, task_id in query.yield_per(10000):
+            events += 1
+            if day_stats is None or day_stats[0] != date:
+                if date >= today and past_tasks is None:
+                    past_tasks = {k: set(v) for k, v in tasks.items()}
+                    past_stats = len(stats)
+                # [date, mapped, validated, cumulative mapped, cumulative validated]
+                day_stats = [date, 0, 0, 0, 0]
+                stats.append(day_stats)
+
+            if task_status == "MAPPED":
+                if task_id not in tasks["MAPPED"]:
+                    tasks["MAPPED"].add(task_id)
+                    day_stats[1] += 1
+            elif task_status == "VALIDATED":
+                if task_id not in tasks["VALIDATED"]:
+                    tasks["VALIDATED"].add(task_id)
+                    day_stats[2] += 1
+                    tasks["INVALIDATED"].discard(task_id)
+                    if task_id not in tasks["MAPPED"]:
+                        tasks["MAPPED"].add(task_id)
+                        day_stats[1] += 1
+            else:
+                if task_id not in tasks["INVALIDATED"]:
+                    tasks["INVALIDATED"].add(task_id)
+                    if task_id in tasks["MAPPED"]:
+                        tasks["MAPPED"].remove(task_id)
+                        if day_stats[1] > 0:
+                            day_stats[1] -= 1
+                    if task_id in tasks["VALIDATED"]:
+                        tasks["VALIDATED"].remove(task_id)
+                        if day_stats[2] > 0:
+                            day_stats[2] -= 1
+
+            day_stats[3] = len(tasks["MAPPED"])
+            day_stats[4] = len(tasks["VALIDATED"])
+
+        if past_tasks is None:
+            past_tasks = tasks
+            past_stats = len(stats)
+        return stats, events, past_tasks, stats[:past_stats]
 
     @staticmethod
     def get_project_dto_for_mapper(
-        project_id, current_user_id, locale="en", abbrev=False
+        project_id, current_user_id, locale="en", abbrev=False, include_tasks=True
     ) -> ProjectDTO:
         """
         Get the project DTO for mappers
         :param project_id: ID of the Project mapper has requested
         :param locale: Locale the mapper has requested
+        :param include_tasks: False leaves the tasks out of the DTO
         :raises ProjectServiceError, NotFound
         """
         project = ProjectService.get_project_by_id(project_id)
         # if project is public and is not draft, we don't need to check permissions
         if not project.private and not project.status == ProjectStatus.DRAFT.value:
-            return project.as_dto_for_mapping(current_user_id, locale, abbrev)
+            return project.as_dto_for_mapping(
+                current_user_id, locale, abbrev, include_tasks
+            )
 
         is_allowed_user = True
         is_team_member = None
@@ -250,7 +327,9 @@ class ProjectService:
                 )
 
         if is_allowed_user or is_manager_permission or is_team_member:
-            return project.as_dto_for_mapping(current_user_id, locale, abbrev)
+            return project.as_dto_for_mapping(
+                current_user_id, locale, abbrev, include_tasks
+            )
         else:
             return None
 
@@ -265,6 +344,115 @@ class ProjectService:
         project = ProjectService.get_project_by_id(project_id)
         return project.tasks_as_geojson(task_ids_str, order_by, order_by_type, status)
 
+    @staticmethod
+    def get_project_tasks_stream(
+        project_id,
+        task_ids_str: str,
+        order_by: str = None,
+        order_by_type: str = "ASC",
+        status: int = None,
+        limit: int = None,
+        min_effort: float = None,
+        max_effort: float = None,
+    ):
+        """
+        Streaming version of get_project_tasks, returning the tasks geojson as encoded chunks
+        :raises NotFound
+        """
+        project = ProjectService.get_project_by_id(project_id)
+        return project.tasks_as_geojson_stream(
+            task_ids_str,
+            order_by,
+            order_by_type,
+            status,
+            limit=limit,
+            min_effort=min_effort,
+            max_effort=max_effort,
+        )
+
+    @staticmethod
+    def get_task_state_changes(
+        project_id: int, since: int = None
+    ) -> TaskStateChangesDTO:
+        """
+        Gets the status, locker and mapper of the tasks of a project changed since a cursor, so task maps
+        can be refreshed without fetching every task again
+        :param since: Cursor of a previous response, None to get all tasks
+        :raises NotFound
+        """
+        ProjectService.get_project_by_id(project_id)
+        cursor, tasks = Task.get_state_changes(project_id, since)
+
+        changes_dto = TaskStateChangesDTO()
+        changes_dto.cursor = cursor
+        changes_dto.tasks = [
+            TaskStateDTO(
+                dict(
+                    task_id=task.id,
+                    task_status=TaskStatus(task.task_status).name,
+                    locked_by=task.locked_by,
+                    mapped_by=task.mapped_by,
+                )
+            )
+            for task in tasks
+        ]
+        return changes_dto
+
+    @staticmethod
+    @cached("project_tasks_tile", key=tile_cache_key, ttl=600)
+    def get_project_tasks_tile(
+        project_id: int, zoom: int, x: int, y: int, etag: str = None
+    ) -> bytes:
+        """
+        Gets the tasks of a project within a web mercator tile as a Mapbox Vector Tile, cached until one of
+        its tasks changes
+        :param etag: ETag of the tile if already known, saves reading it again
+        :raises NotFound
+        """
+        ProjectService.get_project_by_id(project_id)
+        return Task.get_tasks_as_mvt(project_id, zoom, x, y)
+
+    @staticmethod
+    def get_project_tasks_tile_etag(project_id: int, zoom: int, x: int, y: int) -> str:
+        """
+        ETag of a tile of the tasks of a project, changing whenever one of its tasks does. It is read from the
+        database rather than the cache versions, which are private to each worker with the local backend
+        """
+        return CacheService.make_key(
+            "project_tasks_tile",
+            project_id,
+            zoom,
+            x,
+            y,
+            Task.get_tiles_version(project_id),
+        )
+
+    @staticmethod
+    def get_project_stream_for_mapper(project_id, current_user_id, locale="en"):
+        """
+        Get the full project DTO for mappers as encoded JSON chunks, streaming the task geometries
+        straight from the database
+        :raises ProjectServiceError, NotFound
+        :return: generator of JSON chunks or None if the user isn't allowed to see the project
+        """
+        project_dto = ProjectService.get_project_dto_for_mapper(
+            project_id, current_user_id, locale, abbrev=False, include_tasks=False
+        )
+        if project_dto is None:
+            return None
+
+        tasks = Task.get_tasks_as_geojson_stream(project_id)
+        return ProjectService._stream_with_tasks(project_dto.to_primitive(), tasks)
+
+    @staticmethod
+    def _stream_with_tasks(project: dict, tasks):
+        """ Writes the tasks chunks into the JSON of the project """
+        project_json = json.dumps(project)
+        yield project_json[:-1].encode("utf-8")
+        yield b', "tasks": ' if project else b'"tasks": '
+        yield from tasks
+        yield b"}"
+
     @staticmethod
     def get_project_aoi(project_id):
         project = ProjectService.get_project_by_id(project_id)
@@ -478,7 +666,7 @@ class ProjectService:
         return True, "User allowed to validate"
 
     @staticmethod
-    @cached(summary_cache)
+    @cached("project_summary", key=project_cache_key, ttl=600)
     def get_project_summary(
         project_id: int, preferred_locale: str = "en"
     ) -> ProjectSummary:
@@ -504,15 +692,10 @@ class ProjectService:
         query = ProjectSearchService.create_search_query()
         projects = query.filter(Project.featured == true()).group_by(Project.id).all()
 
-        # Get total contributors.
-        contrib_counts = ProjectSearchService.get_total_contributions(projects)
-        zip_items = zip(projects, contrib_counts)
-
         dto = ProjectSearchResultsDTO()
-        dto.results = [
-            ProjectSearchService.create_result_dto(p, preferred_locale, t)
-            for p, t in zip_items
-        ]
+        dto.results = ProjectSearchService.create_result_dtos(
+            projects, preferred_locale
+        )
 
         return dto
 
@@ -539,7 +722,7 @@ class ProjectService:
         return project.get_project_title(preferred_locale)
 
     @staticmethod
-    @cached(TTLCache(maxsize=1024, ttl=600))
+    @cached("project_stats", key=project_cache_key, ttl=600)
     def get_project_stats(project_id: int) -> ProjectStatsDTO:
         """Gets the project stats DTO"""
         project = ProjectService.get_project_by_id(project_id)
@@ -595,12 +778,10 @@ class ProjectService:
                 project_id, project.default_locale
             ).name
             project.progress_email_sent = True
-            threading.Thread(
-                target=SMTPService.send_email_to_contributors_on_project_progress,
-                args=(
-                    email_type,
-                    project_id,
-                    project_title,
-                    project_completion,
-                ),
-            ).start()
+            JobService.enqueue(
+                "send_email_to_contributors_on_project_progress",
+                email_type=email_type,
+                project_id=project_id,
+                project_name=project_title,
+                project_completion=project_completion,
+            )
@@ -1,8 +1,6 @@
-from cachetools import TTLCache, cached
 from datetime import date, timedelta
-from sqlalchemy import func, desc, cast, extract, or_, tuple_
+from sqlalchemy import func, desc, or_, and_
 from sqlalchemy.sql.functions import coalesce
-from sqlalchemy.types import Time
 
 from backend import db
 from backend.models.dtos.stats_dto import (
@@ -24,19 +22,35 @@ from backend.models.dtos.stats_dto import (
 
 from backend.models.dtos.project_dto import ProjectSearchResultsDTO
 from backend.models.postgis.campaign import Campaign, campaign_projects
+from backend.models.postgis.global_stats import (
+    CampaignStats,
+    GlobalStats,
+    OrganisationStats,
+)
 from backend.models.postgis.organisation import Organisation
 from backend.models.postgis.project import Project
+from backend.models.postgis.project_activity import (
+    ProjectActivityStats,
+    ProjectLockActivity,
+    TaskLastAction,
+    TaskStatsDaily,
+)
 from backend.models.postgis.statuses import TaskStatus, MappingLevel, UserGender
 from backend.models.postgis.task import TaskHistory, User, Task, TaskAction
 from backend.models.postgis.utils import timestamp, NotFound  # noqa: F401
+from backend.services.cache_service import CacheService
+from backend.services.pagination_service import (
+    COUNT_CACHED,
+    COUNT_EXACT,
+    PaginationService,
+    SortKey,
+)
 from backend.services.project_service import ProjectService
 from backend.services.project_search_service import ProjectSearchService
 from backend.services.users.user_service import UserService
 from backend.services.organisation_service import OrganisationService
 from backend.services.campaign_service import CampaignService
 
-homepage_stats_cache = TTLCache(maxsize=4, ttl=30)
-
 
 class StatsService:
     @staticmethod
@@ -116,13 +130,19 @@ class StatsService:
         return project, user
 
     @staticmethod
-    def get_latest_activity(project_id: int, page: int) -> ProjectActivityDTO:
-        """ Gets all the activity on a project """
+    def get_latest_activity(
+        project_id: int, page: int, cursor: str = None, count: str = COUNT_EXACT
+    ) -> ProjectActivityDTO:
+        """
+        Gets all the activity on a project, by page number or, if a cursor is supplied, by cursor
+        :param cursor: cursor returned with the previous page, empty for the first page
+        :param count: how the total of activities is counted
+        """
 
         if not ProjectService.exists(project_id):
             raise NotFound
 
-        results = (
+        query = (
             db.session.query(
                 TaskHistory.id,
                 TaskHistory.task_id,
@@ -136,9 +156,37 @@ class StatsService:
                 TaskHistory.project_id == project_id,
                 TaskHistory.action != TaskAction.COMMENT.name,
             )
-            .order_by(TaskHistory.action_date.desc())
-            .paginate(page, 10, True)
         )
+        count_key = None
+        if count == COUNT_CACHED:
+            # Project versions are bumped whenever a task of the project changes
+            count_key = CacheService.make_key(
+                "activity-count",
+                project_id,
+                CacheService.get_project_version(project_id),
+            )
+        if cursor is not None:
+            results = PaginationService.paginate_keyset(
+                query,
+                [
+                    SortKey(TaskHistory.action_date, lambda row: row.action_date),
+                    SortKey(TaskHistory.id, lambda row: row.id),
+                ],
+                cursor,
+                10,
+                descending=True,
+                sort_name="-action_date",
+                count=count,
+                cache_key=count_key,
+            )
+        else:
+            results = PaginationService.paginate(
+                query.order_by(TaskHistory.action_date.desc()),
+                page,
+                10,
+                count,
+                cache_key=count_key,
+            )
 
         activity_dto = ProjectActivityDTO()
         for item in results.items:
@@ -158,73 +206,48 @@ class StatsService:
     def get_popular_projects() -> ProjectSearchResultsDTO:
         """ Get all projects ordered by task_history """
 
-        rate_func = func.count(TaskHistory.user_id) / extract(
-            "epoch", func.sum(cast(TaskHistory.action_date, Time))
+        rate_func = func.sum(ProjectLockActivity.lock_count) / func.nullif(
+            func.sum(ProjectLockActivity.lock_seconds), 0
         )
 
         query = (
-            TaskHistory.query.with_entities(
-                TaskHistory.project_id.label("id"), rate_func.label("rate")
-            )
-            .filter(TaskHistory.action_date >= date.today() - timedelta(days=90))
-            .filter(
-                or_(
-                    TaskHistory.action == TaskAction.LOCKED_FOR_MAPPING.name,
-                    TaskHistory.action == TaskAction.LOCKED_FOR_VALIDATION.name,
-                )
+            ProjectLockActivity.query.with_entities(
+                ProjectLockActivity.project_id.label("id"), rate_func.label("rate")
             )
-            .filter(TaskHistory.action_text is not None)
-            .filter(TaskHistory.action_text != "")
-            .group_by(TaskHistory.project_id)
-            .order_by(desc("rate"))
+            .filter(ProjectLockActivity.day >= date.today() - timedelta(days=90))
+            .group_by(ProjectLockActivity.project_id)
+            .order_by(desc("rate").nullslast())
             .limit(10)
             .subquery()
         )
 
         projects_query = ProjectSearchService.create_search_query()
         projects = projects_query.filter(Project.id == query.c.id).all()
-        # Get total contributors.
-        contrib_counts = ProjectSearchService.get_total_contributions(projects)
-        zip_items = zip(projects, contrib_counts)
-
         dto = ProjectSearchResultsDTO()
-        dto.results = [
-            ProjectSearchService.create_result_dto(p, "en", t) for p, t in zip_items
-        ]
+        dto.results = ProjectSearchService.create_result_dtos(projects, "en")
 
         return dto
 
     @staticmethod
     def get_last_activity(project_id: int) -> ProjectLastActivityDTO:
         """ Gets the last activity for a project's tasks """
-        sq = (
-            TaskHistory.query.with_entities(
-                TaskHistory.task_id,
-                TaskHistory.action_date,
-                TaskHistory.user_id,
-            )
-            .filter(TaskHistory.project_id == project_id)
-            .filter(TaskHistory.action != TaskAction.COMMENT.name)
-            .order_by(TaskHistory.task_id, TaskHistory.action_date.desc())
-            .distinct(TaskHistory.task_id)
-            .subquery()
-        )
-
-        sq_statuses = (
-            Task.query.with_entities(Task.id, Task.task_status)
-            .filter(Task.project_id == project_id)
-            .subquery()
-        )
         results = (
             db.session.query(
-                sq_statuses.c.id,
-                sq.c.action_date,
-                sq_statuses.c.task_status,
+                Task.id,
+                TaskLastAction.action_date,
+                Task.task_status,
                 User.username,
             )
-            .outerjoin(sq, sq.c.task_id == sq_statuses.c.id)
-            .outerjoin(User, User.id == sq.c.user_id)
-            .order_by(sq_statuses.c.id)
+            .outerjoin(
+                TaskLastAction,
+                and_(
+                    TaskLastAction.project_id == Task.project_id,
+                    TaskLastAction.task_id == Task.id,
+                ),
+            )
+            .outerjoin(User, User.id == TaskLastAction.user_id)
+            .filter(Task.project_id == project_id)
+            .order_by(Task.id)
             .all()
         )
 
@@ -326,111 +349,55 @@ class StatsService:
         return contrib_dto
 
     @staticmethod
-    @cached(homepage_stats_cache)
     def get_homepage_stats(abbrev=True) -> HomePageStatsDTO:
         """ Get overall TM stats to give community a feel for progress that's being made """
+        stats = GlobalStats.get()
         dto = HomePageStatsDTO()
-        dto.total_projects = Project.query.with_entities(
-            func.count(Project.id)
-        ).scalar()
+        dto.total_projects = stats.total_projects
         dto.mappers_online = (
             Task.query.with_entities(func.count(Task.locked_by.distinct()))
             .filter(Task.locked_by.isnot(None))
             .scalar()
         )
-        dto.total_mappers = User.query.with_entities(func.count(User.id)).scalar()
-        dto.tasks_mapped = (
-            Task.query.with_entities(func.count())
-            .filter(
-                Task.task_status.in_(
-                    (TaskStatus.MAPPED.value, TaskStatus.VALIDATED.value)
-                )
-            )
-            .scalar()
-        )
+        dto.total_mappers = stats.total_mappers
+        dto.tasks_mapped = stats.tasks_mapped
         if not abbrev:
-            dto.total_validators = (
-                Task.query.filter(Task.task_status == TaskStatus.VALIDATED.value)
-                .distinct(Task.validated_by)
-                .count()
-            )
-            dto.tasks_validated = Task.query.filter(
-                Task.task_status == TaskStatus.VALIDATED.value
-            ).count()
-
-            dto.total_area = Project.query.with_entities(
-                func.coalesce(func.sum(func.ST_Area(Project.geometry, True) / 1000000))
-            ).scalar()
-
-            dto.total_mapped_area = (
-                Task.query.with_entities(
-                    func.coalesce(func.sum(func.ST_Area(Task.geometry, True) / 1000000))
-                )
-                .filter(Task.task_status == TaskStatus.MAPPED.value)
-                .scalar()
-            )
-
-            dto.total_validated_area = (
-                Task.query.with_entities(
-                    func.coalesce(func.sum(func.ST_Area(Task.geometry, True) / 1000000))
-                )
-                .filter(Task.task_status == TaskStatus.VALIDATED.value)
-                .scalar()
-            )
-
-            unique_campaigns = Campaign.query.with_entities(
-                func.count(Campaign.id)
-            ).scalar()
+            dto.total_validators = stats.total_validators
+            dto.tasks_validated = stats.tasks_validated
+            dto.total_area = stats.total_area
+            dto.total_mapped_area = stats.total_mapped_area
+            dto.total_validated_area = stats.total_validated_area
 
+            campaign_stats = CampaignStats.totals()
             linked_campaigns_count = (
-                Campaign.query.join(
-                    campaign_projects, Campaign.id == campaign_projects.c.campaign_id
-                )
-                .with_entities(
-                    Campaign.name, func.count(campaign_projects.c.campaign_id)
-                )
-                .group_by(Campaign.id)
+                db.session.query(Campaign.name, campaign_stats.c.total_projects)
+                .join(campaign_stats, campaign_stats.c.campaign_id == Campaign.id)
+                .filter(campaign_stats.c.total_projects > 0)
                 .all()
             )
-
-            subquery = (
-                db.session.query(campaign_projects.c.project_id.distinct())
-                .order_by(campaign_projects.c.project_id)
-                .subquery()
-            )
-            no_campaign_count = (
-                Project.query.with_entities(func.count())
-                .filter(~Project.id.in_(subquery))
-                .scalar()
-            )
+            linked_projects = db.session.query(
+                func.count(campaign_projects.c.project_id.distinct())
+            ).scalar()
+            no_campaign_count = stats.total_projects - linked_projects
             dto.campaigns = [CampaignStatsDTO(row) for row in linked_campaigns_count]
             if no_campaign_count:
                 dto.campaigns.append(
                     CampaignStatsDTO(("Unassociated", no_campaign_count))
                 )
 
-            dto.total_campaigns = unique_campaigns
-            unique_orgs = Organisation.query.with_entities(
-                func.count(Organisation.id)
-            ).scalar()
+            dto.total_campaigns = stats.total_campaigns
 
+            organisation_stats = OrganisationStats.totals()
             linked_orgs_count = (
-                db.session.query(Organisation.name, func.count(Project.organisation_id))
-                .join(Project.organisation)
-                .group_by(Organisation.id)
+                db.session.query(Organisation.name, organisation_stats.c.total_projects)
+                .join(
+                    organisation_stats,
+                    organisation_stats.c.organisation_id == Organisation.id,
+                )
+                .filter(organisation_stats.c.total_projects > 0)
                 .all()
             )
-
-            subquery = (
-                db.session.query(Project.organisation_id.distinct())
-                .order_by(Project.organisation_id)
-                .subquery()
-            )
-            no_org_project_count = (
-                Organisation.query.with_entities(func.count())
-                .filter(~Organisation.id.in_(subquery))
-                .scalar()
-            )
+            no_org_project_count = stats.total_organisations - len(linked_orgs_count)
             dto.organisations = [
                 OrganizationListStatsDTO(row) for row in linked_orgs_count
             ]
@@ -441,7 +408,7 @@ class StatsService:
                 )
                 dto.organisations.append(no_org_proj)
 
-            dto.total_organisations = unique_orgs
+            dto.total_organisations = stats.total_organisations
         else:
             # Clear null attributes for abbreviated call
             clear_attrs = [
@@ -484,6 +451,16 @@ class StatsService:
         ).count()
         project.save()
 
+    @staticmethod
+    def rebuild_activity_stats(project_id: int = None):
+        """Recomputes the project activity rollups from the full task history"""
+        ProjectActivityStats.rebuild(project_id)
+
+    @staticmethod
+    def reconcile_global_stats() -> dict:
+        """Recomputes the homepage statistics, returning the counters the triggers let drift"""
+        return GlobalStats.reconcile()
+
     @staticmethod
     def get_all_users_statistics(start_date: date, end_date: date):
         users = User.query.filter(
@@ -540,38 +517,12 @@ class StatsService:
     ):
         """ Creates tasks stats for a period using the TaskStatsDTO """
 
-        query = (
-            db.session.query(
-                TaskHistory.task_id,
-                TaskHistory.project_id,
-                TaskHistory.action_text,
-                func.DATE(TaskHistory.action_date).label("day"),
-            )
-            .distinct(
-                tuple_(
-                    TaskHistory.project_id, TaskHistory.task_id, TaskHistory.action_text
-                )
-            )
-            .filter(
-                TaskHistory.action == "STATE_CHANGE",
-                or_(
-                    TaskHistory.action_text == "MAPPED",
-                    TaskHistory.action_text == "VALIDATED",
-                    TaskHistory.action_text == "BADIMAGERY",
-                ),
-            )
-            .order_by(
-                TaskHistory.project_id,
-                TaskHistory.task_id,
-                TaskHistory.action_text,
-                TaskHistory.action_date,
-            )
-        )
-
+        # Resolve the filters to the projects they select, stats are then read from the daily rollup
+        projects = db.session.query(Project.id)
+        filter_projects = False
         if org_id:
-            query = query.join(Project, Project.id == TaskHistory.project_id).filter(
-                Project.organisation_id == org_id
-            )
+            projects = projects.filter(Project.organisation_id == org_id)
+            filter_projects = True
         if org_name:
             try:
                 organisation_id = OrganisationService.get_organisation_by_name(
@@ -579,88 +530,43 @@ class StatsService:
                 ).id
             except NotFound:
                 organisation_id = None
-            query = query.join(Project, Project.id == TaskHistory.project_id).filter(
-                Project.organisation_id == organisation_id
-            )
+            projects = projects.filter(Project.organisation_id == organisation_id)
+            filter_projects = True
         if campaign:
             try:
                 campaign_id = CampaignService.get_campaign_by_name(campaign).id
             except NotFound:
                 campaign_id = None
-            query = query.join(
-                campaign_projects,
-                campaign_projects.c.project_id == TaskHistory.project_id,
+            projects = projects.join(
+                campaign_projects, campaign_projects.c.project_id == Project.id
             ).filter(campaign_projects.c.campaign_id == campaign_id)
+            filter_projects = True
         if project_id:
-            query = query.filter(TaskHistory.project_id.in_(project_id))
+            projects = projects.filter(Project.id.in_(project_id))
+            filter_projects = True
         if country:
             # Unnest country column array.
             sq = Project.query.with_entities(
                 Project.id, func.unnest(Project.country).label("country")
             ).subquery()
-
-            query = query.filter(sq.c.country.ilike("%{}%".format(country))).filter(
-                TaskHistory.project_id == sq.c.id
-            )
-
-        query = query.subquery()
-
-        date_query = db.session.query(
-            func.DATE(
-                func.generate_series(start_date, end_date, timedelta(days=1))
-            ).label("d_day")
-        ).subquery()
-
-        grouped_dates = (
-            db.session.query(
-                date_query.c.d_day,
-                query.c.action_text,
-                func.count(query.c.action_text).label("cnt"),
-            )
-            .join(date_query, date_query.c.d_day == query.c.day)
-            .group_by(date_query.c.d_day, query.c.action_text)
-            .order_by(date_query.c.d_day)
-        ).subquery()
-
-        mapped = (
-            db.session.query(
-                grouped_dates.c.d_day, grouped_dates.c.action_text, grouped_dates.c.cnt
-            )
-            .select_from(grouped_dates)
-            .filter(grouped_dates.c.action_text == "MAPPED")
-            .subquery()
-        )
-        validated = (
-            db.session.query(
-                grouped_dates.c.d_day, grouped_dates.c.action_text, grouped_dates.c.cnt
-            )
-            .select_from(grouped_dates)
-            .filter(grouped_dates.c.action_text == "VALIDATED")
-            .subquery()
-        )
-        badimagery = (
-            db.session.query(
-                grouped_dates.c.d_day, grouped_dates.c.action_text, grouped_dates.c.cnt
-            )
-            .select_from(grouped_dates)
-            .filter(grouped_dates.c.action_text == "BADIMAGERY")
-            .subquery()
-        )
-
-        result = (
-            db.session.query(
-                func.to_char(grouped_dates.c.d_day, "YYYY-MM-DD"),
-                func.coalesce(mapped.c.cnt, 0).label("mapped"),
-                func.coalesce(validated.c.cnt, 0).label("validated"),
-                func.coalesce(badimagery.c.cnt, 0).label("badimagery"),
+            projects = projects.filter(
+                Project.id.in_(
+                    db.session.query(sq.c.id).filter(
+                        sq.c.country.ilike("%{}%".format(country))
+                    )
+                )
             )
-            .select_from(grouped_dates)
-            .distinct(grouped_dates.c.d_day)
-            .filter(grouped_dates.c.d_day is not None)
-            .outerjoin(mapped, mapped.c.d_day == grouped_dates.c.d_day)
-            .outerjoin(validated, validated.c.d_day == grouped_dates.c.d_day)
-            .outerjoin(badimagery, badimagery.c.d_day == grouped_dates.c.d_day)
-        )
+            filter_projects = True
+
+        result = db.session.query(
+            func.to_char(TaskStatsDaily.day, "YYYY-MM-DD"),
+            func.sum(TaskStatsDaily.mapped).label("mapped"),
+            func.sum(TaskStatsDaily.validated).label("validated"),
+            func.sum(TaskStatsDaily.bad_imagery).label("badimagery"),
+        ).filter(TaskStatsDaily.day.between(start_date, end_date))
+        if filter_projects:
+            result = result.filter(TaskStatsDaily.project_id.in_(projects.subquery()))
+        result = result.group_by(TaskStatsDaily.day).order_by(TaskStatsDaily.day)
 
         day_stats_dto = list(map(StatsService.set_task_stats, result))
 
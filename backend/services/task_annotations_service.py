@@ -1,33 +1,107 @@
+import json
+from itertools import islice
+
+from flask import current_app
+
+from backend import db
+from backend.models.postgis.task import Task
 from backend.models.postgis.task_annotation import TaskAnnotation
-from backend.models.postgis.utils import timestamp
+
+
+class TaskAnnotationsServiceError(Exception):
+    """ Custom Exception to notify callers an error occurred when validating annotations """
+
+    def __init__(self, message):
+        if current_app:
+            current_app.logger.debug(message)
 
 
 class TaskAnnotationsService:
     @staticmethod
     def add_or_update_annotation(annotation, project_id, annotation_type):
         """ Takes a json of tasks and create annotations in the db """
-
-        task_id = annotation["taskId"]
-        source = annotation.get("annotationSource", None)
-        markdown = annotation.get("annotationMarkdown", None)
-        task_annotation = TaskAnnotation(
-            task_id,
-            project_id,
-            annotation_type,
-            annotation["properties"],
-            source,
-            markdown,
+        TaskAnnotationsService.upsert_annotations(
+            project_id, annotation_type, [annotation]
         )
 
-        # check if the task has this annotation_type
-        existing_annotation = TaskAnnotation.get_task_annotation(
-            task_id, project_id, annotation_type
-        )
-        if existing_annotation:
-            # update this annotation
-            existing_annotation.properties = task_annotation.properties
-            existing_annotation.updated_timestamp = timestamp()
-            existing_annotation.update()
-        else:
-            # add this annotation
-            task_annotation.create()
+    @staticmethod
+    def upsert_annotations(
+        project_id: int, annotation_type: str, annotations, batch_size: int = 1000
+    ) -> dict:
+        """
+        Adds or updates the annotations of many tasks in one transaction. Annotations are validated and
+        saved batch by batch, so they can be read from a stream as they arrive
+        :param annotations: iterable of annotations as posted, with taskId and properties
+        :raises TaskAnnotationsServiceError if an annotation is invalid, nothing is saved then
+        :returns: number of annotations inserted and updated
+        """
+        counts = dict(inserted=0, updated=0)
+        annotations = iter(annotations)
+        try:
+            while True:
+                batch = list(islice(annotations, batch_size))
+                if not batch:
+                    break
+                rows = TaskAnnotationsService._validate_batch(project_id, batch)
+                inserted, updated = TaskAnnotation.upsert(
+                    project_id, annotation_type, rows
+                )
+                counts["inserted"] += inserted
+                counts["updated"] += updated
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return counts
+
+    @staticmethod
+    def _validate_batch(project_id: int, annotations: list) -> list:
+        """ Converts posted annotations to rows, checking their tasks belong to the project """
+        rows = {}
+        for annotation in annotations:
+            if not isinstance(annotation, dict):
+                raise TaskAnnotationsServiceError(
+                    "InvalidData- Annotation not an object"
+                )
+            task_id = annotation.get("taskId")
+            if not isinstance(task_id, int) or isinstance(task_id, bool):
+                raise TaskAnnotationsServiceError("InvalidData- Invalid task id")
+            if not isinstance(annotation.get("properties"), dict):
+                raise TaskAnnotationsServiceError(
+                    f"InvalidData- Properties of task {task_id} not an object"
+                )
+            # A task annotated twice keeps the last annotation, as the same row can't be upserted twice
+            rows[task_id] = dict(
+                task_id=task_id,
+                properties=annotation["properties"],
+                annotation_source=annotation.get("annotationSource"),
+                annotation_markdown=annotation.get("annotationMarkdown"),
+            )
+
+        existing_task_ids = {
+            task_id
+            for task_id, in db.session.query(Task.id).filter(
+                Task.project_id == project_id, Task.id.in_(list(rows))
+            )
+        }
+        missing_task_ids = sorted(set(rows) - existing_task_ids)
+        if missing_task_ids:
+            raise TaskAnnotationsServiceError(
+                f"InvalidData- Invalid task id {missing_task_ids[0]}"
+            )
+
+        return list(rows.values())
+
+    @staticmethod
+    def read_ndjson(stream):
+        """ Reads annotations from a stream of newline delimited JSON objects, one annotation per line """
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise TaskAnnotationsServiceError(
+                    f"InvalidData- Line {line_number} is not valid JSON"
+                )
@@ -2,7 +2,7 @@ from flask import current_app
 from sqlalchemy import and_
 from markdown import markdown
 
-from backend import create_app, db
+from backend import db
 from backend.models.dtos.team_dto import (
     TeamDTO,
     NewTeamDTO,
@@ -27,6 +27,7 @@ from backend.models.postgis.statuses import (
 )
 from backend.services.organisation_service import OrganisationService
 from backend.services.users.user_service import UserService
+from backend.services.users.principal import Principal
 from backend.services.messaging.message_service import MessageService
 
 
@@ -554,49 +555,37 @@ class TeamService:
     @staticmethod
     def check_team_membership(project_id: int, allowed_roles: list, user_id: int):
         """Given a project and permitted team roles, check user's membership in the team list"""
-        teams_dto = TeamService.get_project_teams_as_dto(project_id)
-        teams_allowed = [
-            team_dto for team_dto in teams_dto.teams if team_dto.role in allowed_roles
-        ]
-        user_membership = [
-            team_dto.team_id
-            for team_dto in teams_allowed
-            if TeamService.is_user_an_active_team_member(team_dto.team_id, user_id)
-        ]
-        return len(user_membership) > 0
+        return Principal.get(user_id).has_team_role_on_project(
+            project_id, allowed_roles
+        )
 
     @staticmethod
     def send_message_to_all_team_members(
-        team_id: int, team_name: str, message_dto: MessageDTO
+        team_id: int, team_name: str, message_dto: dict
     ):
         """Sends supplied message to all contributors in a team.  Message all team members can take
-        over a minute to run, so this method is expected to be called on its own thread"""
-        app = (
-            create_app()
-        )  # Because message-all run on background thread it needs it's own app context
-
-        with app.app_context():
-            team_members = TeamService._get_active_team_members(team_id)
-            sender = UserService.get_user_by_id(message_dto.from_user_id).username
-
-            message_dto.message = (
-                "A message from {}, manager of {} team:<br/><br/>{}".format(
-                    MessageService.get_user_profile_link(sender),
-                    MessageService.get_team_link(team_name, team_id, False),
-                    markdown(message_dto.message, output_format="html"),
-                )
+        over a minute to run, so this method is expected to be run as a background job"""
+        message_dto = MessageDTO(message_dto)
+        team_members = TeamService._get_active_team_members(team_id)
+        sender = UserService.get_user_by_id(message_dto.from_user_id).username
+
+        message_dto.message = (
+            "A message from {}, manager of {} team:<br/><br/>{}".format(
+                MessageService.get_user_profile_link(sender),
+                MessageService.get_team_link(team_name, team_id, False),
+                markdown(message_dto.message, output_format="html"),
             )
+        )
 
-            messages = []
-            for team_member in team_members:
-                if team_member.user_id != message_dto.from_user_id:
-                    message = Message.from_dto(team_member.user_id, message_dto)
-                    message.message_type = MessageType.TEAM_BROADCAST.value
-                    message.save()
-                    user = UserService.get_user_by_id(team_member.user_id)
-                    messages.append(dict(message=message, user=user))
+        messages = []
+        for team_member in team_members:
+            if team_member.user_id != message_dto.from_user_id:
+                message = Message.from_dto(team_member.user_id, message_dto)
+                message.message_type = MessageType.TEAM_BROADCAST.value
+                user = UserService.get_user_by_id(team_member.user_id)
+                messages.append(dict(message=message, user=user))
 
-            MessageService._push_messages(messages)
+        MessageService._push_messages(messages)
 
     @staticmethod
     def get_team_members_stats(query: TeamMembersStatsQuery) -> TeamMembersStatsDTO:
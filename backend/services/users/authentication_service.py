@@ -7,6 +7,7 @@ from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
 from backend.api.utils import TMAPIDecorators
 from backend.services.messaging.message_service import MessageService
+from backend.services.users.principal import Principal
 from backend.services.users.user_service import UserService, NotFound
 from random import SystemRandom
 
@@ -28,6 +29,7 @@ def handle_unauthorized_token():
 def verify_token(token):
     """Verify the supplied token and check user role is correct for the requested resource"""
     tm.authenticated_user_id = None
+    Principal.set_current(None)
     if not token:
         return False
 
@@ -45,6 +47,8 @@ def verify_token(token):
     tm.authenticated_user_id = (
         user_id  # Set the user ID on the decorator as a convenience
     )
+    # Permissions of the user are loaded once for the whole request
+    Principal.set_current(user_id)
     return user_id  # All tests passed token is good for the requested resource
 
 
@@ -1,5 +1,11 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from backend.models.dtos.user_dto import UserOSMDTO
 
@@ -12,6 +18,106 @@ class OSMServiceError(Exception):
             current_app.logger.debug(message)
 
 
+# Responses retried after the Retry-After header or an exponential backoff
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+# Responses for users deleted from, or unknown to, OSM
+GONE_STATUSES = [404, 410]
+
+
+class RateLimiter:
+    """Spaces out calls made by any number of threads, so they don't exceed a rate"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            call_at = max(self.next_call, now)
+            self.next_call = call_at + self.interval
+        time.sleep(call_at - now)
+
+
+class OSMUserFetcher:
+    """
+    Fetches OSM user details on a pool of threads sharing one keep-alive session, at a limited rate.
+    Use it as a context manager so the threads and connections are released
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        workers: int,
+        requests_per_second: float,
+        retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 10,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limiter = RateLimiter(requests_per_second)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    def get_changeset_count(self, user_id: int):
+        """
+        Gets the changeset count of a user
+        :returns: whether OSM answered, and the count, None when the user isn't known to OSM
+        """
+        self.limiter.wait()
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/0.6/user/{user_id}.json", timeout=self.timeout
+            )
+        except requests.exceptions.RequestException:
+            return False, None
+
+        if response.status_code in GONE_STATUSES:
+            return True, None
+        if response.status_code != 200:
+            return False, None
+        try:
+            osm_details = OSMService._parse_osm_user_details_response(response.json())
+        except (ValueError, AttributeError, OSMServiceError):
+            return False, None
+        return True, osm_details.changeset_count
+
+    def get_changeset_counts(self, user_ids: list) -> dict:
+        """
+        Gets the changeset counts of users concurrently
+        :returns: count of each user, None for users not known to OSM. Users OSM didn't answer for are left out
+        """
+        results = self.executor.map(self.get_changeset_count, user_ids)
+        return {
+            user_id: changeset_count
+            for user_id, (answered, changeset_count) in zip(user_ids, results)
+            if answered
+        }
+
+
 class OSMService:
     @staticmethod
     def get_osm_details_for_user(user_id: int) -> UserOSMDTO:
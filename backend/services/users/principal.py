@@ -0,0 +1,120 @@
+from flask import g, has_request_context
+
+from backend import db
+from backend.models.postgis.licenses import user_licenses_table
+from backend.models.postgis.organisation import organisation_managers
+from backend.models.postgis.project import ProjectTeams
+from backend.models.postgis.statuses import MappingLevel, UserRole
+from backend.models.postgis.team import TeamMembers
+from backend.models.postgis.user import User
+from backend.models.postgis.utils import NotFound
+
+
+class Principal:
+    """
+    Permissions of a user, loaded lazily with one query per kind and kept for the rest of the request.
+    Changes made to the user later in the same request are not seen
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._role = None
+        self._mapping_level = None
+        self._accepted_licenses = None
+        self._project_team_roles = None
+        self._managed_organisations = None
+
+    @staticmethod
+    def set_current(user_id: int):
+        """ Sets the principal of the user authenticated for the current request """
+        g.principal = Principal(user_id) if user_id else None
+
+    @staticmethod
+    def get(user_id: int) -> "Principal":
+        """
+        Gets the principal of the user, reusing the one of the authenticated user of the current request.
+        Other users get a principal that is not kept once the caller is done with it
+        """
+        if has_request_context():
+            principal = g.get("principal")
+            if principal is not None and principal.user_id == user_id:
+                return principal
+        return Principal(user_id)
+
+    def _load_user(self):
+        user = (
+            db.session.query(User.role, User.mapping_level)
+            .filter(User.id == self.user_id)
+            .one_or_none()
+        )
+        if user is None:
+            raise NotFound()
+        self._role = UserRole(user.role)
+        self._mapping_level = MappingLevel(user.mapping_level)
+
+    @property
+    def role(self) -> UserRole:
+        if self._role is None:
+            self._load_user()
+        return self._role
+
+    @property
+    def mapping_level(self) -> MappingLevel:
+        if self._mapping_level is None:
+            self._load_user()
+        return self._mapping_level
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRole.ADMIN
+
+    @property
+    def is_blocked(self) -> bool:
+        return self.role == UserRole.READ_ONLY
+
+    @property
+    def accepted_licenses(self) -> set:
+        """ Ids of the licenses the user accepted """
+        if self._accepted_licenses is None:
+            rows = db.session.query(user_licenses_table.c.license).filter(
+                user_licenses_table.c.user == self.user_id
+            )
+            self._accepted_licenses = {row.license for row in rows}
+        return self._accepted_licenses
+
+    @property
+    def project_team_roles(self) -> dict:
+        """ Roles given to the user on each project through the teams they are an active member of """
+        if self._project_team_roles is None:
+            rows = (
+                db.session.query(ProjectTeams.project_id, ProjectTeams.role)
+                .join(TeamMembers, TeamMembers.team_id == ProjectTeams.team_id)
+                .filter(
+                    TeamMembers.user_id == self.user_id, TeamMembers.active.is_(True)
+                )
+            )
+            self._project_team_roles = {}
+            for row in rows:
+                self._project_team_roles.setdefault(row.project_id, set()).add(row.role)
+        return self._project_team_roles
+
+    @property
+    def managed_organisations(self) -> set:
+        """ Ids of the organisations the user is a manager of """
+        if self._managed_organisations is None:
+            rows = db.session.query(organisation_managers.c.organisation_id).filter(
+                organisation_managers.c.user_id == self.user_id
+            )
+            self._managed_organisations = {row.organisation_id for row in rows}
+        return self._managed_organisations
+
+    def has_accepted_license(self, license_id: int) -> bool:
+        return license_id in self.accepted_licenses
+
+    def has_team_role_on_project(self, project_id: int, allowed_roles: list) -> bool:
+        """ Is the user an active member of a team of the project with one of the allowed roles """
+        roles = self.project_team_roles.get(project_id, set())
+        return not roles.isdisjoint(allowed_roles)
+
+    def is_org_manager(self, organisation_id: int) -> bool:
+        return organisation_id in self.managed_organisations
@@ -1,8 +1,8 @@
 from cachetools import TTLCache, cached
 from flask import current_app
 import datetime
-from sqlalchemy.sql.expression import literal
-from sqlalchemy import func, or_, desc, and_, distinct, cast, Time
+from typing import Optional
+from sqlalchemy import func, or_, desc, and_, distinct
 from backend import db
 from backend.models.dtos.project_dto import ProjectFavoritesDTO, ProjectSearchResultsDTO
 from backend.models.dtos.user_dto import (
@@ -22,12 +22,29 @@ from backend.models.postgis.interests import Interest, project_interests
 from backend.models.postgis.message import Message
 from backend.models.postgis.project import Project
 from backend.models.postgis.user import User, UserRole, MappingLevel, UserEmail
-from backend.models.postgis.task import TaskHistory, TaskAction, Task
+from backend.models.postgis.user_stats import (
+    UserProjectStats,
+    UserStats,
+    UserStatsDaily,
+)
+from backend.models.postgis.task import TaskHistory, Task
 from backend.models.dtos.user_dto import UserTaskDTOs
 from backend.models.dtos.stats_dto import Pagination
 from backend.models.postgis.statuses import TaskStatus, ProjectStatus
 from backend.models.postgis.utils import NotFound
-from backend.services.users.osm_service import OSMService, OSMServiceError
+from backend.services.users.osm_service import (
+    OSMService,
+    OSMServiceError,
+    OSMUserFetcher,
+)
+from backend.services.users.principal import Principal
+from backend.services.cache_service import CacheService
+from backend.services.pagination_service import (
+    COUNT_CACHED,
+    COUNT_EXACT,
+    PaginationService,
+    SortKey,
+)
 from backend.services.messaging.smtp_service import SMTPService
 from backend.services.messaging.template_service import (
     get_txt_template,
@@ -69,18 +86,16 @@ class UserService:
     def get_contributions_by_day(user_id: int):
         # Validate that user exists.
         stats = (
-            TaskHistory.query.with_entities(
-                func.DATE(TaskHistory.action_date).label("day"),
-                func.count(TaskHistory.action).label("cnt"),
+            UserStatsDaily.query.with_entities(
+                UserStatsDaily.day, UserStatsDaily.contributions
             )
-            .filter(TaskHistory.user_id == user_id)
-            .filter(TaskHistory.action == TaskAction.STATE_CHANGE.name)
+            .filter(UserStatsDaily.user_id == user_id)
+            .filter(UserStatsDaily.contributions > 0)
             .filter(
-                func.DATE(TaskHistory.action_date)
+                UserStatsDaily.day
                 > datetime.date.today() - datetime.timedelta(days=365)
             )
-            .group_by("day")
-            .order_by(desc("day"))
+            .order_by(desc(UserStatsDaily.day))
         )
 
         contributions = [
@@ -236,7 +251,14 @@ class UserService:
         page=1,
         page_size=10,
         sort_by: str = None,
+        cursor: str = None,
+        count: str = COUNT_EXACT,
     ) -> UserTaskDTOs:
+        """
+        Gets the tasks a user has interacted with, by page number or, if a cursor is supplied, by cursor
+        :param cursor: cursor returned with the previous page, empty for the first page
+        :param count: how the total of tasks is counted
+        """
         base_query = (
             TaskHistory.query.with_entities(
                 TaskHistory.project_id.label("project_id"),
@@ -293,14 +315,15 @@ class UserService:
         )
         tasks = tasks.add_columns("max", "comments")
 
-        if sort_by == "action_date":
-            tasks = tasks.order_by(sq.c.max)
-        elif sort_by == "-action_date":
-            tasks = tasks.order_by(desc(sq.c.max))
-        elif sort_by == "project_id":
-            tasks = tasks.order_by(sq.c.project_id)
-        elif sort_by == "-project_id":
-            tasks = tasks.order_by(desc(sq.c.project_id))
+        if cursor is None:
+            if sort_by == "action_date":
+                tasks = tasks.order_by(sq.c.max)
+            elif sort_by == "-action_date":
+                tasks = tasks.order_by(desc(sq.c.max))
+            elif sort_by == "project_id":
+                tasks = tasks.order_by(sq.c.project_id)
+            elif sort_by == "-project_id":
+                tasks = tasks.order_by(desc(sq.c.project_id))
 
         if project_status:
             tasks = tasks.filter(
@@ -311,7 +334,39 @@ class UserService:
         if project_id:
             tasks = tasks.filter_by(project_id=project_id)
 
-        results = tasks.paginate(page, page_size, True)
+        count_key = None
+        if count == COUNT_CACHED:
+            count_key = CacheService.make_key(
+                "user-tasks-count",
+                user_id,
+                start_date,
+                end_date,
+                task_status,
+                project_status,
+                project_id,
+            )
+        if cursor is not None:
+            sort_by = sort_by or "-action_date"
+            sort_keys = [
+                SortKey(Task.project_id, lambda row: row.Task.project_id),
+                SortKey(Task.id, lambda row: row.Task.id),
+            ]
+            if sort_by.lstrip("-") == "action_date":
+                sort_keys.insert(0, SortKey(sq.c.max, lambda row: row.max))
+            results = PaginationService.paginate_keyset(
+                tasks,
+                sort_keys,
+                cursor,
+                page_size,
+                descending=sort_by.startswith("-"),
+                sort_name=sort_by,
+                count=count,
+                cache_key=count_key,
+            )
+        else:
+            results = PaginationService.paginate(
+                tasks, page, page_size, count, cache_key=count_key
+            )
 
         task_list = []
 
@@ -327,143 +382,41 @@ class UserService:
         user = UserService.get_user_by_username(username)
         stats_dto = UserStatsDTO()
 
-        actions = [
-            TaskStatus.VALIDATED.name,
-            TaskStatus.INVALIDATED.name,
-            TaskStatus.MAPPED.name,
-        ]
-
-        actions_table = (
-            db.session.query(literal(TaskStatus.VALIDATED.name).label("action_text"))
-            .union(
-                db.session.query(
-                    literal(TaskStatus.INVALIDATED.name).label("action_text")
-                ),
-                db.session.query(literal(TaskStatus.MAPPED.name).label("action_text")),
-            )
-            .subquery()
-            .alias("actions_table")
-        )
-
-        # Get only rows with the given actions.
-        filtered_actions = (
-            TaskHistory.query.with_entities(
-                TaskHistory.user_id,
-                TaskHistory.project_id,
-                TaskHistory.task_id,
-                TaskHistory.action_text,
-            )
-            .filter(TaskHistory.action_text.in_(actions))
-            .subquery()
-            .alias("filtered_actions")
-        )
-
-        user_tasks = (
-            db.session.query(filtered_actions)
-            .filter(filtered_actions.c.user_id == user.id)
-            .distinct(
-                filtered_actions.c.project_id,
-                filtered_actions.c.task_id,
-                filtered_actions.c.action_text,
-            )
-            .subquery()
-            .alias("user_tasks")
-        )
-
-        others_tasks = (
-            db.session.query(filtered_actions)
-            .filter(filtered_actions.c.user_id != user.id)
-            .filter(filtered_actions.c.task_id == user_tasks.c.task_id)
-            .filter(filtered_actions.c.project_id == user_tasks.c.project_id)
-            .filter(filtered_actions.c.action_text != TaskStatus.MAPPED.name)
-            .distinct(
-                filtered_actions.c.project_id,
-                filtered_actions.c.task_id,
-                filtered_actions.c.action_text,
-            )
-            .subquery()
-            .alias("others_tasks")
-        )
-
-        user_stats = (
-            db.session.query(
-                actions_table.c.action_text, func.count(user_tasks.c.action_text)
-            )
-            .outerjoin(
-                user_tasks, actions_table.c.action_text == user_tasks.c.action_text
-            )
-            .group_by(actions_table.c.action_text)
+        # Statistics are kept up to date from the task history by a database trigger
+        user_stats = UserStats.query.get(user.id) or UserStats(
+            tasks_mapped=0,
+            tasks_validated=0,
+            tasks_invalidated=0,
+            tasks_validated_by_others=0,
+            tasks_invalidated_by_others=0,
+            time_spent_mapping=0,
+            time_spent_validating=0,
         )
 
-        others_stats = (
-            db.session.query(
-                func.concat(actions_table.c.action_text, "_BY_OTHERS"),
-                func.count(others_tasks.c.action_text),
-            )
-            .outerjoin(
-                others_tasks, actions_table.c.action_text == others_tasks.c.action_text
-            )
-            .group_by(actions_table.c.action_text)
-        )
-
-        res = user_stats.union(others_stats).all()
-        results = {key: value for key, value in res}
-
         projects_mapped = UserService.get_projects_mapped(user.id)
-        stats_dto.tasks_mapped = results["MAPPED"]
-        stats_dto.tasks_validated = results["VALIDATED"]
-        stats_dto.tasks_invalidated = results["INVALIDATED"]
-        stats_dto.tasks_validated_by_others = results["VALIDATED_BY_OTHERS"]
-        stats_dto.tasks_invalidated_by_others = results["INVALIDATED_BY_OTHERS"]
+        stats_dto.tasks_mapped = user_stats.tasks_mapped
+        stats_dto.tasks_validated = user_stats.tasks_validated
+        stats_dto.tasks_invalidated = user_stats.tasks_invalidated
+        stats_dto.tasks_validated_by_others = user_stats.tasks_validated_by_others
+        stats_dto.tasks_invalidated_by_others = user_stats.tasks_invalidated_by_others
         stats_dto.projects_mapped = len(projects_mapped)
         stats_dto.countries_contributed = UserService.get_countries_contributed(user.id)
         stats_dto.contributions_by_day = UserService.get_contributions_by_day(user.id)
-        stats_dto.total_time_spent = 0
-        stats_dto.time_spent_mapping = 0
-        stats_dto.time_spent_validating = 0
-
-        query = (
-            TaskHistory.query.with_entities(
-                func.date_trunc("minute", TaskHistory.action_date).label("trn"),
-                func.max(TaskHistory.action_text).label("tm"),
-            )
-            .filter(TaskHistory.user_id == user.id)
-            .filter(TaskHistory.action == "LOCKED_FOR_VALIDATION")
-            .group_by("trn")
-            .subquery()
-        )
-        total_validation_time = db.session.query(
-            func.sum(cast(func.to_timestamp(query.c.tm, "HH24:MI:SS"), Time))
-        ).scalar()
-
-        if total_validation_time:
-            stats_dto.time_spent_validating = total_validation_time.total_seconds()
-            stats_dto.total_time_spent += stats_dto.time_spent_validating
-
-        total_mapping_time = (
-            db.session.query(
-                func.sum(
-                    cast(func.to_timestamp(TaskHistory.action_text, "HH24:MI:SS"), Time)
-                )
-            )
-            .filter(
-                or_(
-                    TaskHistory.action == TaskAction.LOCKED_FOR_MAPPING.name,
-                    TaskHistory.action == TaskAction.AUTO_UNLOCKED_FOR_MAPPING.name,
-                )
-            )
-            .filter(TaskHistory.user_id == user.id)
-            .scalar()
+        stats_dto.time_spent_mapping = user_stats.time_spent_mapping
+        stats_dto.time_spent_validating = user_stats.time_spent_validating
+        stats_dto.total_time_spent = (
+            user_stats.time_spent_mapping + user_stats.time_spent_validating
         )
 
-        if total_mapping_time:
-            stats_dto.time_spent_mapping = total_mapping_time.total_seconds()
-            stats_dto.total_time_spent += stats_dto.time_spent_mapping
-
         stats_dto.contributions_interest = UserService.get_interests_stats(user.id)
 
         return stats_dto
 
+    @staticmethod
+    def rebuild_user_stats(user_id: int = None):
+        """Recomputes the contribution statistics of all users, or of one user, from the task history"""
+        UserStats.rebuild(user_id)
+
     @staticmethod
     def update_user_details(user_id: int, user_dto: UserDTO) -> dict:
         """Update user with info supplied by user, if they add or change their email address a verification mail
@@ -505,11 +458,7 @@ class UserService:
     @staticmethod
     def is_user_an_admin(user_id: int) -> bool:
         """Is the user an admin"""
-        user = UserService.get_user_by_id(user_id)
-        if UserRole(user.role) == UserRole.ADMIN:
-            return True
-
-        return False
+        return Principal.get(user_id).is_admin
 
     @staticmethod
     def is_user_the_project_author(user_id: int, author_id: int) -> bool:
@@ -519,83 +468,56 @@ class UserService:
     @staticmethod
     def get_mapping_level(user_id: int):
         """Gets mapping level user is at"""
-        user = UserService.get_user_by_id(user_id)
-
-        return MappingLevel(user.mapping_level)
+        return Principal.get(user_id).mapping_level
 
     @staticmethod
     def is_user_validator(user_id: int) -> bool:
         """Determines if user is a validator"""
-        user = UserService.get_user_by_id(user_id)
-
-        if UserRole(user.role) in [
-            UserRole.ADMIN,
-        ]:
-            return True
-
-        return False
+        return Principal.get(user_id).is_admin
 
     @staticmethod
     def is_user_blocked(user_id: int) -> bool:
         """Determines if a user is blocked"""
-        user = UserService.get_user_by_id(user_id)
-
-        if UserRole(user.role) == UserRole.READ_ONLY:
-            return True
-
-        return False
+        return Principal.get(user_id).is_blocked
 
     @staticmethod
     def get_countries_contributed(user_id: int):
-        query = (
-            TaskHistory.query.with_entities(
+        project_stats = (
+            db.session.query(
                 func.unnest(Project.country).label("country"),
-                TaskHistory.action_text,
-                func.count(TaskHistory.action_text).label("count"),
-            )
-            .filter(TaskHistory.user_id == user_id)
-            .filter(
-                TaskHistory.action_text.in_(
-                    [
-                        TaskStatus.MAPPED.name,
-                        TaskStatus.BADIMAGERY.name,
-                        TaskStatus.VALIDATED.name,
-                    ]
-                )
+                UserProjectStats.mapped,
+                UserProjectStats.validated,
             )
-            .group_by("country", TaskHistory.action_text)
-            .outerjoin(Project, Project.id == TaskHistory.project_id)
-            .all()
+            .select_from(UserProjectStats)
+            .join(Project, Project.id == UserProjectStats.project_id)
+            .filter(UserProjectStats.user_id == user_id)
+            .subquery()
         )
-        countries = list(set([q.country for q in query]))
-        result = []
-        for country in countries:
-            values = [q for q in query if q.country == country]
-
-            # Filter element to sum mapped values.
-            mapped = sum(
-                [
-                    v.count
-                    for v in values
-                    if v.action_text
-                    in [TaskStatus.MAPPED.name, TaskStatus.BADIMAGERY.name]
-                ]
-            )
-            validated = sum(
-                [v.count for v in values if v.action_text == TaskStatus.VALIDATED.name]
+        mapped = func.sum(project_stats.c.mapped)
+        validated = func.sum(project_stats.c.validated)
+        query = (
+            db.session.query(
+                project_stats.c.country,
+                mapped.label("mapped"),
+                validated.label("validated"),
             )
-            dto = UserCountryContributed(
+            .group_by(project_stats.c.country)
+            .having(mapped + validated > 0)
+            # Order by total
+            .order_by(desc(mapped + validated))
+        )
+
+        result = [
+            UserCountryContributed(
                 dict(
-                    name=country,
-                    mapped=mapped,
-                    validated=validated,
-                    total=mapped + validated,
+                    name=q.country,
+                    mapped=q.mapped,
+                    validated=q.validated,
+                    total=q.mapped + q.validated,
                 )
             )
-            result.append(dto)
-
-        # Order by total
-        result = sorted(result, reverse=True, key=lambda i: i.total)
+            for q in query
+        ]
         countries_dto = UserCountriesContributed()
         countries_dto.countries_contributed = result
         countries_dto.total = len(result)
@@ -658,14 +580,7 @@ class UserService:
 
         dto = ProjectSearchResultsDTO()
 
-        # Get all total contributions for each paginated project.
-        contrib_counts = ProjectSearchService.get_total_contributions(projs)
-
-        zip_items = zip(projs, contrib_counts)
-
-        dto.results = [
-            ProjectSearchService.create_result_dto(p, "en", t) for p, t in zip_items
-        ]
+        dto.results = ProjectSearchService.create_result_dtos(projs, "en")
 
         return dto
 
@@ -736,8 +651,7 @@ class UserService:
     @staticmethod
     def has_user_accepted_license(user_id: int, license_id: int):
         """Checks if user has accepted specified license"""
-        user = UserService.get_user_by_id(user_id)
-        return user.has_user_accepted_licence(license_id)
+        return Principal.get(user_id).has_accepted_license(license_id)
 
     @staticmethod
     def get_osm_details_for_user(username: str) -> UserOSMDTO:
@@ -750,6 +664,23 @@ class UserService:
         osm_dto = OSMService.get_osm_details_for_user(user.id)
         return osm_dto
 
+    @staticmethod
+    def get_upgraded_mapping_level(
+        changeset_count: int, mapping_level: MappingLevel
+    ) -> Optional[MappingLevel]:
+        """Gets the level a user with this many changesets is upgraded to, None if they stay at their level"""
+        intermediate_level = current_app.config["MAPPER_LEVEL_INTERMEDIATE"]
+        advanced_level = current_app.config["MAPPER_LEVEL_ADVANCED"]
+
+        if changeset_count > advanced_level and mapping_level != MappingLevel.ADVANCED:
+            return MappingLevel.ADVANCED
+        elif (
+            intermediate_level < changeset_count < advanced_level
+            and mapping_level != MappingLevel.INTERMEDIATE
+        ):
+            return MappingLevel.INTERMEDIATE
+        return None
+
     @staticmethod
     def check_and_update_mapper_level(user_id: int):
         """Check users mapping level and update if they have crossed threshold"""
@@ -759,32 +690,24 @@ class UserService:
         if user_level == MappingLevel.ADVANCED:
             return  # User has achieved highest level, so no need to do further checking
 
-        intermediate_level = current_app.config["MAPPER_LEVEL_INTERMEDIATE"]
-        advanced_level = current_app.config["MAPPER_LEVEL_ADVANCED"]
-
         try:
             osm_details = OSMService.get_osm_details_for_user(user_id)
-            if (
-                osm_details.changeset_count > advanced_level
-                and user.mapping_level != MappingLevel.ADVANCED.value
-            ):
-                user.mapping_level = MappingLevel.ADVANCED.value
-                UserService.notify_level_upgrade(user_id, user.username, "ADVANCED")
-            elif (
-                intermediate_level < osm_details.changeset_count < advanced_level
-                and user.mapping_level != MappingLevel.INTERMEDIATE.value
-            ):
-                user.mapping_level = MappingLevel.INTERMEDIATE.value
-                UserService.notify_level_upgrade(user_id, user.username, "INTERMEDIATE")
+            new_level = UserService.get_upgraded_mapping_level(
+                osm_details.changeset_count, user_level
+            )
+            if new_level is not None:
+                user.mapping_level = new_level.value
+                UserService.notify_level_upgrade(user_id, user.username, new_level.name)
         except OSMServiceError:
             # Swallow exception as we don't want to blow up the server for this
             current_app.logger.error("Error attempting to update mapper level")
             return
 
+        user.changesets_checked_at = datetime.datetime.utcnow()
         user.save()
 
     @staticmethod
-    def notify_level_upgrade(user_id: int, username: str, level: str):
+    def get_level_upgrade_message(user_id: int, username: str, level: str) -> Message:
         text_template = get_txt_template("level_upgrade_message_en.txt")
         replace_list = [
             ["[USERNAME]", username],
@@ -797,24 +720,82 @@ class UserService:
         level_upgrade_message.to_user_id = user_id
         level_upgrade_message.subject = "Mapper level upgrade"
         level_upgrade_message.message = text_template
-        level_upgrade_message.save()
+        return level_upgrade_message
 
     @staticmethod
-    def refresh_mapper_level() -> int:
-        """Helper function to run thru all users in the DB and update their mapper level"""
-        users = User.get_all_users_not_paginated()
-        users_updated = 1
-        total_users = len(users)
+    def notify_level_upgrade(user_id: int, username: str, level: str):
+        UserService.get_level_upgrade_message(user_id, username, level).save()
 
-        for user in users:
-            UserService.check_and_update_mapper_level(user.id)
+    @staticmethod
+    def refresh_mapper_level(batch_size: int = 1000) -> int:
+        """
+        Updates the mapper level of the users who can still level up and whose changeset count wasn't
+        checked recently. Changeset counts are fetched from OSM concurrently at a limited rate, and the
+        levels saved batch by batch
+        :returns: number of users upgraded
+        """
+        config = current_app.config
+        checked_before = datetime.datetime.utcnow() - datetime.timedelta(
+            days=config["MAPPER_LEVEL_CHECK_INTERVAL"]
+        )
+        query = (
+            db.session.query(User.id)
+            .filter(
+                User.mapping_level != MappingLevel.ADVANCED.value,
+                or_(
+                    User.changesets_checked_at.is_(None),
+                    User.changesets_checked_at < checked_before,
+                ),
+            )
+            .order_by(User.id)
+        )
+        user_ids = [user_id for user_id, in query]
+        current_app.logger.info(f"Checking the mapper level of {len(user_ids)} users")
+
+        users_upgraded = 0
+        with OSMUserFetcher(
+            config["OSM_SERVER_URL"],
+            config["OSM_REFRESH_WORKERS"],
+            config["OSM_REFRESH_REQUESTS_PER_SECOND"],
+            config["OSM_REFRESH_RETRIES"],
+        ) as fetcher:
+            for start in range(0, len(user_ids), batch_size):
+                end = start + batch_size
+                changeset_counts = fetcher.get_changeset_counts(user_ids[start:end])
+                users_upgraded += UserService._update_mapper_levels(changeset_counts)
+                current_app.logger.info(
+                    f"{min(end, len(user_ids))} users checked of {len(user_ids)}, "
+                    f"{end - start - len(changeset_counts)} failed in this batch"
+                )
 
-            if users_updated % 50 == 0:
-                print(f"{users_updated} users updated of {total_users}")
+        return users_upgraded
 
-            users_updated += 1
+    @staticmethod
+    def _update_mapper_levels(changeset_counts: dict) -> int:
+        """Saves the levels of users from their changeset counts, in one transaction"""
+        checked_at = datetime.datetime.utcnow()
+        users = db.session.query(User.id, User.username, User.mapping_level).filter(
+            User.id.in_(list(changeset_counts))
+        )
 
-        return users_updated
+        mappings = []
+        for user_id, username, mapping_level in users:
+            mapping = dict(id=user_id, changesets_checked_at=checked_at)
+            changeset_count = changeset_counts[user_id]
+            if changeset_count is not None:
+                new_level = UserService.get_upgraded_mapping_level(
+                    changeset_count, MappingLevel(mapping_level)
+                )
+                if new_level is not None:
+                    mapping["mapping_level"] = new_level.value
+                    UserService.get_level_upgrade_message(
+                        user_id, username, new_level.name
+                    ).add_message()
+            mappings.append(mapping)
+
+        db.session.bulk_update_mappings(User, mappings)
+        db.session.commit()
+        return sum(1 for mapping in mappings if "mapping_level" in mapping)
 
     @staticmethod
     def register_user_with_email(user_dto: UserRegisterEmailDTO):
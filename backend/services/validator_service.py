@@ -1,7 +1,7 @@
 from flask import current_app
-from sqlalchemy import text
+from sqlalchemy import DateTime, literal, text
 
-from backend.models.dtos.mapping_dto import TaskDTOs
+from backend.models.dtos.mapping_dto import LockNextTaskDTO, TaskDTOs
 from backend.models.dtos.stats_dto import Pagination
 from backend.models.dtos.validator_dto import (
     LockForValidationDTO,
@@ -14,6 +14,7 @@ from backend.models.dtos.validator_dto import (
 from backend.models.postgis.statuses import ValidatingNotAllowed
 from backend.models.postgis.task import (
     Task,
+    TaskAction,
     TaskStatus,
     TaskHistory,
     TaskInvalidationHistory,
@@ -22,6 +23,13 @@ from backend.models.postgis.task import (
 from backend.models.postgis.utils import NotFound, UserLicenseError, timestamp
 from backend.models.postgis.project_info import ProjectInfo
 from backend.services.messaging.message_service import MessageService
+from backend.services.cache_service import CacheService
+from backend.services.pagination_service import (
+    COUNT_CACHED,
+    COUNT_EXACT,
+    PaginationService,
+    SortKey,
+)
 from backend.services.project_service import ProjectService
 from backend.services.stats_service import StatsService
 from backend.services.users.user_service import UserService
@@ -72,8 +80,59 @@ class ValidatorService:
 
             tasks_to_lock.append(task)
 
+        ValidatorService._check_user_can_validate(
+            validation_dto.project_id, validation_dto.user_id, validation_dto.task_ids
+        )
+
+        # Lock all tasks for validation
+        dtos = []
+        for task in tasks_to_lock:
+            task.lock_task_for_validating(validation_dto.user_id)
+            dtos.append(task.as_dto_with_instructions(validation_dto.preferred_locale))
+
+        task_dtos = TaskDTOs()
+        task_dtos.tasks = dtos
+
+        return task_dtos
+
+    @staticmethod
+    def lock_next_task_for_validation(lock_dto: LockNextTaskDTO) -> TaskDTOs:
+        """
+        Picks a task the user can validate and locks it in the same transaction, so users locking tasks
+        at the same time never get the same one
+        :raises ValidatorServiceError, UserLicenseError, NotFound
+        """
+        ValidatorService._check_user_can_validate(
+            lock_dto.project_id, lock_dto.user_id, []
+        )
+
+        # Users cannot validate their own tasks unless they are an admin
+        exclude_mapped_by = (
+            None if UserService.is_user_an_admin(lock_dto.user_id) else lock_dto.user_id
+        )
+        task = Task.get_next_available(
+            lock_dto.project_id,
+            [TaskStatus.MAPPED, TaskStatus.BADIMAGERY],
+            lock_dto.near_task_id,
+            exclude_mapped_by,
+        )
+        if task is None:
+            raise NotFound("No task available for validation")
+
+        task.lock_task_for_validating(lock_dto.user_id)
+        task_dtos = TaskDTOs()
+        task_dtos.tasks = [task.as_dto_with_instructions(lock_dto.preferred_locale)]
+        return task_dtos
+
+    @staticmethod
+    def _check_user_can_validate(project_id: int, user_id: int, task_ids: list):
+        """
+        Raises an error if the user isn't allowed to validate the tasks of the project. A user that already
+        has tasks locked is only allowed to lock those same tasks
+        :raises ValidatorServiceError, UserLicenseError
+        """
         user_can_validate, error_reason = ProjectService.is_user_permitted_to_validate(
-            validation_dto.project_id, validation_dto.user_id
+            project_id, user_id
         )
 
         if not user_can_validate:
@@ -88,8 +147,8 @@ class ValidatorService:
                     "ProjectNotPublished- Validation not allowed because: Project not published"
                 )
             elif error_reason == ValidatingNotAllowed.USER_ALREADY_HAS_TASK_LOCKED:
-                user_tasks = Task.get_locked_tasks_for_user(validation_dto.user_id)
-                if set(user_tasks.locked_tasks) != set(validation_dto.task_ids):
+                user_tasks = Task.get_locked_tasks_for_user(user_id)
+                if set(user_tasks.locked_tasks) != set(task_ids):
                     raise ValidatorServiceError(
                         "UserAlreadyHasTaskLocked- User already has a task locked"
                     )
@@ -98,17 +157,6 @@ class ValidatorService:
                     f"Validation not allowed because: {error_reason}"
                 )
 
-        # Lock all tasks for validation
-        dtos = []
-        for task in tasks_to_lock:
-            task.lock_task_for_validating(validation_dto.user_id)
-            dtos.append(task.as_dto_with_instructions(validation_dto.preferred_locale))
-
-        task_dtos = TaskDTOs()
-        task_dtos.tasks = dtos
-
-        return task_dtos
-
     @staticmethod
     def _user_can_validate_task(user_id: int, mapped_by: int) -> bool:
         """
@@ -299,8 +347,15 @@ class ValidatorService:
         page_size=10,
         sort_by="updated_date",
         sort_direction="desc",
+        cursor: str = None,
+        count: str = COUNT_EXACT,
     ) -> InvalidatedTasks:
-        """Get invalidated tasks either mapped or invalidated by the user"""
+        """
+        Get invalidated tasks either mapped or invalidated by the user, by page number or, if a cursor is
+        supplied, by cursor
+        :param cursor: cursor returned with the previous page, empty for the first page
+        :param count: how the total of invalidated tasks is counted
+        """
         user = UserService.get_user_by_username(username)
         query = (
             TaskInvalidationHistory.query.filter_by(invalidator_id=user.id)
@@ -314,9 +369,50 @@ class ValidatorService:
         if project_id is not None:
             query = query.filter_by(project_id=project_id)
 
-        results = query.order_by(text(sort_by + " " + sort_direction)).paginate(
-            page, page_size, True
-        )
+        count_key = None
+        if count == COUNT_CACHED:
+            count_key = CacheService.make_key(
+                "invalidated-tasks-count", as_validator, user.id, closed, project_id
+            )
+        if cursor is not None:
+            sort_keys = [
+                SortKey(TaskInvalidationHistory.id, lambda entry: entry.id),
+            ]
+            if sort_by == "project_id":
+                sort_keys.insert(
+                    0,
+                    SortKey(
+                        TaskInvalidationHistory.project_id,
+                        lambda entry: entry.project_id,
+                    ),
+                )
+            else:
+                sort_keys.insert(
+                    0,
+                    SortKey(
+                        TaskInvalidationHistory.updated_date,
+                        lambda entry: entry.updated_date,
+                        null_value=literal("infinity", type_=DateTime),
+                    ),
+                )
+            results = PaginationService.paginate_keyset(
+                query,
+                sort_keys,
+                cursor,
+                page_size or 10,
+                descending=sort_direction == "desc",
+                sort_name=f"{sort_by} {sort_direction}",
+                count=count,
+                cache_key=count_key,
+            )
+        else:
+            results = PaginationService.paginate(
+                query.order_by(text(sort_by + " " + sort_direction)),
+                page,
+                page_size,
+                count,
+                cache_key=count_key,
+            )
         project_names = {}
         invalidated_tasks_dto = InvalidatedTasks()
         for entry in results.items:
@@ -341,13 +437,13 @@ class ValidatorService:
     @staticmethod
     def invalidate_all_tasks(project_id: int, user_id: int):
         """Invalidates all validated tasks on a project"""
-        validated_tasks = Task.query.filter(
-            Task.project_id == project_id,
-            Task.task_status == TaskStatus.VALIDATED.value,
-        ).all()
-        for task in validated_tasks:
-            task.lock_task_for_validating(user_id)
-            task.unlock_task(user_id, new_state=TaskStatus.INVALIDATED)
+        Task.bulk_change_state(
+            project_id,
+            user_id,
+            [TaskStatus.VALIDATED],
+            TaskStatus.INVALIDATED,
+            TaskAction.LOCKED_FOR_VALIDATION,
+        )
 
         # Reset counters
         project = ProjectService.get_project_by_id(project_id)
@@ -357,21 +453,19 @@ class ValidatorService:
     @staticmethod
     def validate_all_tasks(project_id: int, user_id: int):
         """Validates all mapped tasks on a project"""
-        tasks_to_validate = Task.query.filter(
+        # Ensure we set mapped by value
+        Task.query.filter(
             Task.project_id == project_id,
             Task.task_status == TaskStatus.MAPPED.value,
-        ).all()
-
-        for task in tasks_to_validate:
-            task.mapped_by = task.mapped_by or user_id  # Ensure we set mapped by value
-            if TaskStatus(task.task_status) not in [
-                TaskStatus.LOCKED_FOR_MAPPING,
-                TaskStatus.LOCKED_FOR_VALIDATION,
-            ]:
-                # Only lock tasks that are not already locked to avoid double lock issue
-                task.lock_task_for_validating(user_id)
-
-            task.unlock_task(user_id, new_state=TaskStatus.VALIDATED)
+            Task.mapped_by.is_(None),
+        ).update({"mapped_by": user_id}, synchronize_session=False)
+        Task.bulk_change_state(
+            project_id,
+            user_id,
+            [TaskStatus.MAPPED],
+            TaskStatus.VALIDATED,
+            TaskAction.LOCKED_FOR_VALIDATION,
+        )
 
         # Set counters to fully mapped and validated
         project = ProjectService.get_project_by_id(project_id)
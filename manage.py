@@ -2,20 +2,20 @@ import os
 import warnings
 import base64
 import csv
-import datetime
 
 from flask_migrate import MigrateCommand
 from flask_script import Manager
 from dotenv import load_dotenv
-from backend import create_app, initialise_counters
+from backend import create_app
 from backend.services.users.authentication_service import AuthenticationService
 from backend.services.users.user_service import UserService
 from backend.services.stats_service import StatsService
 from backend.services.interests_service import InterestService
+from backend.services.job_service import JobService
+from backend.services.project_admin_service import ProjectAdminService
 from backend.models.postgis.utils import NotFound
-from backend.models.postgis.task import Task, TaskHistory
+from backend.models.postgis.task import Task
 
-from sqlalchemy import func
 import atexit
 from apscheduler.schedulers.background import BackgroundScheduler
 
@@ -40,12 +40,6 @@ for key in [
 # Initialise the flask app object
 application = create_app()
 
-# Initialize homepage counters
-try:
-    initialise_counters(application)
-except Exception:
-    warnings.warn("Homepage counters not initialized.")
-
 # Add management commands
 manager = Manager(application)
 
@@ -57,20 +51,12 @@ manager.add_command("db", MigrateCommand)
 @manager.command
 def auto_unlock_tasks():
     with application.app_context():
-        # Identify distinct project IDs that were touched in the last 2 hours
-        query = (
-            TaskHistory.query.with_entities(TaskHistory.project_id)
-            .filter(
-                func.DATE(TaskHistory.action_date)
-                > datetime.datetime.utcnow() - datetime.timedelta(minutes=130)
+        # Release the expired locks of all projects in one go
+        unlocked = Task.auto_unlock_tasks()
+        for project_id, task_ids in unlocked.items():
+            application.logger.info(
+                f"Auto unlocked {len(task_ids)} tasks on project {project_id}"
             )
-            .distinct()
-        )
-        projects = query.all()
-        # For each project update task history for tasks that were not manually unlocked
-        for project in projects:
-            project_id = project[0]
-            Task.auto_unlock_tasks(project_id)
 
 
 # Setup a background cron job
@@ -107,6 +93,49 @@ def refresh_project_stats():
     print("Project stats updated")
 
 
+@manager.option(
+    "-a", "--all", dest="overwrite", action="store_true", help="Overwrite countries"
+)
+def backfill_project_countries(overwrite=False):
+    """Sets the countries of projects from the bundled country polygons"""
+    print("Started backfilling project countries...")
+    updated, unmatched = ProjectAdminService.backfill_project_countries(overwrite)
+    print(f"Set the countries of {updated} projects")
+    if unmatched:
+        print(f"No country found for projects {', '.join(map(str, unmatched))}")
+
+
+@manager.command
+def rebuild_activity_stats():
+    print("Started rebuilding project activity stats...")
+    StatsService.rebuild_activity_stats()
+    print("Project activity stats rebuilt")
+
+
+@manager.option("-u", "--user_id", type=int, help="Only rebuild this user")
+def rebuild_user_stats(user_id=None):
+    print("Started rebuilding user stats...")
+    UserService.rebuild_user_stats(user_id)
+    print("User stats rebuilt")
+
+
+@manager.command
+def reconcile_stats():
+    print("Started reconciling homepage stats...")
+    drift = StatsService.reconcile_global_stats()
+    for scope, counters in sorted(drift.items()):
+        for name, (kept, recomputed) in sorted(counters.items()):
+            print(f"{scope} {name}: {kept} kept, {recomputed} recomputed")
+    print(f"Homepage stats reconciled, {len(drift)} scopes had drifted")
+
+
+@manager.option("-w", "--workers", type=int, help="Number of job threads")
+@manager.option("-p", "--poll_interval", type=float, help="Seconds between polls")
+def run_jobs(workers=None, poll_interval=None):
+    """Runs the queued background jobs, like notification emails, until interrupted"""
+    JobService.run_worker(application, workers, poll_interval)
+
+
 @manager.command
 def update_project_categories(filename):
     with open(filename, "r", encoding="ISO-8859-1", newline="") as csvfile:
@@ -0,0 +1,55 @@
+"""empty message
+
+Revision ID: 5b7e0c2d9a41
+Revises: 9c4e2d7a1f36
+Create Date: 2026-10-18 16:21:09.402718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b7e0c2d9a41"
+down_revision = "9c4e2d7a1f36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "task_stats_daily",
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("mapped", sa.Integer(), nullable=False),
+        sa.Column("validated", sa.Integer(), nullable=False),
+        sa.Column("bad_imagery", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id", "day"),
+    )
+    op.create_index(
+        "idx_task_stats_daily_day", "task_stats_daily", ["day"], unique=False
+    )
+
+    # Backfill the rollup with the first state change of every task to each counted state
+    op.execute(
+        """
+        insert into task_stats_daily (project_id, day, mapped, validated, bad_imagery)
+        select project_id, day,
+               count(*) filter (where action_text = 'MAPPED'),
+               count(*) filter (where action_text = 'VALIDATED'),
+               count(*) filter (where action_text = 'BADIMAGERY')
+          from (select distinct on (project_id, task_id, action_text)
+                       project_id, action_text, action_date::date as day
+                  from task_history
+                 where action = 'STATE_CHANGE'
+                   and action_text in ('MAPPED', 'VALIDATED', 'BADIMAGERY')
+                 order by project_id, task_id, action_text, action_date) first_changes
+         group by project_id, day
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("idx_task_stats_daily_day", table_name="task_stats_daily")
+    op.drop_table("task_stats_daily")
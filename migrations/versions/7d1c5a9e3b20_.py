@@ -0,0 +1,84 @@
+"""empty message
+
+Revision ID: 7d1c5a9e3b20
+Revises: 42c782eaa790
+Create Date: 2026-10-18 10:12:31.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d1c5a9e3b20"
+down_revision = "42c782eaa790"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "project_activity_stats",
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("total_contributors", sa.Integer(), nullable=False),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id"),
+    )
+    op.create_table(
+        "project_lock_activity",
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("lock_count", sa.Integer(), nullable=False),
+        sa.Column("lock_seconds", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id", "day"),
+    )
+    op.create_table(
+        "task_last_actions",
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("action_date", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id", "task_id"),
+    )
+
+    # Backfill the rollups from the existing task history
+    op.execute(
+        """
+        insert into project_activity_stats (project_id, total_contributors, last_activity)
+        select p.id, count(distinct th.user_id), max(th.action_date)
+          from projects p
+          left join task_history th on th.project_id = p.id and th.action != 'COMMENT'
+         group by p.id
+        """
+    )
+    op.execute(
+        """
+        insert into project_lock_activity (project_id, day, lock_count, lock_seconds)
+        select project_id, action_date::date, count(*),
+               sum(extract(epoch from action_date::time))
+          from task_history
+         where action in ('LOCKED_FOR_MAPPING', 'LOCKED_FOR_VALIDATION')
+           and action_text != ''
+         group by project_id, action_date::date
+        """
+    )
+    op.execute(
+        """
+        insert into task_last_actions (project_id, task_id, action, action_date, user_id)
+        select distinct on (project_id, task_id)
+               project_id, task_id, action, action_date, user_id
+          from task_history
+         where action != 'COMMENT'
+         order by project_id, task_id, action_date desc
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("task_last_actions")
+    op.drop_table("project_lock_activity")
+    op.drop_table("project_activity_stats")
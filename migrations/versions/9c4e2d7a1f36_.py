@@ -0,0 +1,104 @@
+"""empty message
+
+Revision ID: 9c4e2d7a1f36
+Revises: 2f6b8e41c7d9
+Create Date: 2026-10-18 15:02:44.873105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.models.postgis.global_stats import STATS_TRIGGERS, STATS_RECOMPUTE
+
+
+# revision identifiers, used by Alembic.
+revision = "9c4e2d7a1f36"
+down_revision = "2f6b8e41c7d9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "global_stats",
+        sa.Column("slot", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("total_projects", sa.Integer(), nullable=False),
+        sa.Column("total_mappers", sa.Integer(), nullable=False),
+        sa.Column("total_organisations", sa.Integer(), nullable=False),
+        sa.Column("total_campaigns", sa.Integer(), nullable=False),
+        sa.Column("total_validators", sa.Integer(), nullable=False),
+        sa.Column("tasks_mapped", sa.Integer(), nullable=False),
+        sa.Column("tasks_validated", sa.Integer(), nullable=False),
+        sa.Column("total_area", sa.Float(), nullable=False),
+        sa.Column("total_mapped_area", sa.Float(), nullable=False),
+        sa.Column("total_validated_area", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("slot"),
+    )
+    op.create_table(
+        "validator_stats",
+        sa.Column("user_id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("tasks_validated", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_table(
+        "organisation_stats",
+        sa.Column("organisation_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("total_projects", sa.Integer(), nullable=False),
+        sa.Column("tasks_mapped", sa.Integer(), nullable=False),
+        sa.Column("tasks_validated", sa.Integer(), nullable=False),
+        sa.Column("mapped_area", sa.Float(), nullable=False),
+        sa.Column("validated_area", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["organisation_id"], ["organisations.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("organisation_id"),
+    )
+    op.create_table(
+        "campaign_stats",
+        sa.Column("campaign_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("total_projects", sa.Integer(), nullable=False),
+        sa.Column("tasks_mapped", sa.Integer(), nullable=False),
+        sa.Column("tasks_validated", sa.Integer(), nullable=False),
+        sa.Column("mapped_area", sa.Float(), nullable=False),
+        sa.Column("validated_area", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["campaign_id"], ["campaigns.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("campaign_id"),
+    )
+
+    # Backfill the statistics, then keep them up to date with triggers
+    for statement in STATS_RECOMPUTE:
+        op.execute(statement)
+    op.execute(STATS_TRIGGERS)
+
+
+def downgrade():
+    op.execute(
+        """
+        drop trigger if exists stats_tasks on tasks;
+        drop trigger if exists stats_projects on projects;
+        drop trigger if exists stats_projects_delete on projects;
+        drop trigger if exists stats_campaign_projects on campaign_projects;
+        drop trigger if exists stats_users on users;
+        drop trigger if exists stats_organisations on organisations;
+        drop trigger if exists stats_campaigns on campaigns;
+        drop function if exists stats_tasks_change();
+        drop function if exists stats_projects_change();
+        drop function if exists stats_campaign_projects_change();
+        drop function if exists stats_count_change();
+        drop function if exists stats_project_totals(integer);
+        drop function if exists stats_add_campaign(
+            integer, integer, integer, integer, double precision, double precision
+        );
+        drop function if exists stats_add_organisation(
+            integer, integer, integer, integer, double precision, double precision
+        );
+        drop function if exists stats_add_global(
+            integer, integer, integer, integer, integer, integer, integer,
+            double precision, double precision, double precision
+        );
+        """
+    )
+    op.drop_table("campaign_stats")
+    op.drop_table("organisation_stats")
+    op.drop_table("validator_stats")
+    op.drop_table("global_stats")
@@ -0,0 +1,28 @@
+"""empty message
+
+Revision ID: a4d9e27c1b58
+Revises: f3c8a1d52e60
+Create Date: 2026-10-19 02:14:47.530912
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "a4d9e27c1b58"
+down_revision = "f3c8a1d52e60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "idx_task_history_project_action_date",
+        "task_history",
+        ["project_id", "action_date", "id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("idx_task_history_project_action_date", table_name="task_history")
@@ -0,0 +1,85 @@
+"""empty message
+
+Revision ID: a6c3f0e8d215
+Revises: e4d19a7c6b52
+Create Date: 2026-10-18 17:52:30.671904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.models.postgis.user_stats import USER_STATS_TRIGGERS, USER_STATS_REBUILD
+
+
+# revision identifiers, used by Alembic.
+revision = "a6c3f0e8d215"
+down_revision = "e4d19a7c6b52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("tasks_mapped", sa.Integer(), nullable=False),
+        sa.Column("tasks_validated", sa.Integer(), nullable=False),
+        sa.Column("tasks_invalidated", sa.Integer(), nullable=False),
+        sa.Column("tasks_validated_by_others", sa.Integer(), nullable=False),
+        sa.Column("tasks_invalidated_by_others", sa.Integer(), nullable=False),
+        sa.Column("time_spent_mapping", sa.Float(), nullable=False),
+        sa.Column("time_spent_validating", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_table(
+        "user_project_stats",
+        sa.Column("user_id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("project_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("mapped", sa.Integer(), nullable=False),
+        sa.Column("validated", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "project_id"),
+    )
+    op.create_table(
+        "user_stats_daily",
+        sa.Column("user_id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("contributions", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "day"),
+    )
+    op.create_index(
+        "idx_task_history_validation_locks",
+        "task_history",
+        ["user_id", "action_date"],
+        unique=False,
+        postgresql_where=sa.text("action = 'LOCKED_FOR_VALIDATION'"),
+    )
+
+    # Install the trigger, then backfill the statistics from the task history
+    op.execute(USER_STATS_TRIGGERS)
+    for statement in USER_STATS_REBUILD:
+        op.execute(
+            statement.format(users_filter="", stats_filter="", history_filter="")
+        )
+
+
+def downgrade():
+    op.execute(
+        """
+        drop trigger if exists user_stats_task_history on task_history;
+        drop function if exists user_stats_task_history_change();
+        drop function if exists user_stats_apply(task_history, integer);
+        drop function if exists user_stats_add(
+            bigint, integer, integer, integer, integer, integer, double precision,
+            double precision
+        );
+        drop function if exists user_stats_seconds(text);
+        """
+    )
+    op.drop_index("idx_task_history_validation_locks", table_name="task_history")
+    op.drop_table("user_stats_daily")
+    op.drop_table("user_project_stats")
+    op.drop_table("user_stats")
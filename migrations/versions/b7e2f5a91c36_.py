@@ -0,0 +1,30 @@
+"""empty message
+
+Revision ID: b7e2f5a91c36
+Revises: a4d9e27c1b58
+Create Date: 2026-10-19 10:42:18.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7e2f5a91c36"
+down_revision = "a4d9e27c1b58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job_steps",
+        sa.Column("job_id", sa.BigInteger(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["job_id"], ["jobs.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("job_id", "key"),
+    )
+
+
+def downgrade():
+    op.drop_table("job_steps")
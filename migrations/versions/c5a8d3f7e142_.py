@@ -0,0 +1,120 @@
+"""empty message
+
+Revision ID: c5a8d3f7e142
+Revises: b7e2f5a91c36
+Create Date: 2026-10-19 14:27:51.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.models.postgis.global_stats import STATS_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = "c5a8d3f7e142"
+down_revision = "b7e2f5a91c36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, key in [
+        ("organisation_stats", "organisation_id"),
+        ("campaign_stats", "campaign_id"),
+    ]:
+        op.add_column(
+            table,
+            sa.Column(
+                "slot",
+                sa.Integer(),
+                autoincrement=False,
+                nullable=False,
+                server_default="0",
+            ),
+        )
+        op.alter_column(table, "slot", server_default=None)
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.create_primary_key(f"{table}_pkey", table, [key, "slot"])
+
+    # Spread the organisation and campaign upserts over the slots
+    op.execute(STATS_TRIGGERS)
+
+
+def downgrade():
+    for table, key in [
+        ("organisation_stats", "organisation_id"),
+        ("campaign_stats", "campaign_id"),
+    ]:
+        op.execute(
+            f"""
+            create temporary table summed_stats as
+            select {key}, sum(total_projects) as total_projects,
+                   sum(tasks_mapped) as tasks_mapped, sum(tasks_validated) as tasks_validated,
+                   sum(mapped_area) as mapped_area, sum(validated_area) as validated_area
+              from {table}
+             group by {key};
+            delete from {table};
+            insert into {table} (
+                {key}, slot, total_projects, tasks_mapped, tasks_validated, mapped_area,
+                validated_area
+            )
+            select {key}, 0, total_projects, tasks_mapped, tasks_validated, mapped_area,
+                   validated_area
+              from summed_stats;
+            drop table summed_stats;
+            """
+        )
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.drop_column(table, "slot")
+        op.create_primary_key(f"{table}_pkey", table, [key])
+
+    op.execute(
+        """
+        create or replace function stats_add_organisation(
+            p_organisation_id integer,
+            d_projects integer,
+            d_tasks_mapped integer,
+            d_tasks_validated integer,
+            d_mapped_area double precision,
+            d_validated_area double precision
+        ) returns void as $$
+            insert into organisation_stats as s (
+                organisation_id, total_projects, tasks_mapped, tasks_validated, mapped_area,
+                validated_area
+            )
+            select p_organisation_id, d_projects, d_tasks_mapped, d_tasks_validated,
+                   d_mapped_area, d_validated_area
+             where p_organisation_id is not null
+            on conflict (organisation_id) do update
+            set total_projects = s.total_projects + excluded.total_projects,
+                tasks_mapped = s.tasks_mapped + excluded.tasks_mapped,
+                tasks_validated = s.tasks_validated + excluded.tasks_validated,
+                mapped_area = s.mapped_area + excluded.mapped_area,
+                validated_area = s.validated_area + excluded.validated_area
+        $$ language sql;
+
+        create or replace function stats_add_campaign(
+            p_campaign_id integer,
+            d_projects integer,
+            d_tasks_mapped integer,
+            d_tasks_validated integer,
+            d_mapped_area double precision,
+            d_validated_area double precision
+        ) returns void as $$
+            insert into campaign_stats as s (
+                campaign_id, total_projects, tasks_mapped, tasks_validated, mapped_area,
+                validated_area
+            )
+            select p_campaign_id, d_projects, d_tasks_mapped, d_tasks_validated,
+                   d_mapped_area, d_validated_area
+             where p_campaign_id is not null
+            on conflict (campaign_id) do update
+            set total_projects = s.total_projects + excluded.total_projects,
+                tasks_mapped = s.tasks_mapped + excluded.tasks_mapped,
+                tasks_validated = s.tasks_validated + excluded.tasks_validated,
+                mapped_area = s.mapped_area + excluded.mapped_area,
+                validated_area = s.validated_area + excluded.validated_area
+        $$ language sql;
+        """
+    )
@@ -0,0 +1,41 @@
+"""empty message
+
+Revision ID: c81f4b2e7d03
+Revises: a6c3f0e8d215
+Create Date: 2026-10-18 21:37:52.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.models.postgis.task import TASK_STATE_TRIGGER
+
+
+# revision identifiers, used by Alembic.
+revision = "c81f4b2e7d03"
+down_revision = "a6c3f0e8d215"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing tasks keep a null version and are only sent to clients without a cursor
+    op.add_column("tasks", sa.Column("state_version", sa.BigInteger(), nullable=True))
+    op.create_index(
+        "idx_tasks_state_version",
+        "tasks",
+        ["project_id", "state_version"],
+        unique=False,
+    )
+    op.execute(TASK_STATE_TRIGGER)
+
+
+def downgrade():
+    op.execute(
+        """
+        drop trigger if exists tasks_state_version on tasks;
+        drop function if exists tasks_state_version();
+        """
+    )
+    op.drop_index("idx_tasks_state_version", table_name="tasks")
+    op.drop_column("tasks", "state_version")
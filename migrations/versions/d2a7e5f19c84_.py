@@ -0,0 +1,26 @@
+"""empty message
+
+Revision ID: d2a7e5f19c84
+Revises: c81f4b2e7d03
+Create Date: 2026-10-18 22:48:13.530291
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d2a7e5f19c84"
+down_revision = "c81f4b2e7d03"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "users", sa.Column("changesets_checked_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("users", "changesets_checked_at")
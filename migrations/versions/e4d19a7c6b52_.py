@@ -0,0 +1,35 @@
+"""empty message
+
+Revision ID: e4d19a7c6b52
+Revises: 5b7e0c2d9a41
+Create Date: 2026-10-18 17:08:51.219364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "e4d19a7c6b52"
+down_revision = "5b7e0c2d9a41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "project_contribs_snapshots",
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("mapped_tasks", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("validated_tasks", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("invalidated_tasks", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("stats", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("project_contribs_snapshots")
@@ -0,0 +1,39 @@
+"""empty message
+
+Revision ID: e9b3c6d04f17
+Revises: d2a7e5f19c84
+Create Date: 2026-10-18 23:41:27.806154
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e9b3c6d04f17"
+down_revision = "d2a7e5f19c84"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the latest annotation of each type of a task, so they can be upserted
+    op.execute(
+        """
+        delete from task_annotations a
+         using task_annotations b
+         where a.project_id = b.project_id
+           and a.task_id = b.task_id
+           and a.annotation_type = b.annotation_type
+           and a.id < b.id
+        """
+    )
+    op.create_index(
+        "idx_task_annotations_type",
+        "task_annotations",
+        ["project_id", "task_id", "annotation_type"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("idx_task_annotations_type", table_name="task_annotations")
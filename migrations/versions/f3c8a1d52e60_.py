@@ -0,0 +1,49 @@
+"""empty message
+
+Revision ID: f3c8a1d52e60
+Revises: e9b3c6d04f17
+Create Date: 2026-10-19 00:36:05.291874
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f3c8a1d52e60"
+down_revision = "e9b3c6d04f17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("tasks", sa.Column("effort_prediction", sa.Float(), nullable=True))
+
+    # Copy the latest numeric prediction of each task out of its annotations
+    op.execute(
+        r"""
+        update tasks
+           set effort_prediction = predictions.effort_prediction
+          from (select distinct on (project_id, task_id)
+                       project_id, task_id,
+                       (properties ->> 'building_area_diff')::double precision
+                       as effort_prediction
+                  from task_annotations
+                 where properties ->> 'building_area_diff'
+                       ~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+                 order by project_id, task_id, updated_timestamp desc) predictions
+         where tasks.project_id = predictions.project_id
+           and tasks.id = predictions.task_id
+        """
+    )
+    op.create_index(
+        "idx_tasks_effort_prediction",
+        "tasks",
+        ["project_id", sa.text("effort_prediction DESC NULLS LAST")],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("idx_tasks_effort_prediction", table_name="tasks")
+    op.drop_column("tasks", "effort_prediction")
@@ -1,4 +1,6 @@
 #!/usr/bin/env bash
 
+/bin/systemctl daemon-reload
 /bin/systemctl start tasking-manager.service
+/bin/systemctl start tasking-manager-jobs.service
 /bin/sleep 10
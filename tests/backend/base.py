@@ -1,11 +1,15 @@
 import unittest
 
 from backend import create_app, db
+from backend.models.postgis.global_stats import GlobalStats, ValidatorStats
 
 
 def clean_db(db):
     for table in reversed(db.metadata.sorted_tables):
         db.session.execute(table.delete())
+    # Deleting the rows above changed the statistics kept by the triggers
+    db.session.execute(GlobalStats.__table__.delete())
+    db.session.execute(ValidatorStats.__table__.delete())
 
 
 class BaseTestCase(unittest.TestCase):
@@ -1,6 +1,7 @@
 import geojson
 import base64
 import json
+import math
 import os
 from typing import Tuple
 import xml.etree.ElementTree as ET
@@ -72,6 +73,57 @@ def get_canned_osm_user_details_changed_name():
         raise FileNotFoundError("osm_user_details_changed_name.xml not found")
 
 
+def get_large_aoi_grid_json(islands=4, vertices=2000, tiles=150) -> dict:
+    """
+    Generates a grid request over a large aoi, made of several wobbly islands with many vertices,
+    to benchmark grid trimming
+    """
+    features = []
+    for island in range(islands):
+        centre_x, centre_y = 300 * (island % 2), 300 * (island // 2)
+        ring = []
+        for vertex in range(vertices):
+            angle = vertex * 2 * math.pi / vertices
+            radius = 100 * (1 + 0.2 * math.sin(7 * angle))
+            ring.append(
+                [
+                    centre_x + radius * math.cos(angle),
+                    centre_y + radius * math.sin(angle),
+                ]
+            )
+        ring.append(ring[0])
+        features.append(
+            geojson.Feature(geometry=geojson.Polygon([ring]), properties={})
+        )
+
+    tile_size = 4
+    origin = -150
+    grid = []
+    for x in range(tiles):
+        for y in range(tiles):
+            min_x, min_y = origin + x * tile_size, origin + y * tile_size
+            max_x, max_y = min_x + tile_size, min_y + tile_size
+            square = [
+                [min_x, min_y],
+                [min_x, max_y],
+                [max_x, max_y],
+                [max_x, min_y],
+                [min_x, min_y],
+            ]
+            grid.append(
+                geojson.Feature(
+                    geometry=geojson.MultiPolygon([[square]]),
+                    properties={"x": x, "y": y, "zoom": 19, "isSquare": True},
+                )
+            )
+
+    return {
+        "areaOfInterest": geojson.FeatureCollection(features),
+        "grid": geojson.FeatureCollection(grid),
+        "clipToAoi": True,
+    }
+
+
 def get_canned_json(name_of_file):
     """ Read canned Grid request from file """
 
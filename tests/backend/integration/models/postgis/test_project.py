@@ -42,6 +42,25 @@ class TestProject(BaseTestCase):
             self.test_project.total_tasks, len(feature_collection.features)
         )
 
+    def test_task_feature_collection_can_be_streamed_in_chunks(self):
+        self.test_project, self.test_user = create_canned_project()
+        # Act
+        chunks = list(
+            Task.get_tasks_as_geojson_stream(self.test_project.id, chunk_size=3)
+        )
+        feature_collection = geojson.loads(b"".join(chunks).decode("utf-8"))
+
+        # Assert
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(
+            self.test_project.total_tasks, len(feature_collection.features)
+        )
+        statuses = {
+            f.properties["taskId"]: f.properties["taskStatus"]
+            for f in feature_collection.features
+        }
+        self.assertEqual(statuses[1], "MAPPED")
+
     def test_project_can_be_generated_as_dto(self):
         self.test_project, self.test_user = create_canned_project()
         # Arrange
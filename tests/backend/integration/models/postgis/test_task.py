@@ -0,0 +1,492 @@
+import datetime
+import json
+import math
+import re
+
+from sqlalchemy import func
+
+from backend import db
+from backend.models.dtos.project_dto import DraftProjectDTO
+from backend.models.postgis.priority_area import PriorityArea
+from backend.models.postgis.project import Project
+from backend.models.postgis.project_activity import (
+    ProjectActivityStats,
+    ProjectLockActivity,
+    TaskLastAction,
+    TaskStatsDaily,
+)
+from backend.models.postgis.statuses import TaskStatus
+from backend.models.postgis.task import (
+    Task,
+    TaskHistory,
+    TaskAction,
+    TaskInvalidationHistory,
+)
+from backend.models.postgis.task_annotation import TaskAnnotation
+from tests.backend.base import BaseTestCase
+from tests.backend.helpers.test_helpers import (
+    create_canned_project,
+    get_canned_json,
+    return_canned_user,
+)
+
+
+def change_state_per_task(project_id, user_id, task_statuses, new_state, lock_action):
+    """ Reference implementation of Task.bulk_change_state, changing one task at a time """
+    tasks = Task.query.filter(
+        Task.project_id == project_id,
+        Task.task_status.in_([status.value for status in task_statuses]),
+    ).all()
+    for task in tasks:
+        if TaskStatus(task.task_status) not in [
+            TaskStatus.LOCKED_FOR_MAPPING,
+            TaskStatus.LOCKED_FOR_VALIDATION,
+        ]:
+            task.set_task_history(lock_action, user_id)
+            task.task_status = TaskStatus[lock_action.name].value
+            task.locked_by = user_id
+            task.update()
+        task.unlock_task(user_id, new_state=new_state)
+
+
+def reset_tasks_per_task(project_id, user_id):
+    """ Reference implementation of Task.bulk_reset_tasks, resetting one task at a time """
+    tasks = Task.query.filter(
+        Task.project_id == project_id,
+        Task.task_status != TaskStatus.READY.value,
+    ).all()
+    for task in tasks:
+        task.set_task_history(
+            TaskAction.COMMENT, user_id, "Task reset", TaskStatus.READY
+        )
+        task.reset_task(user_id)
+
+
+class TestTask(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_project, self.test_user = create_canned_project()
+
+    def lock_task(self, task_id: int, hours_ago: int) -> Task:
+        task = Task.get(task_id, self.test_project.id)
+        task.lock_task_for_mapping(self.test_user.id)
+        lock = TaskHistory.get_last_locked_action(self.test_project.id, task_id)
+        lock.action_date = datetime.datetime.utcnow() - datetime.timedelta(
+            hours=hours_ago
+        )
+        db.session.commit()
+        return task
+
+    def test_auto_unlock_tasks_releases_expired_locks(self):
+        # Arrange
+        expired_task = self.lock_task(2, hours_ago=3)
+
+        # Act
+        unlocked = Task.auto_unlock_tasks(self.test_project.id)
+
+        # Assert
+        self.assertEqual(unlocked, {self.test_project.id: [2]})
+        self.assertEqual(expired_task.task_status, TaskStatus.READY.value)
+        self.assertIsNone(expired_task.locked_by)
+        last_action = TaskHistory.get_last_action(self.test_project.id, 2)
+        self.assertEqual(last_action.action, TaskAction.AUTO_UNLOCKED_FOR_MAPPING.name)
+
+    def test_auto_unlock_tasks_keeps_current_locks(self):
+        # Arrange
+        current_task = self.lock_task(2, hours_ago=0)
+
+        # Act
+        unlocked = Task.auto_unlock_tasks()
+
+        # Assert
+        self.assertEqual(unlocked, {})
+        self.assertEqual(current_task.task_status, TaskStatus.LOCKED_FOR_MAPPING.value)
+
+    def get_rebuilt_total_contributors(self) -> int:
+        ProjectActivityStats.rebuild(self.test_project.id)
+        return ProjectActivityStats.get_total_contributors([self.test_project.id])[
+            self.test_project.id
+        ]
+
+    def test_reset_task_counts_lock_holders_once(self):
+        # Arrange
+        lock_holder = return_canned_user("lock_holder", 3333)
+        lock_holder.create()
+        task = Task.get(2, self.test_project.id)
+        task.lock_task_for_mapping(lock_holder.id)
+
+        # Act
+        task.reset_task(self.test_user.id)
+        total_contributors = ProjectActivityStats.get_total_contributors(
+            [self.test_project.id]
+        )[self.test_project.id]
+
+        # Assert
+        self.assertEqual(total_contributors, self.get_rebuilt_total_contributors())
+
+    def test_delete_task_recounts_contributors(self):
+        # Arrange
+        mapper = return_canned_user("single_task_mapper", 4444)
+        mapper.create()
+        task = Task.get(2, self.test_project.id)
+        task.lock_task_for_mapping(mapper.id)
+        task.unlock_task(mapper.id, new_state=TaskStatus.MAPPED)
+
+        # Act
+        task.delete()
+        total_contributors = ProjectActivityStats.get_total_contributors(
+            [self.test_project.id]
+        )[self.test_project.id]
+
+        # Assert
+        self.assertEqual(total_contributors, self.get_rebuilt_total_contributors())
+
+    def test_delete_task_removes_its_daily_task_stats(self):
+        # Arrange
+        for task_id in [2, 3]:
+            task = Task.get(task_id, self.test_project.id)
+            task.lock_task_for_mapping(self.test_user.id)
+            task.unlock_task(self.test_user.id, new_state=TaskStatus.MAPPED)
+
+        # Act
+        Task.get(2, self.test_project.id).delete()
+        daily_stats = self.get_daily_task_stats()
+        ProjectActivityStats.rebuild(self.test_project.id)
+
+        # Assert
+        self.assertEqual(daily_stats, self.get_daily_task_stats())
+
+    def get_daily_task_stats(self) -> list:
+        return [
+            (s.day, s.mapped, s.validated, s.bad_imagery)
+            for s in TaskStatsDaily.query.filter(
+                TaskStatsDaily.project_id == self.test_project.id,
+                TaskStatsDaily.mapped
+                + TaskStatsDaily.validated
+                + TaskStatsDaily.bad_imagery
+                > 0,
+            ).order_by(TaskStatsDaily.day)
+        ]
+
+    def set_task_statuses(self, task_status: TaskStatus, task_ids: list):
+        for task_id in task_ids:
+            Task.get(task_id, self.test_project.id).task_status = task_status.value
+        db.session.commit()
+
+    def test_get_next_available_returns_task_in_requested_status(self):
+        # Act
+        task = Task.get_next_available(
+            self.test_project.id, [TaskStatus.READY, TaskStatus.INVALIDATED]
+        )
+
+        # Assert
+        self.assertEqual(task.id, 2)
+
+    def test_get_next_available_skips_tasks_mapped_by_user(self):
+        # Act
+        task = Task.get_next_available(
+            self.test_project.id,
+            [TaskStatus.MAPPED],
+            exclude_mapped_by=self.test_user.id,
+        )
+
+        # Assert
+        self.assertIsNone(task)
+
+    def test_get_next_available_prefers_priority_areas(self):
+        # Arrange
+        self.set_task_statuses(TaskStatus.READY, [1, 2, 3, 4])
+        task_geometry = get_canned_json("non_square_task.json")["geometry"]
+        self.test_project.priority_areas.append(
+            PriorityArea.from_dict(
+                {"type": "Polygon", "coordinates": task_geometry["coordinates"][0]}
+            )
+        )
+        db.session.commit()
+
+        # Act
+        task = Task.get_next_available(self.test_project.id, [TaskStatus.READY])
+
+        # Assert
+        self.assertEqual(task.id, 2)
+
+    def test_get_next_available_prefers_tasks_near_task(self):
+        # Arrange
+        self.set_task_statuses(TaskStatus.READY, [1, 2])
+
+        # Act
+        task = Task.get_next_available(
+            self.test_project.id, [TaskStatus.READY], near_task_id=4
+        )
+
+        # Assert
+        self.assertEqual(task.id, 1)
+
+    def test_get_tasks_as_mvt_returns_tasks_within_tile(self):
+        # Arrange
+        lon, lat = (
+            db.session.query(
+                func.ST_X(func.ST_Centroid(Task.geometry)),
+                func.ST_Y(func.ST_Centroid(Task.geometry)),
+            )
+            .filter(Task.project_id == self.test_project.id, Task.id == 1)
+            .one()
+        )
+        zoom = 14
+        x = int((lon + 180) / 360 * 2 ** zoom)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * 2 ** zoom)
+
+        # Act
+        tile = Task.get_tasks_as_mvt(self.test_project.id, zoom, x, y)
+        empty_tile = Task.get_tasks_as_mvt(self.test_project.id, zoom, x + 100, y)
+
+        # Assert
+        self.assertIn(b"tasks", tile)
+        for attribute in [b"taskId", b"taskStatus", b"mappedBy"]:
+            self.assertIn(attribute, tile)
+        self.assertIn(
+            TaskStatus(Task.get(1, self.test_project.id).task_status).name.encode(),
+            tile,
+        )
+        self.assertEqual(empty_tile, b"")
+
+    def test_get_tiles_version_changes_with_task_states(self):
+        # Arrange
+        version = Task.get_tiles_version(self.test_project.id)
+        task = Task.get(2, self.test_project.id)
+
+        # Act
+        task.lock_task_for_mapping(self.test_user.id)
+        db.session.commit()
+        locked_version = Task.get_tiles_version(self.test_project.id)
+
+        # Assert
+        self.assertEqual(version[0], 4)
+        self.assertEqual(locked_version[0], 4)
+        self.assertGreater(locked_version[1], version[1])
+
+    def test_get_state_changes_returns_tasks_changed_since_cursor(self):
+        # Arrange
+        cursor, all_tasks = Task.get_state_changes(self.test_project.id)
+        self.lock_task(2, hours_ago=0)
+
+        # Act
+        next_cursor, changed_tasks = Task.get_state_changes(
+            self.test_project.id, cursor
+        )
+        _, unchanged_tasks = Task.get_state_changes(self.test_project.id, next_cursor)
+
+        # Assert
+        self.assertEqual(len(all_tasks), self.test_project.total_tasks)
+        self.assertEqual(len(changed_tasks), 1)
+        self.assertEqual(changed_tasks[0].id, 2)
+        self.assertEqual(
+            changed_tasks[0].task_status, TaskStatus.LOCKED_FOR_MAPPING.value
+        )
+        self.assertEqual(changed_tasks[0].locked_by, self.test_user.id)
+        self.assertEqual(unchanged_tasks, [])
+
+    def test_get_tasks_as_geojson_stream_orders_and_filters_by_effort_prediction(
+        self,
+    ):
+        # Arrange
+        TaskAnnotation.upsert(
+            self.test_project.id,
+            "building_area",
+            [
+                dict(
+                    task_id=task_id,
+                    properties={"building_area_diff": building_area_diff},
+                    annotation_source=None,
+                    annotation_markdown=None,
+                )
+                for task_id, building_area_diff in [(1, "5.5"), (2, 20), (3, "n/a")]
+            ],
+        )
+        db.session.commit()
+
+        def get_task_ids(**kwargs):
+            stream = Task.get_tasks_as_geojson_stream(self.test_project.id, **kwargs)
+            features = json.loads(b"".join(stream))["features"]
+            return [feature["properties"]["taskId"] for feature in features]
+
+        # Act
+        top_tasks = get_task_ids(
+            order_by="effort_prediction", order_by_type="DESC", limit=2
+        )
+        easiest_tasks = get_task_ids(order_by="effort_prediction")
+        tasks_above = get_task_ids(min_effort=10)
+        tasks_below = get_task_ids(max_effort=10)
+
+        # Assert
+        self.assertEqual(Task.get(3, self.test_project.id).effort_prediction, None)
+        self.assertEqual(top_tasks, [2, 1])
+        self.assertEqual(easiest_tasks[:2], [1, 2])
+        self.assertEqual(tasks_above, [2])
+        self.assertEqual(tasks_below, [1])
+
+    def test_bulk_insert_matches_tasks_created_from_features(self):
+        # Arrange
+        features = [
+            get_canned_json("splittable_task.json"),
+            get_canned_json("non_square_task.json"),
+        ]
+        project_dto = DraftProjectDTO()
+        project_dto.project_name = "Bulk insert project"
+        project_dto.user_id = self.test_user.id
+        project_dto.area_of_interest = get_canned_json("test_aoi.json")
+        bulk_project = Project()
+        bulk_project.create_draft_project(project_dto)
+        bulk_project.set_project_aoi(project_dto)
+        db.session.add(bulk_project)
+        db.session.flush()
+
+        # Act
+        Task.bulk_insert(bulk_project.id, Task.rows_from_geojson_features(features))
+        db.session.commit()
+
+        # Assert
+        for task_id in [1, 2]:
+            expected = Task.get(task_id, self.test_project.id)
+            actual = Task.get(task_id, bulk_project.id)
+            self.assertEqual(
+                (actual.x, actual.y, actual.zoom, actual.extra_properties),
+                (expected.x, expected.y, expected.zoom, expected.extra_properties),
+            )
+            self.assertEqual(actual.task_status, TaskStatus.READY.value)
+            self.assertEqual(
+                db.session.query(func.ST_AsEWKB(Task.geometry))
+                .filter(Task.id == task_id, Task.project_id == bulk_project.id)
+                .scalar(),
+                db.session.query(func.ST_AsEWKB(Task.geometry))
+                .filter(Task.id == task_id, Task.project_id == self.test_project.id)
+                .scalar(),
+            )
+
+    def run_bulk_scenario(self, project_id: int, other_user_id: int, bulk: bool):
+        change_state = Task.bulk_change_state if bulk else change_state_per_task
+        reset_tasks = Task.bulk_reset_tasks if bulk else reset_tasks_per_task
+        user_id = self.test_user.id
+
+        Task.get(2, project_id).lock_task_for_mapping(user_id)
+        # Map all, validate all, invalidate all and map and validate again
+        for task_statuses, new_state, lock_action in [
+            (
+                [TaskStatus.READY, TaskStatus.LOCKED_FOR_MAPPING],
+                TaskStatus.MAPPED,
+                TaskAction.LOCKED_FOR_MAPPING,
+            ),
+            (
+                [TaskStatus.MAPPED],
+                TaskStatus.VALIDATED,
+                TaskAction.LOCKED_FOR_VALIDATION,
+            ),
+            (
+                [TaskStatus.VALIDATED],
+                TaskStatus.INVALIDATED,
+                TaskAction.LOCKED_FOR_VALIDATION,
+            ),
+            (
+                [TaskStatus.INVALIDATED],
+                TaskStatus.MAPPED,
+                TaskAction.LOCKED_FOR_MAPPING,
+            ),
+            (
+                [TaskStatus.MAPPED],
+                TaskStatus.VALIDATED,
+                TaskAction.LOCKED_FOR_VALIDATION,
+            ),
+            (
+                [TaskStatus.BADIMAGERY],
+                TaskStatus.READY,
+                TaskAction.LOCKED_FOR_MAPPING,
+            ),
+        ]:
+            change_state(project_id, user_id, task_statuses, new_state, lock_action)
+            db.session.commit()
+
+        Task.get(3, project_id).lock_task_for_mapping(other_user_id)
+        reset_tasks(project_id, user_id)
+        db.session.commit()
+
+    def get_bulk_scenario_state(self, project_id: int) -> dict:
+        tasks = Task.query.filter(Task.project_id == project_id).order_by(Task.id).all()
+        history = (
+            TaskHistory.query.filter(TaskHistory.project_id == project_id)
+            .order_by(TaskHistory.task_id, TaskHistory.action_date, TaskHistory.id)
+            .all()
+        )
+        invalidations = (
+            TaskInvalidationHistory.query.filter(
+                TaskInvalidationHistory.project_id == project_id
+            )
+            .order_by(TaskInvalidationHistory.task_id, TaskInvalidationHistory.id)
+            .all()
+        )
+        # Lock durations depend on the time the locks were held
+        duration = re.compile(r"^\d{2}:\d{2}:\d{2}(\.\d{6})?$")
+        return dict(
+            tasks=[
+                (t.id, t.task_status, t.mapped_by, t.validated_by, t.locked_by)
+                for t in tasks
+            ],
+            history=[
+                (
+                    h.task_id,
+                    h.action,
+                    "duration"
+                    if h.action.startswith("LOCKED_")
+                    and duration.match(h.action_text or "")
+                    else h.action_text,
+                    h.user_id,
+                )
+                for h in history
+            ],
+            invalidations=[
+                (
+                    i.task_id,
+                    i.is_closed,
+                    i.mapper_id,
+                    i.invalidator_id,
+                    i.validator_id,
+                    i.invalidation_history_id is not None,
+                )
+                for i in invalidations
+            ],
+            total_contributors=ProjectActivityStats.get_total_contributors(
+                [project_id]
+            )[project_id],
+            lock_count=db.session.query(func.sum(ProjectLockActivity.lock_count))
+            .filter(ProjectLockActivity.project_id == project_id)
+            .scalar(),
+            last_actions=[
+                (a.task_id, a.action, a.user_id)
+                for a in TaskLastAction.query.filter(
+                    TaskLastAction.project_id == project_id
+                ).order_by(TaskLastAction.task_id)
+            ],
+        )
+
+    def test_bulk_state_changes_match_per_task_changes(self):
+        # Arrange
+        other_user = return_canned_user("other_mapper", 2222)
+        other_user.create()
+        per_task_project = self.test_project
+        bulk_project, _ = create_canned_project()
+
+        # Act
+        self.run_bulk_scenario(per_task_project.id, other_user.id, bulk=False)
+        self.run_bulk_scenario(bulk_project.id, other_user.id, bulk=True)
+
+        bulk_state = self.get_bulk_scenario_state(bulk_project.id)
+        per_task_state = self.get_bulk_scenario_state(per_task_project.id)
+        ProjectActivityStats.rebuild(bulk_project.id)
+
+        # Assert
+        self.assertEqual(bulk_state, per_task_state)
+        self.assertEqual(
+            bulk_state["total_contributors"],
+            ProjectActivityStats.get_total_contributors([bulk_project.id])[
+                bulk_project.id
+            ],
+        )
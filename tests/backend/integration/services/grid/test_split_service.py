@@ -1,13 +1,15 @@
 import json
-from shapely.geometry import Polygon
+from shapely.geometry import MultiPolygon, Polygon, shape as shapely_shape
 from geoalchemy2 import shape
 from unittest.mock import patch
 
 import geojson
 
+from backend import db
 from backend.models.dtos.grid_dto import SplitTaskDTO
 from backend.models.postgis.project import Project
 from backend.models.postgis.task import Task
+from backend.models.postgis.utils import ST_Area, ST_GeogFromWKB
 from backend.services.grid.split_service import SplitService, SplitServiceError
 from tests.backend.base import BaseTestCase
 from tests.backend.helpers.test_helpers import get_canned_json
@@ -38,6 +40,37 @@ class TestSplitService(BaseTestCase):
         # assert
         self.assertEqual(str(expected), str(result))
 
+    def test_split_geom_over_several_levels(self):
+        # arrange
+        x = 1010
+        y = 1399
+        zoom = 11
+        task_stub = Task()
+        task_stub.is_square = True
+        expected = geojson.loads(json.dumps(get_canned_json("split_task.json")))
+
+        # act
+        result = SplitService._create_split_tasks(x, y, zoom, task_stub, levels=2)
+
+        # assert
+        self.assertEqual(16, len(result))
+        self.assertEqual({13}, {feature.properties["zoom"] for feature in result})
+        self.assertEqual(
+            MultiPolygon([shapely_shape(f.geometry).geoms[0] for f in expected]).bounds,
+            MultiPolygon([shapely_shape(f.geometry).geoms[0] for f in result]).bounds,
+        )
+
+    def test_task_area_matches_postgis(self):
+        # arrange
+        task = Task.get(1, self.test_project.id)
+        expected = db.engine.execute(ST_Area(ST_GeogFromWKB(task.geometry))).scalar()
+
+        # act
+        result = SplitService._geodesic_area(shape.to_shape(task.geometry))
+
+        # assert
+        self.assertAlmostEqual(expected, result, delta=expected * 1e-6)
+
     def test_split_geom_raise_grid_service_error_when_task_not_usable(self):
         with self.assertRaises(SplitServiceError):
             task_stub = Task()
@@ -1,4 +1,3 @@
-import threading
 from unittest.mock import patch
 
 from backend.models.postgis.statuses import ProjectStatus
@@ -6,6 +5,7 @@ from backend.models.postgis.team import TeamRoles, TeamMemberFunctions
 from tests.backend.base import BaseTestCase
 from backend.models.dtos.message_dto import ChatMessageDTO
 from backend.services.messaging.chat_service import ChatService
+from backend.services.job_service import JobService
 from tests.backend.helpers.test_helpers import (
     create_canned_project,
     return_canned_user,
@@ -26,14 +26,14 @@ class TestChatService(BaseTestCase):
         self.chat_dto.timestamp = "2022-06-30T05:45:06.198755Z"
         self.chat_dto.username = self.canned_author.username
 
-    @patch.object(threading, "Thread")
-    def test_post_message_sets_thread_if_user_allowed(self, mock_thread):
+    @patch.object(JobService, "enqueue")
+    def test_post_message_enqueues_notifications_if_user_allowed(self, mock_enqueue):
         # Act
         ChatService.post_message(
             self.chat_dto, self.canned_project.id, self.canned_author.id
         )
         # Assert
-        mock_thread.assert_called()
+        mock_enqueue.assert_called()
 
     def test_post_message_raises_error_if_user_not_manager_in_draft_project(self):
         # Arrange
@@ -48,9 +48,9 @@ class TestChatService(BaseTestCase):
         with self.assertRaises(ValueError):
             ChatService.post_message(self.chat_dto, self.canned_project.id, sender.id)
 
-    @patch.object(threading, "Thread")
-    def test_post_message_sets_thread_if_user_member_of_allowed_team_in_private_project(
-        self, mock_thread
+    @patch.object(JobService, "enqueue")
+    def test_post_message_enqueues_notifications_if_user_member_of_allowed_team_in_private_project(
+        self, mock_enqueue
     ):
         # Arrange
         sender = return_canned_user()
@@ -69,7 +69,7 @@ class TestChatService(BaseTestCase):
             self.chat_dto, self.canned_project.id, self.canned_author.id
         )
         # Assert
-        mock_thread.assert_called()
+        mock_enqueue.assert_called()
 
     def test_post_message_raises_error_if_user_not_member_of_allowed_team_in_private_project(
         self,
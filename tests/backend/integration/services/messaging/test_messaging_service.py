@@ -83,7 +83,9 @@ class TestMessageService(BaseTestCase):
         message_dto.message_type = MessageType.PROJECT_ACTIVITY_NOTIFICATION.value
         message_dto.sent_date = "2020-01-01"
         # Act
-        MessageService.send_message_to_all_contributors(canned_project.id, message_dto)
+        MessageService.send_message_to_all_contributors(
+            canned_project.id, message_dto.to_primitive()
+        )
         # Assert
         mock_push_message.assert_called()
 
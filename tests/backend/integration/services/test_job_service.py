@@ -0,0 +1,118 @@
+import datetime
+from unittest.mock import patch
+
+from backend import db
+from backend.models.postgis.job import Job
+from backend.models.postgis.statuses import JobStatus
+from backend.services.job_service import JobService, JobServiceError
+from backend.services.messaging.message_service import MessageService
+from tests.backend.base import BaseTestCase
+
+
+class TestJobService(BaseTestCase):
+    def enqueue_transfer_message(self) -> Job:
+        job_id = JobService.enqueue(
+            "send_project_transfer_message",
+            project_id=1,
+            transferred_to="new_owner",
+            transferred_by="old_owner",
+        )
+        return Job.query.get(job_id)
+
+    def test_enqueue_raises_error_if_job_unknown(self):
+        # Act/Assert
+        with self.assertRaises(JobServiceError):
+            JobService.enqueue("unknown_job", project_id=1)
+
+    @patch.object(MessageService, "send_project_transfer_message")
+    def test_run_pending_runs_job_with_payload(self, mock_send_message):
+        # Arrange
+        job = self.enqueue_transfer_message()
+
+        # Act
+        jobs_run = JobService.run_pending()
+
+        # Assert
+        self.assertEqual(jobs_run, 1)
+        mock_send_message.assert_called_with(
+            project_id=1, transferred_to="new_owner", transferred_by="old_owner"
+        )
+        self.assertEqual(job.status, JobStatus.DONE.value)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(JobService.run_pending(), 0)
+
+    @patch.object(MessageService, "send_project_transfer_message")
+    def test_run_pending_retries_failed_job_with_backoff(self, mock_send_message):
+        # Arrange
+        mock_send_message.side_effect = Exception("SMTP server unavailable")
+        job = self.enqueue_transfer_message()
+
+        # Act
+        JobService.run_pending()
+
+        # Assert
+        self.assertEqual(job.status, JobStatus.QUEUED.value)
+        self.assertEqual(job.last_error, "SMTP server unavailable")
+        self.assertGreater(job.run_at, datetime.datetime.utcnow())
+        self.assertEqual(JobService.run_pending(), 0)
+
+    @patch.object(MessageService, "send_project_transfer_message")
+    def test_run_pending_gives_up_after_max_attempts(self, mock_send_message):
+        # Arrange
+        mock_send_message.side_effect = Exception("SMTP server unavailable")
+        job = self.enqueue_transfer_message()
+        job.max_attempts = 1
+        db.session.commit()
+
+        # Act
+        JobService.run_pending()
+
+        # Assert
+        self.assertEqual(job.status, JobStatus.FAILED.value)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_pending_fails_lost_job_out_of_attempts(self):
+        # Arrange
+        job = self.enqueue_transfer_message()
+        job.status = JobStatus.RUNNING.value
+        job.attempts = job.max_attempts
+        job.locked_at = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        db.session.commit()
+
+        # Act
+        jobs_run = JobService.run_pending()
+
+        # Assert
+        db.session.refresh(job)
+        self.assertEqual(jobs_run, 0)
+        self.assertEqual(job.status, JobStatus.FAILED.value)
+        self.assertEqual(job.attempts, job.max_attempts)
+
+    @patch.object(MessageService, "send_project_transfer_message")
+    def test_run_pending_skips_steps_done_by_failed_attempt(self, mock_send_message):
+        # Arrange
+        sent = []
+
+        def send_to_recipients(**payload):
+            for recipient in [1, 2]:
+                step = f"recipient:{recipient}"
+                if JobService.is_step_done(step):
+                    continue
+                JobService.record_step(step)
+                db.session.commit()
+                sent.append(recipient)
+                if len(sent) == 1:
+                    raise Exception("SMTP server unavailable")
+
+        mock_send_message.side_effect = send_to_recipients
+        job = self.enqueue_transfer_message()
+        JobService.run_pending()
+        job.run_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+        # Act
+        JobService.run_pending()
+
+        # Assert
+        self.assertEqual(sent, [1, 2])
+        self.assertEqual(job.status, JobStatus.DONE.value)
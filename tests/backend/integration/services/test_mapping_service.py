@@ -1,6 +1,11 @@
 import datetime
+import gzip
 import hashlib
 from unittest.mock import patch
+
+from geoalchemy2 import shape
+
+from backend.api.utils import gzip_stream
 from backend.services.mapping_service import MappingService, Task
 from backend.models.postgis.task import TaskStatus
 from tests.backend.base import BaseTestCase
@@ -17,14 +22,14 @@ class TestMappingService(BaseTestCase):
         super().setUp()
         self.test_project, self.test_user = create_canned_project()
 
-    @patch.object(Task, "get_tasks")
+    @patch.object(Task, "get_tasks_as_wkb")
     def test_gpx_xml_file_generated_correctly(self, mock_task):
         if self.skip_tests:
             return
 
         # Arrange
         task = Task.get(1, self.test_project.id)
-        mock_task.return_value = [task]
+        mock_task.return_value = [(task.id, shape.to_shape(task.geometry).wkb)]
         timestamp = datetime.date(2017, 4, 13)
 
         # Act
@@ -37,14 +42,14 @@ class TestMappingService(BaseTestCase):
         # Assert
         self.assertEqual(gpx_hash, "b91f7361cc1d6d9433cf393609103272")
 
-    @patch.object(Task, "get_all_tasks")
+    @patch.object(Task, "get_tasks_as_wkb")
     def test_gpx_xml_file_generated_correctly_all_tasks(self, mock_task):
         if self.skip_tests:
             return
 
         # Arrange
         task = Task.get(1, self.test_project.id)
-        mock_task.return_value = [task]
+        mock_task.return_value = [(task.id, shape.to_shape(task.geometry).wkb)]
         timestamp = datetime.date(2017, 4, 13)
 
         # Act
@@ -57,14 +62,14 @@ class TestMappingService(BaseTestCase):
         # Assert
         self.assertEqual(gpx_hash, "b91f7361cc1d6d9433cf393609103272")
 
-    @patch.object(Task, "get_tasks")
+    @patch.object(Task, "get_tasks_as_wkb")
     def test_osm_xml_file_generated_correctly(self, mock_task):
         if self.skip_tests:
             return
 
         # Arrange
         task = Task.get(1, self.test_project.id)
-        mock_task.return_value = [task]
+        mock_task.return_value = [(task.id, shape.to_shape(task.geometry).wkb)]
 
         # Act
         osm_xml = MappingService.generate_osm_xml(1, "1,2")
@@ -76,14 +81,14 @@ class TestMappingService(BaseTestCase):
         # Assert
         self.assertEqual(osm_hash, "eafd0760a0d372e2ab139e25a2d300f1")
 
-    @patch.object(Task, "get_all_tasks")
+    @patch.object(Task, "get_tasks_as_wkb")
     def test_osm_xml_file_generated_correctly_all_tasks(self, mock_task):
         if self.skip_tests:
             return
 
         # Arrange
         task = Task.get(1, self.test_project.id)
-        mock_task.return_value = [task]
+        mock_task.return_value = [(task.id, shape.to_shape(task.geometry).wkb)]
 
         # Act
         osm_xml = MappingService.generate_osm_xml(1, None)
@@ -95,6 +100,21 @@ class TestMappingService(BaseTestCase):
         # Assert
         self.assertEqual(osm_hash, "eafd0760a0d372e2ab139e25a2d300f1")
 
+    @patch.object(Task, "get_tasks_as_wkb")
+    def test_gpx_xml_file_streamed_with_gzip(self, mock_task):
+        # Arrange
+        task = Task.get(1, self.test_project.id)
+        mock_task.return_value = [(task.id, shape.to_shape(task.geometry).wkb)]
+        timestamp = datetime.date(2017, 4, 13)
+
+        # Act
+        gpx_gzip = b"".join(gzip_stream(MappingService.stream_gpx(1, "1", timestamp)))
+
+        # Assert
+        self.assertEqual(
+            gzip.decompress(gpx_gzip), MappingService.generate_gpx(1, "1", timestamp)
+        )
+
     def test_map_all_sets_counters_correctly(self):
         if self.skip_tests:
             return
@@ -4,7 +4,7 @@ from flask import current_app
 
 from backend.models.postgis.project import Project, User, NotFound, ProjectPriority
 from backend.models.postgis.statuses import UserRole, ProjectDifficulty
-from backend.services.messaging.message_service import MessageService
+from backend.services.job_service import JobService
 from backend.services.team_service import TeamService
 from tests.backend.base import BaseTestCase
 from backend.models.dtos.organisation_dto import ListOrganisationsDTO
@@ -150,14 +150,15 @@ class TestProjectAdminService(BaseTestCase):
         test_project = Project()
 
         # Act
-        ProjectAdminService._attach_tasks_to_project(
+        task_rows = ProjectAdminService._attach_tasks_to_project(
             test_project, valid_feature_collection
         )
 
         # Assert
+        self.assertEqual(1, test_project.total_tasks)
         self.assertEqual(
             1,
-            test_project.tasks.count(),
+            len(task_rows),
             "One task should have been attached to project",
         )
 
@@ -425,7 +426,7 @@ class TestProjectAdminService(BaseTestCase):
             updated_project.priority, ProjectPriority[dto.project_priority].value
         )
 
-    @patch.object(MessageService, "send_project_transfer_message")
+    @patch.object(JobService, "enqueue")
     def test_project_transfer_to_(self, mock_send_message):
         test_project, test_author = create_canned_project()
         test_organisation = create_canned_organisation()
@@ -461,7 +462,10 @@ class TestProjectAdminService(BaseTestCase):
             test_project.id, test_author.id, test_manager.username
         )
         mock_send_message.assert_called_with(
-            test_project.id, test_manager.username, test_author.username
+            "send_project_transfer_message",
+            project_id=test_project.id,
+            transferred_to=test_manager.username,
+            transferred_by=test_author.username,
         )
 
         # Test admin can transfer project
@@ -472,7 +476,10 @@ class TestProjectAdminService(BaseTestCase):
             test_project.id, test_user.id, test_manager.username
         )
         mock_send_message.assert_called_with(
-            test_project.id, test_manager.username, test_user.username
+            "send_project_transfer_message",
+            project_id=test_project.id,
+            transferred_to=test_manager.username,
+            transferred_by=test_user.username,
         )
 
         # Test org manager can transfer project
@@ -482,5 +489,24 @@ class TestProjectAdminService(BaseTestCase):
             test_project.id, test_manager.id, test_manager.username
         )
         mock_send_message.assert_called_with(
-            test_project.id, test_manager.username, test_manager.username
+            "send_project_transfer_message",
+            project_id=test_project.id,
+            transferred_to=test_manager.username,
+            transferred_by=test_manager.username,
         )
+
+    def test_backfill_project_countries_sets_countries_of_projects_without(self):
+        # Arrange
+        test_project, _ = create_canned_project()
+        test_project.country = None
+        test_project.save()
+
+        # Act
+        updated, unmatched = ProjectAdminService.backfill_project_countries()
+        rerun_updated, _ = ProjectAdminService.backfill_project_countries()
+
+        # Assert
+        self.assertEqual(updated, 1)
+        self.assertEqual(unmatched, [])
+        self.assertEqual(rerun_updated, 0)
+        self.assertEqual(Project.get(test_project.id).country, ["United Kingdom"])
@@ -1,13 +1,16 @@
 import json
+from sqlalchemy import event
 from backend.services.project_search_service import ProjectSearchService
+from backend.services.cache_service import CacheService
 from backend.services.users.user_service import UserService
 from backend.models.postgis.project import ProjectInfo, Project
 from shapely.geometry import Polygon
 from unittest.mock import patch
-from backend.models.dtos.project_dto import ProjectSearchBBoxDTO
+from backend.models.dtos.project_dto import ProjectSearchBBoxDTO, ProjectSearchDTO
+from backend.models.postgis.statuses import ProjectStatus
 from backend.models.postgis.user import User
 from tests.backend.base import BaseTestCase
-from tests.backend.helpers.test_helpers import get_canned_json
+from tests.backend.helpers.test_helpers import get_canned_json, create_canned_project
 
 
 class TestProjectSearchService(BaseTestCase):
@@ -110,3 +113,44 @@ class TestProjectSearchService(BaseTestCase):
 
         # assert
         self.assertAlmostEqual(expected, 28276407740.2797, places=3)
+
+    def _count_search_queries(self) -> int:
+        search_dto = ProjectSearchDTO()
+        search_dto.preferred_locale = "en"
+        search_dto.project_statuses = [ProjectStatus.PUBLISHED.name]
+        search_dto.order_by = "priority"
+        search_dto.order_by_type = "ASC"
+        search_dto.page = 1
+        search_dto.omit_map_results = True
+        CacheService.get_backend().clear()
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(self.db.engine, "before_cursor_execute", count_statement)
+        try:
+            ProjectSearchService.search_projects(search_dto, None)
+        finally:
+            event.remove(self.db.engine, "before_cursor_execute", count_statement)
+
+        return len(statements)
+
+    def test_search_projects_query_count_does_not_grow_with_results(self):
+        # Arrange
+        test_project, test_user = create_canned_project()
+        test_project.status = ProjectStatus.PUBLISHED.value
+        test_project.save()
+        single_result_queries = self._count_search_queries()
+
+        for _ in range(4):
+            project, _ = create_canned_project()
+            project.status = ProjectStatus.PUBLISHED.value
+            project.save()
+
+        # Act
+        many_results_queries = self._count_search_queries()
+
+        # Assert
+        self.assertEqual(single_result_queries, many_results_queries)
@@ -1,6 +1,15 @@
+import datetime
 from unittest.mock import patch
 
-from backend.models.postgis.statuses import ProjectStatus, UserRole
+from sqlalchemy import text
+
+from backend import db
+from backend.models.postgis.job import Job
+from backend.models.postgis.project_activity import ProjectContribsSnapshot
+from backend.models.postgis.statuses import ProjectStatus, TaskStatus, UserRole
+from backend.models.postgis.task import Task, TaskHistory
+from backend.services.cache_service import CacheService
+from backend.services.job_service import JobService
 from backend.services.project_admin_service import ProjectAdminService
 from backend.services.project_service import ProjectService, ProjectServiceError
 from backend.services.team_service import TeamService
@@ -28,6 +37,29 @@ class TestProjectService(BaseTestCase):
         # Assert
         self.assertIsNotNone(project_dto)
 
+    def test_auto_unlock_tasks_async_queues_one_job(self):
+        # Arrange
+        task = Task.get(2, self.test_project.id)
+        task.lock_task_for_mapping(self.test_mapper.id)
+        lock = TaskHistory.get_last_locked_action(self.test_project.id, 2)
+        lock.action_date = datetime.datetime.utcnow() - datetime.timedelta(hours=3)
+        db.session.commit()
+        CacheService.get_backend().clear()
+
+        # Act
+        ProjectService.auto_unlock_tasks_async(self.test_project.id)
+        # Another worker doesn't share the throttle of the first one
+        CacheService.get_backend().clear()
+        ProjectService.auto_unlock_tasks_async(self.test_project.id)
+        jobs = Job.query.filter_by(name="auto_unlock_tasks").count()
+        JobService.run_pending()
+
+        # Assert
+        self.assertEqual(jobs, 1)
+        self.assertEqual(
+            Task.get(2, self.test_project.id).task_status, TaskStatus.READY.value
+        )
+
     def test_get_project_dto_for_mapper_raises_error_if_draft_project(self):
         # Project status is already set as draft while creating test project so no need to change it's status
         # Act/Assert
@@ -90,3 +122,139 @@ class TestProjectService(BaseTestCase):
         )
         # Assert
         self.assertIsNotNone(project_dto)
+
+    def add_state_changes(self, changes):
+        """ Adds (days ago, action_text, task_id) state changes to the history of the test project """
+        now = datetime.datetime.utcnow()
+        for days_ago, action_text, task_id in changes:
+            db.session.execute(
+                text(
+                    """
+                    insert into task_history (project_id, task_id, action, action_text, action_date, user_id)
+                    values (:project_id, :task_id, 'STATE_CHANGE', :action_text, :action_date, :user_id)
+                    """
+                ),
+                dict(
+                    project_id=self.test_project.id,
+                    task_id=task_id,
+                    action_text=action_text,
+                    action_date=now - datetime.timedelta(days=days_ago),
+                    user_id=self.project_author.id,
+                ),
+            )
+        db.session.commit()
+
+    def test_get_contribs_by_day_returns_cumulative_timeline(self):
+        # Arrange
+        self.add_state_changes(
+            [
+                (3, "MAPPED", 1),
+                (3, "MAPPED", 2),
+                (2, "VALIDATED", 1),
+                (2, "INVALIDATED", 2),
+                (1, "MAPPED", 2),
+            ]
+        )
+
+        # Act
+        contribs = ProjectService.get_contribs_by_day(self.test_project.id)
+
+        # Assert
+        self.assertEqual(
+            [
+                (
+                    day.mapped,
+                    day.validated,
+                    day.cumulative_mapped,
+                    day.cumulative_validated,
+                )
+                for day in contribs.stats
+            ],
+            [(2, 0, 2, 0), (0, 1, 1, 1), (1, 0, 2, 1)],
+        )
+
+    def test_get_contribs_by_day_resumes_from_snapshot(self):
+        # Arrange
+        self.add_state_changes(
+            [
+                (4, "MAPPED", 1),
+                (3, "MAPPED", 2),
+                (2, "INVALIDATED", 1),
+                (0, "MAPPED", 3),
+            ]
+        )
+        with patch.dict(self.app.config, {"CONTRIBS_SNAPSHOT_MIN_EVENTS": 1}):
+            ProjectService.get_contribs_by_day(self.test_project.id)
+        JobService.run_pending()
+        self.add_state_changes([(0, "VALIDATED", 2)])
+
+        # Act
+        snapshot = ProjectContribsSnapshot.query.get(self.test_project.id)
+        contribs = ProjectService.get_contribs_by_day(self.test_project.id)
+        ProjectContribsSnapshot.invalidate(self.test_project.id)
+        replayed_contribs = ProjectService.get_contribs_by_day(self.test_project.id)
+
+        # Assert
+        self.assertEqual(
+            snapshot.day, datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+        )
+        self.assertEqual(snapshot.mapped_tasks, [2])
+        self.assertEqual(snapshot.invalidated_tasks, [1])
+        self.assertEqual(len(snapshot.stats), 3)
+        self.assertEqual(contribs.to_primitive(), replayed_contribs.to_primitive())
+        self.assertEqual(contribs.stats[-1].cumulative_mapped, 2)
+        self.assertEqual(contribs.stats[-1].cumulative_validated, 1)
+
+    def test_get_contribs_by_day_only_replays_events_after_snapshot(self):
+        # Arrange
+        # 10k distinct state changes, one of each kind per task and day over more than 2 years
+        db.session.execute(
+            text(
+                """
+                insert into task_history (project_id, task_id, action, action_text, action_date, user_id)
+                select :project_id, i % 4 + 1, 'STATE_CHANGE',
+                       (array['MAPPED', 'VALIDATED', 'INVALIDATED'])[i / 4 % 3 + 1],
+                       date '2000-01-01' + i / 12, :user_id
+                  from generate_series(0, 9999) as i
+                """
+            ),
+            dict(project_id=self.test_project.id, user_id=self.project_author.id),
+        )
+        db.session.commit()
+        self.add_state_changes([(0, "MAPPED", 1)])
+
+        # Act
+        with patch.dict(self.app.config, {"CONTRIBS_SNAPSHOT_MIN_EVENTS": 10000}):
+            contribs = ProjectService.get_contribs_by_day(self.test_project.id)
+            ProjectService.get_contribs_by_day(self.test_project.id)
+        job = Job.get_pending(
+            "save_contribs_snapshot", dict(project_id=self.test_project.id)
+        )
+        saved_by_request = ProjectContribsSnapshot.query.get(self.test_project.id)
+        JobService.run_pending()
+        snapshot = ProjectContribsSnapshot.query.get(self.test_project.id)
+        # Only the events after the snapshot are left to replay
+        db.session.execute(
+            text(
+                "delete from task_history where project_id = :project_id and action_date < :today"
+            ),
+            dict(
+                project_id=self.test_project.id,
+                today=datetime.datetime.combine(
+                    datetime.datetime.utcnow().date(), datetime.time()
+                ),
+            ),
+        )
+        db.session.commit()
+        snapshot_contribs = ProjectService.get_contribs_by_day(self.test_project.id)
+
+        # Assert
+        self.assertIsNotNone(job)
+        self.assertEqual(Job.query.filter_by(name="save_contribs_snapshot").count(), 1)
+        self.assertIsNone(saved_by_request)
+        self.assertEqual(
+            snapshot.day, datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+        )
+        self.assertEqual(len(snapshot.stats), 834)
+        self.assertEqual(len(contribs.stats), 835)
+        self.assertEqual(contribs.to_primitive(), snapshot_contribs.to_primitive())
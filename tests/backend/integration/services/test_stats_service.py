@@ -1,6 +1,21 @@
+import datetime
+
+from backend import db
+from backend.models.postgis.campaign import Campaign
+from backend.models.postgis.global_stats import (
+    GLOBAL_STATS_SLOTS,
+    CampaignStats,
+    OrganisationStats,
+)
+from backend.models.postgis.project_activity import ProjectActivityStats
+from backend.models.postgis.statuses import TaskStatus
+from backend.models.postgis.task import Task, TaskAction
 from backend.services.stats_service import StatsService
 from tests.backend.base import BaseTestCase
-from tests.backend.helpers.test_helpers import create_canned_project
+from tests.backend.helpers.test_helpers import (
+    create_canned_organisation,
+    create_canned_project,
+)
 
 
 class TestStatsService(BaseTestCase):
@@ -17,3 +32,168 @@ class TestStatsService(BaseTestCase):
         self.assertGreaterEqual(stats.mappers_online, 0)
         self.assertGreater(stats.tasks_mapped, 0)
         self.assertGreater(stats.total_mappers, 0)
+
+    def test_homepage_stats_are_kept_up_to_date_by_triggers(self):
+        # Arrange
+        campaign = Campaign()
+        campaign.name = "Stats campaign"
+        campaign.create()
+        self.test_project.organisation = create_canned_organisation()
+        self.test_project.campaign.append(campaign)
+        self.test_project.save()
+
+        # Act
+        task = Task.get(2, self.test_project.id)
+        task.lock_task_for_validating(self.test_user.id)
+        task.unlock_task(self.test_user.id, new_state=TaskStatus.VALIDATED)
+        task = Task.get(4, self.test_project.id)
+        task.lock_task_for_validating(self.test_user.id)
+        task.unlock_task(self.test_user.id, new_state=TaskStatus.INVALIDATED)
+        db.session.commit()
+        stats = StatsService.get_homepage_stats(abbrev=False)
+        drift = StatsService.reconcile_global_stats()
+
+        # Assert
+        self.assertEqual(drift, {})
+        self.assertEqual(stats.total_projects, 1)
+        self.assertEqual(stats.tasks_mapped, 2)
+        self.assertEqual(stats.tasks_validated, 1)
+        self.assertEqual(stats.total_validators, 1)
+        self.assertEqual(stats.total_campaigns, 1)
+        self.assertEqual(stats.campaigns[0].projects_created, 1)
+        self.assertEqual(stats.organisations[0].projects_created, 1)
+
+    def test_organisation_and_campaign_stats_sum_their_slots(self):
+        # Arrange
+        campaign = Campaign()
+        campaign.name = "Slots campaign"
+        campaign.create()
+        self.test_project.organisation = create_canned_organisation()
+        self.test_project.campaign.append(campaign)
+        self.test_project.save()
+        # Move projects to another slot, as a concurrent transaction would
+        for model, key, key_id in [
+            (OrganisationStats, "organisation_id", self.test_project.organisation_id),
+            (CampaignStats, "campaign_id", campaign.id),
+        ]:
+            row = model.query.filter_by(**{key: key_id}).one()
+            row.total_projects -= 3
+            db.session.add(
+                model(
+                    **{key: key_id},
+                    slot=(row.slot + 1) % GLOBAL_STATS_SLOTS,
+                    total_projects=3,
+                    tasks_mapped=0,
+                    tasks_validated=0,
+                    mapped_area=0,
+                    validated_area=0,
+                )
+            )
+        db.session.commit()
+
+        # Act
+        stats = StatsService.get_homepage_stats(abbrev=False)
+        drift = StatsService.reconcile_global_stats()
+
+        # Assert
+        self.assertEqual(drift, {})
+        self.assertEqual(stats.campaigns[0].projects_created, 1)
+        self.assertEqual(stats.organisations[0].projects_created, 1)
+
+    def test_task_history_updates_activity_rollup(self):
+        # Arrange
+        task = Task.get(2, self.test_project.id)
+
+        # Act
+        task.set_task_history(
+            TaskAction.STATE_CHANGE, self.test_user.id, new_state=TaskStatus.MAPPED
+        )
+        task.update()
+        activity = StatsService.get_last_activity(self.test_project.id)
+
+        # Assert
+        contributors = ProjectActivityStats.get_total_contributors(
+            [self.test_project.id]
+        )
+        self.assertEqual(contributors[self.test_project.id], 1)
+        task_activity = [a for a in activity.activity if a.task_id == 2][0]
+        self.assertEqual(task_activity.action_by, self.test_user.username)
+
+    def test_rebuild_activity_stats_matches_task_history(self):
+        # Arrange
+        task = Task.get(2, self.test_project.id)
+        task.set_task_history(
+            TaskAction.STATE_CHANGE, self.test_user.id, new_state=TaskStatus.MAPPED
+        )
+        task.update()
+        ProjectActivityStats.query.filter_by(project_id=self.test_project.id).delete()
+
+        # Act
+        StatsService.rebuild_activity_stats(self.test_project.id)
+
+        # Assert
+        contributors = ProjectActivityStats.get_total_contributors(
+            [self.test_project.id]
+        )
+        self.assertEqual(contributors[self.test_project.id], 1)
+
+    def test_task_stats_count_the_first_state_changes_of_tasks(self):
+        # Arrange
+        today = datetime.datetime.utcnow().date()
+        task = Task.get(2, self.test_project.id)
+        for state in [
+            TaskStatus.MAPPED,
+            TaskStatus.INVALIDATED,
+            TaskStatus.MAPPED,
+            TaskStatus.VALIDATED,
+        ]:
+            task.set_task_history(
+                TaskAction.STATE_CHANGE, self.test_user.id, new_state=state
+            )
+        task.update()
+
+        # Act
+        stats = StatsService.get_task_stats(today, today, None, None, None, None, None)
+        StatsService.rebuild_activity_stats(self.test_project.id)
+        rebuilt_stats = StatsService.get_task_stats(
+            today, today, None, None, None, [self.test_project.id], None
+        )
+
+        # Assert
+        self.assertEqual(
+            [(day.mapped, day.validated, day.bad_imagery) for day in stats.stats],
+            [(1, 1, 0)],
+        )
+        self.assertEqual(rebuilt_stats.to_primitive(), stats.to_primitive())
+
+    def test_get_latest_activity_pages_by_cursor(self):
+        # Arrange
+        tasks = [Task.get(task_id, self.test_project.id) for task_id in [1, 2, 3, 4]]
+        for i in range(12):
+            tasks[i % 4].set_task_history(
+                TaskAction.STATE_CHANGE, self.test_user.id, new_state=TaskStatus.MAPPED
+            )
+        db.session.commit()
+
+        # Act
+        first_page = StatsService.get_latest_activity(
+            self.test_project.id, 1, cursor="", count="exact"
+        )
+        second_page = StatsService.get_latest_activity(
+            self.test_project.id, 1, cursor=first_page.pagination.next_cursor
+        )
+
+        # Assert
+        self.assertEqual(len(first_page.activity), 10)
+        self.assertEqual(first_page.pagination.total, 12)
+        self.assertTrue(first_page.pagination.has_next)
+        self.assertEqual(len(second_page.activity), 2)
+        self.assertFalse(second_page.pagination.has_next)
+        self.assertIsNone(second_page.pagination.next_cursor)
+        self.assertEqual(
+            sorted(
+                activity.task_id
+                for activity in first_page.activity + second_page.activity
+            ),
+            [1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4],
+        )
@@ -0,0 +1,98 @@
+import io
+
+from backend.models.postgis.task import Task
+from backend.models.postgis.task_annotation import TaskAnnotation
+from backend.services.task_annotations_service import (
+    TaskAnnotationsService,
+    TaskAnnotationsServiceError,
+)
+from tests.backend.base import BaseTestCase
+from tests.backend.helpers.test_helpers import create_canned_project
+
+
+class TestTaskAnnotationsService(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_project, _ = create_canned_project()
+
+    def get_properties(self) -> dict:
+        annotations = TaskAnnotation.query.filter_by(
+            project_id=self.test_project.id, annotation_type="building_area"
+        )
+        return {annotation.task_id: annotation.properties for annotation in annotations}
+
+    def test_upsert_annotations_inserts_and_updates_annotations(self):
+        # Arrange
+        TaskAnnotationsService.upsert_annotations(
+            self.test_project.id,
+            "building_area",
+            [
+                {"taskId": 1, "properties": {"area": "10"}},
+                {"taskId": 2, "properties": {"area": "20"}},
+            ],
+        )
+
+        # Act
+        counts = TaskAnnotationsService.upsert_annotations(
+            self.test_project.id,
+            "building_area",
+            [
+                {"taskId": 2, "properties": {"area": "25"}},
+                {"taskId": 3, "properties": {"area": "30"}},
+            ],
+            batch_size=1,
+        )
+
+        # Assert
+        self.assertEqual(counts, dict(inserted=1, updated=1))
+        self.assertEqual(
+            self.get_properties(),
+            {1: {"area": "10"}, 2: {"area": "25"}, 3: {"area": "30"}},
+        )
+
+    def test_upsert_annotations_saves_nothing_if_a_task_is_not_in_project(self):
+        # Arrange
+        annotations = TaskAnnotationsService.read_ndjson(
+            io.BytesIO(
+                b'{"taskId": 1, "properties": {"area": "10"}}\n'
+                b"\n"
+                b'{"taskId": 99, "properties": {"area": "20"}}\n'
+            )
+        )
+
+        # Act / Assert
+        with self.assertRaises(TaskAnnotationsServiceError):
+            TaskAnnotationsService.upsert_annotations(
+                self.test_project.id, "building_area", annotations, batch_size=1
+            )
+        self.assertEqual(self.get_properties(), {})
+
+    def test_upsert_annotations_clears_effort_prediction_no_longer_annotated(self):
+        # Arrange
+        TaskAnnotationsService.upsert_annotations(
+            self.test_project.id,
+            "ml_estimate",
+            [{"taskId": 1, "properties": {"building_area_diff": "5"}}],
+        )
+        TaskAnnotationsService.upsert_annotations(
+            self.test_project.id,
+            "building_area",
+            [
+                {"taskId": 1, "properties": {"building_area_diff": "10"}},
+                {"taskId": 2, "properties": {"building_area_diff": "20"}},
+            ],
+        )
+
+        # Act
+        TaskAnnotationsService.upsert_annotations(
+            self.test_project.id,
+            "building_area",
+            [
+                {"taskId": 1, "properties": {"building_area_diff": "unknown"}},
+                {"taskId": 2, "properties": {}},
+            ],
+        )
+
+        # Assert
+        self.assertEqual(Task.get(1, self.test_project.id).effort_prediction, 5)
+        self.assertIsNone(Task.get(2, self.test_project.id).effort_prediction)
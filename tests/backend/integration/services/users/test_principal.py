@@ -0,0 +1,70 @@
+from backend.models.postgis.statuses import (
+    MappingLevel,
+    TeamMemberFunctions,
+    TeamRoles,
+    UserRole,
+)
+from backend.models.postgis.utils import NotFound
+from backend.services.users.principal import Principal
+from tests.backend.base import BaseTestCase
+from tests.backend.helpers.test_helpers import (
+    add_user_to_team,
+    assign_team_to_project,
+    create_canned_organisation,
+    create_canned_project,
+    create_canned_team,
+    return_canned_user,
+)
+
+
+class TestPrincipal(BaseTestCase):
+    def test_principal_of_authenticated_user_is_reused_for_the_request(self):
+        # Arrange
+        test_user = return_canned_user()
+        test_user.role = UserRole.ADMIN.value
+        test_user.create()
+
+        with self.app.test_request_context():
+            Principal.set_current(test_user.id)
+
+            # Act
+            principal = Principal.get(test_user.id)
+            other_principal = Principal.get(1234)
+
+            # Assert
+            self.assertIs(principal, Principal.get(test_user.id))
+            self.assertIsNot(other_principal, Principal.get(1234))
+            self.assertTrue(principal.is_admin)
+            self.assertEqual(principal.mapping_level, MappingLevel.BEGINNER)
+
+    def test_principal_raises_error_if_user_not_found(self):
+        # Act / Assert
+        with self.assertRaises(NotFound):
+            Principal(1234).role
+
+    def test_principal_loads_team_roles_and_managed_organisations(self):
+        # Arrange
+        test_project, test_user = create_canned_project()
+        test_team = create_canned_team()
+        assign_team_to_project(test_project, test_team, TeamRoles.VALIDATOR.value)
+        add_user_to_team(
+            test_team, test_user, TeamMemberFunctions.MEMBER.value, is_active=True
+        )
+        test_org = create_canned_organisation()
+        test_org.managers = [test_user]
+
+        # Act
+        principal = Principal(test_user.id)
+
+        # Assert
+        self.assertTrue(
+            principal.has_team_role_on_project(
+                test_project.id, [TeamRoles.VALIDATOR.value]
+            )
+        )
+        self.assertFalse(
+            principal.has_team_role_on_project(
+                test_project.id, [TeamRoles.PROJECT_MANAGER.value]
+            )
+        )
+        self.assertTrue(principal.is_org_manager(test_org.id))
@@ -1,5 +1,13 @@
+import datetime
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch
 
+from sqlalchemy import text
+
+from backend import db
 from tests.backend.base import BaseTestCase
 from backend.models.postgis.message import Message
 from backend.services.users.user_service import (
@@ -17,6 +25,34 @@ from tests.backend.helpers.test_helpers import (
 )
 
 
+class StubOSMHandler(BaseHTTPRequestHandler):
+    """Answers OSM API user details requests from the changeset counts of the server"""
+
+    def do_GET(self):
+        match = re.fullmatch(r"/api/0.6/user/(\d+).json", self.path)
+        user_id = int(match.group(1)) if match else None
+        self.server.requests.append(user_id)
+        if self.server.requests.count(user_id) <= self.server.failures.get(user_id, 0):
+            self.send_response(503)
+            self.end_headers()
+            return
+        if user_id not in self.server.changeset_counts:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        count = self.server.changeset_counts[user_id]
+        body = json.dumps({"user": {"id": user_id, "changesets": {"count": count}}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
 class TestUserService(BaseTestCase):
     def test_upsert_inserts_project_if_not_exists(self):
         self.test_project, self.test_user = create_canned_project()
@@ -98,3 +134,121 @@ class TestUserService(BaseTestCase):
         # Assert
         self.assertEqual(expected_user.username, test_user.username)
         self.assertEqual(expected_user.mapping_level, MappingLevel.INTERMEDIATE.value)
+
+    def test_detailed_stats_are_kept_up_to_date_from_task_history(self):
+        # Arrange
+        test_project, mapper = create_canned_project()
+        test_project.country = ["Kenya"]
+        test_project.save()
+        validator = return_canned_user("Test Validator", 11111)
+        validator.create()
+        action_date = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        for task_id, user_id, action, action_text in [
+            (1, mapper.id, "LOCKED_FOR_MAPPING", "00:10:00"),
+            (1, mapper.id, "STATE_CHANGE", "MAPPED"),
+            (2, mapper.id, "STATE_CHANGE", "MAPPED"),
+            (1, validator.id, "LOCKED_FOR_VALIDATION", "00:05:00"),
+            (2, validator.id, "LOCKED_FOR_VALIDATION", "00:03:00"),
+            (1, validator.id, "STATE_CHANGE", "VALIDATED"),
+            (2, validator.id, "STATE_CHANGE", "INVALIDATED"),
+            (2, mapper.id, "STATE_CHANGE", "MAPPED"),
+        ]:
+            db.session.execute(
+                text(
+                    """
+                    insert into task_history (project_id, task_id, action, action_text, action_date, user_id)
+                    values (:project_id, :task_id, :action, :action_text, :action_date, :user_id)
+                    """
+                ),
+                dict(
+                    project_id=test_project.id,
+                    task_id=task_id,
+                    action=action,
+                    action_text=action_text,
+                    action_date=action_date,
+                    user_id=user_id,
+                ),
+            )
+        db.session.commit()
+
+        # Act
+        mapper_stats = UserService.get_detailed_stats(mapper.username)
+        validator_stats = UserService.get_detailed_stats(validator.username)
+        UserService.rebuild_user_stats()
+        rebuilt_mapper_stats = UserService.get_detailed_stats(mapper.username)
+        rebuilt_validator_stats = UserService.get_detailed_stats(validator.username)
+
+        # Assert
+        self.assertEqual(mapper_stats.tasks_mapped, 2)
+        self.assertEqual(mapper_stats.tasks_validated_by_others, 1)
+        self.assertEqual(mapper_stats.tasks_invalidated_by_others, 1)
+        self.assertEqual(mapper_stats.time_spent_mapping, 600)
+        self.assertEqual(mapper_stats.contributions_by_day[0].count, 3)
+        self.assertEqual(
+            mapper_stats.countries_contributed.countries_contributed[0].mapped, 3
+        )
+        self.assertEqual(validator_stats.tasks_validated, 1)
+        self.assertEqual(validator_stats.tasks_invalidated, 1)
+        self.assertEqual(validator_stats.tasks_validated_by_others, 0)
+        self.assertEqual(validator_stats.time_spent_validating, 300)
+        self.assertEqual(
+            rebuilt_mapper_stats.to_primitive(), mapper_stats.to_primitive()
+        )
+        self.assertEqual(
+            rebuilt_validator_stats.to_primitive(), validator_stats.to_primitive()
+        )
+
+    def test_refresh_mapper_level_fetches_changeset_counts_from_osm(self):
+        # Arrange
+        levels = {
+            1: MappingLevel.BEGINNER,
+            2: MappingLevel.BEGINNER,
+            3: MappingLevel.INTERMEDIATE,
+            4: MappingLevel.BEGINNER,
+            5: MappingLevel.ADVANCED,
+            6: MappingLevel.BEGINNER,
+        }
+        for user_id, level in levels.items():
+            user = return_canned_user(f"user {user_id}", user_id)
+            user.mapping_level = level.value
+            db.session.add(user)
+        # User 6 was checked yesterday, so isn't checked again yet
+        User.get_by_id(
+            6
+        ).changesets_checked_at = datetime.datetime.utcnow() - datetime.timedelta(
+            days=1
+        )
+        db.session.commit()
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubOSMHandler)
+        server.requests = []
+        server.changeset_counts = {1: 300, 2: 600, 3: 1000, 6: 1000}
+        server.failures = {2: 1}  # Answered after a retry
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        config = {
+            "OSM_SERVER_URL": f"http://127.0.0.1:{server.server_port}",
+            "OSM_REFRESH_REQUESTS_PER_SECOND": 100,
+        }
+
+        # Act
+        with patch.dict(self.app.config, config):
+            users_upgraded = UserService.refresh_mapper_level(batch_size=2)
+        server.shutdown()
+        server.server_close()
+
+        # Assert
+        self.assertEqual(users_upgraded, 3)
+        self.assertCountEqual(server.requests, [1, 2, 2, 3, 4])
+        expected_levels = {
+            1: MappingLevel.INTERMEDIATE,
+            2: MappingLevel.ADVANCED,
+            3: MappingLevel.ADVANCED,
+            4: MappingLevel.BEGINNER,
+            5: MappingLevel.ADVANCED,
+            6: MappingLevel.BEGINNER,
+        }
+        for user_id, level in expected_levels.items():
+            user = User.get_by_id(user_id)
+            self.assertEqual(MappingLevel(user.mapping_level), level)
+            self.assertEqual(user.changesets_checked_at is not None, user_id != 5)
+        self.assertEqual(Message.query.count(), 3)
@@ -1,12 +1,16 @@
 import json
 import geojson
+import shapely.geometry
 
 from backend.models.dtos.grid_dto import GridDTO
 from backend.models.dtos.project_dto import DraftProjectDTO
 from backend.models.postgis.utils import InvalidGeoJson
 from backend.services.grid.grid_service import GridService
 from tests.backend.base import BaseTestCase
-from tests.backend.helpers.test_helpers import get_canned_json
+from tests.backend.helpers.test_helpers import (
+    get_canned_json,
+    get_large_aoi_grid_json,
+)
 
 
 class TestGridService(BaseTestCase):
@@ -69,6 +73,24 @@ class TestGridService(BaseTestCase):
         # assert
         self.assertEqual(str(expected), str(result))
 
+    def test_trim_grid_to_large_aoi(self):
+        # arrange
+        grid_json = get_large_aoi_grid_json()
+        grid_dto = GridDTO(grid_json)
+        aoi = shapely.geometry.shape(
+            GridService.merge_to_multi_polygon(grid_dto.area_of_interest, True)
+        )
+
+        # act
+        result = GridService.trim_grid_to_aoi(grid_dto)
+
+        # assert
+        tiles = [shapely.geometry.shape(f["geometry"]) for f in result["features"]]
+        squares = [f for f in result["features"] if f["properties"]["isSquare"]]
+        self.assertAlmostEqual(sum(tile.area for tile in tiles), aoi.area, places=3)
+        self.assertGreater(len(squares), 0)
+        self.assertLess(len(squares), len(tiles))
+
     def test_tasks_from_aoi_features(self):
         # arrange
         grid_json = get_canned_json("test_arbitrary.json")
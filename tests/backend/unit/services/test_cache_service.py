@@ -0,0 +1,262 @@
+import fnmatch
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+
+from backend.models.dtos.project_dto import ProjectSearchDTO
+from backend.models.postgis.statuses import UserRole
+from backend.models.postgis.user import User
+from backend.services.cache_service import (
+    CacheService,
+    LocalCacheBackend,
+    FileCacheBackend,
+    RedisCacheBackend,
+    cached,
+)
+from tests.backend.base import BaseTestCase
+
+
+class RedisStandInHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough of the Redis protocol to exercise RedisCacheBackend"""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def write_bulk(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b"GET":
+                self.write_bulk(store.get(args[1]))
+            elif command == b"MGET":
+                self.wfile.write(b"*%d\r\n" % (len(args) - 1))
+                for key in args[1:]:
+                    self.write_bulk(store.get(key))
+            elif command == b"SET":
+                store[args[1]] = args[2]
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"INCR":
+                value = int(store.get(args[1], b"0")) + 1
+                store[args[1]] = str(value).encode()
+                self.wfile.write(b":%d\r\n" % value)
+            elif command in (b"EXPIRE", b"DEL"):
+                if command == b"DEL":
+                    for key in args[1:]:
+                        store.pop(key, None)
+                self.wfile.write(b":1\r\n")
+            elif command == b"SCAN":
+                keys = [k for k in store if fnmatch.fnmatch(k, args[3])]
+                self.wfile.write(b"*2\r\n")
+                self.write_bulk(b"0")
+                self.wfile.write(b"*%d\r\n" % len(keys))
+                for key in keys:
+                    self.write_bulk(key)
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+class TestCacheService(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.server = socketserver.ThreadingTCPServer(
+            ("127.0.0.1", 0), RedisStandInHandler
+        )
+        self.server.daemon_threads = True
+        self.server.store = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.backends = [
+            LocalCacheBackend(),
+            FileCacheBackend(self.cache_dir),
+            RedisCacheBackend(f"redis://{host}:{port}/0"),
+        ]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+        CacheService.set_backend(LocalCacheBackend())
+        super().tearDown()
+
+    def test_backends_store_values(self):
+        for backend in self.backends:
+            # Act
+            backend.set("a", {"value": [1, 2]})
+
+            # Assert
+            self.assertEqual(backend.get("a"), {"value": [1, 2]})
+            self.assertEqual(backend.get_many(["a", "c"]), [{"value": [1, 2]}, None])
+
+    def test_expired_values_are_dropped(self):
+        # Expiry of the redis backend is handled by the server itself
+        for backend in self.backends[:2]:
+            # Act
+            backend.set("b", "expired", ttl=-1)
+
+            # Assert
+            self.assertIsNone(backend.get("b"))
+
+    def test_backends_increment_counters(self):
+        for backend in self.backends:
+            # Act
+            backend.incr("version")
+            backend.incr("version")
+
+            # Assert
+            self.assertEqual(backend.get_counters(["version", "other"]), [2, None])
+
+    def test_backends_get_prefixed_entries(self):
+        for backend in self.backends:
+            # Arrange
+            backend.set("p:a", 1)
+            backend.set("p:b", 2)
+            backend.set("q:c", 4)
+            # Expiry of the redis backend is handled by the server itself
+            if not isinstance(backend, RedisCacheBackend):
+                backend.set("p:expired", 3, ttl=-1)
+
+            # Act
+            values = backend.get_prefixed("p:")
+
+            # Assert
+            self.assertEqual(values, {"p:a": 1, "p:b": 2})
+
+    def test_local_backend_never_evicts_counters(self):
+        # Arrange
+        backend = LocalCacheBackend(maxsize=2)
+        backend.incr("version")
+
+        # Act
+        for key in ["a", "b", "c"]:
+            backend.set(key, 1)
+
+        # Assert
+        self.assertEqual(backend.get_counters(["version"]), [1])
+        self.assertEqual(backend.incr("version"), 2)
+
+    def test_backends_clear_entries(self):
+        for backend in self.backends:
+            # Arrange
+            backend.set("a", 1)
+
+            # Act
+            backend.clear()
+
+            # Assert
+            self.assertIsNone(backend.get("a"))
+
+    def test_file_backend_sweeps_expired_and_extra_entries(self):
+        # Arrange
+        backend = FileCacheBackend(self.cache_dir, maxsize=2)
+        backend.incr("version")
+        backend.set("expired", 1, ttl=-1)
+
+        # Act
+        for key, ttl in [("a", 60), ("b", 120), ("c", 180)]:
+            backend.set(key, key, ttl=ttl)
+
+        # Assert
+        cache_files = [f for f in os.listdir(self.cache_dir) if f.endswith(".cache")]
+        self.assertEqual(len(cache_files), 2)
+        self.assertEqual(backend.get_many(["a", "b", "c"]), [None, "b", "c"])
+        self.assertEqual(backend.get_counters(["version"]), [1])
+
+    def test_file_backend_is_shared_between_instances(self):
+        # Arrange
+        FileCacheBackend(self.cache_dir).set("a", 1)
+
+        # Act/Assert
+        self.assertEqual(FileCacheBackend(self.cache_dir).get("a"), 1)
+
+    def test_cached_result_is_invalidated_when_project_changes(self):
+        # Arrange
+        calls = []
+
+        @cached("test", key=lambda project_id: project_id, ttl=60, projects=list)
+        def load(project_id):
+            calls.append(project_id)
+            return [project_id]
+
+        for backend in self.backends:
+            CacheService.set_backend(backend)
+            calls.clear()
+
+            # Act
+            load(1)
+            load(1)
+            CacheService.invalidate_project(2)
+            load(1)
+            CacheService.invalidate_project(1)
+            load(1)
+
+            # Assert
+            self.assertEqual(calls, [1, 1])
+
+    def test_result_computed_while_project_changes_is_not_cached(self):
+        # Arrange
+        calls = []
+
+        @cached("test", key=lambda project_id: project_id, ttl=60, projects=list)
+        def load(project_id):
+            calls.append(project_id)
+            if len(calls) == 1:
+                CacheService.invalidate_project(project_id, catalogue=False)
+            return [project_id]
+
+        for backend in self.backends:
+            CacheService.set_backend(backend)
+            calls.clear()
+
+            # Act
+            load(1)
+            load(1)
+            load(1)
+
+            # Assert
+            self.assertEqual(calls, [1, 1])
+
+    def test_search_key_parts_ignore_list_order_and_empty_fields(self):
+        # Arrange
+        first_dto = ProjectSearchDTO()
+        first_dto.page = 1
+        first_dto.project_statuses = ["PUBLISHED", "ARCHIVED"]
+        second_dto = ProjectSearchDTO()
+        second_dto.page = 1
+        second_dto.project_statuses = ["ARCHIVED", "PUBLISHED"]
+        second_dto.interests = []
+
+        # Act/Assert
+        self.assertEqual(
+            CacheService.get_search_key_parts(first_dto),
+            CacheService.get_search_key_parts(second_dto),
+        )
+
+    def test_admins_share_fingerprint(self):
+        # Arrange
+        first_admin = User(id=1, role=UserRole.ADMIN.value)
+        second_admin = User(id=2, role=UserRole.ADMIN.value)
+
+        # Act/Assert
+        self.assertEqual(
+            CacheService.get_user_fingerprint(first_admin),
+            CacheService.get_user_fingerprint(second_admin),
+        )
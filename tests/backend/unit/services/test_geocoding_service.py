@@ -0,0 +1,30 @@
+from shapely.geometry import Point, box
+
+from backend.services.geocoding_service import GeocodingService
+from tests.backend.base import BaseTestCase
+
+
+class TestGeocodingService(BaseTestCase):
+    def test_get_countries_returns_country_of_point(self):
+        # Act
+        nairobi = GeocodingService.get_countries(Point(36.82, -1.29))
+        dodoma = GeocodingService.get_countries(Point(35.74, -6.17))
+        gulf_of_guinea = GeocodingService.get_countries(Point(0, 0))
+
+        # Assert
+        self.assertEqual(nairobi, ["Kenya"])
+        self.assertEqual(dodoma, ["Tanzania"])
+        self.assertEqual(gulf_of_guinea, [])
+
+    def test_get_countries_returns_every_country_of_area(self):
+        # Arrange
+        kilimanjaro_area = box(36.5, -3.5, 37.5, -2.5)
+        nairobi_area = box(36.7, -1.4, 36.9, -1.2)
+
+        # Act
+        border_countries = GeocodingService.get_countries(kilimanjaro_area)
+        countries = GeocodingService.get_countries(nairobi_area)
+
+        # Assert
+        self.assertCountEqual(border_countries, ["Kenya", "Tanzania"])
+        self.assertEqual(countries, ["Kenya"])
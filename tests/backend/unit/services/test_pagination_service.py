@@ -0,0 +1,33 @@
+import datetime
+
+from backend.services.pagination_service import (
+    PaginationService,
+    PaginationServiceError,
+)
+from tests.backend.base import BaseTestCase
+
+
+class TestPaginationService(BaseTestCase):
+    def test_cursor_keeps_sort_key_values(self):
+        # Arrange
+        action_date = datetime.datetime(2021, 3, 4, 5, 6, 7, 890)
+
+        # Act
+        cursor = PaginationService.encode_cursor("-action_date", [action_date, 42])
+        values = PaginationService.decode_cursor(cursor, "-action_date", 2)
+
+        # Assert
+        self.assertEqual(values, [action_date.isoformat(), 42])
+
+    def test_decode_cursor_raises_error_if_cursor_is_invalid(self):
+        # Arrange
+        cursor = PaginationService.encode_cursor("-action_date", [None, 42])
+
+        # Act / Assert
+        for invalid_cursor, sort_name, length in [
+            (cursor, "action_date", 2),
+            (cursor, "-action_date", 3),
+            ("not a cursor", "-action_date", 2),
+        ]:
+            with self.assertRaises(PaginationServiceError):
+                PaginationService.decode_cursor(invalid_cursor, sort_name, length)
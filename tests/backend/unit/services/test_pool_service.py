@@ -0,0 +1,76 @@
+import shutil
+import sqlite3
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from sqlalchemy import exc
+
+from backend.services.cache_service import (
+    CacheService,
+    FileCacheBackend,
+    LocalCacheBackend,
+)
+from backend.services.pool_service import InstrumentedQueuePool, PoolService
+from tests.backend.base import BaseTestCase
+
+
+class TestPoolService(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = InstrumentedQueuePool(
+            lambda: sqlite3.connect(":memory:"),
+            pool_size=1,
+            max_overflow=0,
+            timeout=0.01,
+        )
+
+    def tearDown(self):
+        self.pool.dispose()
+        super().tearDown()
+
+    def test_pool_counts_checkouts(self):
+        # Act
+        self.pool.connect().close()
+        connection = self.pool.connect()
+
+        # Assert
+        metrics = self.pool.get_metrics()
+        self.assertEqual(metrics["checkouts"], 2)
+        self.assertEqual(metrics["checked_out"], 1)
+        self.assertEqual(metrics["timeouts"], 0)
+        connection.close()
+
+    def test_pool_counts_timeouts(self):
+        # Arrange
+        connection = self.pool.connect()
+
+        # Act
+        with self.assertRaises(exc.TimeoutError):
+            self.pool.connect()
+
+        # Assert
+        metrics = self.pool.get_metrics()
+        self.assertEqual(metrics["timeouts"], 1)
+        self.assertGreaterEqual(metrics["max_wait_seconds"], 0.01)
+        connection.close()
+
+    def test_metrics_of_every_worker_are_listed(self):
+        # Arrange
+        cache_dir = tempfile.mkdtemp()
+        CacheService.set_backend(FileCacheBackend(cache_dir))
+        engine = SimpleNamespace(pool=self.pool)
+        with patch("backend.services.pool_service.os.getpid", return_value=1):
+            PoolService.publish_metrics(engine, force=True)
+
+        # Act
+        with patch("backend.services.pool_service.os.getpid", return_value=2):
+            metrics = PoolService.get_metrics(engine)
+
+        # Assert
+        CacheService.set_backend(LocalCacheBackend())
+        shutil.rmtree(cache_dir)
+        self.assertEqual(
+            [worker["worker"].split(":")[-1] for worker in metrics["workers"]],
+            ["1", "2"],
+        )
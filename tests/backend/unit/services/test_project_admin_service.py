@@ -37,14 +37,15 @@ class TestProjectAdminService(BaseTestCase):
         test_project = Project()
 
         # Act
-        ProjectAdminService._attach_tasks_to_project(
+        task_rows = ProjectAdminService._attach_tasks_to_project(
             test_project, valid_feature_collection
         )
 
         # Assert
+        self.assertEqual(1, test_project.total_tasks)
         self.assertEqual(
             1,
-            test_project.tasks.count(),
+            len(task_rows),
             "One task should have been attached to project",
         )
 
@@ -111,25 +112,18 @@ class TestProjectAdminService(BaseTestCase):
             ProjectAdminService._validate_imagery_licence(1)
 
     @patch.object(ProjectAdminService, "_get_project_by_id")
-    @patch("flask_sqlalchemy._QueryProperty.__get__")
-    @patch.object(Task, "set_task_history")
-    def test_reset_all_tasks(self, mock_set_task_history, mock_query, mock_get_project):
+    @patch.object(Task, "bulk_reset_tasks")
+    def test_reset_all_tasks(self, mock_bulk_reset_tasks, mock_get_project):
         user_id = 123
         test_project = MagicMock(spec=Project)
         test_project.id = 456
         test_project.tasks_mapped = 2
         test_project.tasks_validated = 2
-        test_tasks = [MagicMock(spec=Task), MagicMock(spec=Task), MagicMock(spec=Task)]
-
-        mock_query.return_value.filter.return_value.all.return_value = test_tasks
         mock_get_project.return_value = test_project
 
         ProjectAdminService.reset_all_tasks(test_project.id, user_id)
 
-        for test_task in test_tasks:
-            test_task.set_task_history.assert_called()
-            test_task.reset_task.assert_called_with(user_id)
-
+        mock_bulk_reset_tasks.assert_called_with(test_project.id, user_id)
         mock_get_project.assert_called_with(test_project.id)
         self.assertEqual(test_project.tasks_mapped, 0)
         self.assertEqual(test_project.tasks_validated, 0)
@@ -1,7 +1,7 @@
 from unittest.mock import patch
 from flask import current_app
 
-from backend.services.messaging.smtp_service import SMTPService
+from backend.services.job_service import JobService
 from backend.services.project_service import (
     ProjectService,
     Project,
@@ -196,7 +196,7 @@ class TestProjectService(BaseTestCase):
         self.assertFalse(allowed)
         self.assertEqual(reason, ValidatingNotAllowed.USER_NOT_ACCEPTED_LICENSE)
 
-    @patch.object(SMTPService, "send_email_to_contributors_on_project_progress")
+    @patch.object(JobService, "enqueue")
     @patch.object(Project, "calculate_tasks_percent")
     @patch.object(ProjectInfo, "get_dto_for_locale")
     @patch.object(ProjectService, "get_project_by_id")
@@ -212,7 +212,7 @@ class TestProjectService(BaseTestCase):
         # Assert
         mock_send_email.assert_called()
 
-    @patch.object(SMTPService, "send_email_to_contributors_on_project_progress")
+    @patch.object(JobService, "enqueue")
     @patch.object(Project, "calculate_tasks_percent")
     @patch.object(ProjectInfo, "get_dto_for_locale")
     @patch.object(ProjectService, "get_project_by_id")
@@ -228,7 +228,7 @@ class TestProjectService(BaseTestCase):
         # Assert
         mock_send_email.assert_called()
 
-    @patch.object(SMTPService, "send_email_to_contributors_on_project_progress")
+    @patch.object(JobService, "enqueue")
     @patch.object(Project, "calculate_tasks_percent")
     @patch.object(ProjectInfo, "get_dto_for_locale")
     @patch.object(ProjectService, "get_project_by_id")
@@ -244,7 +244,7 @@ class TestProjectService(BaseTestCase):
         # Assert
         self.assertFalse(mock_send_email.called)
 
-    @patch.object(SMTPService, "send_email_to_contributors_on_project_progress")
+    @patch.object(JobService, "enqueue")
     @patch.object(Project, "calculate_tasks_percent")
     @patch.object(ProjectService, "get_project_by_id")
     def test_send_email_on_project_progress_doesnt_send_email_if_email_already_sent(
@@ -261,7 +261,7 @@ class TestProjectService(BaseTestCase):
         # Assert
         self.assertFalse(mock_send_email.called)
 
-    @patch.object(SMTPService, "send_email_to_contributors_on_project_progress")
+    @patch.object(JobService, "enqueue")
     @patch.object(ProjectService, "get_project_by_id")
     def test_send_email_on_project_progress_doesnt_send_email_if_send_project_update_email_is_disabled(
         self, mock_project, mock_send_email
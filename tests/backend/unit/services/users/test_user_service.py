@@ -1,5 +1,3 @@
-from unittest.mock import patch
-from backend.models.postgis.user import User
 from backend.services.users.user_service import (
     UserService,
     UserServiceError,
@@ -52,25 +50,23 @@ class TestUserService(BaseTestCase):
         # Act
         self.assertFalse(UserService.is_user_an_admin(user.id))
 
-    @patch.object(UserService, "get_user_by_id")
-    def test_mapper_role_is_not_recognized_as_a_validator(self, mock_user):
+    def test_mapper_role_is_not_recognized_as_a_validator(self):
         # Arrange
-        stub_user = User()
-        stub_user.role = UserRole.MAPPER.value
-        mock_user.return_value = stub_user
+        user = return_canned_user()
+        user.role = UserRole.MAPPER.value
+        user.create()
 
         # Act / Assert
-        self.assertFalse(UserService.is_user_validator(123))
+        self.assertFalse(UserService.is_user_validator(user.id))
 
-    @patch.object(UserService, "get_user_by_id")
-    def test_admin_role_is_recognized_as_a_validator(self, mock_user):
+    def test_admin_role_is_recognized_as_a_validator(self):
         # Arrange
-        stub_user = User()
-        stub_user.role = UserRole.ADMIN.value
-        mock_user.return_value = stub_user
+        user = return_canned_user()
+        user.role = UserRole.ADMIN.value
+        user.create()
 
         # Act / Assert
-        self.assertTrue(UserService.is_user_validator(123))
+        self.assertTrue(UserService.is_user_validator(user.id))
 
     def test_unknown_role_raise_error_when_setting_role(self):
         # Act / Assert